@@ -1,9 +1,17 @@
-import json
 import os
+import sys
 import time
 import pika
 
+sys.path.append("/app/common")
+from codec import get_codec, decode_event
+from instrumentation import MessageMetrics, start_http_server
+
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = no /metrics listener
+codec = get_codec()  # EVENT_CODEC=json|binary
+instruments = MessageMetrics("rabbitmq_inventory_service", "inventory_order_queue")
+publish_latency = instruments.publish("inventory_events")
 
 inventory = {"burger": 100, "pizza": 100, "salad": 100}
 processed_orders = set()  # idempotency: track already-processed order IDs
@@ -22,12 +30,21 @@ def get_rabbit_connection(retries=10, delay=3):
 
 
 def on_order_placed(ch, method, properties, body):
+    with instruments.processing.time():
+        handle_order_placed(ch, method, properties, body)
+
+
+def handle_order_placed(ch, method, properties, body):
     try:
-        message = json.loads(body)
-    except json.JSONDecodeError:
+        message = decode_event(body, properties.content_type)
+    except ValueError:
         print(f"[InventoryService] Malformed message, rejecting to DLQ: {body[:100]}")
+        instruments.failed.inc()
         ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
         return
+    instruments.processed.inc()
+    if isinstance(message.get("timestamp"), (int, float)):
+        instruments.age.observe(time.time() - message["timestamp"])
 
     order_id = message.get("order_id")
     item = message.get("item", "burger")
@@ -64,16 +81,19 @@ def on_order_placed(ch, method, properties, body):
         }
         print(f"[InventoryService] Failed to reserve {qty}x {item}")
 
-    ch.basic_publish(
-        exchange="inventory_events",
-        routing_key="",
-        body=json.dumps(event),
-        properties=pika.BasicProperties(delivery_mode=2),
-    )
+    with publish_latency.time():
+        ch.basic_publish(
+            exchange="inventory_events",
+            routing_key="",
+            body=codec.encode(event),
+            properties=pika.BasicProperties(delivery_mode=2, content_type=codec.content_type),
+        )
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
 
 def main():
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
     conn = get_rabbit_connection()
     ch = conn.channel()
 
@@ -1,9 +1,17 @@
-import json
 import os
+import sys
 import time
 import pika
 
+sys.path.append("/app/common")
+from codec import get_codec, decode_event
+from instrumentation import MessageMetrics, start_http_server
+
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = no /metrics listener
+codec = get_codec()  # EVENT_CODEC=json|binary
+instruments = MessageMetrics("rabbitmq_notification_service", "notification_queue")
+publish_latency = instruments.publish("notification_events")
 
 
 def get_rabbit_connection(retries=10, delay=3):
@@ -19,37 +27,62 @@ def get_rabbit_connection(retries=10, delay=3):
 
 
 def on_inventory_event(ch, method, properties, body):
+    with instruments.processing.time():
+        handle_inventory_event(ch, method, properties, body)
+
+
+def handle_inventory_event(ch, method, properties, body):
     try:
-        message = json.loads(body)
-    except json.JSONDecodeError:
+        message = decode_event(body, properties.content_type)
+    except ValueError:
         print(f"[NotificationService] Malformed message: {body[:100]}")
+        instruments.failed.inc()
         ch.basic_ack(delivery_tag=method.delivery_tag)
         return
+    instruments.processed.inc()
+    if isinstance(message.get("timestamp"), (int, float)):
+        instruments.age.observe(time.time() - message["timestamp"])
 
     event = message.get("event")
     order_id = message.get("order_id")
 
     if event == "InventoryReserved":
+        notice = "confirmation"
         print(
             f"[NotificationService] Sending confirmation for order {order_id}: "
             f"{message.get('qty')}x {message.get('item')} reserved successfully"
         )
     elif event == "InventoryFailed":
+        notice = "failure"
         print(
             f"[NotificationService] Sending failure notice for order {order_id}: "
             f"{message.get('reason')}"
         )
     else:
         print(f"[NotificationService] Unknown event: {event}")
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        return
 
+    # Tell OrderService the order is notified (placed -> reserved -> notified)
+    sent = {"event": "NotificationSent", "order_id": order_id, "notice": notice, "timestamp": time.time()}
+    with publish_latency.time():
+        ch.basic_publish(
+            exchange="notification_events",
+            routing_key="",
+            body=codec.encode(sent),
+            properties=pika.BasicProperties(delivery_mode=2, content_type=codec.content_type),
+        )
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
 
 def main():
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
     conn = get_rabbit_connection()
     ch = conn.channel()
 
     ch.exchange_declare(exchange="inventory_events", exchange_type="fanout", durable=True)
+    ch.exchange_declare(exchange="notification_events", exchange_type="fanout", durable=True)
 
     ch.queue_declare(queue="notification_queue", durable=True)
     ch.queue_bind(queue="notification_queue", exchange="inventory_events")
@@ -1,15 +1,49 @@
-import json
 import os
+import sys
 import uuid
 import time
+import threading
 import pika
 from flask import Flask, request, jsonify
 
+sys.path.append("/app/common")
+from codec import get_codec, decode_event
+from instrumentation import instrument_flask, publish_latency as publish_histogram, completion_latency
+from loadgen import LatencyHistogram
+
+from order_store import OrderStore
+
 app = Flask(__name__)
+instrument_flask(app, "rabbitmq_order_service")  # GET /metrics, request latency per route
 
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
-
-orders = {}
+codec = get_codec()  # EVENT_CODEC=json|binary
+
+# Connect + basic_publish time per order (the cost the 201 waits for)
+publish_latency = publish_histogram("rabbitmq_order_service", "order_events")
+
+# Order status from the events that follow it: placed -> reserved/failed -> notified
+STATUS_QUEUE = "order_status_queue"
+STAGES = {"InventoryReserved": "reserved", "InventoryFailed": "failed", "NotificationSent": "notified"}
+stage_latency = {stage: completion_latency("rabbitmq_order_service", stage) for stage in STAGES.values()}
+# The same latencies at 0.1% precision in constant memory, for GET /orders/latency
+stage_percentiles = {stage: LatencyHistogram() for stage in STAGES.values()}
+stage_percentiles_lock = threading.Lock()
+# Status events are small and cheap to apply: a deeper prefetch keeps the
+# measured completion latency from waiting on one ack round trip per event
+STATUS_PREFETCH = int(os.getenv("STATUS_PREFETCH", "100"))
+STATUS_RECONNECT_SECONDS = float(os.getenv("STATUS_RECONNECT_SECONDS", "3"))
+status_stop = threading.Event()  # Set to end the status consumer thread
+
+# Bounded, indexed orders; ORDER_DB adds SQLite write-through and an archive of evicted orders
+orders = OrderStore(
+    max_orders=int(os.getenv("MAX_ORDERS", "100000")),
+    completed_ttl_seconds=int(os.getenv("COMPLETED_TTL_SECONDS", "0")),
+    db_path=os.getenv("ORDER_DB", ""),
+)
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+PAGE_PARAMETERS = ("status", "item", "limit", "cursor")  # Any of them selects the paged GET /orders
 
 
 def get_rabbit_connection(retries=10, delay=3):
@@ -37,12 +71,82 @@ def setup_exchanges():
     ch.queue_declare(queue="dead_letter_queue", durable=True)
     ch.queue_bind(queue="dead_letter_queue", exchange="dlx")
 
-    # Inventory events exchange
+    # Inventory and notification events exchanges
     ch.exchange_declare(exchange="inventory_events", exchange_type="fanout", durable=True)
+    ch.exchange_declare(exchange="notification_events", exchange_type="fanout", durable=True)
 
     conn.close()
 
 
+def record_stage(message, now=None):
+    """
+    Move an order to the stage an event reports and record the time since it
+    was placed. Returns False for unknown orders, other events and repeats.
+    """
+    stage = STAGES.get(message.get("event"))
+    if stage is None:
+        return False
+    now = time.time() if now is None else now
+    fields = {"reason": message.get("reason")} if stage == "failed" else {}
+    order = orders.set_status(message.get("order_id"), stage, now, **fields)
+    if order is None:
+        return False
+    elapsed = now - order["timestamps"]["placed"]
+    stage_latency[stage].observe(elapsed)
+    with stage_percentiles_lock:
+        stage_percentiles[stage].record(elapsed * 1_000_000)  # Microseconds
+    return True
+
+
+def on_status_event(ch, method, properties, body):
+    try:
+        message = decode_event(body, properties.content_type)
+    except ValueError:
+        print(f"[OrderService] Malformed status event: {body[:100]}")
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        return
+    try:
+        record_stage(message)
+    except Exception as e:
+        # Redelivering it would fail the same way: log and drop
+        print(f"[OrderService] Could not apply status event {message.get('event')} "
+              f"for {message.get('order_id')}: {e}")
+    ch.basic_ack(delivery_tag=method.delivery_tag)
+
+
+def consume_status_events():
+    """
+    Consume inventory and notification events into the order status (runs in a thread)
+
+    A lost connection is reopened after STATUS_RECONNECT_SECONDS until
+    status_stop is set; unacked events are redelivered, and record_stage
+    skips the stages an order already has.
+    """
+    while not status_stop.is_set():
+        try:
+            conn = get_rabbit_connection()
+            ch = conn.channel()
+            ch.queue_declare(queue=STATUS_QUEUE, durable=True)
+            ch.queue_bind(queue=STATUS_QUEUE, exchange="inventory_events")
+            ch.queue_bind(queue=STATUS_QUEUE, exchange="notification_events")
+            ch.basic_qos(prefetch_count=STATUS_PREFETCH)
+            ch.basic_consume(queue=STATUS_QUEUE, on_message_callback=on_status_event)
+            print("[OrderService] Waiting for inventory and notification events...")
+            ch.start_consuming()
+        except Exception as e:
+            if status_stop.is_set():
+                break
+            print(f"[OrderService] Status consumer lost its connection ({e!r}), "
+                  f"reconnecting in {STATUS_RECONNECT_SECONDS}s...")
+        status_stop.wait(STATUS_RECONNECT_SECONDS)
+
+
+def start_status_consumer():
+    thread = threading.Thread(target=consume_status_events, daemon=True)
+    thread.start()
+    return thread
+
+
 @app.route("/order", methods=["POST"])
 def create_order():
     data = request.get_json() or {}
@@ -50,36 +154,77 @@ def create_order():
     item = data.get("item", "burger")
     qty = data.get("qty", 1)
 
-    order = {"order_id": order_id, "item": item, "qty": qty, "status": "placed"}
-    orders[order_id] = order
+    placed_at = time.time()
+    order = {"order_id": order_id, "item": item, "qty": qty, "status": "placed",
+             "timestamps": {"placed": placed_at}}
+    orders.add(order)
 
     message = {
         "event": "OrderPlaced",
         "order_id": order_id,
         "item": item,
         "qty": qty,
-        "timestamp": time.time(),
+        "timestamp": placed_at,
     }
 
-    conn = get_rabbit_connection()
-    ch = conn.channel()
-    ch.basic_publish(
-        exchange="order_events",
-        routing_key="",
-        body=json.dumps(message),
-        properties=pika.BasicProperties(
-            delivery_mode=2,  
-            message_id=order_id,
-        ),
-    )
-    conn.close()
+    with publish_latency.time():
+        conn = get_rabbit_connection()
+        ch = conn.channel()
+        ch.basic_publish(
+            exchange="order_events",
+            routing_key="",
+            body=codec.encode(message),
+            properties=pika.BasicProperties(
+                delivery_mode=2,  
+                message_id=order_id,
+                content_type=codec.content_type,
+            ),
+        )
+        conn.close()
 
     return jsonify(order), 201
 
 
 @app.route("/orders", methods=["GET"])
 def list_orders():
-    return jsonify(list(orders.values()))
+    """
+    Without parameters: every order in memory, as a list (oldest first).
+    With any of ?status=&item=&limit=&cursor=: one page of orders, newest
+    first, as {"orders": [...], "next_cursor": ...}. Pass next_cursor back
+    as cursor for the next page (same filters).
+    """
+    if not any(name in request.args for name in PAGE_PARAMETERS):
+        return jsonify(orders.values())
+    try:
+        limit = min(max(int(request.args.get("limit", PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        cursor = request.args.get("cursor")
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers"}), 400
+    page, next_cursor = orders.list(status=request.args.get("status"), item=request.args.get("item"),
+                                    limit=limit, cursor=cursor)
+    return jsonify({"orders": page, "next_cursor": str(next_cursor) if next_cursor else None})
+
+
+@app.route("/orders/stats", methods=["GET"])
+def order_stats():
+    """Orders in memory by status, evictions and limits"""
+    return jsonify(orders.stats())
+
+
+@app.route("/orders/latency", methods=["GET"])
+def order_latency():
+    """Placed -> reserved / failed / notified latency in ms of every order since the service started"""
+    stages = {}
+    with stage_percentiles_lock:
+        for stage, histogram in stage_percentiles.items():
+            if not histogram.total_count:
+                stages[stage] = {"count": 0}
+                continue
+            stages[stage] = {"count": histogram.total_count, "p50": histogram.percentile(50),
+                             "p95": histogram.percentile(95), "p99": histogram.percentile(99),
+                             "max": histogram.max_value / 1000}
+    return jsonify({"orders": orders.count(), "pending": orders.count("placed"), "stages": stages})
 
 
 @app.route("/orders/<order_id>", methods=["GET"])
@@ -92,4 +237,5 @@ def get_order(order_id):
 
 if __name__ == "__main__":
     setup_exchanges()
+    start_status_consumer()
     app.run(host="0.0.0.0", port=8001)
@@ -0,0 +1,338 @@
+"""
+Bounded, indexed order store for OrderService
+Orders are kept in memory up to a size limit, with secondary indexes by
+status and item so listing a page (optionally filtered) costs the same
+whatever the number of orders. Completed orders are evicted first,
+oldest first, and after a TTL. With a SQLite file configured, every
+change is written through, evicted orders stay readable from the file
+(archived), and a restart reloads the most recent orders.
+"""
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+COMPLETED = "notified"  # Terminal status: evicted first
+
+
+class SeqIndex:
+    """
+    Increasing integer keys -> order_id, removable anywhere
+
+    Keys are kept sorted in blocks of at most BLOCK keys, so appending a
+    new (largest) key, removing a key and seeking to the first key before
+    a cursor all cost O(log n + BLOCK) instead of O(n).
+    """
+
+    BLOCK = 512
+
+    def __init__(self):
+        self.blocks = []   # Sorted lists of keys
+        self.firsts = []   # First key of each block, for bisect
+        self.values = {}   # key -> order_id
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, key, order_id):
+        """Add a key larger than every key in the index"""
+        if self.blocks and len(self.blocks[-1]) < self.BLOCK:
+            self.blocks[-1].append(key)
+        else:
+            self.blocks.append([key])
+            self.firsts.append(key)
+        self.values[key] = order_id
+
+    def remove(self, key):
+        if self.values.pop(key, None) is None:
+            return
+        b = bisect.bisect_right(self.firsts, key) - 1
+        block = self.blocks[b]
+        del block[bisect.bisect_left(block, key)]
+        if not block:
+            del self.blocks[b]
+            del self.firsts[b]
+        else:
+            self.firsts[b] = block[0]
+
+    def first(self):
+        """(key, order_id) of the smallest key, or None"""
+        if not self.blocks:
+            return None
+        key = self.blocks[0][0]
+        return key, self.values[key]
+
+    def before(self, cursor, limit):
+        """Up to limit (key, order_id) with key < cursor (None = newest), newest first"""
+        result = []
+        if cursor is None:
+            b, i = len(self.blocks) - 1, (len(self.blocks[-1]) if self.blocks else 0)
+        else:
+            b = bisect.bisect_left(self.firsts, cursor) - 1
+            i = bisect.bisect_left(self.blocks[b], cursor) if b >= 0 else 0
+        while b >= 0 and len(result) < limit:
+            block = self.blocks[b]
+            start = max(0, i - (limit - len(result)))
+            result.extend((key, self.values[key]) for key in reversed(block[start:i]))
+            b -= 1
+            i = len(self.blocks[b]) if b >= 0 else 0
+        return result
+
+
+class OrderStore:
+    """
+    order_id -> order dict with status and item indexes, a size limit and
+    optional SQLite write-through
+
+    Every order gets a sequence number when it is added and a new one
+    whenever its status changes. The "all" and item indexes are keyed by
+    the first, the status indexes by the second, so a status listing runs
+    in the order orders reached that status. Cursors are sequence numbers.
+
+    Stored orders are only changed under the lock (set_status); callers get
+    copies, which they can serialize while the status consumer updates
+    the originals.
+    """
+
+    def __init__(self, max_orders=100000, completed_ttl_seconds=0, db_path=''):
+        """
+        Args:
+            max_orders: Keep at most this many orders in memory (0 = unbounded)
+            completed_ttl_seconds: Evict notified orders this long after they
+                                   were notified (0 = only when over max_orders)
+            db_path: SQLite file for write-through persistence ('' = memory only)
+        """
+        self.max_orders = max_orders
+        self.completed_ttl = completed_ttl_seconds
+        self.lock = threading.Lock()
+        self.orders = {}
+        self.keys = {}  # order_id -> (seq, status_seq)
+        self.indexes = {}  # ('all',) / ('status', s) / ('item', i) / ('status_item', s, i) -> SeqIndex
+        self.seq = 0
+        self.evicted = 0
+        self.db = None
+        if db_path:
+            self._open(db_path)
+
+    # -- indexes -----------------------------------------------------------
+
+    def _index(self, key):
+        index = self.indexes.get(key)
+        if index is None:
+            index = self.indexes[key] = SeqIndex()
+        return index
+
+    def _next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    def _index_status(self, order, status_seq):
+        order_id, status, item = order["order_id"], order["status"], order["item"]
+        self._index(("status", status)).append(status_seq, order_id)
+        self._index(("status_item", status, item)).append(status_seq, order_id)
+
+    def _unindex_status(self, order, status_seq):
+        self.indexes[("status", order["status"])].remove(status_seq)
+        self.indexes[("status_item", order["status"], order["item"])].remove(status_seq)
+
+    def _insert(self, order, seq, status_seq):
+        order_id = order["order_id"]
+        self.orders[order_id] = order
+        self.keys[order_id] = (seq, status_seq)
+        self._index(("all",)).append(seq, order_id)
+        self._index(("item", order["item"])).append(seq, order_id)
+        self._index_status(order, status_seq)
+
+    @staticmethod
+    def _copy(order):
+        return dict(order, timestamps=dict(order["timestamps"]))
+
+    def _drop(self, order_id):
+        order = self.orders.pop(order_id)
+        seq, status_seq = self.keys.pop(order_id)
+        self.indexes[("all",)].remove(seq)
+        self.indexes[("item", order["item"])].remove(seq)
+        self._unindex_status(order, status_seq)
+
+    # -- orders ------------------------------------------------------------
+
+    def add(self, order):
+        """
+        Store a copy of a new order (order_id, item, status, timestamps, ...)
+        and evict what is now over the limits; returns a copy
+        """
+        order = self._copy(order)
+        with self.lock:
+            if order["order_id"] in self.orders:
+                self._drop(order["order_id"])  # Replaced: indexed again as the newest
+            seq = self._next_seq()
+            status_seq = self._next_seq()
+            self._insert(order, seq, status_seq)
+            self._write(order, seq)
+            copy = self._copy(order)
+            self._evict()
+        return copy
+
+    def get(self, order_id):
+        """Copy of the order in memory, else from the archive (None when unknown)"""
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is not None:
+                return self._copy(order)
+            if self.db is None:
+                return None
+            row = self.db.execute('SELECT data FROM orders WHERE order_id = ?', (order_id,)).fetchone()
+        return dict(json.loads(row[0]), archived=True) if row else None
+
+    def live(self, order_id):
+        """Copy of the order if it is in memory (archived orders are final)"""
+        with self.lock:
+            order = self.orders.get(order_id)
+            return self._copy(order) if order is not None else None
+
+    def set_status(self, order_id, status, at, **fields):
+        """
+        Record that an order in memory reached status at time at (epoch
+        seconds), set fields (e.g. reason) on it and persist it
+
+        A notification can overtake the inventory event, so a notified order
+        keeps that status and only gains the other stage's timestamp.
+
+        Returns:
+            Copy of the updated order, or None when the order is not in
+            memory or already has a timestamp for status
+        """
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None or status in order["timestamps"]:
+                return None
+            order["timestamps"][status] = at
+            order.update(fields)
+            seq, status_seq = self.keys[order_id]
+            if order["status"] != COMPLETED and order["status"] != status:
+                self._unindex_status(order, status_seq)
+                order["status"] = status
+                status_seq = self._next_seq()
+                self._index_status(order, status_seq)
+                self.keys[order_id] = (seq, status_seq)
+            self._write(order, seq)
+            copy = self._copy(order)
+            self._evict()
+        return copy
+
+    def list(self, status=None, item=None, limit=50, cursor=None):
+        """
+        One page of orders, newest first
+
+        Returns:
+            (orders, next_cursor) where next_cursor is None on the last page
+        """
+        if status and item:
+            key = ("status_item", status, item)
+        elif status:
+            key = ("status", status)
+        elif item:
+            key = ("item", item)
+        else:
+            key = ("all",)
+        with self.lock:
+            index = self.indexes.get(key)
+            page = index.before(cursor, limit + 1) if index else []
+            orders = [self._copy(self.orders[order_id]) for _, order_id in page[:limit]]
+        next_cursor = page[limit - 1][0] if len(page) > limit else None
+        return orders, next_cursor
+
+    def values(self):
+        """Copies of the orders in memory"""
+        with self.lock:
+            return [self._copy(order) for order in self.orders.values()]
+
+    def count(self, status=None):
+        index = self.indexes.get(("status", status) if status else ("all",))
+        return len(index) if index else 0
+
+    def stats(self):
+        with self.lock:
+            by_status = {key[1]: len(index) for key, index in self.indexes.items()
+                         if key[0] == "status" and len(index)}
+        return {"orders": len(self.orders), "by_status": by_status, "evicted": self.evicted,
+                "max_orders": self.max_orders, "persistent": self.db is not None}
+
+    # -- eviction ----------------------------------------------------------
+
+    def _evict(self, now=None):
+        """Completed orders past the TTL, then the oldest completed (or oldest) orders over max_orders"""
+        completed = self.indexes.get(("status", COMPLETED))
+        if self.completed_ttl and completed:
+            now = time.time() if now is None else now
+            while True:
+                head = completed.first()
+                if head is None:
+                    break
+                done_at = self.orders[head[1]]["timestamps"].get(COMPLETED, now)
+                if now - done_at < self.completed_ttl:
+                    break
+                self._archive(head[1])
+        while self.max_orders and len(self.orders) > self.max_orders:
+            head = completed.first() if completed else None
+            if head is None:
+                head = self.indexes[("all",)].first()
+            self._archive(head[1])
+
+    def _archive(self, order_id):
+        self._drop(order_id)
+        self.evicted += 1
+        if self.db is not None:
+            self.db.execute('UPDATE orders SET archived = 1 WHERE order_id = ?', (order_id,))
+            self.db.commit()
+
+    # -- persistence -------------------------------------------------------
+
+    def _open(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS orders (
+                order_id TEXT PRIMARY KEY,
+                seq INTEGER,
+                status TEXT,
+                archived INTEGER DEFAULT 0,
+                data TEXT
+            )
+        """)
+        self.db.execute('CREATE INDEX IF NOT EXISTS orders_live ON orders (archived, seq)')
+        self.db.commit()
+        self._load()
+
+    def _load(self):
+        """Reload the newest unarchived orders, archiving the rest"""
+        rows = self.db.execute('SELECT data FROM orders WHERE archived = 0 ORDER BY seq').fetchall()
+        if self.max_orders and len(rows) > self.max_orders:
+            rows = rows[-self.max_orders:]
+        self.db.execute('UPDATE orders SET archived = 1 WHERE archived = 0')
+        for (data,) in rows:
+            order = json.loads(data)
+            seq = self._next_seq()
+            self._insert(order, seq, self._next_seq())
+            self._write(order, seq, commit=False)
+        self.db.commit()
+
+    def _write(self, order, seq, commit=True):
+        if self.db is None:
+            return
+        self.db.execute(
+            'INSERT INTO orders (order_id, seq, status, archived, data) VALUES (?, ?, ?, 0, ?) '
+            'ON CONFLICT(order_id) DO UPDATE SET seq = excluded.seq, status = excluded.status, archived = 0, '
+            'data = excluded.data',
+            (order["order_id"], seq, order["status"], json.dumps(order))
+        )
+        if commit:
+            self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
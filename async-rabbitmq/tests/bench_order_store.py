@@ -0,0 +1,314 @@
+"""
+Order Store Benchmark
+Checks and times OrderService's order store (order_service/order_store.py)
+without a broker:
+  1. Page cost: time one page of GET /orders (unfiltered, by status, by
+     item, by both, first and deep pages) at several store sizes; the
+     cost must not grow with the number of orders
+  2. Pagination: walking a filtered listing with next_cursor returns every
+     matching order exactly once, also while new orders arrive
+  3. Bounds: past max_orders, completed orders are evicted first, and the
+     completed TTL evicts notified orders on its own
+  4. Persistence: with a SQLite file, evicted orders stay readable
+     (archived) and a restart reloads the most recent orders
+  5. API: GET /orders pages through OrderService's Flask app on the
+     in-process AMQP stand-in, and still returns a bare list of every
+     order without parameters
+Results are exported to order_store_bench_results.json.
+"""
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'async-rabbitmq', 'order_service'))
+
+import local_pika
+local_pika.install()
+
+from order_store import OrderStore
+
+SIZES = [10000, 100000, 300000]
+PAGE = 50
+REPEATS = 200
+MAX_GROWTH = 3.0  # Largest store's page time may be at most 3x the smallest's
+ITEMS = ["burger", "pizza", "salad", "sandwich"]
+RESULTS_FILE = 'order_store_bench_results.json'
+
+
+def make_order(i, now):
+    return {"order_id": f"order-{i}", "item": ITEMS[i % len(ITEMS)], "qty": 1,
+            "status": "placed", "timestamps": {"placed": now}}
+
+
+def fill(store, n, start=0):
+    """Add n orders; every other one is reserved and every fourth of those notified"""
+    now = time.time()
+    for i in range(start, start + n):
+        store.add(make_order(i, now))
+        if i % 2:
+            store.set_status(f"order-{i}", "reserved", now)
+            if i % 8 == 1:
+                store.set_status(f"order-{i}", "notified", now)
+
+
+def page_time_us(store, **query):
+    """Median microseconds for one page"""
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        store.list(limit=PAGE, **query)
+        times.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(times)
+
+
+def deep_cursor(store, status=None):
+    """Cursor of the page halfway down a listing"""
+    return store.list(status=status, limit=max(store.count(status) // 2, 1))[1]
+
+
+def bench_page_cost():
+    print("\n" + "=" * 60)
+    print("1. Page cost by store size")
+    print("=" * 60)
+    queries = {
+        "all": {},
+        "status=placed": {"status": "placed"},
+        "item=pizza": {"item": "pizza"},
+        "status=notified&item=pizza": {"status": "notified", "item": "pizza"},
+    }
+    results = {}
+    for size in SIZES:
+        store = OrderStore(max_orders=0)
+        start = time.perf_counter()
+        fill(store, size)
+        fill_s = time.perf_counter() - start
+        row = {"fill_orders_per_sec": round(size / fill_s)}
+        for name, query in queries.items():
+            row[name] = round(page_time_us(store, **query), 1)
+        row["all (deep page)"] = round(page_time_us(store, cursor=deep_cursor(store)), 1)
+        row["status=placed (deep page)"] = round(
+            page_time_us(store, status="placed", cursor=deep_cursor(store, "placed")), 1)
+        results[size] = row
+        print(f"  {size:>7,} orders (filled at {row['fill_orders_per_sec']:,}/s)")
+        for name, value in row.items():
+            if name != "fill_orders_per_sec":
+                print(f"    {name:<28} {value:>8.1f} µs/page")
+
+    passed = True
+    smallest, largest = results[SIZES[0]], results[SIZES[-1]]
+    for name in smallest:
+        if name == "fill_orders_per_sec":
+            continue
+        growth = largest[name] / max(smallest[name], 1e-9)
+        ok = growth <= MAX_GROWTH
+        passed &= ok
+        print(f"  {'✓' if ok else '✗'} {name}: {growth:.2f}x from {SIZES[0]:,} to {SIZES[-1]:,} orders")
+    return {"sizes": results, "passed": passed}
+
+
+def bench_pagination():
+    print("\n" + "=" * 60)
+    print("2. Pagination")
+    print("=" * 60)
+    store = OrderStore(max_orders=0)
+    fill(store, 10000)
+    checks = []
+    next_id = 100000
+
+    for query in [{}, {"status": "reserved"}, {"item": "salad"}, {"status": "notified", "item": "pizza"}]:
+        expected = {o["order_id"] for o in store.values()
+                    if all(o[field] == value for field, value in query.items())}
+        seen, cursor, pages = [], None, 0
+        while True:
+            orders, cursor = store.list(limit=PAGE, cursor=cursor, **query)
+            seen.extend(o["order_id"] for o in orders)
+            pages += 1
+            # New orders arriving mid-walk are newer than the cursor and stay out of this walk
+            fill(store, 3, start=next_id)
+            next_id += 3
+            if cursor is None:
+                break
+        ok = len(seen) == len(set(seen)) and set(seen) == expected
+        checks.append(ok)
+        print(f"  {'✓' if ok else '✗'} {query or 'all'}: {len(seen)} orders in {pages} pages, "
+              f"{len(expected)} expected, no duplicates")
+
+    store.add(make_order(999999, time.time()))
+    newest = store.list(limit=1)[0][0]["order_id"]
+    ok = newest == "order-999999"
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} First page starts with the newest order ({newest})")
+
+    listed = store.list(limit=1)[0][0]
+    listed["timestamps"]["failed"] = 0
+    ok = "failed" not in store.get("order-999999")["timestamps"]
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} Listed orders are copies: changing one leaves the store unchanged")
+
+    store.set_status("order-999999", "notified", time.time())
+    late = store.set_status("order-999999", "reserved", time.time())
+    ok = late["status"] == "notified" and "reserved" in late["timestamps"] \
+        and store.set_status("order-999999", "reserved", time.time()) is None
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} A late inventory event keeps a notified order notified; repeats are ignored")
+    return {"passed": all(checks)}
+
+
+def bench_bounds():
+    print("\n" + "=" * 60)
+    print("3. Memory bounds")
+    print("=" * 60)
+    checks = []
+
+    store = OrderStore(max_orders=5000)
+    fill(store, 20000)
+    stats = store.stats()
+    ok = stats["orders"] == 5000 and stats["evicted"] == 15000
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} 20,000 orders into max_orders=5,000: {stats['orders']:,} kept, "
+          f"{stats['evicted']:,} evicted")
+
+    # Only 1 in 8 orders is notified, so completed orders run out and the oldest go next
+    newest = store.get("order-19999")
+    ok = newest is not None and store.get("order-0") is None
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} Newest order kept, oldest evicted ({stats['by_status']})")
+
+    store = OrderStore(max_orders=1000)
+    now = time.time()
+    for i in range(1000):
+        store.add(make_order(i, now))
+    for i in range(0, 1000, 2):
+        store.set_status(f"order-{i}", "notified", now)
+    for i in range(1000, 1400):
+        store.add(make_order(i, now))
+    placed_kept = store.count("placed")
+    ok = placed_kept == 900 and store.count("notified") == 100
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} Over the limit, notified orders go first: "
+          f"{placed_kept} placed kept, {store.count('notified')} notified left")
+
+    store = OrderStore(max_orders=0, completed_ttl_seconds=60)
+    old = time.time() - 120
+    for i in range(100):
+        store.add(make_order(i, old))
+        store.set_status(f"order-{i}", "notified", old if i < 50 else time.time())
+    store.add(make_order(100, time.time()))
+    ok = store.count("notified") == 50 and store.count() == 51
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} completed_ttl_seconds=60: orders notified 2 minutes ago evicted, "
+          f"{store.count('notified')} recent kept")
+    return {"passed": all(checks)}
+
+
+def bench_persistence():
+    print("\n" + "=" * 60)
+    print("4. SQLite persistence")
+    print("=" * 60)
+    checks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'orders.db')
+        store = OrderStore(max_orders=1000, db_path=path)
+        start = time.perf_counter()
+        fill(store, 3000)
+        rate = 3000 / (time.perf_counter() - start)
+        print(f"  Write-through: {rate:,.0f} orders/s (including status changes)")
+
+        archived = store.get("order-0")
+        ok = archived is not None and archived.get("archived") is True and store.live("order-0") is None
+        checks.append(ok)
+        print(f"  {'✓' if ok else '✗'} Evicted order readable from the archive: {archived and archived['status']}")
+
+        store.set_status("order-2999", "notified", time.time())
+        store.close()
+
+        restarted = OrderStore(max_orders=1000, db_path=path)
+        reloaded = restarted.get("order-2999")
+        ok = restarted.count() == 1000 and reloaded["status"] == "notified" and "archived" not in reloaded
+        checks.append(ok)
+        print(f"  {'✓' if ok else '✗'} Restart reloads the newest {restarted.count():,} orders "
+              f"with their status ({reloaded['status']})")
+
+        newest = [o["order_id"] for o in restarted.list(limit=3)[0]]
+        ok = newest[0] == "order-2999"
+        checks.append(ok)
+        print(f"  {'✓' if ok else '✗'} Order preserved across the restart: {newest}")
+        restarted.close()
+    return {"write_orders_per_sec": round(rate), "passed": all(checks)}
+
+
+def bench_api():
+    print("\n" + "=" * 60)
+    print("5. GET /orders through OrderService")
+    print("=" * 60)
+    local_pika.reset()
+    path = os.path.join(ROOT, 'async-rabbitmq', 'order_service', 'app.py')
+    spec = importlib.util.spec_from_file_location('order_service_app', path)
+    order_service = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(order_service)
+    order_service.setup_exchanges()
+    client = order_service.app.test_client()
+    checks = []
+
+    for i in range(120):
+        client.post('/order', json={"item": ITEMS[i % len(ITEMS)], "qty": 1})
+    seen, cursor = [], None
+    while True:
+        query = '?item=burger&limit=7' + (f'&cursor={cursor}' if cursor else '')
+        body = client.get('/orders' + query).get_json()
+        seen.extend(order["order_id"] for order in body["orders"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    ok = len(seen) == len(set(seen)) == 30
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} ?item=burger&limit=7 paged through {len(seen)} orders")
+
+    body = client.get('/orders').get_json()
+    ok = isinstance(body, list) and len(body) == 120
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} GET /orders without parameters lists all {len(body)} orders")
+
+    ok = client.get('/orders?cursor=abc').status_code == 400
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} Invalid cursor returns 400")
+
+    stats = client.get('/orders/stats').get_json()
+    ok = stats["orders"] == 120 and stats["by_status"] == {"placed": 120}
+    checks.append(ok)
+    print(f"  {'✓' if ok else '✗'} GET /orders/stats: {stats}")
+    return {"passed": all(checks)}
+
+
+def main():
+    print("=" * 60)
+    print("ORDER STORE BENCHMARK")
+    print("=" * 60)
+    results = {
+        "page_cost": bench_page_cost(),
+        "pagination": bench_pagination(),
+        "bounds": bench_bounds(),
+        "persistence": bench_persistence(),
+        "api": bench_api(),
+    }
+
+    with open(RESULTS_FILE, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n" + "=" * 60)
+    print("SUMMARY")
+    print("=" * 60)
+    for name, result in results.items():
+        print(f"  {'✓' if result['passed'] else '✗'} {name}")
+    print(f"\nResults exported to {RESULTS_FILE}")
+    return 0 if all(result["passed"] for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+RabbitMQ Pipeline Benchmark
+Runs OrderService, InventoryService and NotificationService in one process
+on the in-process AMQP stand-in (local_pika.py), so no broker, Docker or
+curl is needed and repeated runs are comparable:
+  1. Publish: POST /order through OrderService while InventoryService is
+     down, so the orders build a backlog (as in test_backlog_drain.sh)
+  2. Drain: start InventoryService and NotificationService and time how long
+     until every order has been reserved or failed and notified; OrderService
+     tracks each order placed -> reserved -> notified (GET /orders/latency)
+  3. Redelivery: kill InventoryService halfway through a second backlog and
+     restart it; the unacked order is redelivered, and duplicates published
+     on purpose must be skipped (test_idempotency.sh). OrderService's status
+     consumer loses its connection at the same time and must reconnect
+  4. Dead letters: malformed messages are nacked into dead_letter_queue (test_dlq.sh)
+Rates are compared with the previous run's rabbitmq_bench_results.json and
+drops of more than REGRESSION_THRESHOLD are flagged.
+"""
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+
+import local_pika
+local_pika.install()
+import pika
+
+NUM_ORDERS = 5000
+DUPLICATES = 100
+MALFORMED = 50
+ITEMS = ["burger", "pizza", "salad"]  # 100 of each in stock: the rest fail
+STALL_SECONDS = 30
+REGRESSION_THRESHOLD = 0.2  # Flag rates more than 20% below the previous run
+RESULTS_FILE = 'rabbitmq_bench_results.json'
+AUDIT_QUEUE = 'bench_inventory_audit'  # Extra queue on inventory_events that the bench reads
+
+
+def load_service(name):
+    """Fresh import of a service's app.py (all three are called app.py), with empty in-memory state"""
+    directory = os.path.join(ROOT, 'async-rabbitmq', name)
+    sys.path.insert(0, directory)  # Its sibling modules (order_store.py)
+    try:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(directory, 'app.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(directory)
+    return module
+
+
+def run_service(main):
+    """Run a consumer loop (a service's main()) in a thread; it ends when its connection is dropped"""
+    def target():
+        try:
+            main()
+        except pika.exceptions.AMQPConnectionError:
+            pass
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_service(queue, thread):
+    local_pika.get_broker().disconnect(queue)
+    thread.join(timeout=10)
+
+
+def wait_for(condition):
+    """Poll condition() until true or no progress for STALL_SECONDS; returns seconds waited"""
+    start = time.time()
+    last, last_change = None, time.time()
+    while time.time() - last_change < STALL_SECONDS:
+        done, progress = condition()
+        if done:
+            break
+        if progress != last:
+            last, last_change = progress, time.time()
+        time.sleep(0.005)
+    return time.time() - start
+
+
+def depth(queue):
+    return local_pika.get_broker().stats(queue)['depth']
+
+
+def read_audit(channel):
+    """Drain the audit queue: inventory events by order_id"""
+    events = {}
+    while True:
+        method, properties, body = channel.basic_get(AUDIT_QUEUE, auto_ack=True)
+        if method is None:
+            return events
+        event = json.loads(body)
+        events.setdefault(event['order_id'], []).append(event['event'])
+
+
+def post_orders(client, n):
+    order_ids = []
+    for i in range(n):
+        response = client.post('/order', json={"item": ITEMS[i % len(ITEMS)], "qty": 1})
+        order_ids.append(response.get_json()['order_id'])
+    return order_ids
+
+
+def completed(order_service):
+    """Number of orders OrderService has seen notified (with wait_for: done when all are)"""
+    notified = order_service.orders.count('notified')
+    return notified == order_service.orders.count(), notified
+
+
+def drained(n_events, notification_start):
+    """Condition for wait_for(): every order consumed and every inventory event notified"""
+    broker = local_pika.get_broker()
+
+    def condition():
+        orders = broker.stats('inventory_order_queue')
+        notified = broker.stats('notification_queue')['acked'] - notification_start
+        done = orders['depth'] == 0 and orders['unacked'] == 0 and notified >= n_events
+        return done, (orders['acked'], notified)
+    return condition
+
+
+def bench_rabbitmq():
+    print("Starting RabbitMQ Pipeline Benchmark")
+    print("="*60)
+    print(f"Broker: in-process stand-in, orders: {NUM_ORDERS}, duplicates: {DUPLICATES}, "
+          f"malformed: {MALFORMED}")
+
+    previous = None
+    if os.path.exists(RESULTS_FILE):
+        with open(RESULTS_FILE) as f:
+            previous = json.load(f)
+
+    local_pika.reset()
+    broker = local_pika.get_broker()
+    devnull = open(os.devnull, 'w')
+    os.environ['STATUS_RECONNECT_SECONDS'] = '0.1'
+    with contextlib.redirect_stdout(devnull):  # The services print every message
+        order_service = load_service('order_service')
+        order_service.setup_exchanges()
+        status = run_service(order_service.consume_status_events)
+        client = order_service.app.test_client()
+
+        # Queues as the consumers declare them (a fanout exchange drops what no
+        # queue is bound to yet), plus the audit queue
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
+        channel = connection.channel()
+        channel.queue_declare(queue='inventory_order_queue', durable=True,
+                              arguments={"x-dead-letter-exchange": "dlx"})
+        channel.queue_bind(queue='inventory_order_queue', exchange='order_events')
+        channel.queue_declare(queue='notification_queue', durable=True)
+        channel.queue_bind(queue='notification_queue', exchange='inventory_events')
+        channel.queue_declare(queue=AUDIT_QUEUE)
+        channel.queue_bind(queue=AUDIT_QUEUE, exchange='inventory_events')
+
+        # 1. Publish while InventoryService is down
+        start = time.time()
+        order_ids = post_orders(client, NUM_ORDERS)
+        publish_seconds = time.time() - start
+        backlog = depth('inventory_order_queue')
+
+        # 2. Drain the backlog
+        inventory = run_service(load_service('inventory_service').main)
+        notification = run_service(load_service('notification_service').main)
+        drain_seconds = wait_for(drained(NUM_ORDERS, 0))
+        wait_for(lambda: completed(order_service))
+        completion = client.get('/orders/latency').get_json()
+        first_events = read_audit(channel)
+        stop_service('inventory_order_queue', inventory)
+
+        # 3. Kill InventoryService halfway through a second backlog, restart it,
+        #    then publish duplicates of orders it has already processed
+        order_ids = post_orders(client, NUM_ORDERS)
+        notified_before = broker.stats('notification_queue')['acked']
+        redelivered_before = broker.stats('inventory_order_queue')['redelivered']
+        inventory = run_service(load_service('inventory_service').main)
+        wait_for(lambda: (broker.stats('inventory_order_queue')['acked'] >= 3 * NUM_ORDERS // 2, None))
+        stop_service('inventory_order_queue', inventory)
+        status_redelivered_before = broker.stats('order_status_queue')['redelivered']
+        broker.disconnect('order_status_queue')  # OrderService's consumer thread must reconnect
+        restarted = load_service('inventory_service')  # Restart: processed_orders starts empty
+        start = time.time()
+        inventory = run_service(restarted.main)
+        wait_for(lambda: (depth('inventory_order_queue') == 0, depth('inventory_order_queue')))
+        for order_id in order_ids[-DUPLICATES:]:
+            channel.basic_publish(
+                exchange='order_events', routing_key='',
+                body=json.dumps({"event": "OrderPlaced", "order_id": order_id, "item": "burger",
+                                 "qty": 1, "timestamp": time.time()}),
+                properties=pika.BasicProperties(delivery_mode=2, message_id=order_id)
+            )
+        wait_for(drained(0, 0))  # Duplicates consumed: no more inventory events coming
+        events_so_far = broker.stats('notification_queue')['published']
+        wait_for(drained(events_so_far - notified_before, notified_before))
+        recovery_seconds = time.time() - start
+        redelivered = broker.stats('inventory_order_queue')['redelivered'] - redelivered_before
+        second_events = read_audit(channel)
+        wait_for(lambda: completed(order_service))
+        status_complete = completed(order_service)[0] and order_service.orders.count() == 2 * NUM_ORDERS
+        status_redelivered = broker.stats('order_status_queue')['redelivered'] - status_redelivered_before
+
+        # 4. Malformed messages go to the dead-letter queue
+        dead_before = depth('dead_letter_queue')
+        for i in range(MALFORMED):
+            channel.basic_publish(exchange='order_events', routing_key='',
+                                  body=b'THIS IS NOT VALID JSON {{{',
+                                  properties=pika.BasicProperties(delivery_mode=2))
+        wait_for(lambda: (depth('dead_letter_queue') - dead_before >= MALFORMED, depth('dead_letter_queue')))
+        dead_lettered = depth('dead_letter_queue') - dead_before
+
+        stop_service('inventory_order_queue', inventory)
+        stop_service('notification_queue', notification)
+        order_service.status_stop.set()
+        stop_service('order_status_queue', status)
+        connection.close()
+    devnull.close()
+
+    reserved = sum(1 for events in first_events.values() if events == ['InventoryReserved'])
+    failed = sum(1 for events in first_events.values() if events == ['InventoryFailed'])
+    once = len(first_events) == NUM_ORDERS and reserved + failed == NUM_ORDERS
+    covered = all(order_id in second_events for order_id in order_ids)
+    repeated = sorted(order_id for order_id, events in second_events.items() if len(events) > 1)
+
+    results = {
+        "orders": NUM_ORDERS,
+        "publish": {"seconds": round(publish_seconds, 3), "orders_per_second": round(NUM_ORDERS / publish_seconds),
+                    "backlog": backlog},
+        "drain": {"seconds": round(drain_seconds, 3), "orders_per_second": round(NUM_ORDERS / drain_seconds),
+                  "reserved": reserved, "failed": failed, "each_order_once": once},
+        "redelivery": {"redelivered": redelivered, "every_order_handled": covered,
+                       "orders_with_repeated_events": len(repeated), "duplicates_published": DUPLICATES,
+                       "recovery_seconds": round(recovery_seconds, 3),
+                       "status_events_redelivered": status_redelivered, "status_complete": status_complete},
+        "dead_letters": {"malformed": MALFORMED, "dead_lettered": dead_lettered},
+        "completion_ms": {stage: completion['stages'][stage] for stage in ('reserved', 'failed', 'notified')},
+    }
+
+    print(f"\n1. Publish: {NUM_ORDERS} orders in {publish_seconds:.2f}s "
+          f"({results['publish']['orders_per_second']:,} orders/s), backlog {backlog}")
+    print(f"2. Drain: {drain_seconds:.2f}s ({results['drain']['orders_per_second']:,} orders/s), "
+          f"{reserved} reserved, {failed} failed")
+    notified = completion['stages']['notified']
+    print(f"   Placed -> notified (includes the backlog wait): p50 {notified.get('p50', 0):,.0f} ms, "
+          f"p99 {notified.get('p99', 0):,.0f} ms")
+    print(f"3. Redelivery: {redelivered} redelivered after the kill, "
+          f"{len(repeated)} orders with more than one inventory event, "
+          f"{status_redelivered} status events redelivered to OrderService")
+    print(f"4. Dead letters: {dead_lettered}/{MALFORMED} malformed messages in dead_letter_queue")
+
+    print("="*60)
+    checks = [
+        (backlog == NUM_ORDERS, f"All {NUM_ORDERS} orders queued while InventoryService was down"),
+        (once, "Backlog drained: one inventory event per order"),
+        (notified['count'] == NUM_ORDERS and completion['pending'] == 0,
+         "OrderService saw every order reserved or failed, then notified"),
+        (covered, "Every order handled across the kill and restart"),
+        (len(repeated) <= redelivered, "Published duplicates skipped; only redelivered orders repeat"),
+        (status_complete, "OrderService's status consumer reconnected and saw every order notified"),
+        (dead_lettered == MALFORMED, "Malformed messages dead-lettered"),
+    ]
+    for ok, text in checks:
+        print(f"{'✓' if ok else '✗'} {text}")
+
+    passed = all(ok for ok, _ in checks)
+    if previous is not None:
+        for stage in ('publish', 'drain'):
+            rate, before = results[stage]['orders_per_second'], previous[stage]['orders_per_second']
+            change = (rate - before) / before if before else 0
+            regressed = change < -REGRESSION_THRESHOLD
+            passed &= not regressed
+            mark = '✗' if regressed else '✓'
+            print(f"{mark} {stage.capitalize()} rate {rate:,} orders/s vs. {before:,} in the previous run "
+                  f"({change:+.0%})")
+        results["previous"] = {stage: previous[stage]['orders_per_second'] for stage in ('publish', 'drain')}
+
+    with open(RESULTS_FILE, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n✓ Results exported to {RESULTS_FILE}")
+    return passed
+
+
+if __name__ == '__main__':
+    sys.exit(0 if bench_rabbitmq() else 1)
@@ -0,0 +1,638 @@
+"""
+In-process AMQP stand-in for hermetic RabbitMQ benchmarks
+Implements the pika BlockingConnection surface used by OrderService,
+InventoryService and NotificationService on in-memory queues: fanout,
+direct and topic exchanges, durable queues, dead-lettering through
+x-dead-letter-exchange, prefetch, ack, nack and reject, and requeueing
+(with redelivered set) of whatever a closed or dropped connection left
+unacknowledged.
+
+Usage:
+    import local_pika
+    local_pika.install()   # registers itself as the pika module
+    import app             # a service, unchanged
+
+    local_pika.get_broker().disconnect('inventory_order_queue')  # "kill" its consumers
+
+Every connection whose host is the same shares one broker. Nothing is
+written to disk: durable queues survive connections, not the process.
+"""
+import itertools
+import sys
+import threading
+import time
+import types
+from collections import deque
+
+
+# -- pika.exceptions -------------------------------------------------------
+
+class AMQPError(Exception):
+    pass
+
+
+class AMQPConnectionError(AMQPError):
+    pass
+
+
+class ConnectionClosed(AMQPConnectionError):
+    def __init__(self, reply_code, reply_text):
+        super().__init__(reply_code, reply_text)
+        self.reply_code = reply_code
+        self.reply_text = reply_text
+
+
+class StreamLostError(ConnectionClosed):
+    def __init__(self, reply_text='Stream connection lost'):
+        super().__init__(-1, reply_text)
+
+
+class AMQPChannelError(AMQPError):
+    pass
+
+
+class ChannelClosed(AMQPChannelError):
+    def __init__(self, reply_code, reply_text):
+        super().__init__(reply_code, reply_text)
+        self.reply_code = reply_code
+        self.reply_text = reply_text
+
+
+class ChannelClosedByBroker(ChannelClosed):
+    pass
+
+
+class ChannelWrongStateError(AMQPChannelError):
+    pass
+
+
+exceptions = types.ModuleType('pika.exceptions')
+for _cls in (AMQPError, AMQPConnectionError, ConnectionClosed, StreamLostError, AMQPChannelError,
+             ChannelClosed, ChannelClosedByBroker, ChannelWrongStateError):
+    setattr(exceptions, _cls.__name__, _cls)
+
+NOT_FOUND = 404
+PRECONDITION_FAILED = 406
+
+
+# -- parameters, properties and method frames -----------------------------
+
+class ConnectionParameters:
+    def __init__(self, host='localhost', port=5672, virtual_host='/', credentials=None, **kwargs):
+        self.host = host
+        self.port = port
+        self.virtual_host = virtual_host
+        self.credentials = credentials
+
+
+class PlainCredentials:
+    def __init__(self, username, password, erase_on_connect=False):
+        self.username = username
+        self.password = password
+
+
+class BasicProperties:
+    def __init__(self, content_type=None, content_encoding=None, headers=None, delivery_mode=None,
+                 priority=None, correlation_id=None, reply_to=None, expiration=None, message_id=None,
+                 timestamp=None, type=None, user_id=None, app_id=None, cluster_id=None):
+        self.content_type = content_type
+        self.content_encoding = content_encoding
+        self.headers = headers
+        self.delivery_mode = delivery_mode
+        self.priority = priority
+        self.correlation_id = correlation_id
+        self.reply_to = reply_to
+        self.expiration = expiration
+        self.message_id = message_id
+        self.timestamp = timestamp
+        self.type = type
+        self.user_id = user_id
+        self.app_id = app_id
+        self.cluster_id = cluster_id
+
+    def copy(self, **changes):
+        properties = BasicProperties()
+        properties.__dict__.update(self.__dict__, **changes)
+        return properties
+
+
+class Deliver:
+    """method argument of on_message_callback (pika.spec.Basic.Deliver)"""
+
+    def __init__(self, consumer_tag, delivery_tag, redelivered, exchange, routing_key):
+        self.consumer_tag = consumer_tag
+        self.delivery_tag = delivery_tag
+        self.redelivered = redelivered
+        self.exchange = exchange
+        self.routing_key = routing_key
+
+
+class GetOk:
+    """method returned by basic_get (pika.spec.Basic.GetOk)"""
+
+    def __init__(self, delivery_tag, redelivered, exchange, routing_key, message_count):
+        self.delivery_tag = delivery_tag
+        self.redelivered = redelivered
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.message_count = message_count
+
+
+class DeclareOk:
+    """Queue.DeclareOk / Queue.PurgeOk"""
+
+    def __init__(self, queue, message_count, consumer_count):
+        self.queue = queue
+        self.message_count = message_count
+        self.consumer_count = consumer_count
+
+
+class Method:
+    """pika.frame.Method: the reply to a synchronous channel call"""
+
+    def __init__(self, channel_number, method):
+        self.channel_number = channel_number
+        self.method = method
+
+
+# -- broker -------------------------------------------------------------
+
+class _Message:
+    __slots__ = ('body', 'properties', 'exchange', 'routing_key', 'redelivered')
+
+    def __init__(self, body, properties, exchange, routing_key, redelivered=False):
+        self.body = body
+        self.properties = properties
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.redelivered = redelivered
+
+
+class _Queue:
+    def __init__(self, name, durable, arguments):
+        self.name = name
+        self.durable = durable
+        self.arguments = dict(arguments or {})
+        self.messages = deque()
+        self.consumers = []  # (channel, consumer_tag)
+        self.stats = dict.fromkeys(
+            ('published', 'delivered', 'redelivered', 'acked', 'requeued', 'dead_lettered'), 0
+        )
+
+
+def _topic_match(binding_words, key_words):
+    """Topic exchange match: '*' is exactly one word, '#' zero or more"""
+    if not binding_words:
+        return not key_words
+    word, rest = binding_words[0], binding_words[1:]
+    if word == '#':
+        return any(_topic_match(rest, key_words[i:]) for i in range(len(key_words) + 1))
+    if not key_words:
+        return False
+    return (word == '*' or word == key_words[0]) and _topic_match(rest, key_words[1:])
+
+
+class LocalBroker:
+    """In-memory exchanges, queues and bindings shared by every connection to one host"""
+
+    def __init__(self):
+        self.exchanges = {'': ('direct', True)}  # name -> (type, durable)
+        self.bindings = {}  # exchange -> [(queue, routing key)]
+        self.queues = {}
+        self.connections = []
+        self.cond = threading.Condition()
+
+    def route(self, exchange, routing_key):
+        if exchange == '':
+            return [routing_key] if routing_key in self.queues else []
+        exchange_type = self.exchanges[exchange][0]
+        bound = self.bindings.get(exchange, [])
+        if exchange_type == 'fanout':
+            return [queue for queue, _ in bound]
+        if exchange_type == 'topic':
+            words = routing_key.split('.')
+            return [queue for queue, key in bound if _topic_match(key.split('.'), words)]
+        return [queue for queue, key in bound if key == routing_key]
+
+    def publish(self, exchange, routing_key, body, properties):
+        """Copy a message to every queue the exchange routes it to (unroutable messages are dropped)"""
+        with self.cond:
+            for name in self.route(exchange, routing_key):
+                queue = self.queues[name]
+                queue.messages.append(_Message(body, properties, exchange, routing_key))
+                queue.stats['published'] += 1
+            self.cond.notify_all()
+
+    def dead_letter(self, queue, message, reason):
+        """Route a rejected message through the queue's x-dead-letter-exchange, if any"""
+        exchange = queue.arguments.get('x-dead-letter-exchange')
+        if exchange is None or exchange not in self.exchanges:
+            return
+        routing_key = queue.arguments.get('x-dead-letter-routing-key', message.routing_key)
+        headers = dict((message.properties.headers or {}) if message.properties else {})
+        deaths = list(headers.get('x-death', []))
+        deaths.insert(0, {'queue': queue.name, 'reason': reason, 'count': 1,
+                          'exchange': message.exchange, 'routing-keys': [message.routing_key],
+                          'time': int(time.time())})
+        headers['x-death'] = deaths
+        properties = (message.properties or BasicProperties()).copy(headers=headers)
+        queue.stats['dead_lettered'] += 1
+        self.publish(exchange, routing_key, message.body, properties)
+
+    def requeue(self, queue, messages):
+        """Put unacknowledged messages back at the head of their queue, marked redelivered"""
+        for message in reversed(messages):
+            message.redelivered = True
+            queue.messages.appendleft(message)
+        queue.stats['requeued'] += len(messages)
+        self.cond.notify_all()
+
+    def disconnect(self, queue=None):
+        """
+        Drop the connections consuming from queue (all connections if None),
+        like a killed service: their unacked messages are requeued at once
+        and their next call raises StreamLostError
+
+        Returns:
+            Number of connections dropped
+        """
+        with self.cond:
+            consumers = {id(channel) for channel, _ in self.queues[queue].consumers} if queue in self.queues else set()
+            dropped = [
+                connection for connection in self.connections
+                if queue is None or any(id(channel) in consumers for channel in connection.channels.values())
+            ]
+            for connection in dropped:
+                connection._drop()
+            self.cond.notify_all()
+        return len(dropped)
+
+    def stats(self, queue):
+        """Depth, unacked count and lifetime counters of a queue"""
+        with self.cond:
+            q = self.queues[queue]
+            unacked = sum(1 for channel, _ in q.consumers for name, _ in channel._unacked.values()
+                          if name == queue)
+            return dict(q.stats, depth=len(q.messages), unacked=unacked, consumers=len(q.consumers))
+
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def get_broker(host='localhost'):
+    """Broker instance shared by every connection to the same host"""
+    with _brokers_lock:
+        if host not in _brokers:
+            _brokers[host] = LocalBroker()
+        return _brokers[host]
+
+
+def reset():
+    """Drop all brokers (fresh exchanges, queues and messages)"""
+    with _brokers_lock:
+        _brokers.clear()
+
+
+# -- client ---------------------------------------------------------------
+
+class BlockingChannel:
+    def __init__(self, connection, channel_number):
+        self.connection = connection
+        self.broker = connection.broker
+        self.channel_number = channel_number
+        self.is_open = True
+        self.prefetch_count = 0
+        self._consumers = {}  # consumer_tag -> (queue, callback, auto_ack)
+        self._unacked = {}  # delivery_tag -> (queue name, message)
+        self._delivery_tags = itertools.count(1)
+        self._consumer_tags = itertools.count(1)
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    @property
+    def consumer_tags(self):
+        return list(self._consumers)
+
+    def _check(self):
+        if self.connection._dropped:
+            raise StreamLostError()
+        if not self.is_open:
+            raise ChannelWrongStateError('Channel is closed.')
+
+    def _fail(self, code, text):
+        """Channel-level error: the broker closes the channel"""
+        self._close(requeue=True)
+        raise ChannelClosedByBroker(code, text)
+
+    def _queue(self, name):
+        queue = self.broker.queues.get(name)
+        if queue is None:
+            self._fail(NOT_FOUND, f"NOT_FOUND - no queue '{name}' in vhost '/'")
+        return queue
+
+    # -- topology -----------------------------------------------------
+
+    def exchange_declare(self, exchange, exchange_type='direct', passive=False, durable=False,
+                         auto_delete=False, internal=False, arguments=None):
+        exchange_type = getattr(exchange_type, 'value', exchange_type)
+        with self.broker.cond:
+            self._check()
+            existing = self.broker.exchanges.get(exchange)
+            if existing is None:
+                if passive:
+                    self._fail(NOT_FOUND, f"NOT_FOUND - no exchange '{exchange}' in vhost '/'")
+                self.broker.exchanges[exchange] = (exchange_type, durable)
+            elif not passive and existing != (exchange_type, durable):
+                self._fail(PRECONDITION_FAILED,
+                           f"PRECONDITION_FAILED - inequivalent arg 'type' for exchange '{exchange}'")
+        return Method(self.channel_number, None)
+
+    def queue_declare(self, queue='', passive=False, durable=False, exclusive=False, auto_delete=False,
+                      arguments=None):
+        with self.broker.cond:
+            self._check()
+            name = queue or f"amq.gen-{id(self):x}-{len(self.broker.queues)}"
+            existing = self.broker.queues.get(name)
+            if existing is None:
+                if passive:
+                    self._fail(NOT_FOUND, f"NOT_FOUND - no queue '{name}' in vhost '/'")
+                existing = self.broker.queues[name] = _Queue(name, durable, arguments)
+            elif not passive and (existing.durable != durable or existing.arguments != dict(arguments or {})):
+                self._fail(PRECONDITION_FAILED,
+                           f"PRECONDITION_FAILED - inequivalent arg for queue '{name}' in vhost '/'")
+            return Method(self.channel_number, DeclareOk(name, len(existing.messages), len(existing.consumers)))
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None):
+        with self.broker.cond:
+            self._check()
+            self._queue(queue)
+            if exchange not in self.broker.exchanges:
+                self._fail(NOT_FOUND, f"NOT_FOUND - no exchange '{exchange}' in vhost '/'")
+            binding = (queue, queue if routing_key is None else routing_key)
+            bound = self.broker.bindings.setdefault(exchange, [])
+            if binding not in bound:
+                bound.append(binding)
+        return Method(self.channel_number, None)
+
+    def queue_unbind(self, queue, exchange=None, routing_key=None, arguments=None):
+        with self.broker.cond:
+            self._check()
+            binding = (queue, queue if routing_key is None else routing_key)
+            bound = self.broker.bindings.get(exchange, [])
+            if binding in bound:
+                bound.remove(binding)
+        return Method(self.channel_number, None)
+
+    def queue_purge(self, queue):
+        with self.broker.cond:
+            self._check()
+            q = self._queue(queue)
+            count = len(q.messages)
+            q.messages.clear()
+        return Method(self.channel_number, DeclareOk(queue, count, len(q.consumers)))
+
+    def queue_delete(self, queue, if_unused=False, if_empty=False):
+        with self.broker.cond:
+            self._check()
+            q = self.broker.queues.pop(queue, None)
+            for exchange, bound in self.broker.bindings.items():
+                bound[:] = [binding for binding in bound if binding[0] != queue]
+        return Method(self.channel_number, DeclareOk(queue, len(q.messages) if q else 0, 0))
+
+    # -- publishing ---------------------------------------------------
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        with self.broker.cond:
+            self._check()
+            if exchange not in self.broker.exchanges:
+                self._fail(NOT_FOUND, f"NOT_FOUND - no exchange '{exchange}' in vhost '/'")
+            self.broker.publish(exchange, routing_key, body, properties or BasicProperties())
+
+    # -- consuming ----------------------------------------------------
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False):
+        self._check()
+        self.prefetch_count = prefetch_count
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, exclusive=False,
+                      consumer_tag=None, arguments=None):
+        with self.broker.cond:
+            self._check()
+            q = self._queue(queue)
+            tag = consumer_tag or f"ctag{self.channel_number}.{next(self._consumer_tags)}"
+            self._consumers[tag] = (queue, on_message_callback, auto_ack)
+            q.consumers.append((self, tag))
+        return tag
+
+    def basic_cancel(self, consumer_tag=''):
+        with self.broker.cond:
+            entry = self._consumers.pop(consumer_tag, None)
+            if entry is not None:
+                q = self.broker.queues.get(entry[0])
+                if q is not None and (self, consumer_tag) in q.consumers:
+                    q.consumers.remove((self, consumer_tag))
+        return []
+
+    def basic_get(self, queue, auto_ack=False):
+        with self.broker.cond:
+            self._check()
+            q = self._queue(queue)
+            if not q.messages:
+                return None, None, None
+            message = q.messages.popleft()
+            tag = self._deliver(q, message, auto_ack)
+            method = GetOk(tag, message.redelivered, message.exchange, message.routing_key, len(q.messages))
+        return method, message.properties, message.body
+
+    def _deliver(self, queue, message, auto_ack):
+        tag = next(self._delivery_tags)
+        queue.stats['delivered'] += 1
+        if message.redelivered:
+            queue.stats['redelivered'] += 1
+        if auto_ack:
+            queue.stats['acked'] += 1
+        else:
+            self._unacked[tag] = (queue.name, message)
+        return tag
+
+    def _settle(self, delivery_tag, multiple):
+        """Unacked entries covered by delivery_tag (0 with multiple=True: all of them)"""
+        if multiple:
+            tags = [tag for tag in self._unacked if delivery_tag == 0 or tag <= delivery_tag]
+        elif delivery_tag in self._unacked:
+            tags = [delivery_tag]
+        else:
+            self._fail(PRECONDITION_FAILED, f"PRECONDITION_FAILED - unknown delivery tag {delivery_tag}")
+        return [self._unacked.pop(tag) for tag in sorted(tags)]
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        with self.broker.cond:
+            self._check()
+            for name, _ in self._settle(delivery_tag, multiple):
+                if name in self.broker.queues:
+                    self.broker.queues[name].stats['acked'] += 1
+            self.broker.cond.notify_all()
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        with self.broker.cond:
+            self._check()
+            for name, message in self._settle(delivery_tag, multiple):
+                queue = self.broker.queues.get(name)
+                if queue is None:
+                    continue
+                if requeue:
+                    self.broker.requeue(queue, [message])
+                else:
+                    self.broker.dead_letter(queue, message, 'rejected')
+            self.broker.cond.notify_all()
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        self.basic_nack(delivery_tag, multiple=False, requeue=requeue)
+
+    def _next_delivery(self):
+        """(callback, method, properties, body) for the next message this channel may take, or None"""
+        if self.prefetch_count and len(self._unacked) >= self.prefetch_count:
+            return None
+        for tag, (name, callback, auto_ack) in self._consumers.items():
+            q = self.broker.queues.get(name)
+            if q is not None and q.messages:
+                message = q.messages.popleft()
+                delivery_tag = self._deliver(q, message, auto_ack)
+                method = Deliver(tag, delivery_tag, message.redelivered, message.exchange, message.routing_key)
+                return callback, method, message.properties, message.body
+        return None
+
+    def _dispatch(self, deadline):
+        """Run callbacks for deliverable messages until none is left or the deadline passes"""
+        dispatched = 0
+        while True:
+            with self.broker.cond:
+                self._check()
+                delivery = self._next_delivery()
+                if delivery is None:
+                    return dispatched
+            callback, method, properties, body = delivery
+            callback(self, method, properties, body)
+            dispatched += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                return dispatched
+
+    def start_consuming(self):
+        """Deliver messages to this channel's consumers until stop_consuming() or the connection drops"""
+        while self._consumers:
+            self.connection._run_callbacks()
+            if not self._consumers:
+                break
+            if not self._dispatch(time.monotonic() + 0.05):
+                with self.broker.cond:
+                    self._check()
+                    self.broker.cond.wait(0.05)
+
+    def stop_consuming(self, consumer_tag=None):
+        for tag in ([consumer_tag] if consumer_tag else list(self._consumers)):
+            self.basic_cancel(tag)
+
+    def _close(self, requeue=True):
+        """Close without locking (caller holds broker.cond): cancel consumers, requeue unacked"""
+        if not self.is_open:
+            return
+        self.is_open = False
+        for tag, (name, _, _) in list(self._consumers.items()):
+            q = self.broker.queues.get(name)
+            if q is not None and (self, tag) in q.consumers:
+                q.consumers.remove((self, tag))
+        self._consumers.clear()
+        by_queue = {}
+        for name, message in (self._unacked[tag] for tag in sorted(self._unacked)):
+            by_queue.setdefault(name, []).append(message)
+        self._unacked.clear()
+        for name, messages in by_queue.items():
+            if name in self.broker.queues:
+                self.broker.requeue(self.broker.queues[name], messages)
+
+    def close(self, reply_code=0, reply_text='Normal shutdown'):
+        with self.broker.cond:
+            self._close()
+
+
+class BlockingConnection:
+    def __init__(self, parameters=None):
+        parameters = parameters or ConnectionParameters()
+        self.broker = get_broker(parameters.host)
+        self.channels = {}
+        self.is_open = True
+        self._dropped = False
+        self._callbacks = deque()
+        self._channel_numbers = itertools.count(1)
+        with self.broker.cond:
+            self.broker.connections.append(self)
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    def channel(self, channel_number=None):
+        if self._dropped:
+            raise StreamLostError()
+        number = channel_number or next(self._channel_numbers)
+        self.channels[number] = BlockingChannel(self, number)
+        return self.channels[number]
+
+    def add_callback_threadsafe(self, callback):
+        self._callbacks.append(callback)
+        with self.broker.cond:
+            self.broker.cond.notify_all()
+
+    def _run_callbacks(self):
+        while self._callbacks:
+            self._callbacks.popleft()()
+
+    def process_data_events(self, time_limit=0):
+        """Serve callbacks and deliveries for up to time_limit seconds"""
+        deadline = time.monotonic() + (time_limit or 0)
+        while True:
+            self._run_callbacks()
+            dispatched = sum(channel._dispatch(deadline) for channel in list(self.channels.values())
+                             if channel.is_open)
+            remaining = deadline - time.monotonic()
+            if dispatched or remaining <= 0:
+                return
+            with self.broker.cond:
+                self.broker.cond.wait(min(remaining, 0.05))
+
+    def sleep(self, duration):
+        self.process_data_events(duration)
+
+    def _drop(self):
+        """Lost connection (caller holds broker.cond)"""
+        self._dropped = True
+        self.is_open = False
+        for channel in self.channels.values():
+            channel._close()
+        if self in self.broker.connections:
+            self.broker.connections.remove(self)
+
+    def close(self, reply_code=200, reply_text='Normal shutdown'):
+        with self.broker.cond:
+            if self._dropped or not self.is_open:
+                return
+            for channel in self.channels.values():
+                channel._close()
+            self.is_open = False
+            if self in self.broker.connections:
+                self.broker.connections.remove(self)
+            self.broker.cond.notify_all()
+
+
+def install():
+    """Register this module as pika (and pika.exceptions)"""
+    module = sys.modules[__name__]
+    sys.modules.setdefault('local_pika', module)
+    sys.modules['pika'] = module
+    sys.modules['pika.exceptions'] = exceptions
+    return module
@@ -0,0 +1,604 @@
+"""
+Cross-Paradigm Benchmark
+Drives one workload (order mix, rate, duration, payload size) through the
+entry point of each communication model and writes one comparable report:
+  rest         sync-rest        POST /order        (Order -> Inventory -> Notification over HTTP)
+  rabbitmq     async-rabbitmq   POST /order        (order_events -> InventoryService)
+  kafka        streaming-kafka  POST /order        (order-events -> InventoryConsumer)
+  kafka-batch  streaming-kafka  POST /orders/batch
+Requests are sent open-loop at a constant order rate (common/loadgen.py).
+An order is complete when its inventory outcome exists: the HTTP response
+for REST, the event on inventory_events / inventory-events for the
+brokers. For each target the report has entry throughput, request latency
+percentiles, end-to-end completion time and CPU/memory use.
+
+--stack local (default) runs every service in this process, on the
+in-process broker stand-ins (local_pika.py, local_kafka.py) and real HTTP
+servers on free ports, so no Docker or network is needed and runs are
+comparable. --stack docker measures the running docker compose stacks
+instead (one at a time: sync-rest and async-rabbitmq both use port 8001).
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+
+import requests
+from loadgen import run_load
+
+TARGETS = ['rest', 'rabbitmq', 'kafka', 'kafka-batch']
+ORDER_MIX = {"Burger": 40, "Pizza": 30, "Salad": 20, "Sandwich": 10}  # Item weights
+USERS = 100
+RATE = 100              # Orders per second (batch requests carry BATCH_SIZE orders each)
+DURATION = 10           # Seconds of measured load
+WARMUP_SECONDS = 2
+PAYLOAD_BYTES = 256     # JSON size of one order, padded with a "notes" field
+BATCH_SIZE = 25
+CONCURRENCY = 20
+STALL_SECONDS = 30      # Give up waiting for outcomes after this long without progress
+SAMPLE_INTERVAL = 0.5   # Resource sampling period (docker stats takes ~1-2s per call)
+RESULTS_FILE = 'benchmark_results.json'
+REPORT_FILE = 'benchmark_report.md'
+
+# docker mode: entry point URL, container name prefix, broker address
+DOCKER = {
+    'rest': {'url': 'http://localhost:8001', 'containers': 'sync_'},
+    'rabbitmq': {'url': 'http://localhost:8001', 'containers': 'async-rabbitmq', 'broker': 'localhost'},
+    'kafka': {'url': 'http://localhost:8201', 'containers': 'streaming_', 'broker': 'localhost:9092'},
+}
+
+logging.disable(logging.CRITICAL)  # Every service logs every request
+
+
+def make_orders(n, payload_bytes, seed=7):
+    """Deterministic orders drawn from ORDER_MIX, each padded to about payload_bytes of JSON"""
+    rng = random.Random(seed)
+    items, weights = list(ORDER_MIX), list(ORDER_MIX.values())
+    orders = []
+    for i in range(n):
+        order = {"user_id": f"user_{rng.randrange(USERS)}", "item": rng.choices(items, weights)[0],
+                 "quantity": rng.randint(1, 3), "notes": ""}
+        order["notes"] = "x" * max(0, payload_bytes - len(json.dumps(order)))
+        orders.append(order)
+    return orders
+
+
+def load_module(name, path):
+    """Import a service file under its own module name (most services are app.py), with its directory importable"""
+    directory = os.path.dirname(path)
+    sys.path.insert(0, directory)
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(directory)
+    return module
+
+
+def serve(app):
+    """Serve a Flask app over HTTP on a free local port; returns (url, server)"""
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+class OutcomeCounter:
+    """Orders with an outcome so far, and when the last one arrived"""
+
+    def __init__(self):
+        self.count = 0
+        self.last_at = None
+        self.lock = threading.Lock()
+
+    def add(self, n=1):
+        with self.lock:
+            self.count += n
+            self.last_at = time.time()
+
+
+class RestStack:
+    """sync-rest: the response is the outcome (inventory and notification are called inline)"""
+    observed = False
+
+    def __init__(self, local):
+        self.local = local
+        self.servers = []
+
+    def start(self):
+        if not self.local:
+            return DOCKER['rest']['url']
+        services = os.path.join(ROOT, 'sync-rest')
+        inventory_url, inventory = serve(load_module('rest_inventory_service', os.path.join(services, 'inventory_service', 'app.py')).app)
+        notification_url, notification = serve(load_module('rest_notification_service', os.path.join(services, 'notification_service', 'app.py')).app)
+        os.environ.update({'INVENTORY_SERVICE_URL': inventory_url, 'NOTIFICATION_SERVICE_URL': notification_url})
+        order_url, order = serve(load_module('rest_order_service', os.path.join(services, 'order_service', 'app.py')).app)
+        self.servers = [order, inventory, notification]
+        return order_url
+
+    def request(self, order):
+        return order
+
+    def order_completion(self, url, orders):
+        return None  # The round trip is the completion: service time of the requests
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+
+
+class RabbitStack:
+    """async-rabbitmq: an order is complete when its event is on the inventory_events exchange"""
+    observed = True
+    AUDIT_QUEUE = 'bench_outcome_audit'
+
+    def __init__(self, local):
+        self.local = local
+        self.outcomes = OutcomeCounter()
+        self.running = True
+        self.threads = []
+
+    def start(self):
+        import pika
+        self.pika = pika
+        self.host = 'localhost' if self.local else DOCKER['rabbitmq']['broker']
+        os.environ['RABBITMQ_HOST'] = self.host
+        services = os.path.join(ROOT, 'async-rabbitmq')
+        if self.local:
+            import local_pika
+            local_pika.reset()
+            order = load_module('rabbitmq_order_service', os.path.join(services, 'order_service', 'app.py'))
+            order.setup_exchanges()
+
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+        channel = connection.channel()
+        channel.exchange_declare(exchange='inventory_events', exchange_type='fanout', durable=True)
+        channel.queue_declare(queue=self.AUDIT_QUEUE)
+        channel.queue_bind(queue=self.AUDIT_QUEUE, exchange='inventory_events')
+        channel.queue_purge(self.AUDIT_QUEUE)
+        if self.local:  # Queues as the consumers declare them: a fanout drops what nothing is bound to yet
+            channel.queue_declare(queue='inventory_order_queue', durable=True,
+                                  arguments={"x-dead-letter-exchange": "dlx"})
+            channel.queue_bind(queue='inventory_order_queue', exchange='order_events')
+            channel.queue_declare(queue='notification_queue', durable=True)
+            channel.queue_bind(queue='notification_queue', exchange='inventory_events')
+        self.threads.append(self._thread(self._observe, connection, channel))
+        if not self.local:
+            return DOCKER['rabbitmq']['url']
+
+        for name in ('inventory_service', 'notification_service'):
+            module = load_module(f"rabbitmq_{name}", os.path.join(services, name, 'app.py'))
+            self.threads.append(self._thread(self._consume, module.main))
+        self.threads.append(self._thread(self._consume, order.consume_status_events))
+        url, self.server = serve(order.app)
+        return url
+
+    def _thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def _consume(self, main):
+        try:
+            main()
+        except self.pika.exceptions.AMQPConnectionError:
+            pass  # Dropped by stop()
+
+    def _observe(self, connection, channel):
+        """basic_get loop (works the same on pika and the stand-in, no cross-thread callbacks)"""
+        while self.running:
+            method, _, _ = channel.basic_get(self.AUDIT_QUEUE, auto_ack=True)
+            if method is None:
+                time.sleep(0.002)
+                continue
+            self.outcomes.add()
+        channel.queue_delete(self.AUDIT_QUEUE)
+        connection.close()
+
+    def request(self, order):
+        return {"item": order['item'].lower(), "qty": order['quantity'],
+                "user_id": order['user_id'], "notes": order['notes']}
+
+    def order_completion(self, url, orders):
+        """Placed -> notified percentiles from OrderService, once it has seen the orders notified"""
+        deadline = time.time() + STALL_SECONDS
+        while True:
+            latency = requests.get(f"{url}/orders/latency", timeout=10).json()
+            if latency['pending'] == 0 and latency['stages']['notified']['count'] >= orders or time.time() > deadline:
+                return latency['stages']['notified']
+            time.sleep(0.05)
+
+    def stop(self):
+        self.running = False
+        if self.local:
+            import local_pika
+            self.server.shutdown()
+            local_pika.get_broker().disconnect()
+        for thread in self.threads:
+            thread.join(timeout=10)
+
+
+class KafkaStack:
+    """streaming-kafka: an order is complete when its event is on inventory-events"""
+    observed = True
+
+    def __init__(self, local):
+        self.local = local
+        self.outcomes = OutcomeCounter()
+        self.running = True
+        self.threads = []
+        self.broker = 'local' if local else DOCKER['kafka']['broker']
+
+    def start(self):
+        from confluent_kafka import Consumer
+        if self.local:
+            import local_kafka
+            from confluent_kafka.admin import AdminClient, NewTopic
+            local_kafka.reset()
+            admin = AdminClient({'bootstrap.servers': self.broker})
+            for future in admin.create_topics([NewTopic(topic, num_partitions=3, replication_factor=1)
+                                               for topic in ('order-events', 'inventory-events')]).values():
+                future.result()
+
+        observer = Consumer({'bootstrap.servers': self.broker, 'group.id': f"bench-observer-{uuid.uuid4().hex[:8]}",
+                             'auto.offset.reset': 'latest', 'enable.auto.commit': False})
+        observer.subscribe(['inventory-events'])
+        deadline = time.time() + STALL_SECONDS
+        while not observer.assignment() and time.time() < deadline:
+            observer.poll(0.1)  # Join the group before any order is sent
+        self.threads.append(self._thread(self._observe, observer))
+        if not self.local:
+            return DOCKER['kafka']['url']
+
+        services = os.path.join(ROOT, 'streaming-kafka')
+        os.environ.update({'KAFKA_BROKER': self.broker, 'METRICS_PORT': '0', 'STATE_DIR': '',
+                           'GROUP_ID': f"bench-inventory-{uuid.uuid4().hex[:8]}",
+                           'INPUT_TOPIC': 'order-events', 'OUTPUT_TOPIC': 'inventory-events'})
+        self.producer_app = load_module('kafka_producer_order', os.path.join(services, 'producer_order', 'app.py'))
+        inventory_module = load_module('kafka_inventory_consumer', os.path.join(services, 'inventory_consumer', 'consumer.py'))
+        self.inventory = inventory_module.InventoryConsumer()
+        self.threads.append(self._thread(self.inventory.start))
+        url, self.server = serve(self.producer_app.app)
+        return url
+
+    def _thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def _observe(self, observer):
+        while self.running:
+            messages = observer.consume(num_messages=500, timeout=0.1)
+            n = sum(1 for msg in messages if not msg.error())
+            if n:
+                self.outcomes.add(n)
+        observer.close()
+
+    def request(self, order):
+        return order
+
+    def order_completion(self, url, orders):
+        return None  # No per-order status in the producer
+
+    def stop(self):
+        self.running = False
+        if self.local:
+            self.server.shutdown()
+            self.inventory.running = False
+            self.producer_app.producer.close()
+        for thread in self.threads:
+            thread.join(timeout=30)
+
+
+STACKS = {'rest': RestStack, 'rabbitmq': RabbitStack, 'kafka': KafkaStack, 'kafka-batch': KafkaStack}
+
+
+class ResourceSampler:
+    """
+    CPU and memory while a target runs: the stack's containers from
+    `docker stats` in docker mode; in local mode this whole process, so the
+    numbers are runner-inclusive (load generator, stand-ins and the stopped
+    stacks of earlier targets too). Local memory is also reported as the
+    growth over the resident size when the target started.
+    """
+
+    def __init__(self, containers=None):
+        self.containers = containers
+        self.memory_mb = []
+        self.cpu_percent = []
+        self.running = True
+        self.note = None
+
+    def __enter__(self):
+        if self.containers is None:
+            self._sample_process()
+        self.cpu_start = sum(os.times()[:2])
+        self.wall_start = time.time()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.cpu_seconds = sum(os.times()[:2]) - self.cpu_start
+        self.wall_seconds = time.time() - self.wall_start
+
+    def _run(self):
+        while self.running:
+            if self.containers is None:
+                self._sample_process()
+            else:
+                self._sample_docker()
+            time.sleep(SAMPLE_INTERVAL)
+
+    def _sample_process(self):
+        try:
+            with open('/proc/self/statm') as f:
+                rss_pages = int(f.read().split()[1])
+            self.memory_mb.append(rss_pages * os.sysconf('SC_PAGE_SIZE') / 2**20)
+        except (OSError, ValueError):
+            import resource
+            self.memory_mb.append(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+    def _sample_docker(self):
+        try:
+            output = subprocess.run(['docker', 'stats', '--no-stream', '--format', '{{json .}}'],
+                                    capture_output=True, text=True, timeout=10).stdout
+        except (OSError, subprocess.TimeoutExpired) as e:
+            self.note = f"docker stats unavailable: {e}"
+            self.running = False
+            return
+        cpu, memory = 0.0, 0.0
+        for line in output.splitlines():
+            stats = json.loads(line)
+            if not stats.get('Name', '').startswith(self.containers):
+                continue
+            cpu += float(stats['CPUPerc'].rstrip('%') or 0)
+            memory += _parse_size(stats['MemUsage'].split('/')[0])
+        self.cpu_percent.append(cpu)
+        self.memory_mb.append(memory)
+
+    def summary(self):
+        result = {"peak_memory_mb": round(max(self.memory_mb), 1) if self.memory_mb else None}
+        if self.containers is None:
+            result["scope"] = "runner-inclusive"
+            result["memory_growth_mb"] = round(max(self.memory_mb) - self.memory_mb[0], 1)
+            result["cpu_seconds"] = round(self.cpu_seconds, 3)
+            result["cpu_percent"] = round(100 * self.cpu_seconds / self.wall_seconds, 1)
+        else:
+            result["scope"] = "containers"
+            result["cpu_percent"] = round(sum(self.cpu_percent) / len(self.cpu_percent), 1) if self.cpu_percent else None
+            result["cpu_seconds"] = round(result["cpu_percent"] / 100 * self.wall_seconds, 3) \
+                if result["cpu_percent"] is not None else None
+        if self.note:
+            result["note"] = self.note
+        return result
+
+
+def _parse_size(text):
+    """'45.1MiB' -> 45.1 (MiB)"""
+    match = re.match(r'\s*([\d.]+)\s*([KMGT]?i?B)', text)
+    if not match:
+        return 0.0
+    scale = {'B': 2**-20, 'KiB': 2**-10, 'KB': 2**-10, 'MiB': 1, 'MB': 1, 'GiB': 2**10, 'GB': 2**10,
+             'TiB': 2**20, 'TB': 2**20}
+    return float(match.group(1)) * scale.get(match.group(2), 1)
+
+
+def run_target(name, args):
+    batch = args.batch_size if name == 'kafka-batch' else 1
+    entry = '/orders/batch' if batch > 1 else '/order'
+    rate = args.rate / batch  # Requests per second carrying args.rate orders per second
+    warmup_requests = int(rate * args.warmup)
+    measured_requests = max(1, int(rate * args.duration))
+    orders = make_orders((warmup_requests + measured_requests) * batch, args.payload_bytes)
+
+    stack = STACKS[name](args.stack == 'local')
+    accepted = OutcomeCounter()
+    devnull = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(devnull):  # The RabbitMQ services print every message
+        url = stack.start()
+
+    def send(i):
+        chunk = [stack.request(order) for order in orders[i * batch:(i + 1) * batch]]
+        body = {"orders": chunk} if batch > 1 else chunk[0]
+        response = requests.post(f"{url}{entry}", json=body, timeout=30)
+        if response.status_code < 300:
+            accepted.add(response.json().get('order_count', batch) if batch > 1 else 1)
+        return response.status_code
+
+    containers = None if args.stack == 'local' else DOCKER[name.split('-')[0]]['containers']
+    with ResourceSampler(containers) as resources:
+        with contextlib.redirect_stdout(devnull):
+            start = time.time()
+            load = run_load(send, rate=rate, requests=measured_requests, concurrency=args.concurrency,
+                            warmup_seconds=args.warmup, mode=args.mode)
+            last_send = start + load.seconds
+
+            if stack.observed:
+                last, last_change = -1, time.time()
+                while time.time() - last_change < STALL_SECONDS and stack.outcomes.count < accepted.count:
+                    if stack.outcomes.count != last:
+                        last, last_change = stack.outcomes.count, time.time()
+                    time.sleep(0.01)
+                completed = min(stack.outcomes.count, accepted.count)
+                finished = stack.outcomes.last_at or time.time()
+            else:
+                completed = accepted.count
+                finished = last_send
+            order_completion = stack.order_completion(url, accepted.count)
+            stack.stop()
+    devnull.close()
+
+    outcomes = load.outcomes()
+    total_orders = (warmup_requests + measured_requests) * batch
+    completion_seconds = finished - start
+    latency = load.latency.summary()
+    service = load.service.summary()
+    return {
+        "target": name,
+        "entry_point": entry,
+        "orders_per_request": batch,
+        "requests": measured_requests,
+        "orders": total_orders,
+        "accepted": accepted.count,
+        "completed": completed,
+        "status_codes": {str(code): count for code, count in sorted(outcomes.items(), key=str)},
+        "target_orders_per_second": args.rate,
+        "entry_orders_per_second": round(load.achieved_rate() * batch, 1),
+        "completed_orders_per_second": round(completed / completion_seconds, 1) if completion_seconds > 0 else 0,
+        "latency_ms": {k: latency[k] for k in ('p50', 'p95', 'p99', 'max')},
+        "service_time_ms": {k: service[k] for k in ('p50', 'p95', 'p99', 'max')},
+        "order_completion_ms": order_completion,
+        "completion_seconds": round(completion_seconds, 3),
+        "drain_seconds": round(max(0.0, finished - last_send), 3),
+        "resources": resources.summary(),
+    }
+
+
+def write_report(run, path):
+    """Markdown table of the comparable numbers"""
+    local = run['stack'] == 'local'
+    resource_columns = "Runner CPU s | Runner CPU % | Runner peak MB (growth)" if local else "CPU s | CPU % | Peak MB"
+    lines = [
+        f"# Benchmark Report ({run['timestamp']})",
+        "",
+        f"Stack: {run['stack']}. Workload: {run['workload']['rate']} orders/s for {run['workload']['duration']}s "
+        f"after {run['workload']['warmup']}s warmup, {run['workload']['payload_bytes']} B orders, "
+        f"mix {', '.join(f'{item} {weight}%' for item, weight in ORDER_MIX.items())}, "
+        f"concurrency {run['workload']['concurrency']} ({run['workload']['mode']}).",
+        "",
+        "| Target | Entry point | Orders completed | Entry orders/s | Completed orders/s | p50 ms | p95 ms | p99 ms "
+        f"| Max ms | Completion s | Drain s | {resource_columns} |",
+        "|--------|-------------|------------------|----------------|--------------------|--------|--------|--------"
+        "|--------|--------------|---------|-------|-------|---------|",
+    ]
+    for r in run['results']:
+        latency, resources = r['latency_ms'], r['resources']
+        memory = resources['peak_memory_mb']
+        if 'memory_growth_mb' in resources:
+            memory = f"{memory} (+{resources['memory_growth_mb']})"
+        lines.append(
+            f"| {r['target']} | `{r['entry_point']}` | {r['completed']}/{r['orders']} | {r['entry_orders_per_second']} "
+            f"| {r['completed_orders_per_second']} | {latency['p50']:.1f} | {latency['p95']:.1f} | {latency['p99']:.1f} "
+            f"| {latency['max']:.1f} | {r['completion_seconds']} | {r['drain_seconds']} | {resources['cpu_seconds']} "
+            f"| {resources['cpu_percent']} | {memory} |"
+        )
+    lines += [
+        "",
+        "Latency is per HTTP request, from its intended send time (a batch request carries "
+        f"{run['workload']['batch_size']} orders). Completion runs from the first request to the last order's "
+        "inventory outcome; drain is the part after the last response.",
+    ]
+    tracked = [r for r in run['results'] if r['target'] == 'rest' or r['order_completion_ms']]
+    if tracked:
+        lines += [
+            "",
+            "Order completion latency, from the order being placed until it is done "
+            "(REST: request round trip; RabbitMQ: placed -> notified as tracked by OrderService):",
+            "",
+            "| Target | p50 ms | p95 ms | p99 ms | Max ms |",
+            "|--------|--------|--------|--------|--------|",
+        ]
+        for r in tracked:
+            done = r['order_completion_ms'] or r['service_time_ms']
+            lines.append(f"| {r['target']} | {done['p50']:.1f} | {done['p95']:.1f} | {done['p99']:.1f} | {done['max']:.1f} |")
+        lines.append("")
+    if local:
+        lines.append("Local stack: services, broker stand-ins and the load generator share one process, so CPU "
+                     "and memory are runner-inclusive: they cover all of them, plus the stopped stacks of earlier "
+                     "targets. Growth is the peak over the resident size when the target started. Compare the "
+                     "models only relative to each other, or run one target per invocation.")
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one workload through REST, RabbitMQ and Kafka and compare")
+    parser.add_argument('--targets', default=','.join(TARGETS), help=f"Comma-separated subset of {','.join(TARGETS)}")
+    parser.add_argument('--stack', choices=['local', 'docker'], default='local',
+                        help="local: in-process services and broker stand-ins; docker: the running compose stack")
+    parser.add_argument('--rate', type=float, default=RATE, help="Orders per second")
+    parser.add_argument('--duration', type=float, default=DURATION, help="Seconds of measured load")
+    parser.add_argument('--warmup', type=float, default=WARMUP_SECONDS, help="Seconds of warmup load")
+    parser.add_argument('--payload-bytes', type=int, default=PAYLOAD_BYTES, help="JSON size of one order")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Orders per /orders/batch request")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help="Requests in flight")
+    parser.add_argument('--mode', choices=['threads', 'asyncio'], default='threads')
+    args = parser.parse_args()
+
+    targets = [t.strip() for t in args.targets.split(',') if t.strip()]
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        parser.error(f"Unknown targets: {', '.join(unknown)}")
+
+    if args.stack == 'local':
+        sys.path.append(os.path.join(ROOT, 'async-rabbitmq', 'tests'))
+        sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'tests'))
+        import local_pika
+        import local_kafka
+        local_pika.install()
+        local_kafka.install()
+
+    print("Starting Cross-Paradigm Benchmark")
+    print("="*60)
+    print(f"Stack: {args.stack}, targets: {', '.join(targets)}")
+    print(f"Workload: {args.rate:g} orders/s for {args.duration:g}s (+{args.warmup:g}s warmup), "
+          f"{args.payload_bytes} B orders, batch size {args.batch_size}, concurrency {args.concurrency}")
+
+    results = []
+    for name in targets:
+        print(f"\n{name}: running...")
+        result = run_target(name, args)
+        results.append(result)
+        latency = result['latency_ms']
+        print(f"  Entry: {result['entry_orders_per_second']:,} orders/s via {result['entry_point']}, "
+              f"status codes {result['status_codes']}")
+        print(f"  Latency: p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms")
+        print(f"  Completed {result['completed']}/{result['orders']} orders in {result['completion_seconds']:.2f}s "
+              f"({result['completed_orders_per_second']:,} orders/s, drain {result['drain_seconds']:.2f}s)")
+        resources = result['resources']
+        growth = f" (+{resources['memory_growth_mb']} MB)" if 'memory_growth_mb' in resources else ""
+        print(f"  Resources ({resources['scope']}): {resources['cpu_seconds']} CPU s ({resources['cpu_percent']}%), "
+              f"peak {resources['peak_memory_mb']} MB{growth}")
+
+    print("\n" + "="*60)
+    all_ok = True
+    for result in results:
+        ok = result['completed'] == result['orders']
+        all_ok &= ok
+        print(f"{'✓' if ok else '✗'} {result['target']}: {result['completed']}/{result['orders']} orders completed")
+
+    run = {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "stack": args.stack,
+        "workload": {"order_mix": ORDER_MIX, "rate": args.rate, "duration": args.duration, "warmup": args.warmup,
+                     "payload_bytes": args.payload_bytes, "batch_size": args.batch_size,
+                     "concurrency": args.concurrency, "mode": args.mode},
+        "results": results,
+    }
+    with open(RESULTS_FILE, 'w') as f:
+        json.dump(run, f, indent=2)
+    write_report(run, REPORT_FILE)
+
+    print(f"\n✓ Results exported to {RESULTS_FILE} and {REPORT_FILE}")
+    return 0 if all_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
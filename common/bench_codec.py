@@ -0,0 +1,99 @@
+"""
+Codec benchmark for common/codec.py
+Compares payload size and encode/decode CPU cost of the JSON and binary
+codecs for the OrderPlaced and InventoryReserved events of both the Kafka
+and RabbitMQ stacks.
+
+Usage:
+    python common/bench_codec.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from codec import CODECS
+from ids import current_timestamp, generate_event_id, generate_order_id
+
+N = 50_000
+
+
+def sample_events():
+    """One event of each shape the services actually produce"""
+    return {
+        "kafka OrderPlaced": {
+            "event_id": generate_event_id(),
+            "event_type": "OrderPlaced",
+            "order_id": generate_order_id(),
+            "timestamp": current_timestamp(),
+            "payload": {"user_id": "user_1234", "item": "Burger", "quantity": 2}
+        },
+        "kafka InventoryReserved": {
+            "event_id": generate_event_id(),
+            "event_type": "InventoryReserved",
+            "order_id": generate_order_id(),
+            "timestamp": current_timestamp(),
+            "success": True
+        },
+        "rabbitmq OrderPlaced": {
+            "event": "OrderPlaced",
+            "order_id": "order-1a2b3c4d",
+            "item": "burger",
+            "qty": 1,
+            "timestamp": time.time()
+        },
+        "rabbitmq InventoryReserved": {
+            "event": "InventoryReserved",
+            "order_id": "order-1a2b3c4d",
+            "item": "burger",
+            "qty": 1,
+            "remaining": 99,
+            "timestamp": time.time()
+        },
+    }
+
+
+def per_op_ns(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.process_time_ns()
+        fn()
+        elapsed = (time.process_time_ns() - start) / N
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_benchmark():
+    print("Starting Codec Benchmark")
+    print("="*60)
+
+    results = {}
+    for event_name, event in sample_events().items():
+        for codec_name, codec in CODECS.items():
+            encoded = codec.encode(event)
+            assert codec.decode(encoded) == event
+            results.setdefault(event_name, {})[codec_name] = {
+                "bytes": len(encoded),
+                "encode_ns": round(per_op_ns(lambda: [codec.encode(event) for _ in range(N)]), 1),
+                "decode_ns": round(per_op_ns(lambda: [codec.decode(encoded) for _ in range(N)]), 1),
+            }
+    print("✓ All events round-trip through every codec\n")
+
+    print(f"{'Event':<28} | {'Codec':<7} | {'Bytes':>5} | {'Encode ns':>9} | {'Decode ns':>9}")
+    print("-" * 70)
+    for event_name, by_codec in results.items():
+        for codec_name, r in by_codec.items():
+            print(f"{event_name:<28} | {codec_name:<7} | {r['bytes']:>5} | "
+                  f"{r['encode_ns']:>9.1f} | {r['decode_ns']:>9.1f}")
+    print("="*60)
+
+    with open('codec_bench_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to codec_bench_results.json")
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,171 @@
+"""
+Microbenchmark for common/ids.py
+Compares the per-call ID/timestamp functions against the bulk and
+epoch-integer fast paths, and the timestamp parsers consumers use on
+every event.
+
+Usage:
+    python common/bench_ids.py
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ids
+
+N = 100_000
+PARSE_EVENTS = 1_000_000
+EVENTS_PER_SECOND = 2_000  # consecutive events share a second prefix
+PRODUCER_BATCH = 100  # /orders/batch events share one timestamp
+
+
+def per_op_ns(fn, ops=N, repeat=3):
+    """Best-of-repeat CPU nanoseconds per operation for fn()"""
+    best = None
+    for _ in range(repeat):
+        start = time.process_time_ns()
+        fn()
+        elapsed = (time.process_time_ns() - start) / ops
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def check_ids():
+    """Sanity checks for the new ID forms"""
+    bulk = ids.generate_order_ids(1000)
+    assert len(set(bulk)) == 1000
+    assert all(len(i) == 36 and i[14] == '4' for i in bulk)
+
+    sortable = ids.generate_uuid7s(1000)
+    assert sortable == sorted(sortable)
+    assert all(i[14] == '7' for i in sortable)
+
+    first = ids.generate_uuid7()
+    time.sleep(0.002)
+    assert ids.generate_uuid7() > first
+
+    assert len(ids.generate_ulid()) == 26
+    compact = ids.generate_id_bytes()
+    assert len(compact) == 16
+    assert ids.id_to_bytes(ids.id_from_bytes(compact)) == compact
+
+    ms = ids.current_timestamp_ms()
+    assert round(ids.parse_timestamp(ids.format_timestamp(ms)).timestamp() * 1000) == ms
+
+
+def make_timestamps(events_per_timestamp=1):
+    """
+    Realistic consumer input: PARSE_EVENTS timestamps at EVENTS_PER_SECOND,
+    with runs of events_per_timestamp identical values (batch producer).
+    """
+    start_us = ids.current_timestamp_ms() * 1000
+    step_us = 1_000_000 // EVENTS_PER_SECOND
+    timestamps = []
+    for i in range(0, PARSE_EVENTS, events_per_timestamp):
+        us = start_us + i * step_us + i % 1000
+        ts = ids.format_timestamp(us // 1000)[:-4] + f"{us % 1000:03d}Z"
+        timestamps.extend([ts] * events_per_timestamp)
+    return timestamps
+
+
+def parse_per_million(timestamps):
+    """CPU seconds per million events for each parser"""
+    def inline(ts_list):
+        for ts in ts_list:
+            datetime.fromisoformat(ts.replace('Z', '+00:00'))
+
+    def inline_epoch(ts_list):
+        for ts in ts_list:
+            datetime.fromisoformat(ts.replace('Z', '+00:00')).timestamp()
+
+    def direct(ts_list):
+        parse = ids.parse_timestamp
+        for ts in ts_list:
+            parse(ts)
+
+    def epoch(ts_list):
+        parse = ids.parse_timestamp_epoch
+        for ts in ts_list:
+            parse(ts)
+
+    def seconds_per_million(fn):
+        return per_op_ns(lambda: fn(timestamps), ops=1) * 1_000_000 / len(timestamps) / 1e9
+
+    return {
+        "datetime": {
+            "fromisoformat(ts.replace(...)) [before]": seconds_per_million(inline),
+            "parse_timestamp": seconds_per_million(direct),
+        },
+        "epoch": {
+            "fromisoformat(...).timestamp() [before]": seconds_per_million(inline_epoch),
+            "parse_timestamp_epoch (prefix memo)": seconds_per_million(epoch),
+        },
+    }
+
+
+def run_benchmark():
+    print("Starting ids.py Benchmark")
+    print("="*60)
+    check_ids()
+    print("✓ ID and timestamp sanity checks passed\n")
+
+    results = {
+        "generate_order_id (x N)": per_op_ns(lambda: [ids.generate_order_id() for _ in range(N)]),
+        "generate_order_ids(N)": per_op_ns(lambda: ids.generate_order_ids(N)),
+        "generate_uuid7 (x N)": per_op_ns(lambda: [ids.generate_uuid7() for _ in range(N)]),
+        "generate_uuid7s(N)": per_op_ns(lambda: ids.generate_uuid7s(N)),
+        "generate_ulid (x N)": per_op_ns(lambda: [ids.generate_ulid() for _ in range(N)]),
+        "generate_id_bytes (x N)": per_op_ns(lambda: [ids.generate_id_bytes() for _ in range(N)]),
+        "current_timestamp (x N)": per_op_ns(lambda: [ids.current_timestamp() for _ in range(N)]),
+        "current_timestamp_ms (x N)": per_op_ns(lambda: [ids.current_timestamp_ms() for _ in range(N)]),
+        "format_timestamp(ms) (x N)": per_op_ns(
+            lambda: [ids.format_timestamp(ids.current_timestamp_ms()) for _ in range(N)]
+        ),
+    }
+
+    print(f"{'Operation':<32} | {'ns/op':>10}")
+    print("-" * 45)
+    for name, ns in results.items():
+        print(f"{name:<32} | {ns:>10.1f}")
+    print("="*60)
+
+    parse_results = {}
+    for label, per_timestamp in [("unique", 1), (f"batches_of_{PRODUCER_BATCH}", PRODUCER_BATCH)]:
+        timestamps = make_timestamps(per_timestamp)
+        for ts in timestamps[:2000]:
+            expected = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+            assert ids.parse_timestamp(ts) == expected
+            assert abs(ids.parse_timestamp_epoch(ts) - expected.timestamp()) < 1e-6
+        parse_results[label] = parse_per_million(timestamps)
+
+    for label, groups in parse_results.items():
+        print(f"\nTimestamp parsing ({PARSE_EVENTS:,} events, {EVENTS_PER_SECOND}/s, {label} timestamps)")
+        print(f"{'Parser':<42} | {'s/1M events':>11} | {'speedup':>7}")
+        print("-" * 66)
+        for group in groups.values():
+            baseline = next(iter(group.values()))
+            for name, secs in group.items():
+                print(f"{name:<42} | {secs:>11.3f} | {baseline / secs:>6.2f}x")
+    print("="*60)
+
+    with open('ids_bench_results.json', 'w') as f:
+        json.dump({
+            "ns_per_op": {k: round(v, 1) for k, v in results.items()},
+            "parse_seconds_per_million": {
+                label: {
+                    group: {k: round(v, 3) for k, v in values.items()}
+                    for group, values in groups.items()
+                }
+                for label, groups in parse_results.items()
+            }
+        }, f, indent=2)
+
+    print("\n✓ Results exported to ids_bench_results.json")
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,366 @@
+"""
+Pluggable event codecs shared by the Kafka and RabbitMQ services.
+
+JSON stays the default. The binary codec is a compact schema-based layout:
+known field names and event types are replaced by one-byte tags, UUIDs are
+stored as 16 raw bytes and 'Z' timestamps as integer microseconds.
+
+Every message carries its codec in a content-type header (Kafka message
+header / AMQP content_type property), so producers can switch codecs
+without coordinating with consumers. Messages without the header are JSON.
+"""
+
+import json
+import os
+import struct
+import time
+from datetime import datetime
+
+CONTENT_TYPE_HEADER = 'content-type'
+JSON_CONTENT_TYPE = 'application/json'
+BINARY_CONTENT_TYPE = 'application/x-order-event-v1'
+
+# Field names used by the Kafka and RabbitMQ event schemas. Append only:
+# the tag is the position in this list, so reordering breaks old messages.
+FIELD_NAMES = [
+    'event_id', 'event_type', 'event', 'order_id', 'timestamp', 'payload',
+    'user_id', 'item', 'quantity', 'qty', 'success', 'reason', 'remaining',
+    'placed_at_ms', 'reserved_at_ms', 'partition', 'offset', 'notice',
+]
+
+# Common string values stored as a one-byte symbol. Append only.
+SYMBOLS = [
+    'OrderPlaced', 'InventoryReserved', 'InventoryFailed',
+    'Insufficient inventory', 'insufficient stock', 'NotificationSent',
+]
+
+_FIELD_TAGS = {name: tag for tag, name in enumerate(FIELD_NAMES, start=1)}
+_SYMBOL_TAGS = {value: tag for tag, value in enumerate(SYMBOLS)}
+
+# Value type markers
+_T_NONE = 0x00
+_T_FALSE = 0x01
+_T_TRUE = 0x02
+_T_INT = 0x03
+_T_FLOAT = 0x04
+_T_STR = 0x05
+_T_SYMBOL = 0x06
+_T_MAP = 0x07
+_T_UUID = 0x08
+_T_TIMESTAMP = 0x09
+_T_LIST = 0x0A
+
+_UNKNOWN_FIELD = 0x00
+_HEX = frozenset('0123456789abcdef')
+
+_pack_double = struct.Struct('>d').pack
+_unpack_double = struct.Struct('>d').unpack_from
+_pack_int64 = struct.Struct('>q').pack
+_unpack_int64 = struct.Struct('>q').unpack_from
+
+_prefix_epoch = {}
+_epoch_prefix = {}
+
+
+def _write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _write_str(out, value):
+    raw = value.encode('utf-8')
+    _write_varint(out, len(raw))
+    out += raw
+
+
+def _is_uuid(value):
+    """Canonical lowercase UUID string (round-trips through bytes.hex())."""
+    return (
+        value[8] == '-' and value[13] == '-' and value[18] == '-' and value[23] == '-'
+        and _HEX.issuperset(value.replace('-', ''))
+    )
+
+
+def _timestamp_micros(value):
+    """Epoch microseconds for a 27-char 'YYYY-MM-DDTHH:MM:SS.ffffffZ', else None."""
+    if value[19] != '.' or value[26] != 'Z' or not value[20:26].isdigit():
+        return None
+    prefix = value[:19]
+    epoch = _prefix_epoch.get(prefix)
+    if epoch is None:
+        try:
+            epoch = int(datetime.fromisoformat(prefix + '+00:00').timestamp())
+        except ValueError:
+            return None
+        if len(_prefix_epoch) >= 4096:
+            _prefix_epoch.clear()
+        _prefix_epoch[prefix] = epoch
+    return epoch * 1_000_000 + int(value[20:26])
+
+
+def _format_micros(micros):
+    second, frac = divmod(micros, 1_000_000)
+    prefix = _epoch_prefix.get(second)
+    if prefix is None:
+        prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+        if len(_epoch_prefix) >= 4096:
+            _epoch_prefix.clear()
+        _epoch_prefix[second] = prefix
+    return f"{prefix}.{frac:06d}Z"
+
+
+def _write_value(out, value):
+    if value is None:
+        out.append(_T_NONE)
+    elif value is True:
+        out.append(_T_TRUE)
+    elif value is False:
+        out.append(_T_FALSE)
+    elif type(value) is int:
+        if not -2**63 <= value < 2**63:
+            raise ValueError(f"Integer out of 64-bit range: {value}")
+        out.append(_T_INT)
+        _write_varint(out, (value << 1) ^ (value >> 63))
+    elif type(value) is float:
+        out.append(_T_FLOAT)
+        out += _pack_double(value)
+    elif type(value) is str:
+        symbol = _SYMBOL_TAGS.get(value)
+        if symbol is not None:
+            out.append(_T_SYMBOL)
+            out.append(symbol)
+            return
+        length = len(value)
+        if length == 36 and _is_uuid(value):
+            out.append(_T_UUID)
+            out += bytes.fromhex(value.replace('-', ''))
+            return
+        if length == 27:
+            micros = _timestamp_micros(value)
+            if micros is not None:
+                out.append(_T_TIMESTAMP)
+                out += _pack_int64(micros)
+                return
+        out.append(_T_STR)
+        _write_str(out, value)
+    elif isinstance(value, dict):
+        out.append(_T_MAP)
+        _write_map(out, value)
+    elif isinstance(value, (list, tuple)):
+        out.append(_T_LIST)
+        _write_varint(out, len(value))
+        for element in value:
+            _write_value(out, element)
+    else:
+        raise TypeError(f"Cannot encode value of type {type(value).__name__}")
+
+
+def _write_map(out, mapping):
+    _write_varint(out, len(mapping))
+    for key, value in mapping.items():
+        tag = _FIELD_TAGS.get(key)
+        if tag is None:
+            out.append(_UNKNOWN_FIELD)
+            _write_str(out, str(key))
+        else:
+            out.append(tag)
+        _write_value(out, value)
+
+
+def _read_str(data, pos):
+    length, pos = _read_varint(data, pos)
+    end = pos + length
+    return bytes(data[pos:end]).decode('utf-8'), end
+
+
+def _read_value(data, pos):
+    kind = data[pos]
+    pos += 1
+    if kind == _T_SYMBOL:
+        return SYMBOLS[data[pos]], pos + 1
+    if kind == _T_UUID:
+        h = bytes(data[pos:pos + 16]).hex()
+        return f"{h[0:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}", pos + 16
+    if kind == _T_TIMESTAMP:
+        return _format_micros(_unpack_int64(data, pos)[0]), pos + 8
+    if kind == _T_STR:
+        return _read_str(data, pos)
+    if kind == _T_INT:
+        raw, pos = _read_varint(data, pos)
+        return (raw >> 1) ^ -(raw & 1), pos
+    if kind == _T_MAP:
+        return _read_map(data, pos)
+    if kind == _T_TRUE:
+        return True, pos
+    if kind == _T_FALSE:
+        return False, pos
+    if kind == _T_NONE:
+        return None, pos
+    if kind == _T_FLOAT:
+        return _unpack_double(data, pos)[0], pos + 8
+    if kind == _T_LIST:
+        count, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _read_value(data, pos)
+            items.append(item)
+        return items, pos
+    raise ValueError(f"Unknown value type 0x{kind:02x}")
+
+
+def _read_map(data, pos):
+    count, pos = _read_varint(data, pos)
+    result = {}
+    for _ in range(count):
+        tag = data[pos]
+        pos += 1
+        if tag == _UNKNOWN_FIELD:
+            key, pos = _read_str(data, pos)
+        else:
+            key = FIELD_NAMES[tag - 1]
+        result[key], pos = _read_value(data, pos)
+    return result, pos
+
+
+class JsonCodec:
+    """UTF-8 JSON, the format every service used originally."""
+
+    name = 'json'
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, event: dict) -> bytes:
+        return json.dumps(event).encode('utf-8')
+
+    def decode(self, data) -> dict:
+        return json.loads(data)
+
+
+class BinaryCodec:
+    """
+    Compact schema-based binary codec.
+
+    Layout: one version byte, then a map of (field tag, typed value) pairs.
+    Unknown fields and values are still encoded (with their names/strings
+    inline), so events outside the schema round-trip unchanged.
+    """
+
+    name = 'binary'
+    content_type = BINARY_CONTENT_TYPE
+    VERSION = 1
+
+    def encode(self, event: dict) -> bytes:
+        out = bytearray((self.VERSION,))
+        _write_map(out, event)
+        return bytes(out)
+
+    def decode(self, data) -> dict:
+        if not data:
+            raise ValueError("Empty binary event")
+        if data[0] != self.VERSION:
+            raise ValueError(f"Unsupported binary event version {data[0]}")
+        try:
+            event, pos = _read_map(data, 1)
+        except (IndexError, UnicodeDecodeError, struct.error) as e:
+            raise ValueError(f"Malformed binary event: {e}") from e
+        if pos != len(data):
+            raise ValueError("Trailing bytes after binary event")
+        return event
+
+
+CODECS = {
+    JsonCodec.name: JsonCodec(),
+    BinaryCodec.name: BinaryCodec(),
+}
+_BY_CONTENT_TYPE = {codec.content_type: codec for codec in CODECS.values()}
+
+
+def get_codec(name: str = None):
+    """
+    Look up a codec by name ('json' or 'binary').
+
+    Args:
+        name: Codec name; defaults to the EVENT_CODEC environment variable,
+              then 'json'
+
+    Returns:
+        codec object with encode(), decode() and content_type
+    """
+    name = (name or os.getenv('EVENT_CODEC', 'json')).lower()
+    if name not in CODECS:
+        raise ValueError(f"Unknown event codec '{name}', expected one of {sorted(CODECS)}")
+    return CODECS[name]
+
+
+def codec_for_content_type(content_type):
+    """Codec for a content-type value; missing/unknown values mean JSON."""
+    if isinstance(content_type, bytes):
+        content_type = content_type.decode('ascii', 'replace')
+    return _BY_CONTENT_TYPE.get(content_type, CODECS[JsonCodec.name])
+
+
+def content_type_from_headers(headers):
+    """Extract the content-type from Kafka message headers (list of tuples)."""
+    if not headers:
+        return None
+    for key, value in headers:
+        if key == CONTENT_TYPE_HEADER:
+            return value
+    return None
+
+
+def kafka_headers(codec):
+    """Kafka message headers announcing a codec."""
+    return [(CONTENT_TYPE_HEADER, codec.content_type.encode('ascii'))]
+
+
+def decode_event(data, content_type=None) -> dict:
+    """
+    Decode a message body with the codec named by its content type.
+
+    Raises:
+        ValueError: if the body is not valid for that codec
+    """
+    return codec_for_content_type(content_type).decode(data)
+
+
+def decode_events(values, content_types=None) -> list:
+    """
+    Decode a batch of message bodies.
+
+    Each body is decoded on its own, as decode_event() would, so a
+    malformed body fails alone and cannot combine with its neighbours
+    into valid events.
+
+    Args:
+        values: Message bodies (bytes)
+        content_types: Content type per body (default: all JSON)
+
+    Returns:
+        list: Decoded event per body, or None where a body failed to decode
+    """
+    if content_types is None:
+        content_types = [None] * len(values)
+    events = []
+    for value, content_type in zip(values, content_types):
+        event = None
+        if value is not None:
+            try:
+                event = codec_for_content_type(content_type).decode(value)
+            except (ValueError, IndexError, struct.error):
+                pass
+        events.append(event)
+    return events
@@ -3,8 +3,15 @@ Shared utility functions for generating consistent IDs and timestamps
 across all three communication model implementations.
 """
 
+import os
+import sys
+import time
 import uuid
 from datetime import datetime, timezone
+from functools import lru_cache
+
+# Crockford base32 alphabet used by ULIDs
+_ULID_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
 
 
 def generate_order_id() -> str:
@@ -17,6 +24,110 @@ def generate_event_id() -> str:
     return str(uuid.uuid4())
 
 
+def _format_uuid_hex(h: str, n: int) -> list:
+    """Split a hex string of n concatenated UUIDs into dashed UUID strings."""
+    return [
+        f"{h[i:i + 8]}-{h[i + 8:i + 12]}-{h[i + 12:i + 16]}-{h[i + 16:i + 20]}-{h[i + 20:i + 32]}"
+        for i in range(0, 32 * n, 32)
+    ]
+
+
+def _uuid4_bytes(n: int) -> bytearray:
+    """n concatenated UUID4 values from a single urandom call."""
+    buf = bytearray(os.urandom(16 * n))
+    for i in range(6, 16 * n, 16):
+        buf[i] = (buf[i] & 0x0F) | 0x40          # version 4
+        buf[i + 2] = (buf[i + 2] & 0x3F) | 0x80  # RFC 4122 variant
+    return buf
+
+
+def _uuid7_bytes(n: int) -> bytearray:
+    """
+    n concatenated UUIDv7 values sharing the current millisecond.
+
+    The 48-bit millisecond prefix makes IDs sort by creation time; the
+    values are sorted so a bulk batch is monotonic as well.
+    """
+    ms_prefix = (time.time_ns() // 1_000_000).to_bytes(6, 'big')
+    rand = os.urandom(10 * n)
+    values = []
+    for i in range(0, 10 * n, 10):
+        tail = bytearray(rand[i:i + 10])
+        tail[0] = (tail[0] & 0x0F) | 0x70  # version 7
+        tail[2] = (tail[2] & 0x3F) | 0x80  # RFC 4122 variant
+        values.append(ms_prefix + tail)
+    values.sort()
+    return bytearray(b''.join(values))
+
+
+def generate_order_ids(n: int) -> list:
+    """
+    Generate n unique order IDs (UUID4) with one urandom call.
+
+    Args:
+        n: Number of IDs to generate
+
+    Returns:
+        list of UUID4 strings
+    """
+    if n <= 0:
+        return []
+    return _format_uuid_hex(_uuid4_bytes(n).hex(), n)
+
+
+def generate_event_ids(n: int) -> list:
+    """Generate n unique event IDs (UUID4) with one urandom call."""
+    return generate_order_ids(n)
+
+
+def generate_uuid7() -> str:
+    """
+    Generate a time-ordered UUIDv7 string.
+
+    UUIDv7 IDs sort by creation time, which keeps Kafka keys and
+    database index inserts append-mostly.
+    """
+    return _format_uuid_hex(_uuid7_bytes(1).hex(), 1)[0]
+
+
+def generate_uuid7s(n: int) -> list:
+    """Generate n monotonic UUIDv7 strings with one urandom call."""
+    if n <= 0:
+        return []
+    return _format_uuid_hex(_uuid7_bytes(n).hex(), n)
+
+
+def generate_ulid() -> str:
+    """
+    Generate a 26-character ULID (Crockford base32, time-ordered).
+
+    Returns:
+        str: ULID like '01HPQ3ZB7X6Q2W8R9T0V1N4M5K'
+    """
+    ms = time.time_ns() // 1_000_000
+    value = (ms << 80) | int.from_bytes(os.urandom(10), 'big')
+    chars = []
+    for _ in range(26):
+        value, rem = divmod(value, 32)
+        chars.append(_ULID_ALPHABET[rem])
+    return ''.join(reversed(chars))
+
+
+def generate_id_bytes() -> bytes:
+    """Generate a compact 16-byte time-ordered ID (UUIDv7 binary form)."""
+    return bytes(_uuid7_bytes(1))
+
+
+def id_to_bytes(id_str: str) -> bytes:
+    """Convert a UUID string to its 16-byte binary form."""
+    return uuid.UUID(id_str).bytes
+
+
+def id_from_bytes(id_bytes: bytes) -> str:
+    """Convert a 16-byte binary ID back to its UUID string form."""
+    return str(uuid.UUID(bytes=bytes(id_bytes)))
+
+
 def current_timestamp() -> str:
     """
     Generate ISO-8601 formatted timestamp in UTC.
@@ -27,6 +138,49 @@ def current_timestamp() -> str:
     return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
 
 
+def current_timestamp_ms() -> int:
+    """
+    Current UTC time as integer milliseconds since the epoch.
+
+    Cheap enough for hot paths; format with format_timestamp() only
+    when an ISO string is actually needed.
+    """
+    return time.time_ns() // 1_000_000
+
+
+@lru_cache(maxsize=1024)
+def _second_prefix(epoch_second: int) -> str:
+    """ISO-8601 date/time prefix for a whole epoch second."""
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(epoch_second))
+
+
+def format_timestamp(epoch_ms: int) -> str:
+    """
+    Format epoch milliseconds as an ISO-8601 UTC timestamp.
+
+    Args:
+        epoch_ms: Milliseconds since the epoch
+
+    Returns:
+        str: Timestamp like '2026-02-10T14:30:00.123000Z'
+    """
+    second, frac = divmod(epoch_ms, 1000)
+    return f"{_second_prefix(second)}.{frac:03d}000Z"
+
+
+# Memo of 'YYYY-MM-DDTHH:MM:SS' prefix -> epoch seconds. Events consumed
+# together almost always share a second, so this stays tiny and hot.
+_EPOCH_PREFIX_CACHE = {}
+_EPOCH_PREFIX_CACHE_SIZE = 4096
+
+# Last parsed (timestamp, epoch). Batch-produced events share one
+# timestamp string, so consecutive events usually hit this.
+_last_epoch_parse = ('', 0.0)
+
+# Python 3.11+ fromisoformat() accepts a trailing 'Z' directly
+_FROMISOFORMAT_ACCEPTS_Z = sys.version_info >= (3, 11)
+
+
 def parse_timestamp(ts_str: str) -> datetime:
     """
     Parse ISO-8601 timestamp string back to datetime object.
@@ -37,4 +191,48 @@ def parse_timestamp(ts_str: str) -> datetime:
     Returns:
         datetime object in UTC
     """
+    if _FROMISOFORMAT_ACCEPTS_Z:
+        return datetime.fromisoformat(ts_str)
     return datetime.fromisoformat(ts_str.replace('Z', '+00:00'))
+
+
+def _epoch_for_prefix(prefix: str) -> int:
+    """Epoch seconds for a UTC 'YYYY-MM-DDTHH:MM:SS' prefix (memoized)."""
+    if len(_EPOCH_PREFIX_CACHE) >= _EPOCH_PREFIX_CACHE_SIZE:
+        _EPOCH_PREFIX_CACHE.clear()
+    epoch = int(datetime.fromisoformat(prefix + '+00:00').timestamp())
+    _EPOCH_PREFIX_CACHE[prefix] = epoch
+    return epoch
+
+
+def parse_timestamp_epoch(ts_str: str) -> float:
+    """
+    Parse an ISO-8601 timestamp string directly to epoch seconds.
+
+    Repeats of the previous timestamp are returned from cache; other
+    'Z'-suffixed timestamps look up their second prefix in a small memo
+    and only parse the fractional part, without building a datetime.
+    Use this on consumer hot paths that only compare or bucket times.
+
+    Args:
+        ts_str: ISO-8601 formatted timestamp
+
+    Returns:
+        float seconds since the epoch
+    """
+    global _last_epoch_parse
+    last_ts, last_epoch = _last_epoch_parse
+    if ts_str == last_ts:
+        return last_epoch
+
+    if ts_str[-1:] == 'Z' and len(ts_str) >= 20:
+        prefix = ts_str[:19]
+        base = _EPOCH_PREFIX_CACHE.get(prefix)
+        if base is None:
+            base = _epoch_for_prefix(prefix)
+        epoch = base + float(ts_str[19:-1]) if len(ts_str) > 20 else float(base)
+    else:
+        epoch = parse_timestamp(ts_str).timestamp()
+
+    _last_epoch_parse = (ts_str, epoch)
+    return epoch
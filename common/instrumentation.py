@@ -0,0 +1,532 @@
+"""
+Lightweight pull metrics shared by the REST, RabbitMQ and Kafka services.
+
+Counters, gauges and fixed-bucket histograms rendered in the Prometheus
+text exposition format on a /metrics endpoint: a Flask route for the HTTP
+services, or a tiny HTTP listener thread for the consumers.
+
+Counters and histograms accumulate into per-thread cells, so recording
+takes no lock: a thread only ever writes its own cell, and a scrape sums
+all cells. Cells of threads that have exited are folded into a shared
+base, so services that start a thread per request (the Flask dev server)
+keep a bounded number of cells. A scrape may miss an increment that is in
+progress; it is picked up by the next one.
+"""
+
+import bisect
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from 0.5 ms to 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds, from 1 ms to 10 min (event age / consume lag)
+AGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 600.0)
+
+_PRUNE_EVERY = 64  # New cells between sweeps for cells of exited threads
+
+
+class _Cells:
+    """Per-thread accumulator cells of `size` numbers each"""
+
+    def __init__(self, size):
+        self.size = size
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.cells = []  # (thread, cell)
+        self.base = [0] * size  # Folded cells of exited threads
+        self.created = 0
+
+    def cell(self):
+        try:
+            return self.local.cell
+        except AttributeError:
+            cell = self.local.cell = [0] * self.size
+            with self.lock:
+                self.cells.append((threading.current_thread(), cell))
+                self.created += 1
+                if self.created % _PRUNE_EVERY == 0:
+                    self._prune()
+            return cell
+
+    def _prune(self):
+        alive = []
+        for thread, cell in self.cells:
+            if thread.is_alive():
+                alive.append((thread, cell))
+            else:
+                for i, value in enumerate(cell):
+                    self.base[i] += value
+        self.cells = alive
+
+    def totals(self):
+        """Element-wise sum over all cells"""
+        with self.lock:
+            self._prune()
+            result = list(self.base)
+            for _, cell in self.cells:
+                for i, value in enumerate(cell):
+                    result[i] += value
+        return result
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _CounterValue:
+    __slots__ = ('cells',)
+
+    def __init__(self):
+        self.cells = _Cells(1)
+
+    def inc(self, amount=1):
+        self.cells.cell()[0] += amount
+
+    def value(self):
+        return self.cells.totals()[0]
+
+
+class _GaugeValue:
+    __slots__ = ('current', 'function', 'lock')
+
+    def __init__(self):
+        self.current = 0
+        self.function = None
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.current = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.current += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.current -= amount
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead"""
+        self.function = function
+
+    def value(self):
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception as e:
+                logger.error(f"Error reading gauge: {e}")
+                return math.nan
+        return self.current
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'cells')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Cell: one count per bucket, one for +Inf, then the sum
+        self.cells = _Cells(len(buckets) + 2)
+
+    def observe(self, value):
+        cell = self.cells.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self):
+        """Context manager observing the elapsed seconds of its block"""
+        return _Timer(self)
+
+    def snapshot(self):
+        """(per-bucket counts incl. +Inf, sum)"""
+        totals = self.cells.totals()
+        return totals[:-1], totals[-1]
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _Metric:
+    """
+    A named metric family
+
+    Without labelnames the family records directly (counter.inc()); with
+    labelnames each combination of values is its own series
+    (counter.labels('GET', '/order').inc()). Keep the child returned by
+    labels() on hot paths to skip the lookup.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation='', labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}  # label values -> value holder
+        self.lock = threading.Lock()
+        self.default = None if self.labelnames else self._new_value()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Value holder for one combination of label values"""
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self.lock:
+                child = self.children.setdefault(values, self._new_value())
+        return child
+
+    def remove(self, *values):
+        """Drop the series for these label values (e.g. a revoked partition)"""
+        with self.lock:
+            self.children.pop(values, None)
+
+    def _series(self):
+        if self.default is not None:
+            return [((), self.default)]
+        with self.lock:
+            return list(self.children.items())
+
+    def collect(self):
+        """Exposition text lines for this family"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._series():
+            lines.extend(self._sample_lines(_label_text(self.labelnames, values), child, values))
+        return lines
+
+    def _sample_lines(self, labels, child, values):
+        return [f"{self.name}{labels} {_format_value(child.value())}"]
+
+
+class Counter(_Metric):
+    """Monotonic count (requests, messages, errors)"""
+
+    kind = 'counter'
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.default.inc(amount)
+
+    def value(self):
+        return self.default.value()
+
+
+class Gauge(_Metric):
+    """Value that goes up and down (queue depth, lag, in-flight requests)"""
+
+    kind = 'gauge'
+
+    def _new_value(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self.default.set(value)
+
+    def inc(self, amount=1):
+        self.default.inc(amount)
+
+    def dec(self, amount=1):
+        self.default.dec(amount)
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead"""
+        self.default.set_function(function)
+
+    def value(self):
+        return self.default.value()
+
+
+class Histogram(_Metric):
+    """
+    Distribution over fixed upper bounds (latencies, batch sizes)
+
+    Each observation is one bisect and two additions in the caller's
+    thread cell; cumulative bucket counts are computed at scrape time.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation='', labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.default.observe(value)
+
+    def time(self):
+        """Context manager observing the elapsed seconds of its block"""
+        return self.default.time()
+
+    def snapshot(self):
+        return self.default.snapshot()
+
+    def _sample_lines(self, labels, child, values):
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = 'le="' + _format_value(float(bound)) + '"'
+            lines.append(f"{self.name}_bucket{_label_text(self.labelnames, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Set of metric families rendered together on /metrics"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self.metrics[metric.name] = metric
+
+    def get(self, name):
+        return self.metrics.get(name)
+
+    def generate(self):
+        """Prometheus text exposition of every registered metric"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation='', labelnames=(), registry=None):
+    """Get or create a Counter in the registry"""
+    return _get_or_create(Counter, name, documentation, labelnames, registry)
+
+
+def gauge(name, documentation='', labelnames=(), registry=None):
+    """Get or create a Gauge in the registry"""
+    return _get_or_create(Gauge, name, documentation, labelnames, registry)
+
+
+def histogram(name, documentation='', labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+    """Get or create a Histogram in the registry"""
+    registry = registry if registry is not None else REGISTRY
+    existing = registry.get(name)
+    if existing is not None:
+        return existing
+    return Histogram(name, documentation, labelnames, buckets, registry)
+
+
+def _get_or_create(cls, name, documentation, labelnames, registry):
+    registry = registry if registry is not None else REGISTRY
+    existing = registry.get(name)
+    if existing is not None:
+        return existing
+    return cls(name, documentation, labelnames, registry)
+
+
+def publish_latency(service, destination, registry=None):
+    """Publish latency histogram of a service for one topic or exchange"""
+    return histogram('publish_duration_seconds', 'Publish latency in seconds (Kafka: produce to delivery report)',
+                     ('service', 'destination'), registry=registry).labels(service, destination)
+
+
+def publish_errors(service, destination, registry=None):
+    """Failed publishes of a service to one topic or exchange"""
+    return counter('publish_errors_total', 'Publishes that failed',
+                   ('service', 'destination'), registry).labels(service, destination)
+
+
+def completion_latency(service, stage, registry=None):
+    """Order placed -> stage reached (e.g. reserved, notified) histogram of a service"""
+    return histogram('order_completion_seconds', 'Order placed to stage reached in seconds',
+                     ('service', 'stage'), AGE_BUCKETS, registry).labels(service, stage)
+
+
+class MessageMetrics:
+    """
+    Standard metrics of a service that consumes (and publishes) messages
+
+    Attributes are label-bound children, so recording is one call:
+    processed.inc(), processing.observe(seconds) or `with processing.time():`.
+    """
+
+    def __init__(self, service, source, registry=None):
+        """
+        Args:
+            service: Service name label (e.g. 'kafka_inventory_consumer')
+            source: Topic(s) or queue consumed from
+        """
+        self.service = service
+        self.registry = registry
+        labels = ('service', 'source')
+        self.processed = counter('messages_processed_total', 'Messages processed',
+                                 labels, registry).labels(service, source)
+        self.failed = counter('messages_failed_total', 'Messages that failed processing',
+                              labels, registry).labels(service, source)
+        self.processing = histogram('message_processing_seconds', 'Processing time per message in seconds',
+                                    labels, registry=registry).labels(service, source)
+        self.batches = histogram('batch_processing_seconds', 'Processing time per consumed batch in seconds',
+                                 labels, registry=registry).labels(service, source)
+        self.age = histogram('message_age_seconds', 'Event timestamp to processing time in seconds (consume lag)',
+                             labels, AGE_BUCKETS, registry).labels(service, source)
+
+    def publish(self, destination):
+        """Publish latency histogram for one topic or exchange"""
+        return publish_latency(self.service, destination, self.registry)
+
+    def publish_errors(self, destination):
+        return publish_errors(self.service, destination, self.registry)
+
+    def observe_kafka_age(self, msg):
+        """Record the age of a Kafka message from its broker timestamp"""
+        _, timestamp_ms = msg.timestamp()
+        if timestamp_ms > 0:
+            self.age.observe(max(0.0, time.time() - timestamp_ms / 1000))
+
+
+class KafkaLag:
+    """
+    Per-partition consumer lag (high watermark - position) of a Kafka consumer
+
+    Nothing is recorded on the consume path: assigned partitions get a gauge
+    whose value is read from the consumer when /metrics is scraped. A scrape
+    makes no broker requests: the high watermark is the one cached from the
+    last fetch response and the position is tracked locally, so the lag is
+    NaN until the partition's first fetch.
+    """
+
+    def __init__(self, consumer, service, registry=None):
+        self.consumer = consumer
+        self.service = service
+        self.gauge = gauge('kafka_consumer_lag_messages', 'Messages between the position and the high watermark',
+                           ('service', 'topic', 'partition'), registry)
+
+    def assign(self, partitions):
+        for tp in partitions:
+            self.gauge.labels(self.service, tp.topic, str(tp.partition)).set_function(
+                lambda tp=tp: self._lag(tp))
+
+    def revoke(self, partitions):
+        for tp in partitions:
+            self.gauge.remove(self.service, tp.topic, str(tp.partition))
+
+    def _lag(self, tp):
+        _, high = self.consumer.get_watermark_offsets(tp, cached=True)
+        position = self.consumer.position([tp])[0].offset
+        if high < 0 or position < 0:  # Not fetched yet
+            return math.nan
+        return max(0, high - position)
+
+
+def instrument_flask(app, service, registry=None):
+    """
+    Add GET /metrics and per-request metrics to a Flask app
+
+    Records http_requests_total and http_request_duration_seconds by
+    method, route (the URL rule, not the raw path) and status.
+    """
+    from flask import Response, g, request
+
+    registry = registry if registry is not None else REGISTRY
+    requests_total = counter('http_requests_total', 'HTTP requests handled',
+                             ('service', 'method', 'route', 'status'), registry)
+    duration = histogram('http_request_duration_seconds', 'HTTP request latency in seconds',
+                         ('service', 'method', 'route'), registry=registry)
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = getattr(g, '_metrics_start', None)
+        if start is not None and request.endpoint != 'metrics':
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            duration.labels(service, request.method, route).observe(time.perf_counter() - start)
+            requests_total.labels(service, request.method, route, str(response.status_code)).inc()
+        return response
+
+    @app.route('/metrics', methods=['GET'], endpoint='metrics')
+    def _metrics():
+        return Response(registry.generate(), content_type=CONTENT_TYPE)
+
+    return app
+
+
+def start_http_server(port, addr='0.0.0.0', registry=None):
+    """
+    Serve GET /metrics from a daemon thread (for services without a web app)
+
+    Returns:
+        The server; call shutdown() to stop it
+    """
+    registry = registry if registry is not None else REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.generate().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would flood the service log
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"Metrics endpoint on http://{addr}:{port}/metrics")
+    return server
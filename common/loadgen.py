@@ -0,0 +1,314 @@
+"""
+Open-loop load generation with HDR latency histograms.
+
+Requests are scheduled at a constant arrival rate: request i is due at
+start + i / rate whether or not earlier requests have finished, and its
+latency is measured from that intended send time, not from when a free
+worker got around to sending it. A stalled server therefore shows up as
+latency for every request that should have been sent during the stall,
+instead of silently lowering the request rate (coordinated omission).
+Service time (actual send -> response) is recorded separately.
+
+Latencies go into HdrHistogram-style log-linear histograms (fixed relative
+precision, constant memory), one per worker, merged at the end.
+
+Usage:
+    from loadgen import run_load
+
+    def send(i):
+        return requests.post(url, json=order(i), timeout=10).status_code
+
+    result = run_load(send, rate=50, requests=500, concurrency=20, warmup_seconds=2)
+    result.latency.percentile(99)    # ms, from the intended send time
+    result.service.percentile(99)    # ms, from the actual send time
+"""
+
+import asyncio
+import inspect
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HdrHistogram:
+    """
+    Log-linear histogram of integer values (microseconds here) with a fixed
+    number of significant digits, after HdrHistogram: every value up to
+    highest_value is stored within 10^-significant_digits relative error
+    """
+
+    def __init__(self, lowest_value=1, highest_value=3_600_000_000, significant_digits=3):
+        self.lowest_value = lowest_value
+        self.highest_value = highest_value
+        self.significant_digits = significant_digits
+        single_unit_resolution = 2 * 10 ** significant_digits
+        sub_bucket_count_magnitude = math.ceil(math.log2(single_unit_resolution))
+        self.sub_bucket_half_count_magnitude = max(sub_bucket_count_magnitude, 1) - 1
+        self.unit_magnitude = int(math.floor(math.log2(lowest_value)))
+        self.sub_bucket_count = 1 << (self.sub_bucket_half_count_magnitude + 1)
+        self.sub_bucket_half_count = self.sub_bucket_count // 2
+        self.sub_bucket_mask = (self.sub_bucket_count - 1) << self.unit_magnitude
+        smallest_untrackable = self.sub_bucket_count << self.unit_magnitude
+        bucket_count = 1
+        while smallest_untrackable <= highest_value:
+            smallest_untrackable <<= 1
+            bucket_count += 1
+        self.counts = [0] * ((bucket_count + 1) * self.sub_bucket_half_count)
+        self.total_count = 0
+        self.min_value = None
+        self.max_value = 0
+        self.sum = 0
+
+    def _index(self, value):
+        bucket_index = (value | self.sub_bucket_mask).bit_length() - self.unit_magnitude \
+            - (self.sub_bucket_half_count_magnitude + 1)
+        sub_bucket_index = value >> (bucket_index + self.unit_magnitude)
+        return ((bucket_index + 1) << self.sub_bucket_half_count_magnitude) \
+            + (sub_bucket_index - self.sub_bucket_half_count)
+
+    def _value_at_index(self, index):
+        bucket_index = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self.sub_bucket_half_count
+            bucket_index = 0
+        lowest = sub_bucket_index << (bucket_index + self.unit_magnitude)
+        return lowest + (1 << (bucket_index + self.unit_magnitude)) - 1  # Highest value in the same slot
+
+    def record(self, value, count=1):
+        """Record an integer value, clamped to [0, highest_value]"""
+        value = min(max(int(value), 0), self.highest_value)
+        self.counts[self._index(value)] += count
+        self.total_count += count
+        self.sum += value * count
+        self.min_value = value if self.min_value is None else min(self.min_value, value)
+        self.max_value = max(self.max_value, value)
+
+    def merge(self, other):
+        """Add another histogram with the same layout"""
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total_count += other.total_count
+        self.sum += other.sum
+        if other.min_value is not None:
+            self.min_value = other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+        self.max_value = max(self.max_value, other.max_value)
+
+    def value_at_percentile(self, percentile):
+        """Value that percentile% of the recordings are at or below (0 when empty)"""
+        if self.total_count == 0:
+            return 0
+        target = max(1, math.ceil(percentile / 100 * self.total_count))
+        running = 0
+        for index, count in enumerate(self.counts):
+            running += count
+            if running >= target:
+                return min(self._value_at_index(index), self.max_value)
+        return self.max_value
+
+    def mean(self):
+        return self.sum / self.total_count if self.total_count else 0
+
+
+class LatencyHistogram(HdrHistogram):
+    """HdrHistogram of latencies stored in microseconds and read in milliseconds"""
+
+    def percentile(self, percentile):
+        return self.value_at_percentile(percentile) / 1000
+
+    def summary(self):
+        """Milliseconds: average, p50, p90, p95, p99, p99.9, min, max"""
+        return {
+            'count': self.total_count,
+            'average': round(self.mean() / 1000, 3),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'p99_9': self.percentile(99.9),
+            'min': (self.min_value or 0) / 1000,
+            'max': self.max_value / 1000,
+        }
+
+
+class Sample:
+    """One request: when it was due, how long it took and what came back"""
+
+    __slots__ = ('index', 'intended', 'latency_ms', 'service_ms', 'outcome', 'error', 'warmup')
+
+    def __init__(self, index, intended, latency_ms, service_ms, outcome, error, warmup):
+        self.index = index
+        self.intended = intended  # Seconds after the start of the run
+        self.latency_ms = latency_ms
+        self.service_ms = service_ms
+        self.outcome = outcome
+        self.error = error
+        self.warmup = warmup
+
+
+class LoadResult:
+    """Histograms and per-request samples of a run (warmup samples kept, not in the histograms)"""
+
+    def __init__(self, rate, concurrency, mode, warmup_requests):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.mode = mode
+        self.warmup_requests = warmup_requests
+        self.latency = LatencyHistogram()
+        self.service = LatencyHistogram()
+        self.samples = []
+        self.seconds = 0.0
+        self.max_send_lag_ms = 0.0  # Worst intended -> actual send delay (all workers busy)
+
+    def add(self, sample, send_lag):
+        self.samples.append(sample)
+        if not sample.warmup:
+            self.latency.record(round(sample.latency_ms * 1000))
+            self.service.record(round(sample.service_ms * 1000))
+            self.max_send_lag_ms = max(self.max_send_lag_ms, send_lag * 1000)
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.service.merge(other.service)
+        self.samples.extend(other.samples)
+        self.max_send_lag_ms = max(self.max_send_lag_ms, other.max_send_lag_ms)
+
+    @property
+    def measured(self):
+        """Samples after warmup, in schedule order"""
+        return [sample for sample in self.samples if not sample.warmup]
+
+    def outcomes(self):
+        """{outcome: count} after warmup"""
+        counts = {}
+        for sample in self.measured:
+            counts[sample.outcome] = counts.get(sample.outcome, 0) + 1
+        return counts
+
+    def achieved_rate(self):
+        """Requests actually sent per second after warmup (below the target when every worker was busy)"""
+        sent = sorted(sample.intended + (sample.latency_ms - sample.service_ms) / 1000
+                      for sample in self.measured)
+        if len(sent) < 2 or sent[-1] <= sent[0]:
+            return 0.0
+        return (len(sent) - 1) / (sent[-1] - sent[0])
+
+
+def _call(send, index):
+    """(outcome, error) of one send(); exceptions become their class name"""
+    try:
+        return send(index), None
+    except Exception as e:
+        return type(e).__name__, str(e)
+
+
+def _run_threads(send, rate, total, warmup_requests, concurrency):
+    result = LoadResult(rate, concurrency, 'threads', warmup_requests)
+    lock = threading.Lock()
+    next_index = [0]
+    start = time.perf_counter() + 0.01  # Every worker is up before the first request is due
+
+    def worker(part):
+        while True:
+            with lock:
+                index = next_index[0]
+                next_index[0] += 1
+            if index >= total:
+                return
+            intended = start + index / rate
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.perf_counter()
+            outcome, error = _call(send, index)
+            done = time.perf_counter()
+            part.add(Sample(index, intended - start, (done - intended) * 1000, (done - sent) * 1000,
+                            outcome, error, index < warmup_requests), sent - intended)
+
+    parts = [LoadResult(rate, concurrency, 'threads', warmup_requests) for _ in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(part,), daemon=True) for part in parts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for part in parts:
+        result.merge(part)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+async def _run_asyncio(send, rate, total, warmup_requests, concurrency):
+    """One task per arrival; at most concurrency in flight, the rest wait (and that wait counts)"""
+    result = LoadResult(rate, concurrency, 'asyncio', warmup_requests)
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(concurrency)
+    coroutine = inspect.iscoroutinefunction(send)
+    executor = None if coroutine else ThreadPoolExecutor(concurrency)
+    start = time.perf_counter()
+
+    async def one(index, intended):
+        async with slots:
+            sent = time.perf_counter()
+            if coroutine:
+                try:
+                    outcome, error = await send(index), None
+                except Exception as e:
+                    outcome, error = type(e).__name__, str(e)
+            else:
+                outcome, error = await loop.run_in_executor(executor, _call, send, index)
+            done = time.perf_counter()
+        result.add(Sample(index, intended - start, (done - intended) * 1000, (done - sent) * 1000,
+                          outcome, error, index < warmup_requests), sent - intended)
+
+    tasks = []
+    try:
+        for index in range(total):
+            intended = start + index / rate
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(index, intended)))
+        await asyncio.gather(*tasks)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def run_load(send, rate, requests=None, duration=None, concurrency=10, warmup_seconds=0.0, mode='threads'):
+    """
+    Send requests at a constant arrival rate
+
+    Args:
+        send: Callable taking the request index and returning an outcome
+              (e.g. the status code); a raised exception is recorded as its
+              class name. With mode='asyncio' it may be a coroutine function.
+        rate: Requests per second
+        requests / duration: Measured requests, or seconds of measured load
+        concurrency: Worker threads (threads) or requests in flight (asyncio)
+        warmup_seconds: Load sent first at the same rate and left out of
+                        the histograms
+        mode: 'threads' or 'asyncio'
+
+    Returns:
+        LoadResult
+    """
+    if rate <= 0:
+        raise ValueError("rate must be positive")
+    if requests is None:
+        if duration is None:
+            raise ValueError("Give requests or duration")
+        requests = int(rate * duration)
+    warmup_requests = int(rate * warmup_seconds)
+    total = warmup_requests + requests
+    if mode == 'threads':
+        result = _run_threads(send, rate, total, warmup_requests, concurrency)
+    elif mode == 'asyncio':
+        result = asyncio.run(_run_asyncio(send, rate, total, warmup_requests, concurrency))
+    else:
+        raise ValueError(f"Unknown mode {mode!r} (threads or asyncio)")
+    result.samples.sort(key=lambda sample: sample.index)
+    return result
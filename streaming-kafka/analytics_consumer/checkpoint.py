@@ -0,0 +1,54 @@
+"""
+Analytics state checkpoints
+The full MetricsCalculator state is written together with the offsets it
+covers (the next offset of every partition counted into it), so a
+restarted consumer restores the metrics and resumes reading exactly where
+they end instead of replaying the topics from earliest. The file is
+replaced atomically, so a crash mid-write keeps the previous checkpoint.
+"""
+import json
+import logging
+import os
+
+from snapshots import write_atomic
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+
+def write_checkpoint(path, offsets, state):
+    """
+    Args:
+        path: Checkpoint file
+        offsets: {(topic, partition): next offset} counted into state
+        state: MetricsCalculator.export()
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    checkpoint = {
+        'version': CHECKPOINT_VERSION,
+        'offsets': [[topic, partition, offset] for (topic, partition), offset in sorted(offsets.items())],
+        'metrics': state
+    }
+    write_atomic(path, json.dumps(checkpoint, separators=(',', ':')))
+
+
+def read_checkpoint(path):
+    """
+    Returns:
+        ({(topic, partition): next offset}, metrics state), or None when
+        there is no usable checkpoint
+    """
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"Unreadable checkpoint {path}: {e}")
+        return None
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        logger.warning(f"Ignoring checkpoint {path} with version {checkpoint.get('version')}")
+        return None
+    offsets = {(topic, partition): offset for topic, partition, offset in checkpoint['offsets']}
+    return offsets, checkpoint['metrics']
@@ -2,14 +2,21 @@
 Kafka Consumer for Analytics
 Consumes from multiple topics and computes real-time metrics
 """
-from confluent_kafka import Consumer, KafkaError
-import json
+from confluent_kafka import Consumer, KafkaError, TopicPartition, OFFSET_BEGINNING
 import logging
 import os
 import signal
+import sys
 import time
 
+sys.path.append('/app/common')
+from codec import decode_event, decode_events, content_type_from_headers
+from instrumentation import KafkaLag, MessageMetrics, start_http_server
+
+from checkpoint import read_checkpoint, write_checkpoint
 from metrics import MetricsCalculator
+from snapshots import SnapshotWriter
+from windows import parse_windows
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -18,105 +25,390 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def build_metrics(time_mode=None):
+    """MetricsCalculator configured from the METRICS_* and LATENCY_* environment"""
+    # Sliding window for orders/minute: processing time (arrival) or event
+    # time (the event's timestamp, so replays report historical rates)
+    return MetricsCalculator(
+        window_seconds=int(os.getenv('METRICS_WINDOW_SECONDS', '60')),
+        bucket_seconds=float(os.getenv('METRICS_BUCKET_SECONDS', '1')),
+        time_mode=time_mode or os.getenv('METRICS_TIME_MODE', 'processing'),
+        # Tumbling (SIZE) and hopping (SIZE/HOP) windows, ranked by payload keys
+        windows=parse_windows(os.getenv('METRICS_WINDOWS', '1m,5m/1m,1h/5m')),
+        group_by=[k for k in os.getenv('METRICS_GROUP_BY', 'item,user_id').split(',') if k],
+        top_k=int(os.getenv('METRICS_TOP_K', '10')),
+        sketch_size=int(os.getenv('METRICS_SKETCH_SIZE', '100')),
+        # OrderPlaced -> InventoryReserved join for latency percentiles
+        latency_max_pending=int(os.getenv('LATENCY_MAX_PENDING', '100000')),
+        latency_ttl_seconds=int(os.getenv('LATENCY_PENDING_TTL_SECONDS', '300'))
+    )
+
+
 class AnalyticsConsumer:
     def __init__(self):
         self.kafka_broker = os.getenv('KAFKA_BROKER', 'kafka:9092')
-        self.group_id = 'analytics-group'
-        self.topics = ['order-events', 'inventory-events']
+        self.group_id = os.getenv('GROUP_ID', 'analytics-group')
+        self.topics = os.getenv('TOPICS', 'order-events,inventory-events').split(',')
         self.running = True
-        self.metrics = MetricsCalculator()
-        self.metrics_interval = 10  # Log metrics every 10 seconds
-        self.last_metrics_time = time.time()
+        self.metrics = build_metrics()
+        # Snapshots (metrics_output.json + JSONL history) are written and
+        # logged by a background thread, never from the consume loop
+        self.snapshots = SnapshotWriter(
+            self.metrics,
+            path='metrics_output.json',
+            history_path=os.getenv('METRICS_HISTORY_FILE', 'metrics_history.jsonl'),
+            interval_seconds=float(os.getenv('METRICS_SNAPSHOT_SECONDS', '10')),
+            on_snapshot=self.log_metrics
+        )
+        
+        # Batch mode: consume up to BATCH_SIZE messages per call, decode and
+        # count them together and commit asynchronously once per batch.
+        # BATCH_SIZE=1 keeps the original poll + synchronous commit loop.
+        self.batch_size = int(os.getenv('BATCH_SIZE', '2000'))
+        self.last_offsets = {}  # (topic, partition) -> next offset, for revokes
+        self.batch_failed = False  # Metrics may hold part of a batch whose offsets were not committed
+        
+        # Checkpoints: STATE_DIR enables periodic checkpoints of the metrics
+        # state with the offsets it covers; a restart restores both and
+        # resumes from them. REPLAY_FROM_EARLIEST=true ignores the checkpoint
+        # and rebuilds the metrics from the start of the topics instead.
+        self.state_dir = os.getenv('STATE_DIR', '')
+        self.checkpoint_path = os.path.join(self.state_dir, 'analytics_checkpoint.json') if self.state_dir else None
+        self.checkpoint_interval = float(os.getenv('CHECKPOINT_INTERVAL_SECONDS', '30'))
+        self.replay_from_earliest = os.getenv('REPLAY_FROM_EARLIEST', 'false').lower() == 'true'
+        self.counted_offsets = {}  # (topic, partition) -> next offset counted into metrics
+        self.resume_offsets = {}  # (topic, partition) -> checkpoint offset to seek to
+        self.positioned = set()  # Partitions already given their start offset
+        self.last_checkpoint = time.monotonic()
+        
+        # Group membership: cooperative-sticky only moves the partitions that
+        # change owner on a rebalance; GROUP_INSTANCE_ID makes this a static
+        # member, so a restart within SESSION_TIMEOUT_MS causes no rebalance
+        self.assignment_strategy = os.getenv('PARTITION_ASSIGNMENT_STRATEGY', 'cooperative-sticky')
+        self.group_instance_id = os.getenv('GROUP_INSTANCE_ID', '')
+        self.session_timeout_ms = int(os.getenv('SESSION_TIMEOUT_MS', '45000'))
         
         # Consumer configuration
         consumer_config = {
             'bootstrap.servers': self.kafka_broker,
             'group.id': self.group_id,
             'auto.offset.reset': 'earliest',
-            'enable.auto.commit': False  # Manual commit for replay capability
+            'enable.auto.commit': False,  # Manual commit for replay capability
+            'partition.assignment.strategy': self.assignment_strategy,
+            'session.timeout.ms': self.session_timeout_ms,
+            'on_commit': self.commit_callback
         }
+        if self.group_instance_id:
+            consumer_config['group.instance.id'] = self.group_instance_id
         
         self.consumer = Consumer(consumer_config)
-        self.consumer.subscribe(self.topics)
+        if self.checkpoint_path and not self.replay_from_earliest:
+            self.restore_state()
+        
+        # Pull metrics: processing time and per-partition lag
+        # (GET /metrics on METRICS_PORT; 0 = recorded but not served)
+        self.metrics_port = int(os.getenv('METRICS_PORT', '0'))
+        self.instruments = MessageMetrics('kafka_analytics_consumer', ','.join(self.topics))
+        self.lag = KafkaLag(self.consumer, 'kafka_analytics_consumer')
+        if self.metrics_port:
+            start_http_server(self.metrics_port)
+        
+        self.consumer.subscribe(
+            self.topics,
+            on_assign=self.on_assign,
+            on_revoke=self.on_revoke,
+            on_lost=self.on_lost
+        )
         
         logger.info(f"Analytics consumer initialized")
         logger.info(f"Consuming from: {', '.join(self.topics)}")
         logger.info(f"Group ID: {self.group_id}")
+        logger.info(f"Batch size: {self.batch_size}")
+        if self.replay_from_earliest:
+            logger.info("Replaying from earliest offsets")
+        logger.info(f"Assignment strategy: {self.assignment_strategy}"
+                    + (f", static member {self.group_instance_id}" if self.group_instance_id else ""))
+    
+    def commit_callback(self, err, partitions):
+        """Callback for asynchronous commit results"""
+        if err:
+            logger.error(f"Offset commit failed: {err}")
+        else:
+            logger.debug(f"Committed offsets: {partitions}")
+    
+    def on_assign(self, consumer, partitions):
+        """
+        Start newly assigned partitions (incremental under cooperative-sticky)
+        
+        The first time this instance gets a partition it starts at the
+        restored checkpoint's offset (or the earliest offset when
+        replaying); later assignments continue from the committed offset.
+        """
+        logger.info(f"Partitions assigned: {[f'{p.topic}[{p.partition}]' for p in partitions]}")
+        seeking = []
+        for p in partitions:
+            key = (p.topic, p.partition)
+            if key in self.positioned:
+                continue
+            self.positioned.add(key)
+            if self.replay_from_earliest:
+                p.offset = OFFSET_BEGINNING
+            elif key in self.resume_offsets:
+                p.offset = self.resume_offsets.pop(key)
+            else:
+                continue
+            seeking.append(f'{p.topic}[{p.partition}]@{p.offset}')
+        if seeking:
+            logger.info(f"Starting at: {seeking}")
+            if self.assignment_strategy == 'cooperative-sticky':
+                consumer.incremental_assign(partitions)
+            else:
+                consumer.assign(partitions)
+        self.lag.assign(partitions)
+    
+    def on_revoke(self, consumer, partitions):
+        """
+        Hand partitions over on a rebalance
+        
+        Batches are committed asynchronously, so commit the revoked
+        partitions' offsets synchronously before the new owner starts from
+        them, then ask for a snapshot so the file reflects everything this
+        instance counted before its partitions move. The next checkpoint no
+        longer covers them: their new owner counts from the committed offset.
+        """
+        logger.info(f"Partitions revoked: {[f'{p.topic}[{p.partition}]' for p in partitions]}")
+        offsets = [TopicPartition(p.topic, p.partition, self.last_offsets.pop((p.topic, p.partition)))
+                   for p in partitions if (p.topic, p.partition) in self.last_offsets]
+        for p in partitions:
+            self.counted_offsets.pop((p.topic, p.partition), None)
+        if offsets:
+            try:
+                consumer.commit(offsets=offsets, asynchronous=False)
+            except Exception as e:
+                logger.error(f"Commit on revoke failed: {e}")
+        self.lag.revoke(partitions)
+        self.snapshots.request()
+    
+    def on_lost(self, consumer, partitions):
+        """Partitions were taken away without a revoke (e.g. session timeout)"""
+        logger.warning(f"Partitions lost: {[f'{p.topic}[{p.partition}]' for p in partitions]}")
+        for p in partitions:
+            self.last_offsets.pop((p.topic, p.partition), None)
+            self.counted_offsets.pop((p.topic, p.partition), None)
+        self.lag.revoke(partitions)
     
     def process_message(self, msg):
         """Process an event and update metrics"""
+        with self.instruments.processing.time():
+            return self._process_message(msg)
+    
+    def _process_message(self, msg):
+        self.instruments.observe_kafka_age(msg)
         try:
-            # Parse message
-            event = json.loads(msg.value().decode('utf-8'))
+            # Decode message with the codec named in its headers
+            event = decode_event(msg.value(), content_type_from_headers(msg.headers()))
             
             event_type = event.get('event_type')
             timestamp = event.get('timestamp')
             
             # Add to metrics
-            self.metrics.add_event(event_type, timestamp)
-            
-            # Log periodically
-            current_time = time.time()
-            if current_time - self.last_metrics_time >= self.metrics_interval:
-                metrics = self.metrics.get_metrics()
-                logger.info(f"=== METRICS ===")
-                logger.info(f"  Orders/min: {metrics['orders_per_minute']}")
-                logger.info(f"  Total orders: {metrics['total_orders']}")
-                logger.info(f"  Reserved: {metrics['reserved_orders']}")
-                logger.info(f"  Failed: {metrics['failed_orders']}")
-                logger.info(f"  Success rate: {metrics['success_rate_percent']}%")
-                logger.info(f"  Failure rate: {metrics['failure_rate_percent']}%")
-                logger.info(f"  Throughput: {metrics['throughput_events_per_second']} events/s")
-                logger.info(f"===============")
-                
-                # Save to file
-                self.metrics.save_to_file()
-                
-                self.last_metrics_time = current_time
+            self.metrics.add_event(event_type, timestamp, event.get('payload'), event.get('order_id'))
             
+            self.instruments.processed.inc()
             return True
             
         except Exception as e:
             logger.error(f"Error processing message: {e}")
+            self.instruments.failed.inc()
             return False
     
+    def process_batch(self, messages):
+        """
+        Decode a batch of messages in bulk and add them to metrics together
+        
+        Returns:
+            Number of events counted (undecodable messages are skipped)
+        
+        Raises:
+            Exception: Re-raised from the metrics; the batch's offsets
+                       must not be committed
+        """
+        started = time.perf_counter()
+        if messages:
+            self.instruments.observe_kafka_age(messages[-1])  # Newest message of the batch
+        events = decode_events(
+            [msg.value() for msg in messages],
+            [content_type_from_headers(msg.headers()) for msg in messages]
+        )
+        valid = [event for event in events if isinstance(event, dict)]
+        if len(valid) < len(messages):
+            logger.error(f"Skipped {len(messages) - len(valid)} undecodable messages")
+            self.instruments.failed.inc(len(messages) - len(valid))
+        try:
+            self.metrics.add_events(valid)
+        except Exception as e:
+            logger.error(f"Error processing batch, stopping before its offsets are committed: {e}")
+            self.batch_failed = True
+            self.instruments.failed.inc(len(valid))
+            raise
+        self.instruments.batches.observe(time.perf_counter() - started)
+        self.instruments.processed.inc(len(valid))
+        return len(valid)
+    
+    def restore_state(self):
+        """
+        Restore the metrics checkpoint and resume from the offsets it covers
+        
+        Checkpoints are only written after a synchronous commit of their
+        offsets, so a committed offset below the checkpoint's means the
+        group was rewound on purpose (e.g. kafka-consumer-groups
+        --reset-offsets): the checkpoint is then dropped and the metrics
+        rebuilt from the committed offsets.
+        """
+        checkpoint = read_checkpoint(self.checkpoint_path)
+        if checkpoint is None:
+            logger.info(f"No checkpoint at {self.checkpoint_path}, starting from committed offsets")
+            return
+        offsets, state = checkpoint
+        committed = self.consumer.committed([TopicPartition(t, p) for t, p in offsets], timeout=10)
+        rewound = [f'{tp.topic}[{tp.partition}]' for tp in committed
+                   if tp.offset < offsets[(tp.topic, tp.partition)]]
+        if rewound:
+            logger.warning(f"Committed offsets of {rewound} are behind the checkpoint (offsets were reset): "
+                           f"rebuilding metrics from the committed offsets")
+            return
+        try:
+            self.metrics.restore(state)
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Ignoring checkpoint {self.checkpoint_path}: {e} "
+                           f"(REPLAY_FROM_EARLIEST=true rebuilds the metrics under the new settings)")
+            return
+        self.counted_offsets = dict(offsets)
+        self.resume_offsets = dict(offsets)
+        logger.info(f"Restored metrics from {self.checkpoint_path}: {self.metrics.total_orders} orders, "
+                    f"resuming {len(offsets)} partitions at their checkpoint offsets")
+    
+    def checkpoint(self):
+        """Commit the counted offsets, then write them with the metrics state"""
+        if self.last_offsets:
+            try:
+                self.consumer.commit(
+                    offsets=[TopicPartition(topic, partition, offset)
+                             for (topic, partition), offset in self.last_offsets.items()],
+                    asynchronous=False
+                )
+            except Exception as e:
+                logger.error(f"Commit before checkpoint failed, skipping checkpoint: {e}")
+                return
+        start = time.perf_counter()
+        try:
+            write_checkpoint(self.checkpoint_path, self.counted_offsets, self.metrics.export())
+        except Exception as e:
+            logger.error(f"Error writing checkpoint: {e}")
+        self.last_checkpoint = time.monotonic()
+        logger.debug(f"Checkpoint written in {(time.perf_counter() - start) * 1000:.1f} ms")
+    
+    def maybe_checkpoint(self):
+        if self.checkpoint_path and time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+    
+    def log_metrics(self, metrics):
+        """Log a metrics summary (runs on the snapshot writer thread)"""
+        logger.info(f"=== METRICS ===")
+        logger.info(f"  Orders/min: {metrics['orders_per_minute']}")
+        logger.info(f"  Total orders: {metrics['total_orders']}")
+        logger.info(f"  Reserved: {metrics['reserved_orders']}")
+        logger.info(f"  Failed: {metrics['failed_orders']}")
+        logger.info(f"  Success rate: {metrics['success_rate_percent']}%")
+        logger.info(f"  Failure rate: {metrics['failure_rate_percent']}%")
+        logger.info(f"  Throughput: {metrics['throughput_events_per_second']} events/s")
+        latency = metrics['latency_ms']
+        logger.info(f"  Order->reserved latency: p50 {latency['p50']} ms, "
+                    f"p95 {latency['p95']} ms, p99 {latency['p99']} ms ({latency['count']} orders)")
+        logger.info(f"===============")
+    
     def start(self):
         """Start consuming messages"""
         logger.info("Starting consumption...")
+        self.snapshots.start()
         
         try:
-            while self.running:
-                msg = self.consumer.poll(timeout=1.0)
-                
-                if msg is None:
-                    continue
-                
+            if self.batch_size > 1:
+                self.run_batch()
+            else:
+                self.run_single()
+        
+        except KeyboardInterrupt:
+            logger.info("Shutdown requested")
+        finally:
+            self.stop()
+    
+    def run_batch(self):
+        """Consume in batches and commit each batch's offsets asynchronously"""
+        while self.running:
+            messages = self.consumer.consume(num_messages=self.batch_size, timeout=1.0)
+            self.maybe_checkpoint()
+            
+            valid = []
+            for msg in messages:
                 if msg.error():
                     if msg.error().code() == KafkaError._PARTITION_EOF:
                         logger.debug(f"Reached end of partition")
                     else:
                         logger.error(f"Consumer error: {msg.error()}")
                     continue
-                
-                # Process message
-                if self.process_message(msg):
-                    # Commit offset manually (for replay capability)
-                    self.consumer.commit(msg)
+                valid.append(msg)
+            if not valid:
+                continue
+            
+            self.process_batch(valid)
+            
+            # One commit per batch: the next offset of every partition in it
+            # (undecodable messages are committed too, as in the single path's
+            # skip-and-continue)
+            batch_offsets = {}
+            for msg in valid:
+                batch_offsets[(msg.topic(), msg.partition())] = msg.offset() + 1
+            self.last_offsets.update(batch_offsets)
+            self.counted_offsets.update(batch_offsets)
+            self.consumer.commit(
+                offsets=[TopicPartition(topic, partition, offset)
+                         for (topic, partition), offset in batch_offsets.items()],
+                asynchronous=True
+            )
+    
+    def run_single(self):
+        """Poll one message at a time and commit each synchronously"""
+        while self.running:
+            msg = self.consumer.poll(timeout=1.0)
+            self.maybe_checkpoint()
+            
+            if msg is None:
+                continue
+            
+            if msg.error():
+                if msg.error().code() == KafkaError._PARTITION_EOF:
+                    logger.debug(f"Reached end of partition")
                 else:
-                    logger.warning(f"Failed to process message")
-        
-        except KeyboardInterrupt:
-            logger.info("Shutdown requested")
-        finally:
-            self.stop()
+                    logger.error(f"Consumer error: {msg.error()}")
+                continue
+            
+            # Process message
+            processed = self.process_message(msg)
+            self.counted_offsets[(msg.topic(), msg.partition())] = msg.offset() + 1
+            if processed:
+                # Commit offset manually (for replay capability)
+                self.consumer.commit(msg)
+            else:
+                logger.warning(f"Failed to process message")
     
     def stop(self):
         """Stop consumer and save final metrics"""
         logger.info("Stopping consumer...")
         self.running = False
         
-        # Save final metrics
-        metrics = self.metrics.get_metrics()
+        # Stop the snapshot writer and write the final metrics
+        metrics = self.snapshots.stop() or self.metrics.get_metrics()
         logger.info(f"\n=== FINAL METRICS ===")
         logger.info(f"  Total orders: {metrics['total_orders']}")
         logger.info(f"  Reserved: {metrics['reserved_orders']}")
@@ -125,9 +417,17 @@ class AnalyticsConsumer:
         logger.info(f"  Failure rate: {metrics['failure_rate_percent']}%")
         logger.info(f"  Elapsed: {metrics['elapsed_seconds']}s")
         logger.info(f"  Avg throughput: {metrics['throughput_events_per_second']} events/s")
+        latency = metrics['latency_ms']
+        logger.info(f"  Order->reserved latency: p50 {latency['p50']} ms, "
+                    f"p95 {latency['p95']} ms, p99 {latency['p99']} ms ({latency['count']} orders)")
         logger.info(f"=====================\n")
         
-        self.metrics.save_to_file()
+        if self.checkpoint_path:
+            if self.batch_failed:
+                # A restart resumes from the previous checkpoint instead
+                logger.warning("Skipping the final checkpoint: metrics may include part of the failed batch")
+            else:
+                self.checkpoint()
         
         # Close consumer
         self.consumer.close()
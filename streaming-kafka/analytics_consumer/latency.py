@@ -0,0 +1,153 @@
+"""
+Order-to-reservation latency for analytics
+Joins OrderPlaced and InventoryReserved events by order_id and feeds the
+time between their timestamps into a DDSketch. The two events come from
+different topics, so either can arrive first; whichever does waits in a
+bounded pending map until its partner shows up or it is evicted.
+"""
+import time
+from collections import OrderedDict
+
+from sketches import DDSketch
+
+PLACED = 'OrderPlaced'
+RESERVED = 'InventoryReserved'
+FAILED = 'InventoryFailed'
+
+
+class LatencyJoin:
+    def __init__(self, max_pending=100000, pending_ttl_seconds=300, relative_accuracy=0.01):
+        """
+        Args:
+            max_pending: Keep at most this many unmatched orders (oldest evicted first)
+            pending_ttl_seconds: Evict unmatched orders waiting longer than this
+            relative_accuracy: Relative error of the reported percentiles
+        """
+        self.max_pending = max_pending
+        self.pending_ttl = pending_ttl_seconds
+        self.pending = OrderedDict()  # order_id -> (event_type, event epoch seconds, arrival monotonic)
+        self.sketch = DDSketch(relative_accuracy)
+        self.matched = 0
+        self.failed = 0
+        self.evicted = 0
+
+    def add(self, event_type, order_id, timestamp):
+        """
+        Record one side of the join
+
+        Args:
+            event_type: OrderPlaced, InventoryReserved or InventoryFailed
+            timestamp: Event timestamp in epoch seconds
+
+        Returns:
+            Latency in milliseconds when this event completed a pair, else None
+        """
+        latency_ms = self._match(event_type, order_id, timestamp, time.monotonic())
+        self._evict()
+        return latency_ms
+
+    def add_many(self, events):
+        """
+        Record a batch of (event_type, order_id, timestamp)
+
+        Evicts once after the batch, so the pending map may hold up to one
+        batch more than max_pending in between.
+        """
+        now = time.monotonic()
+        match = self._match
+        for event_type, order_id, timestamp in events:
+            match(event_type, order_id, timestamp, now)
+        self._evict()
+
+    def _match(self, event_type, order_id, timestamp, now):
+        if order_id is None or event_type not in (PLACED, RESERVED, FAILED):
+            return None
+        other = self.pending.pop(order_id, None)
+        if other is None or other[0] == event_type:
+            # First side (or a redelivery of it): wait for the partner
+            self.pending[order_id] = (event_type, timestamp, now)
+            return None
+        if FAILED in (event_type, other[0]):
+            # Order done without a reservation: no latency sample
+            self.failed += 1
+            return None
+        placed_at, reserved_at = (other[1], timestamp) if event_type == RESERVED else (timestamp, other[1])
+        latency_ms = (reserved_at - placed_at) * 1000
+        self.sketch.add(latency_ms)
+        self.matched += 1
+        return latency_ms
+
+    def _evict(self):
+        while len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+            self.evicted += 1
+        if self.pending_ttl:
+            cutoff = time.monotonic() - self.pending_ttl
+            while self.pending and next(iter(self.pending.values()))[2] < cutoff:
+                self.pending.popitem(last=False)
+                self.evicted += 1
+
+    def percentiles(self):
+        """Latency summary in milliseconds"""
+        def pct(q):
+            value = self.sketch.quantile(q)
+            return round(value, 2) if value is not None else None
+        return {
+            'count': self.sketch.count,
+            'p50': pct(0.50),
+            'p95': pct(0.95),
+            'p99': pct(0.99),
+            'max': round(self.sketch.max, 2) if self.sketch.count else None,
+            'pending': len(self.pending),
+            'evicted_unmatched': self.evicted
+        }
+
+    def clear(self):
+        self.pending.clear()
+        self.sketch.clear()
+        self.matched = 0
+        self.failed = 0
+        self.evicted = 0
+
+    def merge(self, other):
+        """
+        Add another join's samples, then match its pending orders against
+        this one's (pairs split across the two joins complete here)
+        """
+        self.sketch.merge(other.sketch)
+        self.matched += other.matched
+        self.failed += other.failed
+        self.evicted += other.evicted
+        now = time.monotonic()
+        for order_id, (event_type, timestamp, _) in other.pending.items():
+            self._match(event_type, order_id, timestamp, now)
+        self._evict()
+
+    def export(self):
+        """
+        JSON-serializable state for checkpoints
+
+        Pending orders keep how long they have waited rather than their
+        monotonic arrival time, which means nothing in another process.
+        """
+        now = time.monotonic()
+        return {
+            'pending': [[order_id, event_type, timestamp, round(now - arrived, 3)]
+                        for order_id, (event_type, timestamp, arrived) in self.pending.items()],
+            'sketch': self.sketch.export(),
+            'matched': self.matched,
+            'failed': self.failed,
+            'evicted': self.evicted
+        }
+
+    def restore(self, state):
+        """Replace the join state with an export()ed one"""
+        now = time.monotonic()
+        self.pending = OrderedDict(
+            (order_id, (event_type, timestamp, now - waited))
+            for order_id, event_type, timestamp, waited in state['pending']
+        )
+        self.sketch.restore(state['sketch'])
+        self.matched = state['matched']
+        self.failed = state['failed']
+        self.evicted = state['evicted']
@@ -2,58 +2,271 @@
 Metrics calculator for analytics consumer
 Tracks orders per minute, failure rate, and other metrics
 """
-from collections import deque
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 import json
 import logging
+import sys
+import threading
+import time
+
+sys.path.append('/app/common')
+from ids import parse_timestamp_epoch
+
+from latency import LatencyJoin
+from sketches import SpaceSaving
+from snapshots import write_atomic
+from windows import HoppingWindow, bucket_counts, count_keys
 
 logger = logging.getLogger(__name__)
 
 
+class RingWindow:
+    """
+    Sliding window of per-event-type counts in fixed time buckets
+
+    Counts live in a ring of num_buckets integer slots per event type, plus
+    a running total over the window. Adding an event and reading a total
+    are O(1); moving the window forward clears at most num_buckets slots,
+    and memory does not depend on the event rate.
+    """
+
+    def __init__(self, num_buckets=60, bucket_seconds=1.0):
+        self.num_buckets = num_buckets
+        self.bucket_seconds = bucket_seconds
+        self.counts = {}  # event_type -> [count per slot]
+        self.totals = {}  # event_type -> count over the window
+        self.head = None  # Newest bucket number in the window
+        self.late_events = 0
+
+    def advance(self, timestamp):
+        """Move the window so it ends at the bucket holding timestamp"""
+        bucket = int(timestamp // self.bucket_seconds)
+        if self.head is None or bucket > self.head:
+            self._advance_to(bucket)
+
+    def _advance_to(self, bucket):
+        if self.head is not None:
+            # Clear the slots that leave the window (all of them after a long gap)
+            for b in range(max(self.head + 1, bucket - self.num_buckets + 1), bucket + 1):
+                slot = b % self.num_buckets
+                for event_type, counts in self.counts.items():
+                    self.totals[event_type] -= counts[slot]
+                    counts[slot] = 0
+        self.head = bucket
+
+    def add(self, event_type, timestamp, count=1):
+        """
+        Count event_type at timestamp (epoch seconds)
+
+        Returns:
+            False if the event is older than the window and was dropped
+        """
+        return self._add_bucket(event_type, int(timestamp // self.bucket_seconds), count)
+
+    def add_many(self, event_type, timestamps):
+        """Count one event_type per timestamp, histogrammed into buckets first"""
+        for bucket, count in sorted(bucket_counts(timestamps, self.bucket_seconds).items()):
+            self._add_bucket(event_type, bucket, count)
+
+    def _add_bucket(self, event_type, bucket, count):
+        head = self.head
+        if head is None or bucket > head:
+            self._advance_to(bucket)
+        elif bucket <= head - self.num_buckets:
+            self.late_events += count
+            return False
+        counts = self.counts.get(event_type)
+        if counts is None:
+            counts = self.counts[event_type] = [0] * self.num_buckets
+            self.totals[event_type] = 0
+        counts[bucket % self.num_buckets] += count
+        self.totals[event_type] += count
+        return True
+
+    def total(self, event_type):
+        """Count of event_type over the window"""
+        return self.totals.get(event_type, 0)
+
+    @property
+    def window_seconds(self):
+        return self.num_buckets * self.bucket_seconds
+
+    def clear(self):
+        self.counts.clear()
+        self.totals.clear()
+        self.head = None
+        self.late_events = 0
+
+    def merge(self, other):
+        """Add the counts of another window with the same bucket layout"""
+        self.late_events += other.late_events
+        if other.head is None:
+            return
+        for b in range(other.head - other.num_buckets + 1, other.head + 1):
+            slot = b % other.num_buckets
+            for event_type, counts in other.counts.items():
+                if counts[slot]:
+                    self._add_bucket(event_type, b, counts[slot])
+
+    def export(self):
+        """JSON-serializable state for checkpoints"""
+        return {'head': self.head, 'late_events': self.late_events, 'counts': self.counts}
+
+    def restore(self, state):
+        """Replace the counts with an export()ed state (same bucket layout)"""
+        self.counts = {event_type: list(counts) for event_type, counts in state['counts'].items()}
+        self.totals = {event_type: sum(counts) for event_type, counts in self.counts.items()}
+        self.head = state['head']
+        self.late_events = state['late_events']
+
+
 class MetricsCalculator:
-    def __init__(self):
-        self.events = deque()  # (timestamp, event_type)
+    def __init__(self, window_seconds=60, bucket_seconds=1, time_mode='processing',
+                 windows=(), group_by=(), top_k=10, sketch_size=100,
+                 latency_max_pending=100000, latency_ttl_seconds=300):
+        """
+        Args:
+            window_seconds: Length of the sliding window for per-minute rates
+            bucket_seconds: Window resolution
+            windows: [(name, size_seconds, hop_seconds)] tumbling/hopping
+                     windows to aggregate (see windows.parse_windows)
+            group_by: Payload fields to rank per window (e.g. item, user_id)
+            top_k: Keys reported per grouping
+            sketch_size: Counters per SpaceSaving sketch (bounds memory for
+                         high-cardinality keys)
+            latency_max_pending: Unmatched orders kept for the latency join
+            latency_ttl_seconds: Evict unmatched orders after this long
+            time_mode: 'processing' buckets events by arrival time and the
+                       window ends now; 'event' buckets by the event's own
+                       timestamp and the window ends at the newest event seen,
+                       so a replay reports the rates as they were
+        """
+        if time_mode not in ('processing', 'event'):
+            raise ValueError(f"Unknown time mode: {time_mode}")
+        self.time_mode = time_mode
+        self.window = RingWindow(max(1, int(window_seconds / bucket_seconds)), bucket_seconds)
+        self.group_by = tuple(group_by)
+        self.top_k = top_k
+        self.sketch_size = sketch_size
+        self.windows = [HoppingWindow(name, size, hop, self.group_by, sketch_size)
+                        for name, size, hop in windows]
+        self.top_keys = {key: SpaceSaving(sketch_size) for key in self.group_by}  # Since start
+        self.latency = LatencyJoin(latency_max_pending, latency_ttl_seconds)
         self.total_orders = 0
         self.failed_orders = 0
         self.reserved_orders = 0
         self.start_time = datetime.now(timezone.utc)
+        # Held by each add and by get_metrics(), so a snapshot taken on
+        # another thread sees every counter at the same point of the stream
+        self.lock = threading.RLock()
     
-    def add_event(self, event_type, timestamp_str=None):
+    def add_event(self, event_type, timestamp_str=None, payload=None, order_id=None):
         """
         Add an event to metrics
         
         Args:
             event_type: Type of event (OrderPlaced, InventoryReserved, InventoryFailed)
-            timestamp_str: ISO-8601 timestamp string (optional)
+            timestamp_str: ISO-8601 timestamp string (optional, used in event-time mode)
+            payload: Event payload, source of the group_by keys (optional)
+            order_id: Joins OrderPlaced with InventoryReserved for latency (optional)
         """
         try:
-            if timestamp_str:
-                # Parse timestamp
-                timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+            event_time = None
+            if timestamp_str and (self.time_mode == 'event' or order_id is not None):
+                # Parse timestamp (cached per second prefix)
+                event_time = parse_timestamp_epoch(timestamp_str)
+            if self.time_mode == 'event' and event_time is not None:
+                timestamp = event_time
             else:
-                timestamp = datetime.now(timezone.utc)
-            
-            self.events.append((timestamp, event_type))
+                timestamp = time.time()
             
-            # Update counters
-            if event_type == 'OrderPlaced':
-                self.total_orders += 1
-            elif event_type == 'InventoryFailed':
-                self.failed_orders += 1
-            elif event_type == 'InventoryReserved':
-                self.reserved_orders += 1
-            
-            # Remove events older than 1 minute for sliding window
-            cutoff = datetime.now(timezone.utc) - timedelta(minutes=1)
-            while self.events and self.events[0][0] < cutoff:
-                self.events.popleft()
+            with self.lock:
+                if order_id is not None and event_time is not None:
+                    self.latency.add(event_type, order_id, event_time)
+                
+                self.window.add(event_type, timestamp)
+                for window in self.windows:
+                    window.add(event_type, timestamp, payload)
+                if payload:
+                    for key, sketch in self.top_keys.items():
+                        value = payload.get(key)
+                        if value is not None:
+                            sketch.add(value)
+                
+                # Update counters
+                if event_type == 'OrderPlaced':
+                    self.total_orders += 1
+                elif event_type == 'InventoryFailed':
+                    self.failed_orders += 1
+                elif event_type == 'InventoryReserved':
+                    self.reserved_orders += 1
         
         except Exception as e:
             logger.error(f"Error adding event to metrics: {e}")
-    
+
+    def add_events(self, events):
+        """
+        Add a batch of decoded events
+
+        Same counts as add_event() per event, but the window and sketch
+        updates happen once per event type: timestamps are histogrammed
+        into buckets and key values counted before they are applied. In
+        processing mode the whole batch shares one arrival time; in event
+        mode lateness is judged against the newest event of the batch.
+
+        Args:
+            events: Event dicts (event_type, timestamp, payload, order_id)
+        """
+        now = time.time()
+        event_mode = self.time_mode == 'event'
+        by_type = {}  # event_type -> ([timestamps], [payloads])
+        joins = []
+        for event in events:
+            event_type = event.get('event_type')
+            order_id = event.get('order_id')
+            timestamp_str = event.get('timestamp')
+            event_time = None
+            if timestamp_str and (event_mode or order_id is not None):
+                try:
+                    event_time = parse_timestamp_epoch(timestamp_str)
+                except ValueError as e:
+                    logger.error(f"Error adding event to metrics: {e}")
+                    continue
+            if order_id is not None and event_time is not None:
+                joins.append((event_type, order_id, event_time))
+            group = by_type.get(event_type)
+            if group is None:
+                group = by_type[event_type] = ([], [])
+            group[0].append(event_time if event_mode and event_time is not None else now)
+            group[1].append(event.get('payload'))
+        key_counts = {event_type: count_keys(payloads, self.group_by)
+                      for event_type, (_, payloads) in by_type.items()}
+
+        with self.lock:
+            self.latency.add_many(joins)
+            for event_type, (timestamps, payloads) in by_type.items():
+                self.window.add_many(event_type, timestamps)
+                for window in self.windows:
+                    window.add_many(event_type, timestamps, payloads, key_counts[event_type])
+                for key, sketch in self.top_keys.items():
+                    sketch.update(key_counts[event_type][key])
+
+                # Update counters
+                if event_type == 'OrderPlaced':
+                    self.total_orders += len(timestamps)
+                elif event_type == 'InventoryFailed':
+                    self.failed_orders += len(timestamps)
+                elif event_type == 'InventoryReserved':
+                    self.reserved_orders += len(timestamps)
+
     def get_orders_per_minute(self):
-        """Get number of OrderPlaced events in last minute"""
-        return sum(1 for _, event_type in self.events if event_type == 'OrderPlaced')
+        """Get number of OrderPlaced events in the window, scaled to one minute"""
+        if self.time_mode == 'processing':
+            self.window.advance(time.time())
+        orders = self.window.total('OrderPlaced')
+        if self.window.window_seconds == 60:
+            return orders
+        return round(orders * 60 / self.window.window_seconds, 2)
     
     def get_failure_rate(self):
         """Get failure rate as percentage"""
@@ -75,9 +288,26 @@ class MetricsCalculator:
         total_events = self.total_orders + self.failed_orders + self.reserved_orders
         return total_events / elapsed
     
+    def get_windows(self):
+        """Counts and top keys of every tumbling/hopping window"""
+        if self.time_mode == 'processing':
+            now = time.time()
+            for window in self.windows:
+                window.advance(now)
+        return {window.name: window.query(self.top_k) for window in self.windows}
+    
+    def get_top_keys(self):
+        """Top keys per grouping since start"""
+        return {key: [[value, count] for value, count in sketch.top(self.top_k)]
+                for key, sketch in self.top_keys.items()}
+    
     def get_metrics(self):
-        """Get all metrics as dictionary"""
-        return {
+        """Get all metrics as dictionary (a consistent copy, safe from any thread)"""
+        with self.lock:
+            return self._collect_metrics()
+    
+    def _collect_metrics(self):
+        metrics = {
             'timestamp': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
             'orders_per_minute': self.get_orders_per_minute(),
             'failure_rate_percent': round(self.get_failure_rate(), 2),
@@ -86,24 +316,107 @@ class MetricsCalculator:
             'failed_orders': self.failed_orders,
             'reserved_orders': self.reserved_orders,
             'throughput_events_per_second': round(self.get_throughput(), 2),
-            'elapsed_seconds': round((datetime.now(timezone.utc) - self.start_time).total_seconds(), 2)
+            'elapsed_seconds': round((datetime.now(timezone.utc) - self.start_time).total_seconds(), 2),
+            'time_mode': self.time_mode,
+            'late_events': self.window.late_events
+        }
+        if self.windows:
+            metrics['windows'] = self.get_windows()
+        if self.top_keys:
+            metrics['top'] = self.get_top_keys()
+        metrics['latency_ms'] = self.latency.percentiles()
+        return metrics
+    
+    def settings(self):
+        """Settings that shape the state; a checkpoint only restores under the same ones"""
+        return {
+            'time_mode': self.time_mode,
+            'window': [self.window.num_buckets, self.window.bucket_seconds],
+            'windows': [[window.name, window.size, window.hop] for window in self.windows],
+            'group_by': list(self.group_by),
+            'sketch_size': self.sketch_size
         }
     
+    def export(self):
+        """Full metrics state as JSON-serializable data, for checkpoints"""
+        with self.lock:
+            return {
+                'settings': self.settings(),
+                'start_time': self.start_time.isoformat(),
+                'total_orders': self.total_orders,
+                'failed_orders': self.failed_orders,
+                'reserved_orders': self.reserved_orders,
+                'window': self.window.export(),
+                'windows': {window.name: window.export() for window in self.windows},
+                'top_keys': {key: sketch.export() for key, sketch in self.top_keys.items()},
+                'latency': self.latency.export()
+            }
+    
+    def restore(self, state):
+        """
+        Replace all metrics with an export()ed state
+        
+        Raises:
+            ValueError: The state was exported under different settings
+                        (windows, grouping, time mode or sketch size)
+        """
+        if state['settings'] != self.settings():
+            raise ValueError(f"Checkpoint settings {state['settings']} differ from {self.settings()}")
+        with self.lock:
+            self.start_time = datetime.fromisoformat(state['start_time'])
+            self.total_orders = state['total_orders']
+            self.failed_orders = state['failed_orders']
+            self.reserved_orders = state['reserved_orders']
+            self.window.restore(state['window'])
+            for window in self.windows:
+                window.restore(state['windows'][window.name])
+            for key, sketch in self.top_keys.items():
+                sketch.restore(state['top_keys'][key])
+            self.latency.restore(state['latency'])
+    
+    def merge(self, other):
+        """
+        Add the metrics of another calculator with the same settings
+        
+        For metrics computed over disjoint parts of a stream (e.g. one per
+        partition in a parallel replay): counters and window buckets add
+        up, sketches merge, and orders pending in either latency join are
+        matched against the other's.
+        """
+        if other.settings() != self.settings():
+            raise ValueError("Cannot merge metrics with different settings")
+        with self.lock:
+            self.start_time = min(self.start_time, other.start_time)
+            self.total_orders += other.total_orders
+            self.failed_orders += other.failed_orders
+            self.reserved_orders += other.reserved_orders
+            self.window.merge(other.window)
+            for window, other_window in zip(self.windows, other.windows):
+                window.merge(other_window)
+            for key, sketch in self.top_keys.items():
+                self.top_keys[key] = SpaceSaving.merged([sketch, other.top_keys[key]], sketch.capacity)
+            self.latency.merge(other.latency)
+    
     def reset(self):
         """Reset all metrics"""
-        self.events.clear()
-        self.total_orders = 0
-        self.failed_orders = 0
-        self.reserved_orders = 0
-        self.start_time = datetime.now(timezone.utc)
+        with self.lock:
+            self.window.clear()
+            for window in self.windows:
+                window.clear()
+            for sketch in self.top_keys.values():
+                sketch.clear()
+            self.latency.clear()
+            self.total_orders = 0
+            self.failed_orders = 0
+            self.reserved_orders = 0
+            self.start_time = datetime.now(timezone.utc)
         logger.info("Metrics reset")
     
     def save_to_file(self, filename='metrics_output.json'):
-        """Save metrics to JSON file"""
+        """Save metrics to JSON file (replaced atomically, never torn)"""
         try:
             metrics = self.get_metrics()
-            with open(filename, 'w') as f:
-                json.dump(metrics, f, indent=2)
+            write_atomic(filename, json.dumps(metrics, indent=2))
             logger.info(f"Metrics saved to {filename}")
             return True
         except Exception as e:
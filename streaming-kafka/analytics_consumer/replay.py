@@ -0,0 +1,235 @@
+"""
+Offline analytics replay
+Recomputes the analytics metrics straight from the Kafka topics. Partitions
+are assigned directly (no group join, nothing committed), so a backfill
+never moves analytics-group's offsets or rebalances the live consumer. The
+range is given as offsets or timestamps (resolved with offsets_for_times),
+and partitions are read in large batches by parallel worker processes whose
+metrics are merged at the end. Windows use event time.
+
+Usage:
+    python replay.py                                       # Everything retained
+    python replay.py --start 2026-02-10T14:00:00Z --end 2026-02-10T15:00:00Z
+    python replay.py --start 1000 --workers 3 --output backfill.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from confluent_kafka import Consumer, KafkaError, TopicPartition
+
+sys.path.append('/app/common')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from codec import decode_events, content_type_from_headers
+from ids import parse_timestamp_epoch
+
+from consumer import build_metrics
+from snapshots import write_atomic
+
+logger = logging.getLogger('replay')
+
+IDLE_TIMEOUT_SECONDS = 30
+
+
+def parse_position(text):
+    """
+    'earliest', 'latest', an offset or an ISO-8601 timestamp
+
+    Returns:
+        ('earliest' | 'latest', None), ('offset', n) or ('time', epoch ms)
+    """
+    if text in ('earliest', 'latest'):
+        return text, None
+    if text.isdigit():
+        return 'offset', int(text)
+    return 'time', int(parse_timestamp_epoch(text) * 1000)
+
+
+def _resolve(consumer, tp, position, low, high):
+    kind, value = position
+    if kind == 'earliest':
+        return low
+    if kind == 'latest':
+        return high
+    if kind == 'offset':
+        return min(max(value, low), high)
+    offset = consumer.offsets_for_times([TopicPartition(tp.topic, tp.partition, value)], timeout=10)[0].offset
+    return high if offset < 0 else offset  # No message at or after the time
+
+
+def resolve_ranges(consumer, topics, start, end):
+    """
+    Offset range of every partition of the topics
+
+    Returns:
+        [(topic, partition, first offset, end offset (exclusive))], empty ranges left out
+    """
+    ranges = []
+    for topic in topics:
+        metadata = consumer.list_topics(topic, timeout=10).topics[topic]
+        for partition in sorted(metadata.partitions):
+            tp = TopicPartition(topic, partition)
+            low, high = consumer.get_watermark_offsets(tp, timeout=10)
+            first = _resolve(consumer, tp, start, low, high)
+            last = _resolve(consumer, tp, end, low, high)
+            if first < last:
+                ranges.append((topic, partition, first, last))
+    return ranges
+
+
+def split_ranges(ranges, workers):
+    """
+    Spread ranges over workers by partition number
+
+    Both topics are keyed by order_id with the same partition count, so
+    an order's events share a partition number and the latency join of
+    each worker sees both sides.
+    """
+    numbers = sorted({partition for _, partition, _, _ in ranges})
+    tasks = [[] for _ in range(min(workers, len(numbers)))]
+    for i, number in enumerate(numbers):
+        tasks[i % len(tasks)].extend(r for r in ranges if r[1] == number)
+    return tasks
+
+
+def replay_ranges(kafka_broker, ranges, batch_size):
+    """
+    Count the given offset ranges into a fresh MetricsCalculator (runs in a worker)
+
+    Returns:
+        (MetricsCalculator.export(), events read, seconds)
+    """
+    start = time.time()
+    metrics = build_metrics(time_mode='event')
+    consumer = Consumer({
+        'bootstrap.servers': kafka_broker,
+        'group.id': 'analytics-replay',  # Never joined or committed: partitions are assigned
+        'enable.auto.commit': False,
+        'enable.partition.eof': False
+    })
+    ends = {(topic, partition): last for topic, partition, _, last in ranges}
+    remaining = set(ends)
+    events = 0
+    try:
+        consumer.assign([TopicPartition(topic, partition, first) for topic, partition, first, _ in ranges])
+        idle_since = time.monotonic()
+        while remaining:
+            messages = consumer.consume(num_messages=batch_size, timeout=1.0)
+            batch = []
+            for msg in messages:
+                if msg.error():
+                    if msg.error().code() != KafkaError._PARTITION_EOF:
+                        logger.error(f"Consumer error: {msg.error()}")
+                    continue
+                key = (msg.topic(), msg.partition())
+                if msg.offset() < ends[key]:
+                    batch.append(msg)
+                if msg.offset() + 1 >= ends[key] and key in remaining:
+                    remaining.discard(key)
+                    consumer.pause([TopicPartition(*key)])  # Range done: stop fetching it
+            if batch:
+                events += len(batch)
+                decoded = decode_events(
+                    [msg.value() for msg in batch],
+                    [content_type_from_headers(msg.headers()) for msg in batch]
+                )
+                metrics.add_events([event for event in decoded if isinstance(event, dict)])
+                idle_since = time.monotonic()
+            elif not messages:
+                # Positions also step over transaction markers at the end of a range
+                for tp in consumer.position([TopicPartition(*key) for key in remaining]):
+                    if tp.offset >= ends[(tp.topic, tp.partition)]:
+                        remaining.discard((tp.topic, tp.partition))
+                if remaining and time.monotonic() - idle_since > IDLE_TIMEOUT_SECONDS:
+                    logger.warning(f"No messages for {IDLE_TIMEOUT_SECONDS}s, giving up on {sorted(remaining)}")
+                    break
+    finally:
+        consumer.close()
+    return metrics.export(), events, time.time() - start
+
+
+def replay(kafka_broker, topics, start='earliest', end='latest', workers=None, batch_size=5000):
+    """
+    Recompute the analytics metrics of a range of the topics
+
+    Args:
+        start, end: Positions for parse_position() ('earliest', 'latest',
+                    an offset or an ISO-8601 timestamp); end is exclusive
+        workers: Worker processes (default: one per partition number, at
+                 most the CPU count; 1 = read in this process)
+
+    Returns:
+        (MetricsCalculator with the merged metrics, replay summary dict)
+    """
+    started = time.time()
+    consumer = Consumer({'bootstrap.servers': kafka_broker, 'group.id': 'analytics-replay',
+                         'enable.auto.commit': False})
+    try:
+        ranges = resolve_ranges(consumer, topics, parse_position(start), parse_position(end))
+    finally:
+        consumer.close()
+    numbers = {partition for _, partition, _, _ in ranges}
+    workers = workers or min(len(numbers), os.cpu_count() or 1) or 1
+    tasks = split_ranges(ranges, workers)
+    logger.info(f"Replaying {sum(r[3] - r[2] for r in ranges)} messages from {len(ranges)} partitions "
+                f"with {len(tasks)} workers")
+
+    if len(tasks) <= 1:
+        results = [replay_ranges(kafka_broker, task, batch_size) for task in tasks]
+    else:
+        with ProcessPoolExecutor(len(tasks)) as pool:
+            results = list(pool.map(replay_ranges, [kafka_broker] * len(tasks), tasks,
+                                    [batch_size] * len(tasks)))
+
+    metrics = build_metrics(time_mode='event')
+    for state, _, _ in results:
+        part = build_metrics(time_mode='event')
+        part.restore(state)
+        metrics.merge(part)
+
+    seconds = time.time() - started
+    events = sum(count for _, count, _ in results)
+    summary = {
+        'topics': topics,
+        'start': start,
+        'end': end,
+        'ranges': [{'topic': t, 'partition': p, 'start_offset': first, 'end_offset': last}
+                   for t, p, first, last in ranges],
+        'workers': len(tasks),
+        'events': events,
+        'seconds': round(seconds, 3),
+        'events_per_second': round(events / seconds) if seconds else 0,
+        'worker_seconds': [round(s, 3) for _, _, s in results]
+    }
+    return metrics, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute analytics metrics from Kafka without the consumer group")
+    parser.add_argument('--broker', default=os.getenv('KAFKA_BROKER', 'localhost:9093'))
+    parser.add_argument('--topics', default=os.getenv('TOPICS', 'order-events,inventory-events'),
+                        help="Comma-separated topics")
+    parser.add_argument('--start', default='earliest', help="earliest, an offset or an ISO-8601 timestamp")
+    parser.add_argument('--end', default='latest', help="latest, an offset or an ISO-8601 timestamp (exclusive)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: per partition)")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--output', default='replay_metrics.json')
+    args = parser.parse_args()
+
+    metrics, summary = replay(args.broker, args.topics.split(','), args.start, args.end,
+                              args.workers, args.batch_size)
+    result = metrics.get_metrics()
+    result['replay'] = summary
+    write_atomic(args.output, json.dumps(result, indent=2))
+    logger.info(f"Replayed {summary['events']} events in {summary['seconds']}s "
+                f"({summary['events_per_second']} events/s, {summary['workers']} workers): "
+                f"{result['total_orders']} orders, {result['reserved_orders']} reserved, "
+                f"{result['failed_orders']} failed -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Bounded-memory sketches for analytics
+SpaceSaving keeps approximate top-K heavy hitters for keys with any
+number of distinct values (e.g. millions of user_ids) in a fixed number
+of counters. DDSketch keeps latency quantiles within a relative error in
+a bounded number of bins.
+"""
+import heapq
+import math
+from operator import itemgetter
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters (Metwally et al.)
+
+    Keeps at most capacity counters. A new key arriving when all counters
+    are taken replaces the key with the smallest count and inherits that
+    count as its error, so estimates never undercount: a key's true count
+    is between count - error and count. Every key whose true count is
+    above total / capacity is guaranteed to be kept.
+
+    Below capacity the counts are exact and adding is a dict increment;
+    once full, the minimum is found through a lazily updated heap.
+    """
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        self.heap = None  # (count, key) entries, built once the sketch is full
+
+    def add(self, key, count=1):
+        self.total += count
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+        elif len(counts) < self.capacity:
+            counts[key] = count
+            self.errors[key] = 0
+        else:
+            min_key, min_count = self._pop_min()
+            del counts[min_key]
+            del self.errors[min_key]
+            counts[key] = min_count + count
+            self.errors[key] = min_count
+        if self.heap is not None:
+            heapq.heappush(self.heap, (counts[key], key))
+            if len(self.heap) > 4 * self.capacity:
+                self._rebuild_heap()
+        elif len(counts) == self.capacity:
+            self._rebuild_heap()
+
+    def update(self, counts):
+        """
+        Add a batch of {key: count} at once
+
+        Keys already counted are incremented. New keys start from the
+        smallest counter (as if each had replaced it, so estimates still
+        never undercount), and the capacity largest counters are kept.
+        Costs one pass over the counters per batch instead of a heap
+        operation per evicting key.
+        """
+        current = self.counts
+        errors = self.errors
+        floor = min(current.values()) if len(current) >= self.capacity else 0
+        for key, count in counts.items():
+            self.total += count
+            if key in current:
+                current[key] += count
+            else:
+                current[key] = floor + count
+                errors[key] = floor
+        if len(current) > self.capacity:
+            kept = heapq.nlargest(self.capacity, current.items(), key=itemgetter(1))
+            self.counts = dict(kept)
+            self.errors = {key: errors[key] for key in self.counts}
+        if len(self.counts) == self.capacity:
+            self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self.heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self.heap)
+
+    def _pop_min(self):
+        """Smallest current counter; skips heap entries left by later increments"""
+        while True:
+            count, key = heapq.heappop(self.heap)
+            if self.counts.get(key) == count:
+                return key, count
+
+    def top(self, n=10):
+        """[(key, estimated count)] for the n largest counters"""
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+    def __len__(self):
+        return len(self.counts)
+
+    def clear(self):
+        self.counts.clear()
+        self.errors.clear()
+        self.total = 0
+        self.heap = None
+
+    def export(self):
+        """JSON-serializable state for checkpoints"""
+        return {'total': self.total,
+                'counters': [[key, count, self.errors[key]] for key, count in self.counts.items()]}
+
+    def restore(self, state):
+        """Replace the counters with an export()ed state"""
+        self.counts = {key: count for key, count, _ in state['counters']}
+        self.errors = {key: error for key, _, error in state['counters']}
+        self.total = state['total']
+        self.heap = None
+        if len(self.counts) >= self.capacity:
+            self._rebuild_heap()
+
+    @classmethod
+    def merged(cls, sketches, capacity=None):
+        """
+        Combine sketches of disjoint streams (e.g. the panes of a window)
+
+        Counts of a key are added across the sketches that hold it, and
+        the capacity largest are kept. Cost depends only on the number of
+        sketches and their capacity, not on how many distinct keys exist.
+        """
+        sketches = list(sketches)
+        if capacity is None:
+            capacity = max((s.capacity for s in sketches), default=100)
+        counts = {}
+        errors = {}
+        total = 0
+        for sketch in sketches:
+            total += sketch.total
+            for key, count in sketch.counts.items():
+                counts[key] = counts.get(key, 0) + count
+                errors[key] = errors.get(key, 0) + sketch.errors[key]
+        result = cls(capacity)
+        for key, count in heapq.nlargest(capacity, counts.items(), key=itemgetter(1)):
+            result.counts[key] = count
+            result.errors[key] = errors[key]
+        result.total = total
+        if len(result.counts) == capacity:
+            result._rebuild_heap()
+        return result
+
+
+class DDSketch:
+    """
+    Quantile sketch with relative error guarantees (Masson et al., DDSketch)
+
+    Values are counted in logarithmic bins: bin i holds values in
+    (gamma^(i-1), gamma^i] with gamma = (1 + a) / (1 - a) for accuracy a, so any
+    quantile is returned within relative_accuracy of the true value.
+    Memory is bounded by max_bins (the lowest bins are collapsed first),
+    and sketches with the same accuracy merge by adding bin counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048, min_value=1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.bins = {}  # bin index -> count
+        self.zero_count = 0  # Values at or below min_value (incl. negative)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, count=1):
+        self.count += count
+        self.sum += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= self.min_value:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        """Fold the lowest bins together until max_bins remain"""
+        indexes = sorted(self.bins)
+        excess = len(indexes) - self.max_bins
+        target = indexes[excess]
+        for index in indexes[:excess]:
+            self.bins[target] += self.bins.pop(index)
+
+    def quantile(self, q):
+        """Value at quantile q (0..1), or None when empty"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+        seen = self.zero_count
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def merge(self, other):
+        """Add another sketch's counts (same relative_accuracy) into this one"""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge DDSketches with different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def clear(self):
+        self.bins.clear()
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def export(self):
+        """JSON-serializable state for checkpoints"""
+        return {'bins': [[index, count] for index, count in self.bins.items()],
+                'zero_count': self.zero_count, 'count': self.count, 'sum': self.sum,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None}
+
+    def restore(self, state):
+        """Replace the counts with an export()ed state (same relative_accuracy)"""
+        self.bins = {index: count for index, count in state['bins']}
+        self.zero_count = state['zero_count']
+        self.count = state['count']
+        self.sum = state['sum']
+        self.min = state['min'] if state['count'] else math.inf
+        self.max = state['max'] if state['count'] else -math.inf
@@ -0,0 +1,129 @@
+"""
+Background metrics snapshots for analytics
+A writer thread takes a consistent copy of the metrics every interval
+(under the MetricsCalculator lock, which the consume loop only holds for
+one event or batch), then serializes and writes it off the consume thread. The
+snapshot file is replaced atomically (temp file + os.replace), so readers
+never see a torn file, and one compact row per snapshot is appended to a
+JSONL time series for plotting.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomic(path, data):
+    """Write text to path via a temp file in the same directory and os.replace()"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; keep the file readable like open() did
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def history_row(metrics):
+    """Compact time-series row of a metrics snapshot"""
+    latency = metrics.get('latency_ms') or {}
+    return {
+        'timestamp': metrics['timestamp'],
+        'orders_per_minute': metrics['orders_per_minute'],
+        'total_orders': metrics['total_orders'],
+        'reserved_orders': metrics['reserved_orders'],
+        'failed_orders': metrics['failed_orders'],
+        'failure_rate_percent': metrics['failure_rate_percent'],
+        'throughput_events_per_second': metrics['throughput_events_per_second'],
+        'late_events': metrics['late_events'],
+        'latency_p50_ms': latency.get('p50'),
+        'latency_p95_ms': latency.get('p95'),
+        'latency_p99_ms': latency.get('p99'),
+    }
+
+
+class SnapshotWriter:
+    """Writes metrics snapshots from a daemon thread"""
+
+    def __init__(self, metrics, path='metrics_output.json', history_path='metrics_history.jsonl',
+                 interval_seconds=10, on_snapshot=None):
+        """
+        Args:
+            metrics: MetricsCalculator to snapshot
+            path: Snapshot file, replaced atomically on every write
+            history_path: JSONL time series, one row appended per snapshot
+                          (None/empty = no history)
+            interval_seconds: Time between snapshots
+            on_snapshot: Called as on_snapshot(metrics_dict) on the writer
+                         thread after each write (e.g. to log a summary)
+        """
+        self.metrics = metrics
+        self.path = path
+        self.history_path = history_path or None
+        self.interval = interval_seconds
+        self.on_snapshot = on_snapshot
+        self.wake = threading.Event()
+        self.stopping = False
+        self.snapshots = 0
+        self.thread = threading.Thread(target=self._run, name='metrics-snapshots', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        logger.info(f"Snapshot writer started: {self.path} every {self.interval}s"
+                    + (f", history in {self.history_path}" if self.history_path else ""))
+
+    def request(self):
+        """Ask for a snapshot now without waiting for it (e.g. on a rebalance)"""
+        self.wake.set()
+
+    def _run(self):
+        while not self.stopping:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if self.stopping:
+                return
+            self.write()
+
+    def write(self, notify=True):
+        """
+        Take one snapshot and write it
+
+        Returns:
+            The metrics dict, or None if the write failed
+        """
+        try:
+            snapshot = self.metrics.get_metrics()  # Consistent copy under the metrics lock
+            write_atomic(self.path, json.dumps(snapshot, indent=2))
+            if self.history_path:
+                with open(self.history_path, 'a') as f:
+                    f.write(json.dumps(history_row(snapshot), separators=(',', ':')) + '\n')
+            self.snapshots += 1
+            logger.debug(f"Metrics snapshot written to {self.path}")
+        except Exception as e:
+            logger.error(f"Error writing metrics snapshot: {e}")
+            return None
+        if notify and self.on_snapshot:
+            try:
+                self.on_snapshot(snapshot)
+            except Exception as e:
+                logger.error(f"Error in snapshot callback: {e}")
+        return snapshot
+
+    def stop(self):
+        """Stop the thread and write a final snapshot (without on_snapshot) from the caller's thread"""
+        self.stopping = True
+        self.wake.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        return self.write(notify=False)
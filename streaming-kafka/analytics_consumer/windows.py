@@ -0,0 +1,267 @@
+"""
+Tumbling and hopping window aggregations for analytics
+Each window is split into panes of one hop. A pane holds event counts
+and a SpaceSaving sketch per grouping key (e.g. item, user_id), so memory
+and query cost depend on the window and sketch sizes only, never on the
+number of distinct keys.
+"""
+import re
+
+from ids import format_timestamp
+from sketches import SpaceSaving
+
+try:
+    import numpy as np
+except ImportError:  # Optional: vectorised bucket histograms for large batches
+    np = None
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+_NUMPY_MIN_BATCH = 64
+_BINCOUNT_MAX_SPAN = 1_000_000
+
+
+def bucket_counts(timestamps, width):
+    """
+    Histogram timestamps (epoch seconds) into width-second buckets
+
+    Returns:
+        {bucket number: count}
+    """
+    if np is not None and len(timestamps) >= _NUMPY_MIN_BATCH:
+        buckets = np.floor_divide(np.asarray(timestamps, dtype=np.float64), width).astype(np.int64)
+        low = int(buckets.min())
+        if int(buckets.max()) - low < _BINCOUNT_MAX_SPAN:
+            counts = np.bincount(buckets - low)
+            nonzero = np.flatnonzero(counts)
+            return dict(zip((nonzero + low).tolist(), counts[nonzero].tolist()))
+        values, counts = np.unique(buckets, return_counts=True)
+        return dict(zip(values.tolist(), counts.tolist()))
+    counts = {}
+    for timestamp in timestamps:
+        bucket = int(timestamp // width)
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+def count_keys(payloads, keys):
+    """{key: {value: count}} over the payloads that have each key"""
+    counts = {key: {} for key in keys}
+    for payload in payloads:
+        if payload:
+            for key, values in counts.items():
+                value = payload.get(key)
+                if value is not None:
+                    values[value] = values.get(value, 0) + 1
+    return counts
+
+
+def parse_duration(text):
+    """'90s', '5m', '1h' or plain seconds -> seconds"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([smh]?)', text.strip())
+    if not match:
+        raise ValueError(f"Invalid duration: {text}")
+    return float(match.group(1)) * _UNITS.get(match.group(2) or 's')
+
+
+def parse_windows(spec):
+    """
+    Parse a window list like '1m,5m/1m,1h/5m'
+
+    Each entry is SIZE (tumbling) or SIZE/HOP (hopping: a SIZE window
+    starting every HOP). Returns [(name, size_seconds, hop_seconds)].
+    """
+    windows = []
+    for entry in filter(None, (e.strip() for e in spec.split(','))):
+        size_text, _, hop_text = entry.partition('/')
+        size = parse_duration(size_text)
+        hop = parse_duration(hop_text) if hop_text else size
+        windows.append((entry, size, hop))
+    return windows
+
+
+class Pane:
+    """Aggregates for one hop-long slice of time"""
+
+    __slots__ = ('index', 'counts', 'groups')
+
+    def __init__(self, index, group_keys, sketch_size):
+        self.index = index
+        self.counts = {}  # event_type -> count
+        self.groups = {key: SpaceSaving(sketch_size) for key in group_keys}
+
+
+class HoppingWindow:
+    """
+    A window of size seconds that starts every hop seconds (tumbling when
+    hop == size)
+
+    Panes live in a ring of size/hop + 1 slots: the open pane plus the
+    panes of the last closed window. Adding is O(1) plus one sketch
+    update per grouping key.
+    """
+
+    def __init__(self, name, size_seconds, hop_seconds, group_keys=(), sketch_size=100):
+        if hop_seconds <= 0 or hop_seconds > size_seconds:
+            raise ValueError(f"Window {name}: hop must be between 0 and the window size")
+        panes = size_seconds / hop_seconds
+        if abs(panes - round(panes)) > 1e-9:
+            raise ValueError(f"Window {name}: size must be a multiple of the hop")
+        self.name = name
+        self.size = size_seconds
+        self.hop = hop_seconds
+        self.num_panes = int(round(panes))
+        self.group_keys = tuple(group_keys)
+        self.sketch_size = sketch_size
+        self.ring = [None] * (self.num_panes + 1)
+        self.head = None  # Index of the newest pane
+        self.late_events = 0
+
+    def advance(self, timestamp):
+        index = int(timestamp // self.hop)
+        if self.head is None or index > self.head:
+            self.head = index
+
+    def add(self, event_type, timestamp, keys=None):
+        """
+        Count an event at timestamp (epoch seconds)
+
+        Args:
+            keys: {group_key: value} from the event payload
+        """
+        pane = self._pane(int(timestamp // self.hop), 1)
+        if pane is None:
+            return False
+        pane.counts[event_type] = pane.counts.get(event_type, 0) + 1
+        if keys:
+            for key, sketch in pane.groups.items():
+                value = keys.get(key)
+                if value is not None:
+                    sketch.add(value)
+        return True
+
+    def add_many(self, event_type, timestamps, payloads=None, key_counts=None):
+        """
+        Count a batch of events of one type
+
+        Pane counts come from one histogram of the timestamps, and each
+        pane's sketches get one bulk update with the pane's key counts.
+
+        Args:
+            payloads: Event payload per timestamp (source of the group keys)
+            key_counts: count_keys(payloads) when the caller already has it;
+                        only used when the whole batch falls in one pane
+        """
+        counts = bucket_counts(timestamps, self.hop)
+        panes = {}
+        for index, count in sorted(counts.items()):
+            pane = self._pane(index, count)
+            if pane is not None:
+                pane.counts[event_type] = pane.counts.get(event_type, 0) + count
+                panes[index] = pane
+        if payloads is None or not self.group_keys or not panes:
+            return
+        if len(counts) == 1:
+            by_pane = {next(iter(counts)): key_counts or count_keys(payloads, self.group_keys)}
+        else:
+            grouped = {}
+            for timestamp, payload in zip(timestamps, payloads):
+                grouped.setdefault(int(timestamp // self.hop), []).append(payload)
+            by_pane = {index: count_keys(group, self.group_keys) for index, group in grouped.items()}
+        for index, keys in by_pane.items():
+            pane = panes.get(index)
+            if pane is not None:
+                for key, values in keys.items():
+                    if key in pane.groups:
+                        pane.groups[key].update(values)
+
+    def _pane(self, index, count):
+        """Pane for index, or None (counting count late events) if it left the ring"""
+        if self.head is None or index > self.head:
+            self.head = index
+        elif index < self.head - self.num_panes:
+            self.late_events += count
+            return None
+        slot = index % len(self.ring)
+        pane = self.ring[slot]
+        if pane is None or pane.index != index:
+            pane = self.ring[slot] = Pane(index, self.group_keys, self.sketch_size)
+        return pane
+
+    def _panes(self, last_index):
+        first = last_index - self.num_panes + 1
+        for index in range(first, last_index + 1):
+            pane = self.ring[index % len(self.ring)]
+            if pane is not None and pane.index == index:
+                yield pane
+
+    def _summary(self, last_index, top_k):
+        panes = list(self._panes(last_index))
+        counts = {}
+        for pane in panes:
+            for event_type, count in pane.counts.items():
+                counts[event_type] = counts.get(event_type, 0) + count
+        start = (last_index - self.num_panes + 1) * self.hop
+        return {
+            'start': format_timestamp(int(start * 1000)),
+            'end': format_timestamp(int((last_index + 1) * self.hop * 1000)),
+            'counts': counts,
+            'top': {
+                key: [[value, count] for value, count in
+                      SpaceSaving.merged(pane.groups[key] for pane in panes).top(top_k)]
+                for key in self.group_keys
+            }
+        }
+
+    def query(self, top_k=10):
+        """
+        Returns:
+            {'current': window ending with the open pane (still filling),
+             'last': the most recent closed window}
+        """
+        if self.head is None:
+            return {'size_seconds': self.size, 'hop_seconds': self.hop, 'current': None, 'last': None}
+        return {
+            'size_seconds': self.size,
+            'hop_seconds': self.hop,
+            'current': self._summary(self.head, top_k),
+            'last': self._summary(self.head - 1, top_k)
+        }
+
+    def clear(self):
+        self.ring = [None] * (self.num_panes + 1)
+        self.head = None
+        self.late_events = 0
+
+    def merge(self, other):
+        """Add the panes of another window with the same size, hop and group keys"""
+        self.late_events += other.late_events
+        for other_pane in sorted((p for p in other.ring if p is not None), key=lambda p: p.index):
+            pane = self._pane(other_pane.index, sum(other_pane.counts.values()))
+            if pane is None:
+                continue
+            for event_type, count in other_pane.counts.items():
+                pane.counts[event_type] = pane.counts.get(event_type, 0) + count
+            for key, sketch in other_pane.groups.items():
+                pane.groups[key] = SpaceSaving.merged([pane.groups[key], sketch], self.sketch_size)
+
+    def export(self):
+        """JSON-serializable state for checkpoints"""
+        return {
+            'head': self.head,
+            'late_events': self.late_events,
+            'panes': [{'index': pane.index, 'counts': pane.counts,
+                       'groups': {key: sketch.export() for key, sketch in pane.groups.items()}}
+                      for pane in self.ring if pane is not None]
+        }
+
+    def restore(self, state):
+        """Replace the panes with an export()ed state (same size, hop and group keys)"""
+        self.clear()
+        self.head = state['head']
+        self.late_events = state['late_events']
+        for saved in state['panes']:
+            pane = Pane(saved['index'], self.group_keys, self.sketch_size)
+            pane.counts = dict(saved['counts'])
+            for key, sketch in pane.groups.items():
+                sketch.restore(saved['groups'][key])
+            self.ring[pane.index % len(self.ring)] = pane
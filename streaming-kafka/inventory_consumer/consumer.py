@@ -2,16 +2,24 @@
 Kafka Consumer for InventoryService
 Consumes order events and produces inventory events
 """
-from confluent_kafka import Consumer, Producer, KafkaError
-import json
+from confluent_kafka import Consumer, Producer, KafkaError, KafkaException, OFFSET_BEGINNING
 import logging
 import os
 import sys
 import signal
-import random
+import socket
+import time
+from collections import namedtuple
 
 sys.path.append('/app/common')
-from ids import generate_event_id, current_timestamp
+from ids import generate_event_id, current_timestamp, current_timestamp_ms, format_timestamp, parse_timestamp_epoch
+from codec import get_codec, kafka_headers, decode_event, content_type_from_headers
+from instrumentation import KafkaLag, MessageMetrics, start_http_server
+from offsets import OffsetTracker
+from workers import ConsumerProcesses
+from reservations import ReservationStore
+from state_store import StateStore, restore_changelog
+from stock import StockModel
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -19,15 +27,77 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Decoded OrderPlaced event plus where it was read from
+Order = namedtuple('Order', ['order_id', 'item', 'quantity', 'placed_at_ms', 'partition', 'offset'])
+
 
 class InventoryConsumer:
     def __init__(self):
         self.kafka_broker = os.getenv('KAFKA_BROKER', 'kafka:9092')
-        self.group_id = 'inventory-group'
-        self.input_topic = 'order-events'
-        self.output_topic = 'inventory-events'
+        self.group_id = os.getenv('GROUP_ID', 'inventory-group')
+        self.input_topic = os.getenv('INPUT_TOPIC', 'order-events')
+        self.output_topic = os.getenv('OUTPUT_TOPIC', 'inventory-events')
         self.running = True
-        self.inventory = {}  # In-memory inventory
+        
+        # Local state: STATE_DIR enables a SQLite checkpoint of the reservations,
+        # with every reservation also written to the compacted changelog topic
+        self.state_dir = os.getenv('STATE_DIR', '')
+        self.changelog_topic = os.getenv('CHANGELOG_TOPIC', 'inventory-changelog')
+        self.checkpoint_interval = int(os.getenv('CHECKPOINT_INTERVAL_SECONDS', '30'))
+        self.state = None
+        self.changelog_offsets = {}  # Changelog partition -> next offset delivered
+        self.last_checkpoint = time.monotonic()
+        
+        # Reserved orders, bounded by MAX_RESERVATIONS and RESERVATION_TTL_SECONDS
+        self.inventory = ReservationStore(
+            max_size=int(os.getenv('MAX_RESERVATIONS', '100000')),
+            ttl_seconds=int(os.getenv('RESERVATION_TTL_SECONDS', '3600')),
+            track_changes=bool(self.state_dir)
+        )
+        
+        # Stock per (partition, item): seeded initial levels and offset-based
+        # restocks, so replaying the same offsets gives the same outcomes
+        self.stock = StockModel(
+            seed=int(os.getenv('STOCK_SEED', '42')),
+            initial_min=int(os.getenv('STOCK_MIN', '50')),
+            initial_max=int(os.getenv('STOCK_MAX', '150')),
+            restock_every=int(os.getenv('RESTOCK_EVERY', '100')),
+            restock_qty=int(os.getenv('RESTOCK_QTY', '36'))
+        )
+        self.codec = get_codec()  # Codec for produced events (EVENT_CODEC)
+        self.headers = kafka_headers(self.codec)
+        
+        # Batch mode: consume up to BATCH_SIZE messages per call and commit
+        # asynchronously every COMMIT_EVERY messages or COMMIT_INTERVAL_MS.
+        # BATCH_SIZE=1 keeps the original poll + synchronous commit loop.
+        self.batch_size = int(os.getenv('BATCH_SIZE', '500'))
+        self.offsets = OffsetTracker(
+            commit_every=int(os.getenv('COMMIT_EVERY', '1000')),
+            commit_interval_ms=int(os.getenv('COMMIT_INTERVAL_MS', '1000'))
+        )
+        self.delivery_failed = False  # An event failed to deliver since the last commit
+        
+        # Exactly-once mode: each consumed batch is processed inside one Kafka
+        # transaction that holds both the output events and the input offsets
+        self.exactly_once = os.getenv('EXACTLY_ONCE', 'false').lower() == 'true'
+        self.transactional_id = os.getenv('TRANSACTIONAL_ID', f"inventory-consumer-{socket.gethostname()}")
+        self.batch_reserved = []  # Orders reserved by the current batch, undone if it fails
+        self.txn_tombstones = []  # Tombstones produced in the open transaction
+        self.pending_tombstones = []  # Tombstones of an aborted transaction, produced again
+        
+        # Group membership: cooperative-sticky only moves the partitions that
+        # change owner on a rebalance; GROUP_INSTANCE_ID makes this a static
+        # member, so a restart within SESSION_TIMEOUT_MS causes no rebalance
+        self.assignment_strategy = os.getenv('PARTITION_ASSIGNMENT_STRATEGY', 'cooperative-sticky')
+        self.group_instance_id = os.getenv('GROUP_INSTANCE_ID', '')
+        self.session_timeout_ms = int(os.getenv('SESSION_TIMEOUT_MS', '45000'))
+        
+        # Pull metrics: processing time, publish latency and per-partition lag
+        # (GET /metrics on METRICS_PORT; 0 = recorded but not served)
+        self.metrics_port = int(os.getenv('METRICS_PORT', '0'))
+        self.instruments = MessageMetrics('kafka_inventory_consumer', self.input_topic)
+        self.publish_latency = self.instruments.publish(self.output_topic)
+        self.publish_errors = self.instruments.publish_errors(self.output_topic)
         
         # Consumer configuration
         consumer_config = {
@@ -35,8 +105,13 @@ class InventoryConsumer:
             'group.id': self.group_id,
             'auto.offset.reset': 'earliest',
             'enable.auto.commit': False,  # Manual commit
-            'max.poll.interval.ms': 300000
+            'max.poll.interval.ms': 300000,
+            'partition.assignment.strategy': self.assignment_strategy,
+            'session.timeout.ms': self.session_timeout_ms,
+            'on_commit': self.commit_callback
         }
+        if self.group_instance_id:
+            consumer_config['group.instance.id'] = self.group_instance_id
         
         # Producer configuration
         producer_config = {
@@ -44,117 +119,575 @@ class InventoryConsumer:
             'client.id': 'inventory-producer',
             'acks': 'all'
         }
+        if self.exactly_once:
+            consumer_config['isolation.level'] = 'read_committed'
+            producer_config['transactional.id'] = self.transactional_id
+            producer_config['enable.idempotence'] = True
         
         self.consumer = Consumer(consumer_config)
         self.producer = Producer(producer_config)
+        self.lag = KafkaLag(self.consumer, 'kafka_inventory_consumer')
+        if self.metrics_port:
+            start_http_server(self.metrics_port)
+        if self.exactly_once:
+            self.producer.init_transactions(30)
+        
+        if self.state_dir:
+            self.restore_state()
         
         # Subscribe to input topic
-        self.consumer.subscribe([self.input_topic])
+        self.consumer.subscribe(
+            [self.input_topic],
+            on_assign=self.on_assign,
+            on_revoke=self.on_revoke,
+            on_lost=self.on_lost
+        )
         
         logger.info(f"Inventory consumer initialized")
         logger.info(f"Consuming from: {self.input_topic}")
         logger.info(f"Group ID: {self.group_id}")
+        logger.info(f"Batch size: {self.batch_size}")
+        logger.info(f"Assignment strategy: {self.assignment_strategy}"
+                    + (f", static member {self.group_instance_id}" if self.group_instance_id else ""))
+        if self.exactly_once:
+            logger.info(f"Exactly-once mode, transactional.id: {self.transactional_id}")
+    
+    def commit_callback(self, err, partitions):
+        """Callback for asynchronous commit results"""
+        if err:
+            logger.error(f"Offset commit failed: {err}")
+        else:
+            logger.debug(f"Committed offsets: {partitions}")
+    
+    def on_assign(self, consumer, partitions):
+        """
+        Catch up on newly assigned partitions (incremental under cooperative-sticky)
+        
+        Another consumer may have reserved stock on a gained partition since
+        this one last read its changelog, so the co-partitioned changelog is
+        replayed first; otherwise its stock levels would be stale.
+        """
+        logger.info(f"Partitions assigned: {[p.partition for p in partitions]}")
+        if self.state is not None and partitions:
+            self.restore_partitions([p.partition for p in partitions])
+        self.lag.assign(partitions)
+    
+    def on_revoke(self, consumer, partitions):
+        """
+        Commit processed offsets before partitions move to another consumer
+        
+        Under cooperative-sticky only the moving partitions are revoked and
+        the rest keep being consumed; under eager assignment this is every
+        partition and the whole group waits for this callback.
+        """
+        logger.info(f"Partitions revoked: {[p.partition for p in partitions]}")
+        # Output events must be delivered before their inputs are committed
+        remaining = self.producer.flush(timeout=10)
+        if remaining or self.delivery_failed:
+            # Not committed: the new owner reprocesses these messages
+            logger.warning("Events undelivered, leaving revoked offsets uncommitted")
+            self.offsets.drop(partitions)
+        else:
+            self.commit_pending(partitions)
+        self.lag.revoke(partitions)
+    
+    def on_lost(self, consumer, partitions):
+        """
+        Partitions were taken away without a revoke (e.g. session timeout)
+        
+        Another consumer may already own them, so their offsets must not be
+        committed; messages processed since the last commit are redelivered.
+        """
+        logger.warning(f"Partitions lost: {[p.partition for p in partitions]}")
+        self.offsets.drop(partitions)
+        self.lag.revoke(partitions)
+    
+    def commit_pending(self, partitions=None):
+        """Synchronously commit tracked offsets (all, or only the given partitions)"""
+        offsets = self.offsets.take(partitions)
+        if not offsets:
+            return
+        try:
+            self.consumer.commit(offsets=offsets, asynchronous=False)
+        except Exception as e:
+            logger.error(f"Error committing offsets: {e}")
+    
+    def commit_processed(self):
+        """
+        Commit tracked offsets asynchronously once their output events are delivered
+        
+        The flush makes every event produced for the committed messages
+        durable first, so a crash right after the commit cannot lose one.
+        If an event failed to deliver, nothing is committed and consumption
+        rewinds to the last commit (at-least-once).
+        """
+        remaining = self.producer.flush(timeout=10)
+        if remaining or self.delivery_failed:
+            logger.warning(f"{remaining} events undelivered (failed: {self.delivery_failed}), "
+                           f"reprocessing from the last commit")
+            self.reprocess()
+            return
+        self.consumer.commit(offsets=self.offsets.take(), asynchronous=True)
+    
+    def reprocess(self):
+        """Drop uncommitted progress and seek back to the committed offsets"""
+        self.producer.flush(timeout=10)
+        self.offsets.take()  # Discard
+        self.delivery_failed = False
+        self.rewind()
+    
+    def restore_state(self):
+        """Load the local checkpoint, then replay the changelog written after it"""
+        start = time.time()
+        path = os.path.join(self.state_dir, 'inventory.db')
+        self.state = StateStore(path)
+        
+        loaded = 0
+        for order_id, item, quantity, placed_at_ms, reserved_at_ms in self.state.load():
+            self.inventory.reserve(order_id, item, quantity, placed_at_ms, reserved_at_ms, track=False, evict=False)
+            loaded += 1
+        for partition, item, level, as_of_offset in self.state.load_stock():
+            self.stock.restore(partition, item, level, as_of_offset)
+        
+        self.changelog_offsets, replayed = restore_changelog(
+            self.kafka_broker,
+            self.changelog_topic,
+            self.state.changelog_offsets(),
+            self.apply_changelog
+        )
+        self.inventory.evict_restored()
+        self.checkpoint()
+        
+        logger.info(f"Restored {len(self.inventory)} reservations in {time.time() - start:.2f}s "
+                    f"({loaded} from {path}, {replayed} from {self.changelog_topic})")
+    
+    def restore_partitions(self, partitions):
+        """Replay the changelog tail of the given partitions (reservations and stock)"""
+        start = time.time()
+        positions, replayed = restore_changelog(
+            self.kafka_broker,
+            self.changelog_topic,
+            self.changelog_offsets,
+            self.apply_changelog,
+            partitions=partitions
+        )
+        self.inventory.evict_restored()
+        for partition in partitions:
+            if positions.get(partition, 0) > self.changelog_offsets.get(partition, 0):
+                self.changelog_offsets[partition] = positions[partition]
+        if replayed:
+            logger.info(f"Replayed {replayed} changelog records of partitions {partitions} "
+                        f"in {time.time() - start:.2f}s")
+    
+    def apply_changelog(self, msg):
+        """
+        Apply one changelog record to the reservation store
+        
+        Nothing is evicted during the replay (the partitions arrive
+        interleaved, and other owners' live reservations must not be
+        tombstoned); the caller applies the limits once afterwards.
+        """
+        if msg.value() is None:
+            # Tombstone: the reservation was evicted
+            self.inventory.discard(msg.key().decode('utf-8'))
+            return
+        record = decode_event(msg.value(), content_type_from_headers(msg.headers()))
+        self.inventory.reserve(
+            record['order_id'],
+            record['item'],
+            record['quantity'],
+            record.get('placed_at_ms'),
+            record['reserved_at_ms'],
+            evict=False
+        )
+        if record.get('remaining') is not None:
+            self.stock.restore(record['partition'], record['item'], record['remaining'], record['offset'])
+    
+    def changelog_delivered(self, err, msg):
+        """Delivery report for changelog writes; tracks the checkpointable offsets"""
+        if err:
+            self.delivery_failed = True
+            logger.error(f"Changelog delivery failed: {err}")
+            return
+        partition = msg.partition()
+        if msg.offset() + 1 > self.changelog_offsets.get(partition, 0):
+            self.changelog_offsets[partition] = msg.offset() + 1
+    
+    def checkpoint(self):
+        """Persist reservation changes with the changelog offsets they cover"""
+        if not self.exactly_once:
+            # Transactional producers only write inside a batch's transaction
+            self.produce_tombstones()
+        # Flush first: every change drained below then has its changelog
+        # offset recorded, so a restore never skips a reservation
+        self.producer.flush(timeout=10)
+        changes = self.inventory.drain_changes()
+        self.state.checkpoint(changes, dict(self.changelog_offsets), self.stock.export())
+        self.last_checkpoint = time.monotonic()
+        logger.debug(f"Checkpointed {len(changes)} reservation changes")
+    
+    def maybe_checkpoint(self):
+        if self.state is not None and time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+    
+    def parse_order(self, msg):
+        """Decode an OrderPlaced message into an Order (None for other events)"""
+        # Decode message with the codec named in its headers
+        event = decode_event(msg.value(), content_type_from_headers(msg.headers()))
+        
+        event_type = event.get('event_type')
+        if event_type != 'OrderPlaced':
+            logger.debug(f"Skipping non-OrderPlaced event: {event_type}")
+            return None
+        
+        # Extract order details
+        payload = event.get('payload', {})
+        placed_at = parse_timestamp_epoch(event['timestamp']) if event.get('timestamp') else None
+        return Order(
+            order_id=event.get('order_id'),
+            item=payload.get('item', 'unknown'),
+            quantity=payload.get('quantity', 1),
+            placed_at_ms=int(placed_at * 1000) if placed_at is not None else None,
+            partition=msg.partition(),
+            offset=msg.offset()
+        )
     
     def process_message(self, msg):
         """Process an order event and produce inventory event"""
+        with self.instruments.processing.time():
+            return self._process_message(msg)
+    
+    def _process_message(self, msg):
+        self.instruments.observe_kafka_age(msg)
         try:
-            # Parse message
-            event = json.loads(msg.value().decode('utf-8'))
-            
-            event_type = event.get('event_type')
-            order_id = event.get('order_id')
-            
-            if event_type != 'OrderPlaced':
-                logger.debug(f"Skipping non-OrderPlaced event: {event_type}")
+            order = self.parse_order(msg)
+            if order is None:
                 return True
             
-            logger.info(f"Processing order {order_id}")
+            logger.info(f"Processing order {order.order_id}")
             
-            # Extract order details
-            payload = event.get('payload', {})
-            item = payload.get('item', 'unknown')
-            quantity = payload.get('quantity', 1)
-            user_id = payload.get('user_id', 'unknown')
+            existing = self.inventory.get(order.order_id)
+            if existing is not None:
+                success, remaining = True, None
+            else:
+                success, remaining = self.stock.reserve(order.partition, order.item, order.quantity, order.offset)
+            self.complete_order(order, success, existing, remaining)
+            self.producer.poll(0)
             
-            # Simulate inventory check (90% success rate)
-            success = random.random() > 0.1
+            self.instruments.processed.inc()
+            return True
             
-            if success:
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+            self.instruments.failed.inc()
+            return False
+    
+    def process_batch(self, messages):
+        """
+        Process a consumed batch: decode every order, apply stock for the
+        whole batch per item in one pass, then produce the results
+        
+        Returns:
+            list of messages that were processed
+        """
+        started = time.perf_counter()
+        if messages:
+            self.instruments.observe_kafka_age(messages[-1])  # Newest message of the batch
+        self.batch_reserved = []
+        processed = []
+        chunk = []
+        chunk_ids = set()
+        for msg in messages:
+            try:
+                order = self.parse_order(msg)
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+                self.instruments.failed.inc()
+                continue
+            processed.append(msg)
+            if order is None:
+                continue
+            if order.order_id in chunk_ids:
+                # Same order twice in one batch: the second must see the first's outcome
+                self.complete_orders(chunk)
+                chunk = []
+                chunk_ids = set()
+            chunk.append(order)
+            chunk_ids.add(order.order_id)
+        self.complete_orders(chunk)
+        self.instruments.batches.observe(time.perf_counter() - started)
+        self.instruments.processed.inc(len(processed))
+        return processed
+    
+    def complete_orders(self, orders):
+        """
+        Reserve stock for orders with distinct IDs in one pass and emit results
+        
+        An error completing an order propagates, so the batch is undone and
+        none of its offsets are committed.
+        """
+        if not orders:
+            return
+        
+        existing = [self.inventory.get(order.order_id) for order in orders]
+        pending = [order for order, reservation in zip(orders, existing) if reservation is None]
+        outcomes = iter(self.stock.reserve_batch(
+            [(order.partition, order.item, order.quantity, order.offset) for order in pending]
+        ))
+        for order, reservation in zip(orders, existing):
+            if reservation is not None:
+                self.complete_order(order, True, reservation, None)
+            else:
+                success, remaining = next(outcomes)
+                if success:
+                    self.batch_reserved.append(order.order_id)
+                self.complete_order(order, success, None, remaining)
+    
+    def complete_order(self, order, success, existing, remaining):
+        """
+        Record the outcome of one order and produce its inventory event
+        
+        Args:
+            order: Order being processed
+            success: Whether stock was reserved
+            existing: Reservation from an earlier delivery of this order, if any
+            remaining: Stock level of the item after this order
+        """
+        order_id = order.order_id
+        if success:
+            if existing is None:
                 # Reserve inventory
-                self.inventory[order_id] = {
-                    'item': item,
-                    'quantity': quantity,
-                    'reserved_at': current_timestamp()
-                }
-                
-                logger.info(f"Inventory reserved for order {order_id}: {quantity}x {item}")
+                reserved_at_ms = current_timestamp_ms()
+                reservation = self.inventory.reserve(
+                    order_id,
+                    order.item,
+                    order.quantity,
+                    placed_at_ms=order.placed_at_ms,
+                    reserved_at_ms=reserved_at_ms
+                )
                 
-                # Create InventoryReserved event
-                response_event = {
-                    "event_id": generate_event_id(),
-                    "event_type": "InventoryReserved",
-                    "order_id": order_id,
-                    "timestamp": current_timestamp(),
-                    "success": True
-                }
+                if self.state is not None:
+                    self.write_changelog(reservation, order, remaining)
+                    self.produce_tombstones()  # Reservations this one evicted
                 
+                logger.info(f"Inventory reserved for order {order_id}: {order.quantity}x {order.item}")
             else:
-                logger.warning(f"Inventory reservation failed for order {order_id}")
-                
-                # Create InventoryFailed event
-                response_event = {
-                    "event_id": generate_event_id(),
-                    "event_type": "InventoryFailed",
-                    "order_id": order_id,
-                    "timestamp": current_timestamp(),
-                    "success": False,
-                    "reason": "Insufficient inventory"
-                }
-            
-            # Produce inventory event
+                # Redelivered order (restart or rebalance): keep the original reservation
+                reserved_at_ms = existing.reserved_at_ms
+                if self.state is not None:
+                    # Its first changelog record may not have been delivered
+                    self.write_changelog(existing, order, None)
+                logger.info(f"Order {order_id} already reserved, re-emitting result")
+            
+            # Create InventoryReserved event
+            response_event = {
+                "event_id": generate_event_id(),
+                "event_type": "InventoryReserved",
+                "order_id": order_id,
+                "timestamp": format_timestamp(reserved_at_ms),
+                "success": True
+            }
+            
+        else:
+            logger.warning(f"Inventory reservation failed for order {order_id}")
+            
+            # Create InventoryFailed event
+            response_event = {
+                "event_id": generate_event_id(),
+                "event_type": "InventoryFailed",
+                "order_id": order_id,
+                "timestamp": current_timestamp(),
+                "success": False,
+                "reason": "Insufficient inventory"
+            }
+        
+        # Produce inventory event
+        self.producer.produce(
+            topic=self.output_topic,
+            key=order_id.encode('utf-8'),
+            value=self.codec.encode(response_event),
+            headers=self.headers,
+            on_delivery=self.output_delivered
+        )
+    
+    def write_changelog(self, reservation, order, remaining):
+        """
+        Write a reservation to the changelog, keyed like the order so it lands
+        in the same partition; it also carries the item's stock level for restores
+        """
+        record = reservation.to_dict()
+        record.update(partition=order.partition, offset=order.offset, remaining=remaining)
+        self.producer.produce(
+            topic=self.changelog_topic,
+            key=order.order_id.encode('utf-8'),
+            value=self.codec.encode(record),
+            headers=self.headers,
+            on_delivery=self.changelog_delivered
+        )
+    
+    def produce_tombstones(self):
+        """Delete evicted reservations from the compacted changelog (value None)"""
+        order_ids = self.pending_tombstones + self.inventory.drain_evicted()
+        self.pending_tombstones = []
+        if self.exactly_once:
+            self.txn_tombstones.extend(order_ids)
+        for order_id in order_ids:
             self.producer.produce(
-                topic=self.output_topic,
+                topic=self.changelog_topic,
                 key=order_id.encode('utf-8'),
-                value=json.dumps(response_event).encode('utf-8')
+                value=None,
+                on_delivery=self.changelog_delivered
             )
-            self.producer.poll(0)
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
-            return False
+    
+    def output_delivered(self, err, msg):
+        """Delivery report of an inventory event: publish latency and errors"""
+        if err:
+            self.delivery_failed = True
+            self.publish_errors.inc()
+            logger.error(f"Inventory event delivery failed: {err}")
+            return
+        latency = msg.latency()
+        if latency is not None:
+            self.publish_latency.observe(latency)
     
     def start(self):
         """Start consuming messages"""
         logger.info("Starting consumption...")
         
         try:
-            while self.running:
-                msg = self.consumer.poll(timeout=1.0)
-                
-                if msg is None:
-                    continue
-                
-                if msg.error():
-                    if msg.error().code() == KafkaError._PARTITION_EOF:
-                        logger.debug(f"Reached end of partition")
-                    else:
-                        logger.error(f"Consumer error: {msg.error()}")
-                    continue
-                
-                # Process message
-                if self.process_message(msg):
-                    # Commit offset manually
-                    self.consumer.commit(msg)
-                else:
-                    logger.warning(f"Failed to process message, will retry")
+            if self.exactly_once:
+                self.run_transactional()
+            elif self.batch_size > 1:
+                self.run_batch()
+            else:
+                self.run_single()
         
         except KeyboardInterrupt:
             logger.info("Shutdown requested")
         finally:
             self.stop()
     
+    def run_batch(self):
+        """Consume in batches and commit offsets asynchronously"""
+        while self.running:
+            messages = self.consumer.consume(num_messages=self.batch_size, timeout=1.0)
+            
+            stock_before = self.stock.export()
+            try:
+                processed = self.process_batch(self.valid_messages(messages))
+            except Exception as e:
+                # Nothing of the batch was marked: roll it back and redeliver
+                # everything since the last commit
+                logger.error(f"Error processing batch of {len(messages)} messages, "
+                             f"reprocessing from the last commit: {e}")
+                self.instruments.failed.inc()
+                self.undo_batch(stock_before)
+                self.reprocess()
+                continue
+            
+            for msg in processed:
+                self.offsets.mark(msg)
+            
+            # Serve delivery reports once per batch
+            self.producer.poll(0)
+            
+            if self.offsets.due():
+                self.commit_processed()
+            
+            self.maybe_checkpoint()
+    
+    def valid_messages(self, messages):
+        """Filter out (and log) consumer error events from a consumed batch"""
+        valid = []
+        for msg in messages:
+            if msg.error():
+                if msg.error().code() == KafkaError._PARTITION_EOF:
+                    logger.debug(f"Reached end of partition")
+                else:
+                    logger.error(f"Consumer error: {msg.error()}")
+                continue
+            valid.append(msg)
+        return valid
+    
+    def run_transactional(self):
+        """Consume in batches; commit each batch's output and offsets atomically"""
+        while self.running:
+            messages = self.consumer.consume(num_messages=self.batch_size, timeout=1.0)
+            if not messages:
+                continue
+            
+            self.producer.begin_transaction()
+            stock_before = self.stock.export()
+            self.txn_tombstones = []
+            try:
+                self.process_batch(self.valid_messages(messages))
+                
+                # Input offsets become visible together with the output events
+                self.producer.send_offsets_to_transaction(
+                    self.consumer.position(self.consumer.assignment()),
+                    self.consumer.consumer_group_metadata()
+                )
+                self.producer.commit_transaction()
+                self.maybe_checkpoint()
+                
+            except KafkaException as e:
+                error = e.args[0]
+                if not error.txn_requires_abort():
+                    raise
+                logger.warning(f"Aborting transaction of {len(messages)} messages: {error}")
+                self.producer.abort_transaction()
+                self.undo_batch(stock_before)
+                self.rewind()
+            except Exception as e:
+                logger.error(f"Error processing batch, aborting transaction of {len(messages)} messages: {e}")
+                self.instruments.failed.inc()
+                self.producer.abort_transaction()
+                self.undo_batch(stock_before)
+                self.rewind()
+    
+    def undo_batch(self, stock_before):
+        """
+        Roll back the in-memory effects of a failed or aborted batch: its
+        retry must reserve the orders again instead of finding them already
+        reserved, against the stock levels from before the batch
+        """
+        for order_id in self.batch_reserved:
+            self.inventory.discard(order_id)
+        self.stock.reset(stock_before)
+        # The evicted reservations stay evicted; their tombstones go out with the next batch
+        self.pending_tombstones = self.txn_tombstones + self.pending_tombstones
+        self.batch_reserved, self.txn_tombstones = [], []
+    
+    def rewind(self):
+        """Seek back to the committed offsets so an aborted batch is reprocessed"""
+        for tp in self.consumer.committed(self.consumer.assignment(), timeout=10):
+            if tp.offset < 0:
+                tp.offset = OFFSET_BEGINNING  # Nothing committed yet (auto.offset.reset=earliest)
+            self.consumer.seek(tp)
+    
+    def run_single(self):
+        """Poll one message at a time and commit each synchronously"""
+        while self.running:
+            msg = self.consumer.poll(timeout=1.0)
+            self.maybe_checkpoint()
+            
+            if msg is None:
+                continue
+            
+            if msg.error():
+                if msg.error().code() == KafkaError._PARTITION_EOF:
+                    logger.debug(f"Reached end of partition")
+                else:
+                    logger.error(f"Consumer error: {msg.error()}")
+                continue
+            
+            # Process message
+            if self.process_message(msg):
+                # Commit offset manually
+                self.consumer.commit(msg)
+            else:
+                logger.warning(f"Failed to process message, will retry")
+    
     def stop(self):
         """Stop consumer and close connections"""
         logger.info("Stopping consumer...")
@@ -162,8 +695,16 @@ class InventoryConsumer:
         
         # Flush producer
         remaining = self.producer.flush(timeout=10)
-        if remaining > 0:
-            logger.warning(f"{remaining} messages not delivered")
+        if remaining > 0 or self.delivery_failed:
+            # Left uncommitted, so the messages are redelivered after a restart
+            logger.warning(f"{remaining} messages not delivered, skipping the final commit")
+        else:
+            # Commit what was processed since the last asynchronous commit
+            self.commit_pending()
+        
+        if self.state is not None:
+            self.checkpoint()
+            self.state.close()
         
         # Close consumer
         self.consumer.close()
@@ -178,8 +719,8 @@ def signal_handler(signum, frame):
         signal_handler.consumer.running = False
 
 
-def main():
-    """Main entry point"""
+def run_consumer():
+    """Run one InventoryConsumer until SIGINT/SIGTERM"""
     consumer = InventoryConsumer()
     
     # Register signal handlers
@@ -191,5 +732,22 @@ def main():
     consumer.start()
 
 
+def main():
+    """Main entry point"""
+    # WORKERS > 1: that many consumer processes in this container, each
+    # owning some partitions (see workers.py)
+    num_workers = int(os.getenv('WORKERS', '0'))
+    if num_workers <= 1:
+        run_consumer()
+        return
+    
+    processes = ConsumerProcesses(run_consumer, num_workers)
+    signal_handler.consumer = processes  # Clearing running stops the supervisor
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    logger.info(f"Running {num_workers} consumer processes")
+    processes.run()
+
+
 if __name__ == '__main__':
     main()
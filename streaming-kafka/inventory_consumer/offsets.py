@@ -0,0 +1,58 @@
+"""
+Offset tracking for batched, asynchronous commits
+Remembers the next offset to commit per partition and decides when a
+commit is due (every N messages or every T milliseconds).
+"""
+import time
+
+from confluent_kafka import TopicPartition
+
+
+class OffsetTracker:
+    def __init__(self, commit_every=1000, commit_interval_ms=1000):
+        """
+        Args:
+            commit_every: Commit after this many processed messages
+            commit_interval_ms: Commit at least this often while messages arrive
+        """
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval_ms / 1000
+        self.pending = {}  # (topic, partition) -> next offset to commit
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+
+    def mark(self, msg):
+        """Record a processed message; its successor is the offset to commit"""
+        self.pending[(msg.topic(), msg.partition())] = msg.offset() + 1
+        self.uncommitted += 1
+
+    def due(self):
+        """True when enough messages or time have passed since the last commit"""
+        if not self.pending:
+            return False
+        return (self.uncommitted >= self.commit_every
+                or time.monotonic() - self.last_commit >= self.commit_interval)
+
+    def take(self, partitions=None):
+        """
+        Remove and return pending offsets as TopicPartitions
+
+        Args:
+            partitions: Only take these partitions (default: all)
+        """
+        if partitions is None:
+            keys = list(self.pending)
+        else:
+            keys = [(tp.topic, tp.partition) for tp in partitions
+                    if (tp.topic, tp.partition) in self.pending]
+        offsets = [TopicPartition(topic, partition, self.pending.pop((topic, partition)))
+                   for topic, partition in keys]
+        if not self.pending:
+            self.uncommitted = 0
+        self.last_commit = time.monotonic()
+        return offsets
+
+    def drop(self, partitions):
+        """Forget pending offsets for partitions we no longer own"""
+        for tp in partitions:
+            self.pending.pop((tp.topic, tp.partition), None)
@@ -0,0 +1,181 @@
+"""
+Bounded reservation store for InventoryConsumer
+Keeps one compact record per reserved order and evicts the oldest
+reservations by age (TTL) and by count, so replaying order-events from
+earliest cannot grow memory without limit.
+"""
+import threading
+from collections import deque
+
+from ids import current_timestamp_ms
+
+
+class Reservation:
+    """One reserved order; timestamps are epoch milliseconds"""
+
+    __slots__ = ('order_id', 'item', 'quantity', 'placed_at_ms', 'reserved_at_ms')
+
+    def __init__(self, order_id, item, quantity, placed_at_ms, reserved_at_ms):
+        self.order_id = order_id
+        self.item = item
+        self.quantity = quantity
+        self.placed_at_ms = placed_at_ms
+        self.reserved_at_ms = reserved_at_ms
+
+    def to_dict(self):
+        return {
+            'order_id': self.order_id,
+            'item': self.item,
+            'quantity': self.quantity,
+            'placed_at_ms': self.placed_at_ms,
+            'reserved_at_ms': self.reserved_at_ms
+        }
+
+
+class ReservationStore:
+    """
+    order_id -> Reservation with TTL and size-based eviction
+
+    Reservations are also kept in a FIFO in reservation order, so eviction
+    always pops from the front in O(1). A re-reserved order leaves a stale
+    FIFO entry behind, which is skipped when it reaches the front.
+    """
+
+    def __init__(self, max_size=100000, ttl_seconds=3600, track_changes=False):
+        """
+        Args:
+            max_size: Keep at most this many reservations (0 = unbounded)
+            ttl_seconds: Drop reservations older than this (0 = no TTL)
+            track_changes: Remember puts and evictions for drain_changes(),
+                           and evicted order IDs for drain_evicted()
+        """
+        self.max_size = max_size
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self.lock = threading.Lock()
+        self.by_order = {}
+        self.fifo = deque()
+        self.evicted_ttl = 0
+        self.evicted_size = 0
+        self.evicted_restore = 0
+        self._item_names = {}  # Intern item names so records share one string
+        self.track_changes = track_changes
+        self.changes = {}  # order_id -> Reservation (put) or None (evicted)
+        self.evicted_ids = []  # Evicted since drain_evicted(), for changelog tombstones
+
+    def reserve(self, order_id, item, quantity, placed_at_ms=None, reserved_at_ms=None, track=True, evict=True):
+        """
+        Store a reservation and evict anything now over the limits
+
+        Args:
+            track: Record the put for drain_changes() (False when loading
+                   state that is already persisted)
+            evict: Apply the limits now (False while restoring; see
+                   evict_restored())
+        """
+        if reserved_at_ms is None:
+            reserved_at_ms = current_timestamp_ms()
+        item = self._item_names.setdefault(item, item)
+        reservation = Reservation(order_id, item, quantity, placed_at_ms, reserved_at_ms)
+        with self.lock:
+            self.by_order[order_id] = reservation
+            self.fifo.append(reservation)
+            if self.track_changes and track:
+                self.changes[order_id] = reservation
+            if evict:
+                self._evict(reserved_at_ms)
+        return reservation
+
+    def drain_changes(self):
+        """Return and reset {order_id: Reservation or None} since the last drain"""
+        with self.lock:
+            changes, self.changes = self.changes, {}
+        return changes
+
+    def drain_evicted(self):
+        """Return and reset the order IDs evicted since the last drain"""
+        with self.lock:
+            evicted, self.evicted_ids = self.evicted_ids, []
+        return evicted
+
+    def discard(self, order_id):
+        """
+        Remove a reservation without counting it as evicted (a changelog
+        tombstone, or a reservation rolled back with its transaction)
+
+        Returns:
+            True if the order was reserved
+        """
+        with self.lock:
+            if self.by_order.pop(order_id, None) is None:
+                return False
+            if self.track_changes:
+                self.changes[order_id] = None
+            return True  # Its FIFO entry is now stale and skipped
+
+    def get(self, order_id):
+        return self.by_order.get(order_id)
+
+    def __contains__(self, order_id):
+        return order_id in self.by_order
+
+    def __len__(self):
+        return len(self.by_order)
+
+    def _pop_front(self, tombstone=True):
+        reservation = self.fifo.popleft()
+        if self.by_order.get(reservation.order_id) is reservation:
+            del self.by_order[reservation.order_id]
+            if self.track_changes:
+                self.changes[reservation.order_id] = None
+                if tombstone:
+                    self.evicted_ids.append(reservation.order_id)
+            return True
+        return False  # Stale entry for a re-reserved order
+
+    def _evict(self, now_ms):
+        if self.ttl_ms:
+            cutoff = now_ms - self.ttl_ms
+            while self.fifo and self.fifo[0].reserved_at_ms < cutoff:
+                if self._pop_front():
+                    self.evicted_ttl += 1
+        if self.max_size:
+            while len(self.by_order) > self.max_size:
+                if self._pop_front():
+                    self.evicted_size += 1
+        # Compact stale FIFO entries left by re-reserved orders (amortized O(1))
+        if len(self.fifo) > 2 * len(self.by_order) + 1024:
+            by_order = self.by_order
+            self.fifo = deque(r for r in self.fifo if by_order.get(r.order_id) is r)
+
+    def evict_restored(self, now_ms=None):
+        """
+        Apply the limits once after a restore that reserved with evict=False
+
+        Changelog partitions are replayed interleaved, so the FIFO is first
+        put back in reservation order. The evicted orders get no tombstones:
+        the changelog also holds other instances' live reservations, which
+        only their owners may delete.
+        """
+        now_ms = now_ms if now_ms is not None else current_timestamp_ms()
+        with self.lock:
+            by_order = self.by_order
+            self.fifo = deque(sorted((r for r in self.fifo if by_order.get(r.order_id) is r),
+                                     key=lambda r: r.reserved_at_ms))
+            cutoff = now_ms - self.ttl_ms if self.ttl_ms else None
+            while self.fifo and (cutoff is not None and self.fifo[0].reserved_at_ms < cutoff
+                                 or self.max_size and len(by_order) > self.max_size):
+                if self._pop_front(tombstone=False):
+                    self.evicted_restore += 1
+
+    def evict_expired(self, now_ms=None):
+        """Apply the TTL without a new reservation (e.g. from an idle loop)"""
+        with self.lock:
+            self._evict(now_ms if now_ms is not None else current_timestamp_ms())
+
+    def stats(self):
+        return {
+            'reservations': len(self.by_order),
+            'evicted_ttl': self.evicted_ttl,
+            'evicted_size': self.evicted_size,
+            'evicted_restore': self.evicted_restore
+        }
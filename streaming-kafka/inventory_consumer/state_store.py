@@ -0,0 +1,149 @@
+"""
+Local persistent state for InventoryConsumer
+Reservations are checkpointed to a SQLite file together with the
+changelog topic offsets they include. Every reservation is also written
+to a compacted changelog topic as it happens, so a restart only loads the
+local file and replays the changelog tail written after the checkpoint.
+"""
+import logging
+import os
+import sqlite3
+import time
+
+from confluent_kafka import Consumer, TopicPartition, KafkaError, OFFSET_BEGINNING
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """SQLite reservation table plus the changelog offsets it reflects"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS reservations (
+                order_id TEXT PRIMARY KEY,
+                item TEXT,
+                quantity INTEGER,
+                placed_at_ms INTEGER,
+                reserved_at_ms INTEGER
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS stock (
+                partition INTEGER,
+                item TEXT,
+                level INTEGER,
+                as_of_offset INTEGER,
+                PRIMARY KEY (partition, item)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS changelog_offsets (
+                partition INTEGER PRIMARY KEY,
+                next_offset INTEGER
+            )
+        """)
+        self.conn.commit()
+
+    def load(self):
+        """Yield stored reservations as tuples, oldest first"""
+        return self.conn.execute(
+            'SELECT order_id, item, quantity, placed_at_ms, reserved_at_ms '
+            'FROM reservations ORDER BY reserved_at_ms'
+        )
+
+    def load_stock(self):
+        """Yield (partition, item, level, as_of_offset) stock rows"""
+        return self.conn.execute('SELECT partition, item, level, as_of_offset FROM stock')
+
+    def changelog_offsets(self):
+        """{partition: next changelog offset} covered by the last checkpoint"""
+        return dict(self.conn.execute('SELECT partition, next_offset FROM changelog_offsets'))
+
+    def checkpoint(self, changes, changelog_offsets, stock_levels=()):
+        """
+        Persist reservation changes, stock levels and changelog offsets in one transaction
+
+        Args:
+            changes: {order_id: Reservation or None (deleted)}
+            changelog_offsets: {partition: next changelog offset}
+            stock_levels: [(partition, item, level, as_of_offset)]
+        """
+        puts = [(r.order_id, r.item, r.quantity, r.placed_at_ms, r.reserved_at_ms)
+                for r in changes.values() if r is not None]
+        deletes = [(order_id,) for order_id, r in changes.items() if r is None]
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO reservations VALUES (?, ?, ?, ?, ?)', puts)
+            self.conn.executemany('DELETE FROM reservations WHERE order_id = ?', deletes)
+            self.conn.executemany('INSERT OR REPLACE INTO stock VALUES (?, ?, ?, ?)', list(stock_levels))
+            self.conn.executemany('INSERT OR REPLACE INTO changelog_offsets VALUES (?, ?)',
+                                  list(changelog_offsets.items()))
+
+    def close(self):
+        self.conn.close()
+
+
+def restore_changelog(kafka_broker, topic, start_offsets, apply, timeout=30.0, partitions=None):
+    """
+    Replay a changelog topic from the checkpointed offsets to its current end
+
+    Args:
+        kafka_broker: Bootstrap servers
+        topic: Changelog topic
+        start_offsets: {partition: next offset} from the checkpoint
+        apply: Called as apply(msg) for every changelog record
+        timeout: Give up waiting for the end of the topic after this many seconds
+        partitions: Only replay these partitions (default: all)
+
+    Returns:
+        ({partition: next offset}, records applied)
+    """
+    consumer = Consumer({
+        'bootstrap.servers': kafka_broker,
+        'group.id': f"{topic}-restore",  # Only used for metadata; nothing is committed
+        'enable.auto.commit': False,
+        'enable.partition.eof': False,
+        'isolation.level': 'read_committed'
+    })
+    try:
+        available = consumer.list_topics(topic, timeout=10).topics[topic].partitions
+        partitions = available if partitions is None else [p for p in partitions if p in available]
+        positions = {}
+        end_offsets = {}
+        assignment = []
+        for p in partitions:
+            low, high = consumer.get_watermark_offsets(TopicPartition(topic, p), timeout=10)
+            start = max(start_offsets.get(p, low), low)
+            positions[p] = start
+            end_offsets[p] = high
+            if start < high:
+                assignment.append(TopicPartition(topic, p, start if start > 0 else OFFSET_BEGINNING))
+
+        applied = 0
+        deadline = time.monotonic() + timeout
+        consumer.assign(assignment)
+        while assignment and time.monotonic() < deadline:
+            messages = consumer.consume(num_messages=1000, timeout=0.5)
+            for msg in messages:
+                if msg.error():
+                    if msg.error().code() != KafkaError._PARTITION_EOF:
+                        logger.error(f"Changelog restore error: {msg.error()}")
+                    continue
+                apply(msg)
+                applied += 1
+            if not messages:
+                # Positions (not message offsets) also step over transaction markers
+                current = consumer.position(assignment)
+                if all(tp.offset >= end_offsets[tp.partition] for tp in current):
+                    break
+        for tp in consumer.position(assignment):
+            if tp.offset >= 0:
+                positions[tp.partition] = tp.offset
+        return positions, applied
+    finally:
+        consumer.close()
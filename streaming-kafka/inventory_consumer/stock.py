@@ -0,0 +1,149 @@
+"""
+Deterministic stock model for InventoryConsumer
+Stock is tracked per (partition, item), so the outcome of an order depends
+only on the orders before it in the same partition, never on how
+partitions interleave. Initial levels come from a seed, and restocking is
+tied to partition offsets rather than wall-clock time, so replaying the
+same offsets always gives the same reservations.
+"""
+import random
+import threading
+from itertools import accumulate
+
+
+class StockLevel:
+    """Stock of one item in one partition, as of a partition offset"""
+
+    __slots__ = ('level', 'as_of_offset')
+
+    def __init__(self, level, as_of_offset):
+        self.level = level
+        self.as_of_offset = as_of_offset
+
+
+class StockModel:
+    def __init__(self, seed=42, initial_min=50, initial_max=150, restock_every=100, restock_qty=36):
+        """
+        Args:
+            seed: Seed for initial stock levels
+            initial_min: Lowest initial level per (partition, item)
+            initial_max: Highest initial level per (partition, item)
+            restock_every: Add restock_qty of every item once per this many partition offsets
+            restock_qty: Units added per restock (0 disables restocking)
+        """
+        if restock_qty and restock_every <= 0:
+            raise ValueError(f"restock_every must be positive to restock, got {restock_every}")
+        self.seed = seed
+        self.initial_min = initial_min
+        self.initial_max = initial_max
+        self.restock_every = restock_every
+        self.restock_qty = restock_qty
+        self.levels = {}  # (partition, item) -> StockLevel
+        self.lock = threading.Lock()
+
+    def _initial(self, partition, item):
+        return random.Random(f"{self.seed}:{partition}:{item}").randint(self.initial_min, self.initial_max)
+
+    def _level_at(self, partition, item, offset):
+        """StockLevel for a key with restocks up to offset applied"""
+        key = (partition, item)
+        stock = self.levels.get(key)
+        if stock is None:
+            stock = StockLevel(self._initial(partition, item), 0)
+            self.levels[key] = stock
+        if self.restock_qty and offset > stock.as_of_offset:
+            restocks = offset // self.restock_every - stock.as_of_offset // self.restock_every
+            stock.level += restocks * self.restock_qty
+            stock.as_of_offset = offset
+        return stock
+
+    def reserve(self, partition, item, quantity, offset):
+        """
+        Try to take quantity of item for the order at partition/offset
+
+        Returns:
+            (success, remaining level)
+        """
+        with self.lock:
+            stock = self._level_at(partition, item, offset)
+            if stock.level >= quantity:
+                stock.level -= quantity
+                return True, stock.level
+            return False, stock.level
+
+    def reserve_batch(self, orders):
+        """
+        Apply a whole batch of orders, grouped per (partition, item)
+
+        Args:
+            orders: [(partition, item, quantity, offset)] in consume order
+
+        Returns:
+            [(success, remaining)] in the same order as orders; identical
+            to calling reserve() on each order in turn
+        """
+        groups = {}
+        for index, (partition, item, quantity, offset) in enumerate(orders):
+            groups.setdefault((partition, item), []).append(index)
+
+        results = [None] * len(orders)
+        with self.lock:
+            for (partition, item), indexes in groups.items():
+                quantities = [orders[i][2] for i in indexes]
+                offsets = [orders[i][3] for i in indexes]
+                first = self._level_at(partition, item, offsets[0])
+                base_level = first.level
+                as_of = first.as_of_offset
+
+                if base_level >= sum(quantities):
+                    # Fast path: the stock on hand covers every order in the group,
+                    # so all succeed and remaining levels are one prefix sum
+                    if self.restock_qty:
+                        every = self.restock_every
+                        base_restocks = as_of // every
+                        restocked = [(max(o, as_of) // every - base_restocks) * self.restock_qty
+                                     for o in offsets]
+                    else:
+                        restocked = [0] * len(offsets)
+                    for i, taken, added in zip(indexes, accumulate(quantities), restocked):
+                        results[i] = (True, base_level - taken + added)
+                    first.level = results[indexes[-1]][1]
+                    first.as_of_offset = max(as_of, offsets[-1])
+                else:
+                    # Stock runs short inside the batch: decide order by order
+                    for i, quantity, offset in zip(indexes, quantities, offsets):
+                        stock = self._level_at(partition, item, offset)
+                        if stock.level >= quantity:
+                            stock.level -= quantity
+                            results[i] = (True, stock.level)
+                        else:
+                            results[i] = (False, stock.level)
+        return results
+
+    def restore(self, partition, item, level, as_of_offset):
+        """
+        Set a key's level from persisted state (checkpoint or changelog record)
+
+        Level only changes on reservations (which are all in the changelog)
+        and on offset-derived restocks, so the newest known (level, offset)
+        of a key is its exact state; older records are ignored.
+        """
+        with self.lock:
+            stock = self.levels.get((partition, item))
+            if stock is None or as_of_offset >= stock.as_of_offset:
+                self.levels[(partition, item)] = StockLevel(level, as_of_offset)
+
+    def reset(self, levels):
+        """Replace every level with an earlier export() (undo of an aborted batch)"""
+        with self.lock:
+            self.levels = {(p, item): StockLevel(level, as_of) for p, item, level, as_of in levels}
+
+    def export(self):
+        """[(partition, item, level, as_of_offset)] for checkpoints"""
+        with self.lock:
+            return [(p, item, s.level, s.as_of_offset) for (p, item), s in self.levels.items()]
+
+    def snapshot(self):
+        """{(partition, item): level} for reporting and tests"""
+        with self.lock:
+            return {key: stock.level for key, stock in self.levels.items()}
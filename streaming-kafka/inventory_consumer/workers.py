@@ -0,0 +1,105 @@
+"""
+Process-parallel consumption for InventoryConsumer
+WORKERS=N runs N consumer processes in one container, each a full member
+of the consumer group. The group coordinator gives each process its own
+partitions, so every partition (and so every key) is still processed in
+offset order and committed by a single owner, while the processes run
+Python on separate cores. Processes beyond the partition count sit idle.
+"""
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+RESTART_DELAY_SECONDS = 5
+STOP_TIMEOUT_SECONDS = 60
+
+
+def worker_environment(index, environ=os.environ):
+    """
+    Settings that must differ between the processes of one container
+
+    Each process gets its own state directory (one SQLite file per
+    process), static member ID, transactional ID and metrics port.
+    """
+    overrides = {}
+    if environ.get('STATE_DIR'):
+        overrides['STATE_DIR'] = os.path.join(environ['STATE_DIR'], f"worker-{index}")
+    if environ.get('GROUP_INSTANCE_ID'):
+        overrides['GROUP_INSTANCE_ID'] = f"{environ['GROUP_INSTANCE_ID']}-{index}"
+    transactional_id = environ.get('TRANSACTIONAL_ID') or f"inventory-consumer-{socket.gethostname()}"
+    overrides['TRANSACTIONAL_ID'] = f"{transactional_id}-{index}"
+    metrics_port = int(environ.get('METRICS_PORT', '0'))
+    if metrics_port:
+        overrides['METRICS_PORT'] = str(metrics_port + index)
+    return overrides
+
+
+def _run_worker(target, overrides):
+    os.environ.update(overrides)
+    target()
+
+
+class ConsumerProcesses:
+    """Starts the consumer processes and restarts any that exit while running"""
+
+    def __init__(self, target, num_workers):
+        """
+        Args:
+            target: Module-level function that runs one consumer until it is
+                    stopped (SIGTERM); called in each process
+            num_workers: Number of consumer processes
+        """
+        self.target = target
+        self.num_workers = num_workers
+        # Fresh interpreters: librdkafka threads and sockets must not be inherited
+        self.context = multiprocessing.get_context('spawn')
+        self.processes = {}
+        self.running = True
+
+    def _start(self, index):
+        process = self.context.Process(
+            target=_run_worker,
+            args=(self.target, worker_environment(index)),
+            name=f"inventory-worker-{index}"
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Started worker {index} (pid {process.pid})")
+
+    def run(self):
+        """Supervise the processes until running is cleared, then stop them"""
+        for index in range(self.num_workers):
+            self._start(index)
+        try:
+            while self.running:
+                sentinels = [process.sentinel for process in self.processes.values()]
+                multiprocessing.connection.wait(sentinels, timeout=1.0)
+                for index, process in list(self.processes.items()):
+                    if process.is_alive() or not self.running:
+                        continue
+                    logger.error(f"Worker {index} exited with code {process.exitcode}, "
+                                 f"restarting in {RESTART_DELAY_SECONDS}s")
+                    time.sleep(RESTART_DELAY_SECONDS)
+                    if self.running:
+                        self._start(index)
+        finally:
+            self.stop()
+
+    def stop(self):
+        """SIGTERM every process (each commits and closes), then wait for them"""
+        self.running = False
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + STOP_TIMEOUT_SECONDS
+        for index, process in self.processes.items():
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.error(f"Worker {index} did not stop, killing it")
+                process.kill()
+                process.join()
@@ -6,10 +6,13 @@ import time
 
 sys.path.append('/app/common')
 from ids import generate_order_id, generate_event_id, current_timestamp
+from instrumentation import instrument_flask
 
+from envelope import EnvelopeBuilder
 from producer import OrderProducer
 
 app = Flask(__name__)
+instrument_flask(app, 'kafka_order_producer')  # GET /metrics, request latency per route
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -19,6 +22,7 @@ logger = logging.getLogger(__name__)
 
 # Initialize producer
 producer = OrderProducer()
+envelope_builder = EnvelopeBuilder(producer.codec)
 
 
 @app.route('/health', methods=['GET'])
@@ -98,45 +102,25 @@ def create_batch_orders():
         if len(orders) > 1000:
             return jsonify({"error": "Batch size limited to 1000 orders"}), 400
         
-        # Create events for all orders
-        events = []
-        order_ids = []
-        
-        for order_data in orders:
-            if 'user_id' not in order_data or 'item' not in order_data:
-                continue
-            
-            order_id = generate_order_id()
-            event_id = generate_event_id()
-            timestamp = current_timestamp()
-            
-            event = {
-                "event_id": event_id,
-                "event_type": "OrderPlaced",
-                "order_id": order_id,
-                "timestamp": timestamp,
-                "payload": {
-                    "user_id": order_data['user_id'],
-                    "item": order_data['item'],
-                    "quantity": order_data.get('quantity', 1)
-                }
-            }
-            
-            events.append(event)
-            order_ids.append(order_id)
+        # Build serialized events for all valid orders in one pass
+        valid_orders = [
+            order_data for order_data in orders
+            if 'user_id' in order_data and 'item' in order_data
+        ]
+        order_ids, records = envelope_builder.build_order_placed(valid_orders)
         
         # Produce batch to Kafka
-        if not producer.produce_batch(events):
-            logger.error(f"Failed to produce batch of {len(events)} events")
+        if not producer.produce_records(records):
+            logger.error(f"Failed to produce batch of {len(records)} events")
             return jsonify({"error": "Failed to publish events"}), 500
         
-        logger.info(f"Batch of {len(events)} orders published to Kafka")
+        logger.info(f"Batch of {len(records)} orders published to Kafka")
         
         # Return 202 Accepted
         return jsonify({
             "status": "accepted",
-            "message": f"{len(events)} orders received and published to Kafka",
-            "order_count": len(events),
+            "message": f"{len(records)} orders received and published to Kafka",
+            "order_count": len(records),
             "order_ids": order_ids[:10]  # Return first 10 IDs
         }), 202
         
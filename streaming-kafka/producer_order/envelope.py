@@ -0,0 +1,102 @@
+"""
+Batch envelope builder for OrderPlaced events
+Builds pre-serialized Kafka records for a whole batch of orders
+"""
+import json
+import sys
+
+sys.path.append('/app/common')
+from ids import generate_event_ids, current_timestamp_ms, format_timestamp
+from codec import JsonCodec
+
+# C-accelerated string escaper used internally by json.dumps
+_quote = json.encoder.encode_basestring_ascii
+
+# Same key order and separators as json.dumps(event) so consumers see identical bytes
+ORDER_PLACED_TEMPLATE = (
+    '{"event_id": "%s", "event_type": "OrderPlaced", "order_id": "%s", '
+    '"timestamp": "%s", "payload": {"user_id": %s, "item": %s, "quantity": %s}}'
+)
+
+
+def _encode_value(value):
+    """JSON-encode a scalar payload value"""
+    if type(value) is str:
+        return _quote(value)
+    if type(value) is int:
+        return str(value)
+    return json.dumps(value)
+
+
+class TimestampClock:
+    """ISO-8601 UTC timestamps formatted at most once per millisecond tick"""
+
+    def __init__(self):
+        self._last_ms = -1
+        self._value = ''
+
+    def now(self):
+        """Return the current timestamp like '2026-02-10T14:30:00.123000Z'"""
+        ms = current_timestamp_ms()
+        if ms != self._last_ms:
+            self._value = format_timestamp(ms)
+            self._last_ms = ms
+        return self._value
+
+
+class EnvelopeBuilder:
+    """Builds OrderPlaced envelopes for a batch of orders in one pass"""
+
+    def __init__(self, codec=None):
+        self.clock = TimestampClock()
+        self.codec = codec or JsonCodec()
+
+    def build_order_placed(self, orders):
+        """
+        Build serialized OrderPlaced records
+
+        Args:
+            orders: List of validated order dicts (user_id, item, optional quantity)
+
+        Returns:
+            (order_ids, records) where records is a list of (key, value) bytes
+        """
+        n = len(orders)
+        if n == 0:
+            return [], []
+
+        ids = generate_event_ids(2 * n)
+        order_ids = ids[:n]
+        event_ids = ids[n:]
+        timestamp = self.clock.now()
+
+        if self.codec.name != JsonCodec.name:
+            records = [
+                (order_id.encode('ascii'), self.codec.encode({
+                    "event_id": event_id,
+                    "event_type": "OrderPlaced",
+                    "order_id": order_id,
+                    "timestamp": timestamp,
+                    "payload": {
+                        "user_id": order['user_id'],
+                        "item": order['item'],
+                        "quantity": order.get('quantity', 1)
+                    }
+                }))
+                for order_id, event_id, order in zip(order_ids, event_ids, orders)
+            ]
+            return order_ids, records
+
+        records = []
+        for order_id, event_id, order in zip(order_ids, event_ids, orders):
+            value = ORDER_PLACED_TEMPLATE % (
+                event_id,
+                order_id,
+                timestamp,
+                _encode_value(order['user_id']),
+                _encode_value(order['item']),
+                _encode_value(order.get('quantity', 1)),
+            )
+            records.append((order_id.encode('ascii'), value.encode('utf-8')))
+
+        return order_ids, records
@@ -3,9 +3,13 @@ Kafka Producer for OrderService
 Publishes order events to Kafka
 """
 from confluent_kafka import Producer
-import json
 import logging
 import os
+import sys
+
+sys.path.append('/app/common')
+from codec import get_codec, kafka_headers
+from instrumentation import publish_errors, publish_latency
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +18,8 @@ class OrderProducer:
     def __init__(self):
         self.kafka_broker = os.getenv('KAFKA_BROKER', 'kafka:9092')
         self.topic = 'order-events'
+        self.codec = get_codec()  # EVENT_CODEC=json|binary
+        self.headers = kafka_headers(self.codec)
         
         # Producer configuration
         self.config = {
@@ -25,13 +31,21 @@ class OrderProducer:
         }
         
         self.producer = Producer(self.config)
-        logger.info(f"Kafka producer initialized: {self.kafka_broker}")
+        
+        # Produce-to-delivery latency, from the delivery reports
+        self.publish_latency = publish_latency('kafka_order_producer', self.topic)
+        self.publish_errors = publish_errors('kafka_order_producer', self.topic)
+        logger.info(f"Kafka producer initialized: {self.kafka_broker} (codec: {self.codec.name})")
     
     def delivery_callback(self, err, msg):
         """Callback for message delivery reports"""
         if err:
+            self.publish_errors.inc()
             logger.error(f"Message delivery failed: {err}")
         else:
+            latency = msg.latency()
+            if latency is not None:
+                self.publish_latency.observe(latency)
             logger.info(f"Message delivered to {msg.topic()} [{msg.partition()}] @ offset {msg.offset()}")
     
     def produce_event(self, event):
@@ -42,8 +56,8 @@ class OrderProducer:
             event: Dictionary containing event data
         """
         try:
-            # Convert event to JSON
-            value = json.dumps(event).encode('utf-8')
+            # Serialize event with the configured codec
+            value = self.codec.encode(event)
             key = event.get('order_id', '').encode('utf-8')
             
             # Produce message
@@ -51,6 +65,7 @@ class OrderProducer:
                 topic=self.topic,
                 key=key,
                 value=value,
+                headers=self.headers,
                 callback=self.delivery_callback
             )
             
@@ -71,21 +86,37 @@ class OrderProducer:
             events: List of event dictionaries
         """
         try:
-            for event in events:
-                value = json.dumps(event).encode('utf-8')
-                key = event.get('order_id', '').encode('utf-8')
-                
+            records = [
+                (event.get('order_id', '').encode('utf-8'), self.codec.encode(event))
+                for event in events
+            ]
+        except Exception as e:
+            logger.error(f"Error serializing batch: {e}")
+            return False
+
+        return self.produce_records(records)
+    
+    def produce_records(self, records):
+        """
+        Produce pre-serialized records in batch
+        
+        Args:
+            records: List of (key, value) byte tuples encoded with self.codec
+        """
+        try:
+            for key, value in records:
                 self.producer.produce(
                     topic=self.topic,
                     key=key,
                     value=value,
+                    headers=self.headers,
                     callback=self.delivery_callback
                 )
             
             # Wait for all messages to be delivered
             self.producer.flush()
             
-            logger.info(f"Batch of {len(events)} events produced")
+            logger.info(f"Batch of {len(records)} events produced")
             return True
             
         except Exception as e:
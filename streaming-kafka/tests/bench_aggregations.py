@@ -0,0 +1,162 @@
+"""
+Windowed Aggregation Benchmark
+Feeds OrderPlaced events with a skewed user_id distribution through the
+analytics windows (1m tumbling, 5m/1m and 1h/5m hopping, grouped by item
+and user_id) and compares them with exact per-user counters for the same
+windows:
+  - cost per event and per query as distinct users grow to 1M
+  - memory held by the aggregations (tracemalloc)
+  - how many of the exact top-10 users the sketches report
+Runs locally, no Kafka required.
+"""
+import gc
+import heapq
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from operator import itemgetter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'analytics_consumer'))
+
+from windows import HoppingWindow, parse_windows
+
+NUM_EVENTS = 1_000_000
+EVENTS_PER_SECOND = 200  # Simulated event time: 1M events span ~83 minutes
+USER_COUNTS = [1_000, 100_000, 1_000_000]
+WINDOWS = '1m,5m/1m,1h/5m'
+GROUP_BY = ('item', 'user_id')
+TOP_K = 10
+SKETCH_SIZE = 100
+QUERIES = 20
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+
+
+class ExactWindow:
+    """Same panes as HoppingWindow, but an exact dict of counts per key"""
+
+    def __init__(self, name, size, hop):
+        self.name = name
+        self.hop = hop
+        self.num_panes = int(size // hop)
+        self.panes = {}  # pane index -> {group_key: {value: count}}
+        self.head = None
+
+    def add(self, event_type, timestamp, keys):
+        index = int(timestamp // self.hop)
+        if self.head is None or index > self.head:
+            self.head = index
+            for old in [i for i in self.panes if i < index - self.num_panes]:
+                del self.panes[old]
+        pane = self.panes.setdefault(index, {key: {} for key in GROUP_BY})
+        for key in GROUP_BY:
+            counts = pane[key]
+            counts[keys[key]] = counts.get(keys[key], 0) + 1
+
+    def top(self, key):
+        merged = {}
+        for index in range(self.head - self.num_panes, self.head):
+            for value, count in self.panes.get(index, {}).get(key, {}).items():
+                merged[value] = merged.get(value, 0) + count
+        return heapq.nlargest(TOP_K, merged.items(), key=itemgetter(1))
+
+
+def make_events(num_users):
+    """Zipf-like user popularity: a few heavy users, a long tail of rare ones"""
+    rng = random.Random(num_users)
+    events = []
+    for i in range(NUM_EVENTS):
+        user = int(rng.paretovariate(0.8)) % num_users if rng.random() < 0.5 else rng.randrange(num_users)
+        events.append((1_700_000_000 + i / EVENTS_PER_SECOND,
+                       {'item': ITEMS[i % 5], 'user_id': f"user_{user}"}))
+    return events
+
+
+def run(events, build, query):
+    windows = build()
+    start = time.perf_counter()
+    for timestamp, payload in events:
+        for window in windows:
+            window.add('OrderPlaced', timestamp, payload)
+    add_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(QUERIES):
+        tops = [query(window) for window in windows]
+    query_seconds = time.perf_counter() - start
+
+    del windows
+    gc.collect()
+    tracemalloc.start()
+    windows = build()
+    for timestamp, payload in events:
+        for window in windows:
+            window.add('OrderPlaced', timestamp, payload)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "add_us": round(add_seconds / len(events) * 1e6, 2),
+        "query_ms": round(query_seconds / QUERIES * 1000, 2),
+        "memory_mb": round(memory / 1e6, 2),
+    }, tops
+
+
+def run_benchmark():
+    print("Starting Windowed Aggregation Benchmark")
+    print("="*60)
+    print(f"{NUM_EVENTS:,} events, windows {WINDOWS}, sketch size {SKETCH_SIZE}, top {TOP_K}\n")
+
+    specs = parse_windows(WINDOWS)
+    results = []
+    for num_users in USER_COUNTS:
+        events = make_events(num_users)
+        sketch, sketch_tops = run(
+            events,
+            lambda: [HoppingWindow(name, size, hop, GROUP_BY, SKETCH_SIZE) for name, size, hop in specs],
+            lambda window: window.query(TOP_K)['last']['top']['user_id']
+        )
+        exact, exact_tops = run(
+            events,
+            lambda: [ExactWindow(name, size, hop) for name, size, hop in specs],
+            lambda window: window.top('user_id')
+        )
+        recall = [len({v for v, _ in s} & {v for v, _ in e}) / max(len(e), 1)
+                  for s, e in zip(sketch_tops, exact_tops)]
+        del events
+        results.append({
+            "users": num_users,
+            "sketch": sketch,
+            "exact": exact,
+            "top_k_recall": round(min(recall), 2),
+        })
+
+    print(f"{'Users':>9} | {'Counters':<8} | {'Add (us)':>8} | {'Query (ms)':>10} | {'Memory (MB)':>11} | {'Top-10 recall':>13}")
+    print("-" * 75)
+    for r in results:
+        for name in ('exact', 'sketch'):
+            m = r[name]
+            recall = f"{r['top_k_recall']:.0%}" if name == 'sketch' else ''
+            print(f"{r['users']:>9,} | {name:<8} | {m['add_us']:>8.2f} | {m['query_ms']:>10.2f} | "
+                  f"{m['memory_mb']:>11.2f} | {recall:>13}")
+    print("="*60)
+
+    query_ms = [r['sketch']['query_ms'] for r in results]
+    print(f"✓ Sketch query {min(query_ms)}-{max(query_ms)} ms from "
+          f"{USER_COUNTS[0]:,} to {USER_COUNTS[-1]:,} users")
+    recall_ok = all(r['top_k_recall'] >= 0.9 for r in results)
+    print(f"{'✓' if recall_ok else '✗'} "
+          f"Sketches find at least 90% of the exact top-{TOP_K} users in every window")
+
+    with open('aggregation_bench_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to aggregation_bench_results.json")
+    return recall_ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run_benchmark() else 1)
@@ -0,0 +1,161 @@
+"""
+Analytics Batch Processing Benchmark
+Replays 10,000 encoded events (5,000 orders and their reservations) through the
+AnalyticsConsumer processing paths:
+  - per message: decode_event() + MetricsCalculator.add_event()
+  - batched: decode_events() + MetricsCalculator.add_events() at several batch sizes,
+    with NumPy bucket histograms when installed and the pure-Python fallback
+  - both paths give the same counts, windows, top items and latency percentiles
+Runs locally, no Kafka required. Offset commits are not included: the per-message
+path also pays one synchronous commit per event on a real broker.
+"""
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'analytics_consumer'))
+
+from codec import decode_event, decode_events
+from ids import format_timestamp
+from metrics import MetricsCalculator
+import windows
+from windows import parse_windows
+
+NUM_ORDERS = 5_000
+ORDERS_PER_SECOND = 50
+NUM_USERS = 500
+BATCH_SIZES = [100, 500, 2000]
+REPEATS = 5
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+
+logging.disable(logging.CRITICAL)
+
+
+def make_messages():
+    """JSON bodies in log order: each order followed by its reservation 20-40 ms later"""
+    rng = random.Random(3)
+    start_ms = 1_700_000_000_000
+    messages = []
+    for i in range(NUM_ORDERS):
+        placed_ms = start_ms + i * 1000 // ORDERS_PER_SECOND
+        order_id = f"order_{i}"
+        messages.append(json.dumps({
+            "event_type": "OrderPlaced", "order_id": order_id,
+            "timestamp": format_timestamp(placed_ms),
+            "payload": {"user_id": f"user_{int(rng.paretovariate(1.2)) % NUM_USERS}",
+                        "item": rng.choice(ITEMS), "quantity": rng.randint(1, 3)}
+        }).encode())
+        messages.append(json.dumps({
+            "event_type": "InventoryReserved" if rng.random() < 0.9 else "InventoryFailed",
+            "order_id": order_id,
+            "timestamp": format_timestamp(placed_ms + rng.randint(20, 40)),
+            "success": True
+        }).encode())
+    return messages
+
+
+def new_metrics():
+    # Event time, so both paths see the same timestamps and windows
+    return MetricsCalculator(time_mode='event', windows=parse_windows('1m,5m/1m,1h/5m'),
+                             group_by=['item', 'user_id'])
+
+
+def run_single(messages):
+    metrics = new_metrics()
+    start = time.perf_counter()
+    for value in messages:
+        event = decode_event(value)
+        metrics.add_event(event.get('event_type'), event.get('timestamp'),
+                          event.get('payload'), event.get('order_id'))
+    return metrics, time.perf_counter() - start
+
+
+def run_batched(messages, batch_size):
+    metrics = new_metrics()
+    start = time.perf_counter()
+    for i in range(0, len(messages), batch_size):
+        events = decode_events(messages[i:i + batch_size])
+        metrics.add_events([event for event in events if isinstance(event, dict)])
+    return metrics, time.perf_counter() - start
+
+
+def best_of(run, *args):
+    """Fastest of REPEATS runs (and the metrics it produced)"""
+    return min((run(*args) for _ in range(REPEATS)), key=lambda r: r[1])
+
+
+def summary(metrics):
+    """Fields that must not depend on the processing path"""
+    m = metrics.get_metrics()
+    return {
+        "counts": [m['total_orders'], m['reserved_orders'], m['failed_orders'], m['orders_per_minute']],
+        "windows": {name: [w['current']['counts'], w['last']['counts'], w['current']['top']['item']]
+                    for name, w in m['windows'].items()},
+        "latency": [m['latency_ms'][k] for k in ('count', 'p50', 'p95', 'p99')],
+        "top_items": m['top']['item'],
+    }
+
+
+def top_users(metrics):
+    return {user for user, _ in metrics.get_metrics()['top']['user_id']}
+
+
+def run_benchmark():
+    print("Starting Analytics Batch Processing Benchmark")
+    print("="*60)
+
+    messages = make_messages()
+    numpy_available = windows.np is not None
+    single, single_s = best_of(run_single, messages)
+    expected = summary(single)
+    rows = [{"path": "per-message", "batch_size": 1, "numpy": False,
+             "events_per_second": round(len(messages) / single_s), "speedup": 1.0, "matches": True}]
+
+    numpy_modes = [True, False] if numpy_available else [False]
+    saved_np = windows.np
+    for use_numpy in numpy_modes:
+        windows.np = saved_np if use_numpy else None
+        for batch_size in BATCH_SIZES:
+            batched, batch_s = best_of(run_batched, messages, batch_size)
+            rows.append({
+                "path": "batched", "batch_size": batch_size, "numpy": use_numpy,
+                "events_per_second": round(len(messages) / batch_s),
+                "speedup": round(single_s / batch_s, 2),
+                "matches": summary(batched) == expected,
+                "top_user_overlap": len(top_users(batched) & top_users(single)),
+            })
+    windows.np = saved_np
+
+    print(f"{'Path':>11} | {'Batch':>5} | {'NumPy':>5} | {'Events/s':>9} | {'Speedup':>7} | {'Same result':>11}")
+    print("-" * 64)
+    for r in rows:
+        print(f"{r['path']:>11} | {r['batch_size']:>5} | {str(r['numpy']):>5} | "
+              f"{r['events_per_second']:>9,} | {r['speedup']:>6.2f}x | {str(r['matches']):>11}")
+    print("="*60)
+    if not numpy_available:
+        print("  NumPy not installed: batches use the pure-Python bucket histogram\n")
+
+    batched_rows = rows[1:]
+    same = all(r['matches'] for r in batched_rows)
+    print(f"{'✓' if same else '✗'} Batched counts, windows, top items and latency match per-message processing")
+    overlap = min(r['top_user_overlap'] for r in batched_rows)
+    print(f"{'✓' if overlap >= 8 else '✗'} Top-10 users agree on {overlap}/10 (Space-Saving estimates)")
+    best = max(batched_rows, key=lambda r: r['speedup'])
+    print(f"{'✓' if best['speedup'] > 1 else '✗'} Best batch: {best['batch_size']} "
+          f"({best['speedup']}x, {best['events_per_second']:,} events/s)")
+
+    results = {"events": len(messages), "numpy_available": numpy_available, "runs": rows}
+    with open('analytics_batch_bench_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to analytics_batch_bench_results.json")
+    return same and overlap >= 8 and best['speedup'] > 1
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run_benchmark() else 1)
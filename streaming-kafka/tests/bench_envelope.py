@@ -0,0 +1,117 @@
+"""
+Envelope Construction Microbenchmark
+Compares per-event CPU cost of the original per-order envelope path
+(generate_order_id + generate_event_id + current_timestamp + json.dumps)
+against the batch EnvelopeBuilder used by /orders/batch.
+Runs locally, no Kafka required.
+"""
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'producer_order'))
+
+from ids import generate_order_id, generate_event_id, current_timestamp
+from envelope import EnvelopeBuilder
+
+BATCH_SIZE = 1000
+NUM_BATCHES = 200
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+
+
+def make_orders():
+    """Same order shape as produce_10k.py"""
+    return [
+        {"user_id": f"user_{i}", "item": ITEMS[i % 5], "quantity": (i % 3) + 1}
+        for i in range(BATCH_SIZE)
+    ]
+
+
+def build_per_event(orders):
+    """Original create_batch_orders loop plus OrderProducer serialization"""
+    records = []
+    for order_data in orders:
+        order_id = generate_order_id()
+        event = {
+            "event_id": generate_event_id(),
+            "event_type": "OrderPlaced",
+            "order_id": order_id,
+            "timestamp": current_timestamp(),
+            "payload": {
+                "user_id": order_data['user_id'],
+                "item": order_data['item'],
+                "quantity": order_data.get('quantity', 1)
+            }
+        }
+        records.append((order_id.encode('utf-8'), json.dumps(event).encode('utf-8')))
+    return records
+
+
+def time_path(build):
+    """Return best-of-3 nanoseconds per event for a build function"""
+    orders = make_orders()
+    best = None
+    for _ in range(3):
+        start = time.process_time_ns()
+        for _ in range(NUM_BATCHES):
+            build(orders)
+        elapsed = time.process_time_ns() - start
+        per_event = elapsed / (NUM_BATCHES * BATCH_SIZE)
+        best = per_event if best is None else min(best, per_event)
+    return best
+
+
+def check_equivalent(builder):
+    """Builder output must decode to the same envelope shape as json.dumps"""
+    orders = make_orders()[:5]
+    before = build_per_event(orders)
+    _, after = builder.build_order_placed(orders)
+    for (_, old_value), (key, new_value) in zip(before, after):
+        old_event = json.loads(old_value)
+        new_event = json.loads(new_value)
+        assert list(old_event) == list(new_event)
+        assert old_event['payload'] == new_event['payload']
+        assert new_event['order_id'].encode('ascii') == key
+        assert len(new_event['event_id']) == 36
+
+
+def run_benchmark():
+    print("Starting Envelope Construction Benchmark")
+    print("="*60)
+    print(f"Batches: {NUM_BATCHES} x {BATCH_SIZE} events\n")
+
+    builder = EnvelopeBuilder()
+    check_equivalent(builder)
+    print("✓ Builder output matches original envelope layout")
+
+    before_ns = time_path(build_per_event)
+    after_ns = time_path(lambda orders: builder.build_order_placed(orders))
+
+    print("\n" + "="*60)
+    print("ENVELOPE BENCHMARK RESULTS (CPU time per event)")
+    print("="*60)
+    print(f"Per-event path:  {before_ns / 1000:.2f} µs/event")
+    print(f"Batch builder:   {after_ns / 1000:.2f} µs/event")
+    print(f"Speedup:         {before_ns / after_ns:.2f}x")
+    print("="*60)
+
+    results = {
+        "test": "envelope_microbenchmark",
+        "batch_size": BATCH_SIZE,
+        "num_batches": NUM_BATCHES,
+        "per_event_ns_before": round(before_ns, 1),
+        "per_event_ns_after": round(after_ns, 1),
+        "speedup": round(before_ns / after_ns, 2)
+    }
+
+    with open('envelope_bench_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n✓ Results exported to envelope_bench_results.json")
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,154 @@
+"""
+Latency Sketch Benchmark
+Checks the analytics latency join and DDSketch percentiles:
+  - p50/p95/p99 of 1M skewed latencies vs exact percentiles from a sorted list
+  - memory of the sketch vs keeping every sample
+  - merging per-partition sketches gives the same percentiles as one sketch
+  - the join matches events arriving in either order and keeps its
+    pending map bounded when partners never arrive
+Runs locally, no Kafka required.
+"""
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'analytics_consumer'))
+
+from latency import LatencyJoin
+from sketches import DDSketch
+
+NUM_SAMPLES = 1_000_000
+PARTITIONS = 3
+RELATIVE_ACCURACY = 0.01
+QUANTILES = [0.5, 0.95, 0.99]
+JOIN_ORDERS = 200_000
+MAX_PENDING = 10_000
+
+
+def make_latencies():
+    """Log-normal latencies in ms (median ~20 ms) with a 1% slow tail"""
+    rng = random.Random(11)
+    return [rng.lognormvariate(3, 0.6) * (20 if rng.random() < 0.01 else 1) for _ in range(NUM_SAMPLES)]
+
+
+def exact_quantile(ordered, q):
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def measure_memory(build):
+    gc.collect()
+    tracemalloc.start()
+    state = build()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+    return memory
+
+
+def check_accuracy(latencies):
+    sketch = DDSketch(RELATIVE_ACCURACY)
+    start = time.perf_counter()
+    for value in latencies:
+        sketch.add(value)
+    add_ns = (time.perf_counter() - start) / len(latencies) * 1e9
+
+    ordered = sorted(latencies)
+    rows = []
+    for q in QUANTILES:
+        exact = exact_quantile(ordered, q)
+        estimate = sketch.quantile(q)
+        rows.append({"quantile": q, "exact_ms": round(exact, 3), "sketch_ms": round(estimate, 3),
+                     "relative_error": round(abs(estimate - exact) / exact, 5)})
+
+    def build_sketch():
+        s = DDSketch(RELATIVE_ACCURACY)
+        for value in latencies:
+            s.add(value)
+        return s
+
+    return rows, {
+        "add_ns": round(add_ns, 1),
+        "bins": len(sketch.bins),
+        "sketch_kb": round(measure_memory(build_sketch) / 1024, 1),
+        "samples_kb": round(measure_memory(lambda: [float(v) for v in latencies]) / 1024, 1),
+    }
+
+
+def check_merge(latencies):
+    whole = DDSketch(RELATIVE_ACCURACY)
+    parts = [DDSketch(RELATIVE_ACCURACY) for _ in range(PARTITIONS)]
+    for i, value in enumerate(latencies):
+        whole.add(value)
+        parts[i % PARTITIONS].add(value)
+    merged = DDSketch(RELATIVE_ACCURACY)
+    for part in parts:
+        merged.merge(part)
+    return all(merged.quantile(q) == whole.quantile(q) for q in QUANTILES)
+
+
+def check_join():
+    """Half the pairs arrive reservation-first; 10% of orders never get one"""
+    rng = random.Random(5)
+    join = LatencyJoin(max_pending=MAX_PENDING, pending_ttl_seconds=0)
+    events = []
+    for i in range(JOIN_ORDERS):
+        placed_at = 1_700_000_000 + i / 1000
+        pair = [('OrderPlaced', f"order_{i}", placed_at)]
+        if rng.random() < 0.9:
+            pair.append(('InventoryReserved', f"order_{i}", placed_at + 0.025))
+        if rng.random() < 0.5:
+            pair.reverse()
+        events.extend(pair)
+    max_pending = 0
+    for event_type, order_id, timestamp in events:
+        join.add(event_type, order_id, timestamp)
+        max_pending = max(max_pending, len(join.pending))
+    return {
+        "orders": JOIN_ORDERS,
+        "matched": join.matched,
+        "evicted_unmatched": join.evicted,
+        "max_pending": max_pending,
+        "p50_ms": join.percentiles()['p50'],
+    }
+
+
+def run_benchmark():
+    print("Starting Latency Sketch Benchmark")
+    print("="*60)
+
+    latencies = make_latencies()
+    rows, cost = check_accuracy(latencies)
+    merge_ok = check_merge(latencies)
+    join = check_join()
+
+    print(f"{'Quantile':>8} | {'Exact (ms)':>10} | {'Sketch (ms)':>11} | {'Rel. error':>10}")
+    print("-" * 50)
+    for r in rows:
+        print(f"{r['quantile']:>8} | {r['exact_ms']:>10.3f} | {r['sketch_ms']:>11.3f} | {r['relative_error']:>10.4%}")
+    print("="*60)
+    print(f"  Add: {cost['add_ns']} ns/sample, {cost['bins']} bins")
+    print(f"  Memory: sketch {cost['sketch_kb']} KB vs {cost['samples_kb']} KB for {NUM_SAMPLES:,} samples\n")
+
+    accurate = all(r['relative_error'] <= RELATIVE_ACCURACY for r in rows)
+    print(f"{'✓' if accurate else '✗'} Percentiles within {RELATIVE_ACCURACY:.0%} relative error")
+    print(f"{'✓' if merge_ok else '✗'} Merged per-partition sketches match a single sketch")
+    joined_ok = join['max_pending'] <= MAX_PENDING and join['p50_ms'] is not None and abs(join['p50_ms'] - 25) < 0.5
+    print(f"{'✓' if joined_ok else '✗'} Join matched {join['matched']:,} of {JOIN_ORDERS:,} orders in either "
+          f"arrival order (pending peak {join['max_pending']:,}, evicted {join['evicted_unmatched']:,})")
+
+    results = {"quantiles": rows, "cost": cost, "merge_matches": merge_ok, "join": join}
+    with open('latency_bench_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to latency_bench_results.json")
+    return accurate and merge_ok and joined_ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run_benchmark() else 1)
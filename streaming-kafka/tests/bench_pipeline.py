@@ -0,0 +1,187 @@
+"""
+End-to-End Pipeline Benchmark
+Runs the whole streaming pipeline in one process:
+  OrderProducer -> order-events -> InventoryConsumer -> inventory-events -> AnalyticsConsumer
+and measures how long it takes until analytics has counted every order and
+its reservation outcome, for several consumer configurations.
+Uses the in-process broker stand-in (local_kafka.py) unless KAFKA_BROKER
+points at a real broker, so it needs neither docker nor network access and
+repeated runs are comparable.
+"""
+import importlib.util
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'producer_order'))
+
+KAFKA_BROKER = os.getenv('KAFKA_BROKER', 'local')
+if KAFKA_BROKER == 'local':
+    import local_kafka
+    local_kafka.install()
+
+from confluent_kafka.admin import AdminClient, NewTopic
+
+PARTITIONS = 3
+NUM_ORDERS = 20000
+PRODUCE_BATCH = 500  # Orders per OrderProducer.produce_records() call, like /orders/batch
+STALL_SECONDS = 30
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+
+# (name, InventoryConsumer env, AnalyticsConsumer env)
+CASES = [
+    ("per message", {'BATCH_SIZE': '1'}, {'BATCH_SIZE': '1'}),
+    ("batched", {'BATCH_SIZE': '500'}, {'BATCH_SIZE': '2000'}),
+]
+
+logging.disable(logging.CRITICAL)
+
+
+def load_service(name, directory):
+    """Import a service's consumer.py under its own module name (both services use consumer.py)"""
+    directory = os.path.join(ROOT, 'streaming-kafka', directory)
+    sys.path.insert(0, directory)
+    try:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(directory, 'consumer.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(directory)
+    return module
+
+
+def create_topics(*topics):
+    admin = AdminClient({'bootstrap.servers': KAFKA_BROKER})
+    futures = admin.create_topics([
+        NewTopic(topic, num_partitions=PARTITIONS, replication_factor=1) for topic in topics
+    ])
+    for future in futures.values():
+        future.result()
+
+
+def start(service):
+    thread = threading.Thread(target=service.start)
+    thread.start()
+    return thread
+
+
+def run_case(name, inventory_env, analytics_env, inventory_module, analytics_module):
+    """Produce NUM_ORDERS through the pipeline and time them until analytics has counted all of them"""
+    from envelope import EnvelopeBuilder
+    from producer import OrderProducer
+
+    run_id = uuid.uuid4().hex[:8]
+    orders_topic, inventory_topic = f"pipeline-orders-{run_id}", f"pipeline-inventory-{run_id}"
+    create_topics(orders_topic, inventory_topic)
+
+    common = {'KAFKA_BROKER': KAFKA_BROKER, 'METRICS_PORT': '0', 'STATE_DIR': ''}
+    os.environ.update({**common, 'GROUP_ID': f"pipeline-inventory-{run_id}", 'INPUT_TOPIC': orders_topic,
+                       'OUTPUT_TOPIC': inventory_topic, **inventory_env})
+    inventory = inventory_module.InventoryConsumer()
+    os.environ.update({**common, 'GROUP_ID': f"pipeline-analytics-{run_id}",
+                       'TOPICS': f"{orders_topic},{inventory_topic}", 'METRICS_HISTORY_FILE': '', **analytics_env})
+    analytics = analytics_module.AnalyticsConsumer()
+
+    producer = OrderProducer()
+    producer.topic = orders_topic
+    builder = EnvelopeBuilder(producer.codec)
+    rng = random.Random(5)
+    orders = [{"user_id": f"user_{rng.randint(0, 99)}", "item": rng.choice(ITEMS), "quantity": 1}
+              for _ in range(NUM_ORDERS)]
+
+    threads = [start(inventory), start(analytics)]
+    start_time = time.time()
+    for i in range(0, NUM_ORDERS, PRODUCE_BATCH):
+        _, records = builder.build_order_placed(orders[i:i + PRODUCE_BATCH])
+        producer.produce_records(records)
+    produce_seconds = time.time() - start_time
+
+    metrics = analytics.metrics
+    last, last_change = -1, time.time()
+    while time.time() - last_change < STALL_SECONDS:
+        outcomes = metrics.reserved_orders + metrics.failed_orders
+        if metrics.total_orders >= NUM_ORDERS and outcomes >= NUM_ORDERS:
+            break
+        if metrics.total_orders + outcomes != last:
+            last, last_change = metrics.total_orders + outcomes, time.time()
+        time.sleep(0.01)
+    seconds = time.time() - start_time
+
+    inventory.running = False
+    analytics.running = False
+    for thread in threads:
+        thread.join(timeout=60)
+    producer.close()
+
+    m = metrics.get_metrics()
+    counted = m['total_orders'] == NUM_ORDERS and m['reserved_orders'] + m['failed_orders'] == NUM_ORDERS
+    return {
+        "case": name,
+        "inventory_env": inventory_env,
+        "analytics_env": analytics_env,
+        "complete": counted,
+        "produce_seconds": round(produce_seconds, 3),
+        "produce_per_second": round(NUM_ORDERS / produce_seconds),
+        "seconds": round(seconds, 3),
+        "orders_per_second": round(NUM_ORDERS / seconds),
+        "messages_per_second": round(3 * NUM_ORDERS / seconds),  # order in, outcome out, both read by analytics
+        "reserved": m['reserved_orders'],
+        "failed": m['failed_orders'],
+        "latency_ms": {k: m['latency_ms'][k] for k in ('p50', 'p95', 'p99', 'max')},
+    }
+
+
+def bench_pipeline():
+    print("Starting End-to-End Pipeline Benchmark")
+    print("="*60)
+    print(f"Broker: {KAFKA_BROKER}, orders: {NUM_ORDERS}, partitions: {PARTITIONS}")
+
+    inventory_module = load_service('inventory_consumer', 'inventory_consumer')
+    analytics_module = load_service('analytics_consumer', 'analytics_consumer')
+
+    work_dir = tempfile.mkdtemp(prefix='pipeline-bench-')
+    cwd = os.getcwd()
+    os.chdir(work_dir)  # metrics_output.json of the analytics runs
+    try:
+        results = []
+        for name, inventory_env, analytics_env in CASES:
+            result = run_case(name, inventory_env, analytics_env, inventory_module, analytics_module)
+            results.append(result)
+            print(f"\n{name}:")
+            print(f"  Produced in {result['produce_seconds']:.2f}s ({result['produce_per_second']:,} orders/s)")
+            print(f"  Counted by analytics after {result['seconds']:.2f}s "
+                  f"({result['orders_per_second']:,} orders/s end to end)")
+            latency = result['latency_ms']
+            print(f"  Order -> outcome latency: p50 {latency['p50']} ms, p99 {latency['p99']} ms")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("="*60)
+    for result in results:
+        mark = '✓' if result['complete'] else '✗'
+        print(f"{mark} {result['case']}: {result['orders_per_second']:,} orders/s "
+              f"({result['reserved']} reserved, {result['failed']} failed)")
+    baseline = results[0]['orders_per_second']
+    for result in results[1:]:
+        print(f"  {result['case']}: {result['orders_per_second'] / max(baseline, 1):.1f}x per message")
+
+    with open('pipeline_bench_results.json', 'w') as f:
+        json.dump({"broker": KAFKA_BROKER, "orders": NUM_ORDERS, "partitions": PARTITIONS,
+                   "cases": results}, f, indent=2)
+
+    print("\n✓ Results exported to pipeline_bench_results.json")
+    return all(result['complete'] for result in results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if bench_pipeline() else 1)
@@ -0,0 +1,130 @@
+"""
+Stock Model Benchmark
+Checks that the InventoryConsumer stock model is deterministic and measures
+its throughput:
+  - per-order reserve() vs. batch reserve_batch() give identical outcomes
+  - a different interleaving of the partitions gives identical outcomes
+  - restock_every=0 is rejected unless restocking is disabled
+  - orders/second for both paths
+Runs locally, no Kafka required.
+"""
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'inventory_consumer'))
+
+from stock import StockModel
+
+NUM_ORDERS = 1_000_000
+PARTITIONS = 3
+BATCH_SIZE = 500
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+
+
+def make_partition_logs():
+    """Per-partition order logs: [(partition, item, quantity, offset)]"""
+    rng = random.Random(7)
+    logs = [[] for _ in range(PARTITIONS)]
+    for _ in range(NUM_ORDERS):
+        p = rng.randrange(PARTITIONS)
+        logs[p].append((p, rng.choice(ITEMS), rng.randint(1, 3), len(logs[p])))
+    return logs
+
+
+def interleave(logs, seed):
+    """Merge partition logs in a random order, keeping each partition's order"""
+    rng = random.Random(seed)
+    positions = [0] * len(logs)
+    merged = []
+    remaining = [p for p in range(len(logs)) if logs[p]]
+    while remaining:
+        p = rng.choice(remaining)
+        merged.append(logs[p][positions[p]])
+        positions[p] += 1
+        if positions[p] == len(logs[p]):
+            remaining.remove(p)
+    return merged
+
+
+def run_sequential(orders):
+    model = StockModel()
+    start = time.perf_counter()
+    outcomes = [model.reserve(*order) for order in orders]
+    return outcomes, time.perf_counter() - start
+
+
+def run_batched(orders):
+    model = StockModel()
+    outcomes = []
+    start = time.perf_counter()
+    for i in range(0, len(orders), BATCH_SIZE):
+        outcomes.extend(model.reserve_batch(orders[i:i + BATCH_SIZE]))
+    return outcomes, time.perf_counter() - start
+
+
+def by_order(orders, outcomes):
+    return dict(zip(((o[0], o[3]) for o in orders), outcomes))
+
+
+def rejects_zero_restock_interval():
+    """restock_every=0 raises ValueError; with restock_qty=0 it is unused"""
+    try:
+        StockModel(restock_every=0)
+    except ValueError:
+        return StockModel(restock_every=0, restock_qty=0).reserve(0, "Pizza", 1, 1000)[0]
+    return False
+
+
+def run_benchmark():
+    print("Starting Stock Model Benchmark")
+    print("="*60)
+
+    logs = make_partition_logs()
+    orders_a = interleave(logs, seed=1)
+    orders_b = interleave(logs, seed=2)
+
+    sequential, sequential_seconds = run_sequential(orders_a)
+    batched, batched_seconds = run_batched(orders_a)
+    reordered, _ = run_batched(orders_b)
+
+    same_batch = sequential == batched
+    same_interleaving = by_order(orders_a, sequential) == by_order(orders_b, reordered)
+    success_rate = sum(1 for ok, _ in sequential if ok) / len(sequential)
+
+    print(f"{'✓' if same_batch else '✗'} reserve_batch() matches per-order reserve() "
+          f"for {NUM_ORDERS:,} orders")
+    print(f"{'✓' if same_interleaving else '✗'} Different partition interleaving gives identical outcomes")
+    rejects_zero = rejects_zero_restock_interval()
+    print(f"{'✓' if rejects_zero else '✗'} restock_every=0 rejected unless restocking is disabled")
+    print(f"  Success rate: {success_rate:.1%}\n")
+
+    results = {
+        "orders": NUM_ORDERS,
+        "batch_size": BATCH_SIZE,
+        "success_rate": round(success_rate, 4),
+        "batch_matches_sequential": same_batch,
+        "interleaving_invariant": same_interleaving,
+        "rejects_zero_restock_interval": rejects_zero,
+        "sequential_orders_per_second": round(NUM_ORDERS / sequential_seconds),
+        "batched_orders_per_second": round(NUM_ORDERS / batched_seconds),
+    }
+
+    print(f"{'Path':<22} | {'Orders/s':>12}")
+    print("-" * 38)
+    print(f"{'reserve() per order':<22} | {results['sequential_orders_per_second']:>12,}")
+    print(f"{'reserve_batch()':<22} | {results['batched_orders_per_second']:>12,}")
+    print("="*60)
+
+    with open('stock_bench_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to stock_bench_results.json")
+    return same_batch and same_interleaving and rejects_zero
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run_benchmark() else 1)
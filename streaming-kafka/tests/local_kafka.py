@@ -0,0 +1,825 @@
+"""
+In-process Kafka stand-in for hermetic benchmarks
+Implements the subset of the confluent_kafka Producer/Consumer interface
+used by OrderProducer, InventoryConsumer and AnalyticsConsumer, backed by
+an in-memory log per partition.
+
+Usage:
+    import local_kafka
+    local_kafka.install()   # registers itself as the confluent_kafka module
+    from consumer import InventoryConsumer
+
+    python local_kafka.py test_analytics_replay.py   # Run a test script against it
+
+Every client whose bootstrap.servers value is the same shares one broker.
+Worker processes started with fork see a copy of the broker as it was.
+"""
+import runpy
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+
+OFFSET_BEGINNING = -2
+OFFSET_END = -1
+OFFSET_STORED = -1000
+OFFSET_INVALID = -1001
+
+TIMESTAMP_NOT_AVAILABLE = 0
+TIMESTAMP_CREATE_TIME = 1
+
+DEFAULT_PARTITIONS = 3
+
+
+class KafkaError:
+    """Error object with the codes the services check for"""
+
+    _PARTITION_EOF = -191
+    _NO_OFFSET = -168
+    _STATE = -172
+    _TIMED_OUT = -185
+    _FENCED = -144
+    UNKNOWN_TOPIC_OR_PART = 3
+    INVALID_TXN_STATE = 48
+
+    def __init__(self, code, reason='', fatal=False, retriable=False, txn_requires_abort=False):
+        self._code = code
+        self._reason = reason
+        self._fatal = fatal
+        self._retriable = retriable
+        self._txn_requires_abort = txn_requires_abort
+
+    def code(self):
+        return self._code
+
+    def name(self):
+        for attr, value in vars(KafkaError).items():
+            if value == self._code and attr.isupper() or (attr.startswith('_') and value == self._code):
+                return attr
+        return str(self._code)
+
+    def str(self):
+        return self._reason or self.name()
+
+    def fatal(self):
+        return self._fatal
+
+    def retriable(self):
+        return self._retriable
+
+    def txn_requires_abort(self):
+        return self._txn_requires_abort
+
+    def __str__(self):
+        return self.str()
+
+    def __repr__(self):
+        return f"KafkaError({self.name()}, {self._reason!r})"
+
+
+class KafkaException(Exception):
+    """Raised by client calls; args[0] is a KafkaError"""
+
+
+class TopicPartition:
+    def __init__(self, topic, partition=-1, offset=OFFSET_INVALID, metadata=None, leader_epoch=None):
+        self.topic = topic
+        self.partition = partition
+        self.offset = offset
+        self.metadata = metadata
+        self.leader_epoch = leader_epoch
+        self.error = None
+
+    def _key(self):
+        return (self.topic, self.partition)
+
+    def __eq__(self, other):
+        return isinstance(other, TopicPartition) and self._key() == other._key()
+
+    def __lt__(self, other):
+        return self._key() < other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"TopicPartition{{topic={self.topic},partition={self.partition},offset={self.offset}}}"
+
+
+class Message:
+    __slots__ = ('_topic', '_partition', '_offset', '_key', '_value', '_headers', '_timestamp', '_error', '_latency')
+
+    def __init__(self, topic, partition, offset, key, value, headers, timestamp, error=None):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._value = value
+        self._headers = headers
+        self._timestamp = timestamp
+        self._error = error
+        self._latency = None
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def headers(self):
+        return self._headers
+
+    def timestamp(self):
+        if self._timestamp is None:
+            return (TIMESTAMP_NOT_AVAILABLE, -1)
+        return (TIMESTAMP_CREATE_TIME, self._timestamp)
+
+    def error(self):
+        return self._error
+
+    def latency(self):
+        return self._latency
+
+    def __len__(self):
+        return len(self._value) if self._value is not None else 0
+
+
+class PartitionMetadata:
+    def __init__(self, partition_id):
+        self.id = partition_id
+        self.leader = 0
+        self.replicas = [0]
+        self.isrs = [0]
+        self.error = None
+
+
+class TopicMetadata:
+    def __init__(self, topic, num_partitions):
+        self.topic = topic
+        self.partitions = {p: PartitionMetadata(p) for p in range(num_partitions)}
+        self.error = None
+
+
+class ClusterMetadata:
+    def __init__(self, topics):
+        self.cluster_id = 'local'
+        self.controller_id = 0
+        self.brokers = {}
+        self.topics = topics
+        self.orig_broker_id = 0
+        self.orig_broker_name = 'local'
+
+
+class GroupMetadata:
+    """Returned by Consumer.consumer_group_metadata()"""
+
+    def __init__(self, group_id):
+        self.group_id = group_id
+
+
+class _Partition:
+    __slots__ = ('messages', 'timestamps')
+
+    def __init__(self):
+        self.messages = []
+        self.timestamps = []
+
+
+class _Group:
+    """Consumer group coordinator state"""
+
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self.committed = {}        # (topic, partition) -> next offset
+        self.members = []          # joined consumers, in join order
+        self.assignment = {}       # consumer -> set of (topic, partition)
+        self.generation = 0
+        self.pending_revoke = set()  # members that must run on_revoke before reassignment
+        self.static_parked = {}    # group.instance.id -> (assignment, expires_at)
+
+
+class LocalBroker:
+    """In-memory topics, committed offsets and consumer group coordination"""
+
+    def __init__(self, default_partitions=DEFAULT_PARTITIONS):
+        self.default_partitions = default_partitions
+        self.topics = {}
+        self.groups = {}
+        self.cond = threading.Condition()
+
+    # -- topics ---------------------------------------------------------
+
+    def create_topic(self, topic, num_partitions=None):
+        with self.cond:
+            if topic not in self.topics:
+                n = num_partitions or self.default_partitions
+                self.topics[topic] = [_Partition() for _ in range(n)]
+            return len(self.topics[topic])
+
+    def partition_count(self, topic):
+        return self.create_topic(topic)
+
+    def partition_for(self, topic, key):
+        n = self.partition_count(topic)
+        if key is None:
+            return None
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        return zlib.crc32(key) % n
+
+    def append_many(self, records):
+        """Append (topic, partition, key, value, headers, timestamp) records atomically"""
+        offsets = []
+        with self.cond:
+            for topic, partition, key, value, headers, timestamp in records:
+                log = self.topics[topic][partition]
+                offset = len(log.messages)
+                log.messages.append(Message(topic, partition, offset, key, value, headers, timestamp))
+                log.timestamps.append(timestamp)
+                offsets.append(offset)
+            self.cond.notify_all()
+        return offsets
+
+    def watermarks(self, topic, partition):
+        with self.cond:
+            return 0, len(self.topics[topic][partition].messages)
+
+    def fetch(self, topic, partition, offset, max_messages):
+        log = self.topics[topic][partition].messages
+        return log[offset:offset + max_messages]
+
+    def offset_for_time(self, topic, partition, timestamp_ms):
+        timestamps = self.topics[topic][partition].timestamps
+        for offset, ts in enumerate(timestamps):
+            if ts >= timestamp_ms:
+                return offset
+        return OFFSET_END
+
+    # -- groups ---------------------------------------------------------
+
+    def group(self, group_id):
+        if group_id not in self.groups:
+            self.groups[group_id] = _Group(group_id)
+        return self.groups[group_id]
+
+    def commit(self, group_id, offsets):
+        with self.cond:
+            group = self.group(group_id)
+            for tp in offsets:
+                if tp.offset >= 0:
+                    group.committed[(tp.topic, tp.partition)] = tp.offset
+
+    def committed(self, group_id, topic, partition):
+        with self.cond:
+            return self.group(group_id).committed.get((topic, partition), OFFSET_INVALID)
+
+    def join(self, consumer):
+        with self.cond:
+            group = self.group(consumer.group_id)
+            instance_id = consumer.instance_id
+            parked = group.static_parked.pop(instance_id, None) if instance_id else None
+            if parked is not None and parked[1] > time.monotonic():
+                # Static member rejoining within session.timeout.ms: no rebalance
+                group.members.append(consumer)
+                group.assignment[consumer] = set(parked[0])
+                consumer._queue_event('assign', sorted(parked[0]))
+                return
+            if parked is not None:
+                self._expire_static(group)
+            group.members.append(consumer)
+            group.assignment[consumer] = set()
+            self._start_rebalance(group)
+
+    def leave(self, consumer):
+        with self.cond:
+            group = self.group(consumer.group_id)
+            if consumer not in group.members:
+                return
+            group.members.remove(consumer)
+            owned = group.assignment.pop(consumer, set())
+            group.pending_revoke.discard(consumer)
+            if consumer.instance_id:
+                # Static members keep their partitions for session.timeout.ms
+                group.static_parked[consumer.instance_id] = (
+                    owned, time.monotonic() + consumer.session_timeout_ms / 1000
+                )
+                return
+            self._start_rebalance(group)
+
+    def _expire_static(self, group):
+        now = time.monotonic()
+        expired = [iid for iid, (_, expires) in group.static_parked.items() if expires <= now]
+        for iid in expired:
+            del group.static_parked[iid]
+        return bool(expired)
+
+    def check_group(self, consumer):
+        """Called from poll(): expire static members whose session ran out"""
+        with self.cond:
+            group = self.group(consumer.group_id)
+            if group.static_parked and self._expire_static(group):
+                self._start_rebalance(group)
+
+    def _subscribed_partitions(self, group):
+        partitions = set()
+        for member in group.members:
+            for topic in member.subscription:
+                for p in range(self.partition_count(topic)):
+                    partitions.add((topic, p))
+        for owned, _ in group.static_parked.values():
+            partitions -= owned
+        return sorted(partitions)
+
+    def _target_assignment(self, group):
+        """Sticky round-robin: keep current owners where possible, balance the rest"""
+        members = sorted(group.members, key=lambda m: m.member_id)
+        if not members:
+            return {}
+        partitions = self._subscribed_partitions(group)
+        quota = {m: len(partitions) // len(members) + (1 if i < len(partitions) % len(members) else 0)
+                 for i, m in enumerate(members)}
+        target = {m: set() for m in members}
+        unassigned = []
+        for tp in partitions:
+            owner = next((m for m in members if tp in group.assignment.get(m, ())), None)
+            if owner is not None and len(target[owner]) < quota[owner] and tp[0] in owner.subscription:
+                target[owner].add(tp)
+            else:
+                unassigned.append(tp)
+        for tp in unassigned:
+            candidates = [m for m in members if tp[0] in m.subscription and len(target[m]) < quota[m]]
+            if not candidates:
+                candidates = [m for m in members if tp[0] in m.subscription]
+            chosen = min(candidates, key=lambda m: len(target[m]))
+            target[chosen].add(tp)
+        return target
+
+    def _start_rebalance(self, group):
+        group.generation += 1
+        if not group.members:
+            return
+        cooperative = all(m.cooperative for m in group.members)
+        target = self._target_assignment(group)
+        if cooperative:
+            # Incremental: only partitions that move are revoked first
+            moving = False
+            for member in group.members:
+                lost = group.assignment[member] - target[member]
+                if lost:
+                    moving = True
+                    group.assignment[member] -= lost
+                    member._queue_event('revoke', sorted(lost))
+                    group.pending_revoke.add(member)
+            if not moving:
+                self._finish_rebalance(group, target)
+            else:
+                group.target = target
+        else:
+            # Eager: everyone gives up everything, then receives a new assignment
+            for member in group.members:
+                owned = group.assignment[member]
+                group.assignment[member] = set()
+                member._queue_event('revoke', sorted(owned))
+                group.pending_revoke.add(member)
+            group.target = target
+        self.cond.notify_all()
+
+    def revoke_done(self, consumer):
+        with self.cond:
+            group = self.group(consumer.group_id)
+            group.pending_revoke.discard(consumer)
+            if not group.pending_revoke and getattr(group, 'target', None) is not None:
+                target = self._target_assignment(group)
+                group.target = None
+                self._finish_rebalance(group, target)
+
+    def _finish_rebalance(self, group, target):
+        for member in group.members:
+            added = target.get(member, set()) - group.assignment[member]
+            group.assignment[member] = set(target.get(member, set()))
+            if added or not member.cooperative:
+                member._queue_event('assign', sorted(added if member.cooperative else target.get(member, set())))
+        self.cond.notify_all()
+
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def get_broker(bootstrap_servers='local'):
+    """Broker instance shared by all clients with the same bootstrap.servers"""
+    with _brokers_lock:
+        if bootstrap_servers not in _brokers:
+            _brokers[bootstrap_servers] = LocalBroker()
+        return _brokers[bootstrap_servers]
+
+
+def reset():
+    """Drop all brokers (fresh topics, groups and offsets)"""
+    with _brokers_lock:
+        _brokers.clear()
+
+
+class Producer:
+    def __init__(self, config):
+        self.config = dict(config)
+        self.broker = get_broker(self.config.get('bootstrap.servers', 'local'))
+        self.transactional_id = self.config.get('transactional.id')
+        self._delivery = deque()
+        self._round_robin = 0
+        self._in_transaction = False
+        self._txn_records = []
+        self._txn_offsets = []
+        self._txn_group = None
+        self._lock = threading.Lock()
+
+    def produce(self, topic, value=None, key=None, partition=-1, on_delivery=None,
+                callback=None, timestamp=0, headers=None):
+        if self.transactional_id and not self._in_transaction:
+            raise KafkaException(KafkaError(KafkaError._STATE, 'Transaction not begun'))
+        n = self.broker.partition_count(topic)
+        if partition is None or partition < 0:
+            partition = self.broker.partition_for(topic, key)
+            if partition is None:
+                partition = self._round_robin % n
+                self._round_robin += 1
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        if isinstance(headers, dict):
+            headers = list(headers.items())
+        record = (topic, partition, key, value, headers, timestamp or int(time.time() * 1000))
+        cb = callback or on_delivery
+        with self._lock:
+            if self.transactional_id:
+                self._txn_records.append((record, cb))
+                return
+        produced = time.monotonic()
+        offset = self.broker.append_many([record])[0]
+        if cb is not None:
+            msg = Message(topic, partition, offset, key, value, headers, record[5])
+            msg._latency = time.monotonic() - produced
+            with self._lock:
+                self._delivery.append((cb, msg))
+
+    def poll(self, timeout=None):
+        served = 0
+        while True:
+            with self._lock:
+                if not self._delivery:
+                    return served
+                cb, msg = self._delivery.popleft()
+            cb(None, msg)
+            served += 1
+
+    def flush(self, timeout=None):
+        self.poll(0)
+        return 0
+
+    def __len__(self):
+        return len(self._delivery) + len(self._txn_records)
+
+    def list_topics(self, topic=None, timeout=-1):
+        return _list_topics(self.broker, topic)
+
+    # -- transactions -------------------------------------------------
+
+    def init_transactions(self, timeout=None):
+        if not self.transactional_id:
+            raise KafkaException(KafkaError(KafkaError._STATE, 'transactional.id not configured'))
+
+    def begin_transaction(self):
+        if self._in_transaction:
+            raise KafkaException(KafkaError(KafkaError._STATE, 'Transaction already in progress'))
+        self._in_transaction = True
+        self._txn_records = []
+        self._txn_offsets = []
+
+    def send_offsets_to_transaction(self, positions, group_metadata, timeout=None):
+        if not self._in_transaction:
+            raise KafkaException(KafkaError(KafkaError._STATE, 'No transaction in progress'))
+        self._txn_group = group_metadata.group_id
+        self._txn_offsets = [TopicPartition(tp.topic, tp.partition, tp.offset) for tp in positions]
+
+    def commit_transaction(self, timeout=None):
+        if not self._in_transaction:
+            raise KafkaException(KafkaError(KafkaError._STATE, 'No transaction in progress'))
+        records = [record for record, _ in self._txn_records]
+        # Output records and input offsets become visible together
+        with self.broker.cond:
+            offsets = self.broker.append_many(records)
+            if self._txn_group is not None:
+                self.broker.commit(self._txn_group, self._txn_offsets)
+        with self._lock:
+            for (record, cb), offset in zip(self._txn_records, offsets):
+                if cb is not None:
+                    topic, partition, key, value, headers, ts = record
+                    self._delivery.append((cb, Message(topic, partition, offset, key, value, headers, ts)))
+        self._in_transaction = False
+        self._txn_records = []
+        self._txn_offsets = []
+        self.poll(0)
+
+    def abort_transaction(self, timeout=None):
+        self._in_transaction = False
+        self._txn_records = []
+        self._txn_offsets = []
+
+
+def _list_topics(broker, topic=None):
+    names = [topic] if topic else list(broker.topics)
+    return ClusterMetadata({
+        name: TopicMetadata(name, broker.partition_count(name)) for name in names
+    })
+
+
+_member_ids = iter(range(1, 1 << 62))
+
+
+class Consumer:
+    def __init__(self, config):
+        self.config = dict(config)
+        self.broker = get_broker(self.config.get('bootstrap.servers', 'local'))
+        self.group_id = self.config.get('group.id')
+        self.instance_id = self.config.get('group.instance.id')
+        self.session_timeout_ms = int(self.config.get('session.timeout.ms', 45000))
+        self.cooperative = self.config.get('partition.assignment.strategy') == 'cooperative-sticky'
+        self.auto_offset_reset = self.config.get('auto.offset.reset', 'latest')
+        self.auto_commit = str(self.config.get('enable.auto.commit', True)).lower() == 'true'
+        self.partition_eof = str(self.config.get('enable.partition.eof', False)).lower() == 'true'
+        self.on_commit = self.config.get('on_commit')
+        self.member_id = f"{self.instance_id or 'consumer'}-{next(_member_ids):06d}"
+        self.subscription = []
+        self._callbacks = {}
+        self._events = deque()
+        self._positions = {}   # (topic, partition) -> next offset
+        self._eof_sent = set()
+        self._paused = set()
+        self._rr = 0
+        self._commit_results = deque()
+        self._closed = False
+        self._subscribed = False
+
+    # -- group membership ---------------------------------------------
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None, on_lost=None):
+        self.subscription = list(topics)
+        self._callbacks = {'assign': on_assign, 'revoke': on_revoke, 'lost': on_lost}
+        for topic in topics:
+            self.broker.create_topic(topic)
+        if self._subscribed:
+            self.broker.leave(self)
+        self._subscribed = True
+        self.broker.join(self)
+
+    def unsubscribe(self):
+        if self._subscribed:
+            self._subscribed = False
+            self.broker.leave(self)
+            self._positions.clear()
+
+    def _queue_event(self, kind, partitions):
+        self._events.append((kind, partitions))
+
+    def _serve_events(self):
+        if self._subscribed:
+            self.broker.check_group(self)
+        while self._events:
+            kind, partitions = self._events.popleft()
+            tps = [TopicPartition(t, p) for t, p in partitions]
+            callback = self._callbacks.get(kind)
+            if kind == 'assign':
+                if callback is not None:
+                    callback(self, tps)
+                    # Callback may have called assign()/incremental_assign() itself
+                for tp in tps:
+                    self._positions.setdefault(tp._key(), None)
+            else:
+                if callback is not None:
+                    callback(self, tps)
+                for tp in tps:
+                    self._positions.pop(tp._key(), None)
+                    self._eof_sent.discard(tp._key())
+                self.broker.revoke_done(self)
+        while self._commit_results:
+            err, offsets = self._commit_results.popleft()
+            if self.on_commit is not None:
+                self.on_commit(err, offsets)
+
+    def assign(self, partitions):
+        self._positions = {}
+        self.incremental_assign(partitions)
+
+    def incremental_assign(self, partitions):
+        for tp in partitions:
+            self.broker.create_topic(tp.topic)
+            self._positions[tp._key()] = tp.offset if tp.offset != OFFSET_INVALID else None
+
+    def incremental_unassign(self, partitions):
+        for tp in partitions:
+            self._positions.pop(tp._key(), None)
+
+    def unassign(self):
+        self._positions = {}
+
+    def assignment(self):
+        return [TopicPartition(t, p) for t, p in sorted(self._positions)]
+
+    def consumer_group_metadata(self):
+        return GroupMetadata(self.group_id)
+
+    # -- positions ----------------------------------------------------
+
+    def _resolve(self, key):
+        position = self._positions.get(key)
+        if position is None or position < 0:
+            topic, partition = key
+            low, high = self.broker.watermarks(topic, partition)
+            if position is None or position in (OFFSET_STORED, OFFSET_INVALID):
+                committed = self.broker.committed(self.group_id, topic, partition) if self.group_id else OFFSET_INVALID
+                if committed >= 0:
+                    position = committed
+                else:
+                    position = OFFSET_BEGINNING if self.auto_offset_reset in ('earliest', 'smallest', 'beginning') else OFFSET_END
+            if position == OFFSET_BEGINNING:
+                position = low
+            elif position == OFFSET_END:
+                position = high
+            self._positions[key] = position
+        return position
+
+    def pause(self, partitions):
+        self._paused.update(tp._key() for tp in partitions)
+
+    def resume(self, partitions):
+        self._paused.difference_update(tp._key() for tp in partitions)
+
+    def seek(self, partition):
+        self._positions[partition._key()] = partition.offset
+        self._eof_sent.discard(partition._key())
+
+    def position(self, partitions):
+        result = []
+        for tp in partitions:
+            pos = self._positions.get(tp._key())
+            result.append(TopicPartition(tp.topic, tp.partition, pos if pos is not None and pos >= 0 else OFFSET_INVALID))
+        return result
+
+    def committed(self, partitions, timeout=None):
+        return [
+            TopicPartition(tp.topic, tp.partition, self.broker.committed(self.group_id, tp.topic, tp.partition))
+            for tp in partitions
+        ]
+
+    def get_watermark_offsets(self, partition, timeout=None, cached=False):
+        return self.broker.watermarks(partition.topic, partition.partition)
+
+    def offsets_for_times(self, partitions, timeout=None):
+        return [
+            TopicPartition(tp.topic, tp.partition,
+                           self.broker.offset_for_time(tp.topic, tp.partition, tp.offset))
+            for tp in partitions
+        ]
+
+    def list_topics(self, topic=None, timeout=-1):
+        return _list_topics(self.broker, topic)
+
+    # -- fetching -----------------------------------------------------
+
+    def _fetch(self, max_messages):
+        keys = [key for key in self._positions if key not in self._paused]
+        if not keys:
+            return []
+        out = []
+        n = len(keys)
+        start = self._rr
+        self._rr = (self._rr + 1) % n
+        # Drain partitions round-robin, like librdkafka fetch batches
+        for i in range(n):
+            key = keys[(start + i) % n]
+            position = self._resolve(key)
+            batch = self.broker.fetch(key[0], key[1], position, max_messages - len(out))
+            if batch:
+                self._positions[key] = position + len(batch)
+                self._eof_sent.discard(key)
+                out.extend(batch)
+            elif self.partition_eof and key not in self._eof_sent:
+                self._eof_sent.add(key)
+                out.append(Message(key[0], key[1], position, None, None, None, None,
+                                   KafkaError(KafkaError._PARTITION_EOF, 'Reached end of partition')))
+            if len(out) >= max_messages:
+                break
+        if out and self.auto_commit and self.group_id:
+            self.broker.commit(self.group_id, [
+                TopicPartition(t, p, o) for (t, p), o in self._positions.items() if o is not None and o >= 0
+            ])
+        return out
+
+    def consume(self, num_messages=1, timeout=-1):
+        if self._closed:
+            raise RuntimeError('Consumer closed')
+        deadline = None if timeout is None or timeout < 0 else time.monotonic() + timeout
+        while True:
+            self._serve_events()
+            messages = self._fetch(num_messages)
+            if messages:
+                return messages
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return []
+            with self.broker.cond:
+                self.broker.cond.wait(min(remaining, 0.05) if remaining is not None else 0.05)
+
+    def poll(self, timeout=None):
+        messages = self.consume(1, -1 if timeout is None else timeout)
+        return messages[0] if messages else None
+
+    def commit(self, message=None, offsets=None, asynchronous=True):
+        if message is not None:
+            offsets = [TopicPartition(message.topic(), message.partition(), message.offset() + 1)]
+        elif offsets is None:
+            offsets = [TopicPartition(t, p, o) for (t, p), o in self._positions.items() if o is not None and o >= 0]
+        self.broker.commit(self.group_id, offsets)
+        if asynchronous:
+            self._commit_results.append((None, offsets))
+            return None
+        return offsets
+
+    def close(self):
+        if self._closed:
+            return
+        if self.auto_commit and self.group_id and self._positions:
+            self.commit(asynchronous=False)
+        if self._subscribed:
+            partitions = [TopicPartition(t, p) for t, p in sorted(self._positions)]
+            revoke = self._callbacks.get('revoke')
+            if revoke is not None and partitions and not self.instance_id:
+                revoke(self, partitions)
+            self._subscribed = False
+            self.broker.leave(self)
+        self._closed = True
+
+
+class NewTopic:
+    def __init__(self, topic, num_partitions=-1, replication_factor=-1, config=None):
+        self.topic = topic
+        self.num_partitions = num_partitions
+        self.replication_factor = replication_factor
+        self.config = config or {}
+
+
+class _Done:
+    """Completed future, as returned by AdminClient calls"""
+
+    def __init__(self, result=None):
+        self._result = result
+
+    def result(self, timeout=None):
+        return self._result
+
+    def done(self):
+        return True
+
+
+class AdminClient:
+    def __init__(self, config):
+        self.broker = get_broker(dict(config).get('bootstrap.servers', 'local'))
+
+    def create_topics(self, new_topics, **kwargs):
+        futures = {}
+        for new_topic in new_topics:
+            n = new_topic.num_partitions if new_topic.num_partitions > 0 else None
+            self.broker.create_topic(new_topic.topic, n)
+            futures[new_topic.topic] = _Done()
+        return futures
+
+    def list_topics(self, topic=None, timeout=-1):
+        return _list_topics(self.broker, topic)
+
+
+def install():
+    """Register this module as confluent_kafka (and confluent_kafka.admin)"""
+    module = sys.modules[__name__]
+    sys.modules.setdefault('local_kafka', module)  # Same broker when run as a script
+    sys.modules['confluent_kafka'] = module
+    sys.modules['confluent_kafka.admin'] = module
+    return module
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python local_kafka.py <script.py> [args...]")
+    install()
+    sys.argv = sys.argv[1:]
+    runpy.run_path(sys.argv[0], run_name='__main__')
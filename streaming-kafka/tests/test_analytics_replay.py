@@ -0,0 +1,157 @@
+"""
+Offline Analytics Replay Test
+Runs the replay tool (analytics_consumer/replay.py) on fresh topics:
+  1. All events with one worker and with one worker per partition: the
+     merged metrics must equal the single-worker result
+  2. Two timestamp ranges split at the middle (offsets_for_times): their
+     event counts must add up to the full replay
+  3. Nothing is committed for the replay's group id, since partitions are
+     assigned directly instead of joining a group
+"""
+import json
+import logging
+import os
+import random
+import sys
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'analytics_consumer'))
+
+from confluent_kafka import Consumer, Producer, TopicPartition
+from confluent_kafka.admin import AdminClient, NewTopic
+from ids import format_timestamp
+
+KAFKA_BROKER = os.getenv('KAFKA_BROKER', 'localhost:9093')
+PARTITIONS = 3
+NUM_ORDERS = 50000
+START_MS = 1_700_000_000_000
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+
+
+def create_topics(*topics):
+    admin = AdminClient({'bootstrap.servers': KAFKA_BROKER})
+    futures = admin.create_topics([
+        NewTopic(topic, num_partitions=PARTITIONS, replication_factor=1) for topic in topics
+    ])
+    for future in futures.values():
+        future.result()
+
+
+def produce_events(topics, n):
+    """
+    Write n orders and their inventory events, 50 orders per second, with
+    message timestamps equal to the event timestamps. 80 users fit the
+    default sketch size, so top keys are exact however the stream is split.
+    """
+    rng = random.Random(7)
+    producer = Producer({'bootstrap.servers': KAFKA_BROKER})
+    for i in range(n):
+        order_id = f"order_{i}"
+        placed_ms = START_MS + i * 20
+        reserved_ms = placed_ms + rng.randint(20, 40)
+        order = {
+            "event_type": "OrderPlaced", "order_id": order_id,
+            "timestamp": format_timestamp(placed_ms),
+            "payload": {"user_id": f"user_{rng.randint(0, 79)}", "item": rng.choice(ITEMS), "quantity": 1}
+        }
+        inventory = {
+            "event_type": "InventoryReserved" if rng.random() < 0.9 else "InventoryFailed",
+            "order_id": order_id,
+            "timestamp": format_timestamp(reserved_ms)
+        }
+        key = order_id.encode('utf-8')
+        producer.produce(topics[0], key=key, value=json.dumps(order).encode('utf-8'), timestamp=placed_ms)
+        producer.produce(topics[1], key=key, value=json.dumps(inventory).encode('utf-8'), timestamp=reserved_ms)
+        if i % 1000 == 0:
+            producer.poll(0)
+    producer.flush()
+
+
+def summary(metrics):
+    """Metrics that must not depend on the number of workers"""
+    m = metrics.get_metrics()
+
+    def ranked(top):
+        # Ties are ordered by key; keys tied with the last entry may be cut either way
+        result = {}
+        for key, values in top.items():
+            values = sorted(values, key=lambda kv: (-kv[1], str(kv[0])))
+            cutoff = values[-1][1] if values else 0
+            result[key] = [[value, count] if count > cutoff else count for value, count in values]
+        return result
+
+    return {
+        "counts": [m['total_orders'], m['reserved_orders'], m['failed_orders'], m['orders_per_minute']],
+        "windows": {name: [w['current']['counts'], w['last']['counts'], ranked(w['current']['top'])]
+                    for name, w in m['windows'].items()},
+        "latency": [m['latency_ms'][k] for k in ('count', 'p50', 'p95', 'p99', 'pending')],
+        "top": ranked(m['top']),
+    }
+
+
+def test_analytics_replay():
+    print("Starting Offline Analytics Replay Test")
+    print("="*60)
+    print(f"Broker: {KAFKA_BROKER}, orders: {NUM_ORDERS}, partitions: {PARTITIONS}")
+
+    logging.getLogger('replay').setLevel(logging.WARNING)
+    from replay import replay
+
+    run_id = uuid.uuid4().hex[:8]
+    topics = [f"replay-orders-{run_id}", f"replay-inventory-{run_id}"]
+    create_topics(*topics)
+    produce_events(topics, NUM_ORDERS)
+
+    # 1. Whole topics, one worker vs. one worker per partition
+    runs = []
+    for workers in (1, PARTITIONS):
+        metrics, result = replay(KAFKA_BROKER, topics, workers=workers)
+        runs.append((workers, summary(metrics), result))
+        print(f"\n{workers} worker(s): {result['events']} events in {result['seconds']:.2f}s "
+              f"({result['events_per_second']:,} events/s)")
+
+    # 2. Two halves split by timestamp
+    middle = format_timestamp(START_MS + NUM_ORDERS * 10)
+    first_half, first = replay(KAFKA_BROKER, topics, end=middle)
+    second_half, second = replay(KAFKA_BROKER, topics, start=middle)
+    print(f"Before {middle}: {first['events']} events, {first_half.total_orders} orders")
+    print(f"From {middle}: {second['events']} events, {second_half.total_orders} orders")
+
+    # 3. The replay never commits offsets
+    probe = Consumer({'bootstrap.servers': KAFKA_BROKER, 'group.id': 'analytics-replay'})
+    committed = probe.committed([TopicPartition(t, p) for t in topics for p in range(PARTITIONS)], timeout=10)
+    probe.close()
+
+    print("="*60)
+    single, parallel = runs[0][1], runs[1][1]
+    total_events = 2 * NUM_ORDERS
+    complete = runs[0][2]['events'] == total_events
+    print(f"{'✓' if complete else '✗'} Full replay read all {total_events} events")
+    print(f"{'✓' if single == parallel else '✗'} {PARTITIONS} workers merge to the single-worker metrics")
+    halves = first['events'] + second['events'] == total_events
+    orders = first_half.total_orders + second_half.total_orders == NUM_ORDERS
+    print(f"{'✓' if halves and orders else '✗'} Timestamp ranges split the events and orders exactly")
+    untouched = all(tp.offset < 0 for tp in committed)
+    print(f"{'✓' if untouched else '✗'} No offsets committed by the replay")
+
+    results = {
+        "orders": NUM_ORDERS,
+        "runs": [{"workers": workers, **{k: result[k] for k in ('events', 'seconds', 'events_per_second')}}
+                 for workers, _, result in runs],
+        "parallel_matches": single == parallel,
+        "split_at": middle,
+        "split_events": [first['events'], second['events']],
+        "no_commits": untouched,
+        "metrics": single,
+    }
+    with open('analytics_replay_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to analytics_replay_results.json")
+    return complete and single == parallel and halves and orders and untouched
+
+
+if __name__ == '__main__':
+    sys.exit(0 if test_analytics_replay() else 1)
@@ -0,0 +1,306 @@
+"""
+Analytics Checkpoint Restart Test
+Compares ways an AnalyticsConsumer gets its metrics back after a restart:
+  1. Warm restart: restore the checkpoint, read only the events after it
+  2. Crash restart: the checkpoint is older than the committed offsets (the
+     consumer died between checkpoints), so the events after it are re-read
+     from the checkpoint offsets without being counted twice
+  3. Full replay: REPLAY_FROM_EARLIEST=true rebuilds from the first event
+  4. Failed batch: the metrics raise on the second batch; the consumer must
+     stop without committing that batch's offsets or writing a checkpoint
+  5. Rebalance: a second instance joins the group; the first one's
+     checkpoint must only cover the partitions it still owns
+The first three must report the same counts, windows, top items and latency.
+Runs the consumer in-process on fresh topics with event-time windows.
+"""
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'analytics_consumer'))
+
+from confluent_kafka import Consumer, Producer, TopicPartition
+from confluent_kafka.admin import AdminClient, NewTopic
+from checkpoint import read_checkpoint
+from ids import format_timestamp
+
+KAFKA_BROKER = os.getenv('KAFKA_BROKER', 'localhost:9093')
+PARTITIONS = 3
+NUM_ORDERS = 10000  # Per phase; every order is followed by its inventory event
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+
+
+def create_topics(*topics):
+    admin = AdminClient({'bootstrap.servers': KAFKA_BROKER})
+    futures = admin.create_topics([
+        NewTopic(topic, num_partitions=PARTITIONS, replication_factor=1) for topic in topics
+    ])
+    for future in futures.values():
+        future.result()
+
+
+def produce_events(run_id, first, n):
+    """Write n orders and their inventory events, 50 orders per event-time second"""
+    rng = random.Random(first)
+    producer = Producer({'bootstrap.servers': KAFKA_BROKER})
+    start_ms = 1_700_000_000_000
+    for i in range(first, first + n):
+        order_id = f"order_{run_id}_{i}"
+        placed_ms = start_ms + i * 20
+        order = {
+            "event_type": "OrderPlaced", "order_id": order_id,
+            "timestamp": format_timestamp(placed_ms),
+            "payload": {"user_id": f"user_{rng.randint(0, 49)}", "item": rng.choice(ITEMS), "quantity": 1}
+        }
+        inventory = {
+            "event_type": "InventoryReserved" if rng.random() < 0.9 else "InventoryFailed",
+            "order_id": order_id,
+            "timestamp": format_timestamp(placed_ms + rng.randint(20, 40))
+        }
+        key = order_id.encode('utf-8')
+        producer.produce(f"analytics-orders-{run_id}", key=key, value=json.dumps(order).encode('utf-8'))
+        producer.produce(f"analytics-inventory-{run_id}", key=key, value=json.dumps(inventory).encode('utf-8'))
+        if i % 1000 == 0:
+            producer.poll(0)
+    producer.flush()
+
+
+def configure(run_id, state_dir, replay=False, group_id=None):
+    os.environ.update({
+        'KAFKA_BROKER': KAFKA_BROKER,
+        'TOPICS': f"analytics-orders-{run_id},analytics-inventory-{run_id}",
+        'GROUP_ID': group_id or f"analytics-restart-{run_id}",
+        'STATE_DIR': state_dir,
+        'REPLAY_FROM_EARLIEST': 'true' if replay else 'false',
+        'METRICS_TIME_MODE': 'event',
+        'METRICS_HISTORY_FILE': '',
+        'BATCH_SIZE': '500',
+    })
+
+
+def drain(analytics, total_events):
+    """Run a consumer until its metrics hold total_events (or stop growing for 10s), then stop it"""
+    counted = [0]
+    process_batch = analytics.process_batch
+
+    def counting_batch(messages):
+        counted[0] += len(messages)
+        return process_batch(messages)
+
+    analytics.process_batch = counting_batch
+    thread = threading.Thread(target=analytics.start)
+    start = time.time()
+    thread.start()
+    metrics = analytics.metrics
+    last, last_change = -1, time.time()
+    while time.time() - last_change < 10:
+        events = metrics.total_orders + metrics.reserved_orders + metrics.failed_orders
+        if events >= total_events:
+            break
+        if events != last:
+            last, last_change = events, time.time()
+        time.sleep(0.05)
+    seconds = time.time() - start
+    analytics.running = False
+    thread.join(timeout=60)
+    return counted[0], seconds
+
+
+def run_failing_batch(analytics):
+    """Run a consumer whose metrics raise on the second batch; returns (events counted, error)"""
+    add_events = analytics.metrics.add_events
+    batches, counted, error = [0], [0], [None]
+
+    def failing_add_events(events):
+        batches[0] += 1
+        if batches[0] == 2:
+            raise RuntimeError('Injected metrics failure')
+        add_events(events)
+        counted[0] += len(events)
+
+    def run():
+        try:
+            analytics.start()
+        except RuntimeError as e:
+            error[0] = e
+
+    analytics.metrics.add_events = failing_add_events
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join(timeout=60)
+    return counted[0], error[0]
+
+
+def committed_events(run_id, group_id):
+    """Sum of the group's committed offsets over both topics"""
+    consumer = Consumer({'bootstrap.servers': KAFKA_BROKER, 'group.id': group_id})
+    partitions = [TopicPartition(f"analytics-{name}-{run_id}", p)
+                  for name in ('orders', 'inventory') for p in range(PARTITIONS)]
+    committed = consumer.committed(partitions, timeout=10)
+    consumer.close()
+    return sum(tp.offset for tp in committed if tp.offset > 0)
+
+
+def run_rebalance(run_id, state_dir, total_events):
+    """
+    Count everything with one instance, then let a second join its group
+
+    Returns:
+        (partitions in the first instance's checkpoint, partitions it owned
+        at the end, partitions in the second one's checkpoint)
+    """
+    from consumer import AnalyticsConsumer
+    group_id = f"analytics-rebalance-{run_id}"
+    dirs = [os.path.join(state_dir, 'rebalance-a'), os.path.join(state_dir, 'rebalance-b')]
+    configure(run_id, dirs[0], group_id=group_id)
+    first = AnalyticsConsumer()
+    threads = [threading.Thread(target=first.start)]
+    threads[0].start()
+    deadline = time.time() + 60
+    while first.metrics.total_orders + first.metrics.reserved_orders + first.metrics.failed_orders < total_events \
+            and time.time() < deadline:
+        time.sleep(0.05)
+
+    configure(run_id, dirs[1], group_id=group_id)
+    second = AnalyticsConsumer()
+    threads.append(threading.Thread(target=second.start))
+    threads[1].start()
+    while len(first.consumer.assignment()) == 2 * PARTITIONS and time.time() < deadline:
+        time.sleep(0.05)
+    owned = {(tp.topic, tp.partition) for tp in first.consumer.assignment()}
+
+    for analytics, thread in zip((first, second), threads):
+        analytics.running = False
+        thread.join(timeout=60)
+    covered = [set(read_checkpoint(os.path.join(d, 'analytics_checkpoint.json'))[0]) for d in dirs]
+    return covered[0], owned, covered[1]
+
+
+def summary(analytics):
+    """Fields that must not depend on how the state was rebuilt"""
+    m = analytics.metrics.get_metrics()
+    return {
+        "counts": [m['total_orders'], m['reserved_orders'], m['failed_orders'], m['orders_per_minute']],
+        "windows": {name: [w['current']['counts'], w['last']['counts'], w['current']['top']['item']]
+                    for name, w in m['windows'].items()},
+        "latency": [m['latency_ms'][k] for k in ('count', 'p50', 'p95', 'p99', 'pending')],
+        "top": m['top'],
+    }
+
+
+def test_analytics_restart():
+    print("Starting Analytics Checkpoint Restart Test")
+    print("="*60)
+    print(f"Broker: {KAFKA_BROKER}, orders: {2 * NUM_ORDERS} in two phases")
+
+    for name in ('consumer', 'snapshots', 'checkpoint'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+    from consumer import AnalyticsConsumer
+
+    run_id = uuid.uuid4().hex[:8]
+    state_dir = tempfile.mkdtemp(prefix='analytics-state-')
+    work_dir = tempfile.mkdtemp(prefix='analytics-output-')
+    checkpoint = os.path.join(state_dir, 'analytics_checkpoint.json')
+    cwd = os.getcwd()
+    os.chdir(work_dir)  # metrics_output.json of the runs
+    create_topics(f"analytics-orders-{run_id}", f"analytics-inventory-{run_id}")
+    phase_events = 2 * NUM_ORDERS
+    results = {"orders": 2 * NUM_ORDERS, "events": 2 * phase_events}
+
+    try:
+        # Phase 1: count the first half, checkpoint on stop
+        configure(run_id, state_dir)
+        produce_events(run_id, 0, NUM_ORDERS)
+        read, seconds = drain(AnalyticsConsumer(), phase_events)
+        shutil.copy(checkpoint, checkpoint + '.phase1')
+        print(f"\nPhase 1: counted {read} events in {seconds:.2f}s, checkpoint written")
+
+        # 1. Warm restart: restore, then read only the second half
+        produce_events(run_id, NUM_ORDERS, NUM_ORDERS)
+        warm = AnalyticsConsumer()
+        warm_read, warm_seconds = drain(warm, 2 * phase_events)
+        warm_summary = summary(warm)
+        print(f"1. Warm restart: read {warm_read} events in {warm_seconds:.2f}s")
+
+        # 2. Crash restart: back to the phase-1 checkpoint while the group's
+        #    committed offsets are already at the end of both topics
+        shutil.copy(checkpoint + '.phase1', checkpoint)
+        crash = AnalyticsConsumer()
+        crash_read, crash_seconds = drain(crash, 2 * phase_events)
+        crash_summary = summary(crash)
+        print(f"2. Crash restart (stale checkpoint): read {crash_read} events in {crash_seconds:.2f}s")
+
+        # 3. Full replay from earliest
+        configure(run_id, state_dir, replay=True)
+        replay = AnalyticsConsumer()
+        replay_read, replay_seconds = drain(replay, 2 * phase_events)
+        replay_summary = summary(replay)
+        print(f"3. Full replay: read {replay_read} events in {replay_seconds:.2f}s")
+
+        # 4. Failed batch: fresh group and state, metrics raise on the second batch
+        fail_dir = os.path.join(state_dir, 'failed')
+        configure(run_id, fail_dir, group_id=f"analytics-failed-{run_id}")
+        failed_counted, failed_error = run_failing_batch(AnalyticsConsumer())
+        failed_committed = committed_events(run_id, f"analytics-failed-{run_id}")
+        failed_checkpoint = os.path.exists(os.path.join(fail_dir, 'analytics_checkpoint.json'))
+        print(f"4. Failed batch: stopped with {failed_error!r}, {failed_committed} events committed "
+              f"({failed_counted} counted before the failure)")
+
+        # 5. Rebalance: the partitions handed to the second instance leave the first's checkpoint
+        first_covered, first_owned, second_covered = run_rebalance(run_id, state_dir, 2 * phase_events)
+        print(f"5. Rebalance: first instance kept {len(first_owned)} of {2 * PARTITIONS} partitions, "
+              f"its checkpoint covers {len(first_covered)}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(state_dir, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("="*60)
+    print(f"{'✓' if warm_read == phase_events else '✗'} Warm restart read only the {phase_events} new events")
+    print(f"{'✓' if crash_read == phase_events else '✗'} Crash restart re-read the {phase_events} events "
+          f"after the checkpoint")
+    print(f"{'✓' if replay_read == 2 * phase_events else '✗'} Full replay read all {2 * phase_events} events")
+    same = warm_summary == crash_summary == replay_summary
+    print(f"{'✓' if same else '✗'} Counts, windows, top keys and latency match the full replay")
+    faster = warm_seconds < replay_seconds
+    if faster:
+        print(f"✓ Warm restart {replay_seconds / max(warm_seconds, 1e-6):.1f}x faster than full replay")
+    else:
+        print(f"✗ Warm restart ({warm_seconds:.2f}s) not faster than full replay ({replay_seconds:.2f}s)")
+    rebalance_ok = 0 < len(first_owned) < 2 * PARTITIONS and first_covered == first_owned \
+        and not first_covered & second_covered
+    print(f"{'✓' if rebalance_ok else '✗'} After a rebalance the checkpoint only covers the partitions still owned")
+    failed_ok = failed_error is not None and failed_committed == failed_counted and not failed_checkpoint
+    print(f"{'✓' if failed_ok else '✗'} Failed batch stopped the consumer with only the earlier batch committed "
+          f"and no checkpoint written")
+
+    results.update({
+        "warm_restart": {"events_read": warm_read, "seconds": round(warm_seconds, 3)},
+        "crash_restart": {"events_read": crash_read, "seconds": round(crash_seconds, 3)},
+        "full_replay": {"events_read": replay_read, "seconds": round(replay_seconds, 3)},
+        "identical": same,
+        "rebalance": {"partitions_owned": len(first_owned), "partitions_checkpointed": len(first_covered),
+                      "checkpoint_matches_assignment": rebalance_ok},
+        "failed_batch": {"error": repr(failed_error), "events_counted": failed_counted,
+                         "events_committed": failed_committed, "checkpoint_written": failed_checkpoint},
+        "metrics": replay_summary,
+    })
+    with open('analytics_restart_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to analytics_restart_results.json")
+    return (warm_read == crash_read == phase_events and replay_read == 2 * phase_events and same and faster
+            and rebalance_ok and failed_ok)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if test_analytics_restart() else 1)
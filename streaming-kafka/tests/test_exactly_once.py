@@ -0,0 +1,222 @@
+"""
+Exactly-Once Throughput Test
+Runs InventoryConsumer in-process in transactional mode (EXACTLY_ONCE=true)
+at several batch sizes and compares it with the at-least-once batch mode.
+Each run uses fresh topics and a fresh consumer group, then verifies that
+exactly one committed output event exists per input event.
+A last run keeps local state (STATE_DIR) and aborts its first
+transactions: the retried batches must still write every reservation to
+the changelog.
+"""
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'inventory_consumer'))
+
+from confluent_kafka import Consumer, Producer, KafkaError, KafkaException, TopicPartition
+from ids import generate_order_ids, current_timestamp
+
+KAFKA_BROKER = os.getenv('KAFKA_BROKER', 'localhost:9093')
+NUM_EVENTS = 5000
+BATCH_SIZES = [1, 10, 100, 500]
+ABORTS = 3  # Transactions aborted at the start of the state run
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+
+
+def produce_orders(topic, n):
+    """Write n OrderPlaced events straight to the input topic"""
+    producer = Producer({'bootstrap.servers': KAFKA_BROKER})
+    timestamp = current_timestamp()
+    for i, order_id in enumerate(generate_order_ids(n)):
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "event_type": "OrderPlaced",
+            "order_id": order_id,
+            "timestamp": timestamp,
+            "payload": {"user_id": f"user_{i}", "item": ITEMS[i % 5], "quantity": 1}
+        }
+        producer.produce(topic, key=order_id.encode('utf-8'), value=json.dumps(event).encode('utf-8'))
+        if i % 1000 == 0:
+            producer.poll(0)
+    producer.flush()
+
+
+def count_committed_output(topic):
+    """Count distinct order IDs visible to a read_committed consumer"""
+    consumer = Consumer({
+        'bootstrap.servers': KAFKA_BROKER,
+        'group.id': f"eos-verify-{uuid.uuid4()}",
+        'auto.offset.reset': 'earliest',
+        'enable.auto.commit': False,
+        'isolation.level': 'read_committed'
+    })
+    consumer.subscribe([topic])
+    seen = set()
+    total = 0
+    idle_since = time.time()
+    while time.time() - idle_since < 5:
+        messages = consumer.consume(num_messages=1000, timeout=1.0)
+        for msg in messages:
+            if msg.error():
+                continue
+            total += 1
+            seen.add(msg.key())
+        if messages:
+            idle_since = time.time()
+    consumer.close()
+    return total, len(seen)
+
+
+def committed_input(group_id, topic):
+    """Sum of the group's committed offsets on the input topic"""
+    consumer = Consumer({'bootstrap.servers': KAFKA_BROKER, 'group.id': group_id})
+    partitions = consumer.list_topics(topic, timeout=10).topics[topic].partitions
+    committed = consumer.committed([TopicPartition(topic, p) for p in partitions], timeout=10)
+    consumer.close()
+    return sum(tp.offset for tp in committed if tp.offset > 0)
+
+
+def run_case(exactly_once, batch_size, aborts=0):
+    """Drain NUM_EVENTS with one consumer configuration; return throughput stats"""
+    run_id = uuid.uuid4().hex[:8]
+    input_topic = f"eos-orders-{run_id}"
+    output_topic = f"eos-inventory-{run_id}"
+    changelog_topic = f"eos-changelog-{run_id}"
+    group_id = f"eos-group-{run_id}"
+    state_dir = tempfile.mkdtemp(prefix='eos-state-') if aborts else ''
+    produce_orders(input_topic, NUM_EVENTS)
+
+    os.environ.update({
+        'KAFKA_BROKER': KAFKA_BROKER,
+        'INPUT_TOPIC': input_topic,
+        'OUTPUT_TOPIC': output_topic,
+        'GROUP_ID': group_id,
+        'BATCH_SIZE': str(batch_size),
+        'EXACTLY_ONCE': 'true' if exactly_once else 'false',
+        'TRANSACTIONAL_ID': f"eos-bench-{run_id}",
+        'STATE_DIR': state_dir,
+        'CHANGELOG_TOPIC': changelog_topic,
+    })
+    from consumer import InventoryConsumer
+    inventory = InventoryConsumer()
+
+    processed = [0]
+    last_batch = [0]
+
+    if aborts:
+        commit_transaction = inventory.producer.commit_transaction
+        aborted = [0]
+
+        def failing_commit(*args, **kwargs):
+            # As if the broker failed the commit: the batch must be aborted and retried
+            if aborted[0] < aborts:
+                aborted[0] += 1
+                processed[0] -= last_batch[0]  # Consumed again after the abort
+                raise KafkaException(KafkaError(KafkaError._TIMED_OUT, 'Injected commit failure',
+                                                txn_requires_abort=True))
+            return commit_transaction(*args, **kwargs)
+
+        inventory.producer.commit_transaction = failing_commit
+
+    process_message = inventory.process_message
+
+    def counting_process(msg):
+        ok = process_message(msg)
+        processed[0] += 1
+        if processed[0] >= NUM_EVENTS:
+            inventory.running = False
+        return ok
+
+    process_batch = inventory.process_batch
+
+    def counting_batch(messages):
+        done = process_batch(messages)
+        last_batch[0] = len(done)
+        processed[0] += len(done)
+        if processed[0] >= NUM_EVENTS:
+            inventory.running = False
+        return done
+
+    inventory.process_message = counting_process
+    inventory.process_batch = counting_batch
+    thread = threading.Thread(target=inventory.start)
+    start = time.time()
+    thread.start()
+    thread.join(timeout=300)
+    elapsed = time.time() - start
+
+    outputs, distinct = count_committed_output(output_topic)
+    changelog = None
+    if aborts:
+        changelog = {"reservations": len(inventory.inventory),
+                     "changelog_orders": count_committed_output(changelog_topic)[1]}
+        shutil.rmtree(state_dir, ignore_errors=True)
+    return {
+        "mode": "exactly-once" if exactly_once else "at-least-once",
+        "batch_size": batch_size,
+        "aborted_transactions": aborts,
+        "changelog": changelog,
+        "events": processed[0],
+        "elapsed_seconds": round(elapsed, 3),
+        "events_per_second": round(processed[0] / elapsed, 1) if elapsed > 0 else 0,
+        "committed_outputs": outputs,
+        "distinct_outputs": distinct,
+        "committed_input_offsets": committed_input(group_id, input_topic),
+    }
+
+
+def test_exactly_once():
+    print("Starting Exactly-Once Throughput Test")
+    print("="*60)
+    print(f"Broker: {KAFKA_BROKER}, events per run: {NUM_EVENTS}")
+
+    logging.getLogger('consumer').setLevel(logging.ERROR)
+
+    results = [run_case(False, 500)]
+    for batch_size in BATCH_SIZES:
+        results.append(run_case(True, batch_size))
+    results.append(run_case(True, 100, aborts=ABORTS))
+
+    print(f"\n{'Mode':<14} | {'Batch':>5} | {'Aborts':>6} | {'Events/s':>9} | {'Outputs':>7} | {'Distinct':>8} | "
+          f"{'Committed':>9}")
+    print("-" * 77)
+    for r in results:
+        print(f"{r['mode']:<14} | {r['batch_size']:>5} | {r['aborted_transactions']:>6} | "
+              f"{r['events_per_second']:>9.1f} | {r['committed_outputs']:>7} | {r['distinct_outputs']:>8} | "
+              f"{r['committed_input_offsets']:>9}")
+    print("="*60)
+
+    ok = True
+    for r in results:
+        if r['mode'] == 'exactly-once':
+            exact = r['committed_outputs'] == r['distinct_outputs'] == r['committed_input_offsets'] == NUM_EVENTS
+            ok &= exact
+            mark = "✓" if exact else "✗"
+            aborted = f", {r['aborted_transactions']} aborted transactions" if r['aborted_transactions'] else ""
+            print(f"{mark} batch {r['batch_size']}{aborted}: one committed output per input event")
+        if r['changelog']:
+            changelog = r['changelog']
+            complete = changelog['changelog_orders'] == changelog['reservations']
+            ok &= complete
+            mark = "✓" if complete else "✗"
+            print(f"{mark} After aborts, the changelog holds all {changelog['reservations']} reservations "
+                  f"({changelog['changelog_orders']} found)")
+
+    with open('exactly_once_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to exactly_once_results.json")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if test_exactly_once() else 1)
@@ -0,0 +1,246 @@
+"""
+Lag Drain Test
+Builds a backlog of OrderPlaced events while no InventoryConsumer runs,
+then starts one and samples the group's committed lag until it is 0:
+  1. Per-message: poll + synchronous commit per event (BATCH_SIZE=1)
+  2. Batched: consume(BATCH_SIZE) + asynchronous commits every
+     COMMIT_EVERY messages / COMMIT_INTERVAL_MS
+  3. Batched with injected output delivery failures: offsets must not be
+     committed past an undelivered event, so every order still gets an
+     inventory event (at-least-once)
+  4. Batched with injected errors while completing orders: the failed
+     batch must not be committed, so it is processed again
+Runs the consumer in-process on fresh topics.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'inventory_consumer'))
+
+from confluent_kafka import Consumer, Producer, KafkaError, TopicPartition
+from confluent_kafka.admin import AdminClient, NewTopic
+from ids import generate_order_ids, current_timestamp
+
+KAFKA_BROKER = os.getenv('KAFKA_BROKER', 'localhost:9093')
+PARTITIONS = 3  # Same as order-events in docker-compose kafka-setup
+NUM_EVENTS = 10000
+SAMPLE_INTERVAL = 0.05
+TIMEOUT_SECONDS = 600
+FAILED_DELIVERIES = 20  # Output delivery reports turned into errors in case 3
+FAILED_ORDERS = 5  # Orders whose completion raises in case 4
+CASES = [
+    ("per-message", {'BATCH_SIZE': '1'}, 0, 0),
+    ("batched", {'BATCH_SIZE': '500'}, 0, 0),
+    ("batched, failed deliveries", {'BATCH_SIZE': '500'}, FAILED_DELIVERIES, 0),
+    ("batched, failed orders", {'BATCH_SIZE': '500'}, 0, FAILED_ORDERS),
+]
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+
+
+def create_topics(*topics):
+    admin = AdminClient({'bootstrap.servers': KAFKA_BROKER})
+    futures = admin.create_topics([NewTopic(topic, num_partitions=PARTITIONS, replication_factor=1)
+                                   for topic in topics])
+    for future in futures.values():
+        future.result()
+
+
+def produce_orders(topic, n):
+    """Write n OrderPlaced events straight to the input topic; returns their order IDs"""
+    producer = Producer({'bootstrap.servers': KAFKA_BROKER})
+    timestamp = current_timestamp()
+    order_ids = generate_order_ids(n)
+    for i, order_id in enumerate(order_ids):
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "event_type": "OrderPlaced",
+            "order_id": order_id,
+            "timestamp": timestamp,
+            "payload": {"user_id": f"user_{i}", "item": ITEMS[i % 5], "quantity": 1}
+        }
+        producer.produce(topic, key=order_id.encode('utf-8'), value=json.dumps(event).encode('utf-8'))
+        if i % 1000 == 0:
+            producer.poll(0)
+    producer.flush()
+    return set(order_ids)
+
+
+def committed_lag(consumer, topic):
+    """Sum over partitions of end offset - committed offset"""
+    partitions = [TopicPartition(topic, p) for p in range(PARTITIONS)]
+    lag = 0
+    for tp in consumer.committed(partitions, timeout=10):
+        _, high = consumer.get_watermark_offsets(TopicPartition(topic, tp.partition), timeout=10)
+        lag += high - max(tp.offset, 0)
+    return lag
+
+
+def output_order_ids(topic):
+    """Order IDs of every event on the output topic"""
+    consumer = Consumer({'bootstrap.servers': KAFKA_BROKER, 'group.id': f"drain-reader-{uuid.uuid4().hex[:8]}",
+                         'auto.offset.reset': 'earliest', 'enable.auto.commit': False})
+    ends = {}
+    for p in range(PARTITIONS):
+        ends[p] = consumer.get_watermark_offsets(TopicPartition(topic, p), timeout=10)[1]
+    consumer.assign([TopicPartition(topic, p, 0) for p in range(PARTITIONS)])
+    order_ids = set()
+    positions = {p: 0 for p in range(PARTITIONS)}
+    deadline = time.time() + 60
+    while any(positions[p] < ends[p] for p in ends) and time.time() < deadline:
+        for msg in consumer.consume(num_messages=1000, timeout=1.0):
+            if msg.error():
+                continue
+            order_ids.add(msg.key().decode('utf-8'))
+            positions[msg.partition()] = msg.offset() + 1
+    consumer.close()
+    return order_ids
+
+
+def run_case(name, settings, failures, failed_orders):
+    """Drain a fresh backlog with one consumer setup; return the lag curve and drain rate"""
+    run_id = uuid.uuid4().hex[:8]
+    input_topic = f"drain-orders-{run_id}"
+    output_topic = f"drain-inventory-{run_id}"
+    group_id = f"drain-group-{run_id}"
+    create_topics(input_topic, output_topic)
+    orders = produce_orders(input_topic, NUM_EVENTS)
+
+    os.environ.update({
+        'KAFKA_BROKER': KAFKA_BROKER,
+        'INPUT_TOPIC': input_topic,
+        'OUTPUT_TOPIC': output_topic,
+        'GROUP_ID': group_id,
+        'STATE_DIR': '',
+        'EXACTLY_ONCE': 'false',
+        'MAX_RESERVATIONS': '0',
+        **settings,
+    })
+    from consumer import InventoryConsumer
+    inventory = InventoryConsumer()
+
+    if failures:
+        # Turn the first delivery reports into errors, as if the events were lost
+        output_delivered = inventory.output_delivered
+        failed = [0]
+
+        def failing_delivered(err, msg):
+            if err is None and failed[0] < failures:
+                failed[0] += 1
+                err = KafkaError(KafkaError._TIMED_OUT, 'Injected delivery failure')
+            output_delivered(err, msg)
+
+        inventory.output_delivered = failing_delivered
+
+    if failed_orders:
+        # Raise while completing the first orders, as if the producer queue were full
+        complete_order = inventory.complete_order
+        raised = [0]
+
+        def failing_complete(order, *args):
+            if raised[0] < failed_orders:
+                raised[0] += 1
+                raise BufferError('Injected local queue full')
+            complete_order(order, *args)
+
+        inventory.complete_order = failing_complete
+
+    rewinds = [0]
+    reprocess = inventory.reprocess
+
+    def counting_reprocess():
+        rewinds[0] += 1
+        reprocess()
+
+    inventory.reprocess = counting_reprocess
+
+    monitor = Consumer({'bootstrap.servers': KAFKA_BROKER, 'group.id': group_id})
+    thread = threading.Thread(target=inventory.start)
+    start = time.time()
+    thread.start()
+
+    samples = []
+    while time.time() - start < TIMEOUT_SECONDS:
+        lag = committed_lag(monitor, input_topic)
+        samples.append((round(time.time() - start, 2), lag))
+        if lag == 0:
+            break
+        time.sleep(SAMPLE_INTERVAL)
+    elapsed = time.time() - start
+    inventory.running = False
+    thread.join(timeout=60)
+    monitor.close()
+
+    missing = len(orders - output_order_ids(output_topic))
+    drained = NUM_EVENTS - samples[-1][1]
+    return {
+        "case": name,
+        "failed_deliveries": failures,
+        "failed_orders": failed_orders,
+        "rewinds": rewinds[0],
+        "drained": drained,
+        "drain_seconds": round(elapsed, 3),
+        "drain_rate": round(drained / elapsed, 1) if elapsed > 0 else 0,
+        "orders_without_output": missing,
+        "lag_samples": samples,
+    }
+
+
+def test_lag_drain():
+    print("Starting Lag Drain Test")
+    print("="*60)
+    print(f"Broker: {KAFKA_BROKER}, partitions: {PARTITIONS}, backlog: {NUM_EVENTS} events")
+
+    logging.getLogger('consumer').setLevel(logging.CRITICAL)
+
+    results = [run_case(*case) for case in CASES]
+    baseline = results[0]['drain_rate'] or 1
+
+    print(f"\n{'Case':<28} | {'Drained':>7} | {'Seconds':>7} | {'Events/s':>9} | {'Speedup':>7} | "
+          f"{'Rewinds':>7} | {'No output':>9}")
+    print("-" * 92)
+    for r in results:
+        r['speedup'] = round(r['drain_rate'] / baseline, 1)
+        print(f"{r['case']:<28} | {r['drained']:>7} | {r['drain_seconds']:>7.2f} | {r['drain_rate']:>9.1f} | "
+              f"{r['speedup']:>6.1f}x | {r['rewinds']:>7} | {r['orders_without_output']:>9}")
+    print("="*60)
+
+    drained = all(r['drained'] == NUM_EVENTS for r in results)
+    if drained:
+        print("✓ Every run drained the backlog to zero committed lag")
+    else:
+        print("✗ Some runs did not drain the backlog")
+    no_lost = all(r['orders_without_output'] == 0 for r in results)
+    if no_lost:
+        print("✓ Every order has an inventory event, including after failed deliveries and orders")
+    else:
+        print("✗ Some committed orders have no inventory event")
+    rewound = results[2]['rewinds'] > 0
+    if rewound:
+        print(f"✓ Failed deliveries held back the commit and rewound {results[2]['rewinds']} time(s)")
+    else:
+        print("✗ Failed deliveries did not stop a commit")
+    retried = results[3]['rewinds'] > 0
+    if retried:
+        print(f"✓ Failed orders held back the commit and rewound {results[3]['rewinds']} time(s)")
+    else:
+        print("✗ Failed orders did not stop a commit")
+    # The gain is the commit round trip saved per message, so it needs a real broker
+    # (the in-process stand-in commits without one and shows about 1x)
+    print(f"  Batched drain rate: {results[1]['speedup']:.1f}x per-message")
+
+    with open('lag_drain_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to lag_drain_results.json")
+    return drained and no_lost and rewound and retried
+
+
+if __name__ == '__main__':
+    sys.exit(0 if test_lag_drain() else 1)
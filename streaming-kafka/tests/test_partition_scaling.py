@@ -0,0 +1,222 @@
+"""
+Partition Scaling Test
+Runs consumer.py as its own process with WORKERS = 1, 2, 3 and 6 consumer
+processes on an input topic with the same partition count as kafka-setup
+creates for order-events (3), and reports throughput for each. Every
+process is a group member owning some of the partitions, so the speedup
+comes from using more cores and is capped by the partition count (and by
+the cores of this machine). The work is the consumer's own: nothing is
+patched in.
+Throughput is measured on the output topic, from the first to the last
+inventory event's timestamp, after the group has settled.
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+
+from confluent_kafka import Consumer, Producer, TopicPartition
+from confluent_kafka.admin import AdminClient, NewTopic
+from ids import generate_order_ids, current_timestamp
+
+KAFKA_BROKER = os.getenv('KAFKA_BROKER', 'localhost:9093')
+PARTITIONS = 3  # Same as order-events in docker-compose kafka-setup
+NUM_EVENTS = 60000
+PROCESS_COUNTS = [1, 2, 3, 6]
+SETTLE_TIMEOUT = 60  # Seconds for every process to join and the group to settle
+IDLE_TIMEOUT = 30  # Give up reading the output after this long without a new event
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+CONSUMER_DIR = os.path.join(ROOT, 'streaming-kafka', 'inventory_consumer')
+
+
+def create_topic(topic):
+    admin = AdminClient({'bootstrap.servers': KAFKA_BROKER})
+    futures = admin.create_topics([NewTopic(topic, num_partitions=PARTITIONS, replication_factor=1)])
+    for future in futures.values():
+        future.result()
+
+
+def encode_orders(n):
+    """n OrderPlaced events as (key, value), encoded before the clock starts"""
+    timestamp = current_timestamp()
+    records = []
+    for i, order_id in enumerate(generate_order_ids(n)):
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "event_type": "OrderPlaced",
+            "order_id": order_id,
+            "timestamp": timestamp,
+            "payload": {"user_id": f"user_{i}", "item": ITEMS[i % 5], "quantity": 1}
+        }
+        records.append((order_id.encode('utf-8'), json.dumps(event).encode('utf-8')))
+    return records
+
+
+def produce(topic, records):
+    """Write the records to the input topic; returns events per second"""
+    producer = Producer({'bootstrap.servers': KAFKA_BROKER, 'linger.ms': 5})
+    start = time.time()
+    for i, (key, value) in enumerate(records):
+        producer.produce(topic, key=key, value=value)
+        if i % 1000 == 0:
+            producer.poll(0)
+    producer.flush()
+    return len(records) / (time.time() - start)
+
+
+def start_consumer(processes, input_topic, output_topic, group_id):
+    """consumer.py in its own process tree, with its logs discarded"""
+    env = dict(os.environ, **{
+        'PYTHONPATH': os.path.join(ROOT, 'common'),
+        'KAFKA_BROKER': KAFKA_BROKER,
+        'INPUT_TOPIC': input_topic,
+        'OUTPUT_TOPIC': output_topic,
+        'GROUP_ID': group_id,
+        'BATCH_SIZE': '500',
+        'WORKERS': str(processes),
+        'EXACTLY_ONCE': 'false',
+        'STATE_DIR': '',
+        'METRICS_PORT': '0',
+    })
+    return subprocess.Popen([sys.executable, 'consumer.py'], cwd=CONSUMER_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_settled(group_id, members):
+    """Wait until the group has all its members and every partition is assigned"""
+    admin = AdminClient({'bootstrap.servers': KAFKA_BROKER})
+    deadline = time.time() + SETTLE_TIMEOUT
+    while time.time() < deadline:
+        try:
+            group = admin.describe_consumer_groups([group_id])[group_id].result()
+            assigned = sum(len(m.assignment.topic_partitions) for m in group.members)
+            if len(group.members) == members and assigned == PARTITIONS:
+                return True
+        except Exception:
+            pass  # Group not created yet
+        time.sleep(0.5)
+    return False
+
+
+def read_output(topic):
+    """Distinct order IDs on the output topic and the first/last event timestamps (ms)"""
+    consumer = Consumer({
+        'bootstrap.servers': KAFKA_BROKER,
+        'group.id': f"scaling-verify-{uuid.uuid4()}",
+        'auto.offset.reset': 'earliest',
+        'enable.auto.commit': False
+    })
+    consumer.subscribe([topic])
+    seen = set()
+    first, last = None, None
+    idle_since = time.time()
+    while len(seen) < NUM_EVENTS and time.time() - idle_since < IDLE_TIMEOUT:
+        messages = consumer.consume(num_messages=1000, timeout=1.0)
+        for msg in messages:
+            if msg.error():
+                continue
+            seen.add(msg.key())
+            timestamp = msg.timestamp()[1]
+            first = timestamp if first is None else min(first, timestamp)
+            last = timestamp if last is None else max(last, timestamp)
+        if messages:
+            idle_since = time.time()
+    consumer.close()
+    return len(seen), first, last
+
+
+def committed_input(group_id, topic):
+    """Sum of the group's committed offsets on the input topic"""
+    consumer = Consumer({'bootstrap.servers': KAFKA_BROKER, 'group.id': group_id})
+    committed = consumer.committed([TopicPartition(topic, p) for p in range(PARTITIONS)], timeout=10)
+    consumer.close()
+    return sum(tp.offset for tp in committed if tp.offset > 0)
+
+
+def run_case(processes, records):
+    """Drain NUM_EVENTS with the given number of consumer processes; return throughput stats"""
+    run_id = uuid.uuid4().hex[:8]
+    input_topic = f"scaling-orders-{run_id}"
+    output_topic = f"scaling-inventory-{run_id}"
+    group_id = f"scaling-group-{run_id}"
+    create_topic(input_topic)
+    create_topic(output_topic)
+
+    consumer = start_consumer(processes, input_topic, output_topic, group_id)
+    settled = wait_until_settled(group_id, processes)
+    produce_rate = produce(input_topic, records)
+    distinct, first, last = read_output(output_topic)
+
+    consumer.send_signal(signal.SIGTERM)  # Every process commits and closes
+    try:
+        consumer.wait(timeout=90)
+    except subprocess.TimeoutExpired:
+        consumer.kill()
+        consumer.wait()
+
+    elapsed = (last - first) / 1000 if first is not None and last > first else 0
+    return {
+        "processes": processes,
+        "group_settled": settled,
+        "produce_events_per_second": round(produce_rate, 1),
+        "outputs": distinct,
+        "elapsed_seconds": round(elapsed, 3),
+        "events_per_second": round(distinct / elapsed, 1) if elapsed > 0 else 0,
+        "committed_input_offsets": committed_input(group_id, input_topic),
+        "exit_code": consumer.returncode,
+    }
+
+
+def test_partition_scaling():
+    print("Starting Partition Scaling Test")
+    print("="*60)
+    cores = os.cpu_count() or 1
+    print(f"Broker: {KAFKA_BROKER}, partitions: {PARTITIONS}, events per run: {NUM_EVENTS}, cores: {cores}")
+
+    records = encode_orders(NUM_EVENTS)
+    results = [run_case(processes, records) for processes in PROCESS_COUNTS]
+    baseline = results[0]['events_per_second'] or 1
+
+    print(f"\n{'Processes':>9} | {'Produced/s':>10} | {'Events/s':>9} | {'Speedup':>7} | {'Outputs':>7} | "
+          f"{'Committed':>9}")
+    print("-" * 68)
+    for r in results:
+        r['speedup'] = round(r['events_per_second'] / baseline, 2)
+        print(f"{r['processes']:>9} | {r['produce_events_per_second']:>10.1f} | {r['events_per_second']:>9.1f} | "
+              f"{r['speedup']:>6.2f}x | {r['outputs']:>7} | {r['committed_input_offsets']:>9}")
+    print("="*60)
+
+    ok = True
+    complete = all(r['outputs'] == r['committed_input_offsets'] == NUM_EVENTS and r['exit_code'] == 0
+                   for r in results)
+    ok &= complete
+    print(f"{'✓' if complete else '✗'} Every run emitted one event per order, committed all input offsets "
+          f"and stopped cleanly")
+    settled = all(r['group_settled'] for r in results)
+    ok &= settled
+    print(f"{'✓' if settled else '✗'} Every process joined the group before the orders were produced")
+
+    by_count = {r['processes']: r for r in results}
+    if cores >= PARTITIONS:
+        faster = by_count[PARTITIONS]['events_per_second'] > by_count[1]['events_per_second']
+        ok &= faster
+        print(f"{'✓' if faster else '✗'} {PARTITIONS} processes are faster than 1 "
+              f"({by_count[PARTITIONS]['speedup']:.2f}x)")
+    else:
+        print(f"- Speedup not checked: {cores} core(s), fewer than the {PARTITIONS} partitions")
+
+    with open('partition_scaling_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to partition_scaling_results.json")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if test_partition_scaling() else 1)
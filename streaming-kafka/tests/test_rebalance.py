@@ -0,0 +1,217 @@
+"""
+Rebalance Pause Test
+Runs InventoryConsumer instances in-process while orders are produced at a
+steady rate, and measures what happens to processing when the group changes:
+  1. eager (range): a second instance joins
+  2. cooperative-sticky: a second instance joins
+  3. cooperative-sticky + static membership: one of two instances restarts
+For each scenario it reports the longest stall of the whole group, the
+longest stall of any single partition, the worst end-to-end latency after
+the change, and how many messages were processed twice.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'inventory_consumer'))
+
+from confluent_kafka import Producer
+from confluent_kafka.admin import AdminClient, NewTopic
+from ids import generate_order_ids, current_timestamp
+
+KAFKA_BROKER = os.getenv('KAFKA_BROKER', 'localhost:9093')
+PARTITIONS = 3  # Same as order-events in docker-compose kafka-setup
+RATE = 1000  # Orders produced per second
+DURATION = 12  # Seconds of production per scenario
+CHANGE_AT = 4  # Seconds after the start when the group changes
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+
+
+def create_topic(topic):
+    admin = AdminClient({'bootstrap.servers': KAFKA_BROKER})
+    futures = admin.create_topics([NewTopic(topic, num_partitions=PARTITIONS, replication_factor=1)])
+    for future in futures.values():
+        future.result()
+
+
+def produce_steadily(topic):
+    """Produce RATE orders per second for DURATION seconds"""
+    producer = Producer({'bootstrap.servers': KAFKA_BROKER, 'linger.ms': 5})
+    start = time.time()
+    for i, order_id in enumerate(generate_order_ids(RATE * DURATION)):
+        delay = start + i / RATE - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "event_type": "OrderPlaced",
+            "order_id": order_id,
+            "timestamp": current_timestamp(),
+            "payload": {"user_id": f"user_{i}", "item": ITEMS[i % 5], "quantity": 1}
+        }
+        producer.produce(topic, key=order_id.encode('utf-8'), value=json.dumps(event).encode('utf-8'))
+        producer.poll(0)
+    producer.flush()
+
+
+class Instance:
+    """One InventoryConsumer running on its own thread, recording what it processes"""
+
+    def __init__(self, name, records, lock, instance_id=''):
+        os.environ['GROUP_INSTANCE_ID'] = instance_id
+        from consumer import InventoryConsumer
+        self.name = name
+        self.inventory = InventoryConsumer()
+        process_batch = self.inventory.process_batch
+
+        def recording_batch(messages):
+            done = process_batch(messages)
+            now = time.time()
+            with lock:
+                for msg in done:
+                    records.append((now, name, msg.partition(), msg.offset(), msg.timestamp()[1] / 1000))
+            return done
+
+        self.inventory.process_batch = recording_batch
+        self.thread = threading.Thread(target=self.inventory.start)
+        self.thread.start()
+
+    def stop(self):
+        self.inventory.running = False
+        self.thread.join(timeout=60)
+
+
+def longest_gap(times, after):
+    """Longest gap between consecutive times that ends after the given time"""
+    times = sorted(times)
+    gaps = [b - a for a, b in zip(times, times[1:]) if b > after]
+    return max(gaps, default=0.0)
+
+
+def summarize(name, records, change_time):
+    records.sort()
+    seen = set()
+    redelivered = 0
+    by_partition = {}
+    owners = {}
+    owner_changes = 0
+    for now, instance, partition, offset, produced in records:
+        if (partition, offset) in seen:
+            redelivered += 1
+        seen.add((partition, offset))
+        by_partition.setdefault(partition, []).append(now)
+        if owners.get(partition, instance) != instance:
+            owner_changes += 1
+        owners[partition] = instance
+
+    latencies_before = sorted(now - produced for now, _, _, _, produced in records if now < change_time)
+    latency_after = max((now - produced for now, _, _, _, produced in records if now >= change_time), default=0.0)
+    return {
+        "scenario": name,
+        "processed": len(records),
+        "distinct": len(seen),
+        "redelivered": redelivered,
+        "partition_owner_changes": owner_changes,
+        "group_stall_ms": round(longest_gap([r[0] for r in records], change_time) * 1000, 1),
+        "partition_stall_ms": round(max(longest_gap(t, change_time) for t in by_partition.values()) * 1000, 1),
+        "p99_latency_before_ms": round(latencies_before[int(len(latencies_before) * 0.99)] * 1000, 1)
+                                 if latencies_before else 0.0,
+        "max_latency_after_ms": round(latency_after * 1000, 1),
+    }
+
+
+def run_scenario(name, strategy, static):
+    """Start one instance, change the group at CHANGE_AT, run until production ends"""
+    run_id = uuid.uuid4().hex[:8]
+    input_topic = f"rebalance-orders-{run_id}"
+    create_topic(input_topic)
+    os.environ.update({
+        'KAFKA_BROKER': KAFKA_BROKER,
+        'INPUT_TOPIC': input_topic,
+        'OUTPUT_TOPIC': f"rebalance-inventory-{run_id}",
+        'GROUP_ID': f"rebalance-group-{run_id}",
+        'PARTITION_ASSIGNMENT_STRATEGY': strategy,
+        'BATCH_SIZE': '100',
+        'EXACTLY_ONCE': 'false',
+        'STATE_DIR': '',
+    })
+
+    records = []
+    lock = threading.Lock()
+    producer = threading.Thread(target=produce_steadily, args=(input_topic,))
+    producer.start()
+
+    instances = [Instance('a', records, lock, f"a-{run_id}" if static else '')]
+    if static:
+        instances.append(Instance('b', records, lock, f"b-{run_id}"))
+    time.sleep(CHANGE_AT)
+    change_time = time.time()
+    if static:
+        # Restart b with the same group.instance.id
+        instances.pop().stop()
+        instances.append(Instance('b', records, lock, f"b-{run_id}"))
+    else:
+        instances.append(Instance('b', records, lock))
+
+    producer.join()
+    time.sleep(2)  # Let the consumers catch up
+    for instance in instances:
+        instance.stop()
+    return summarize(name, records, change_time)
+
+
+def test_rebalance():
+    print("Starting Rebalance Pause Test")
+    print("="*60)
+    print(f"Broker: {KAFKA_BROKER}, partitions: {PARTITIONS}, rate: {RATE}/s, "
+          f"duration: {DURATION}s, group change at {CHANGE_AT}s")
+
+    logging.getLogger('consumer').setLevel(logging.ERROR)
+
+    results = [
+        run_scenario('eager join', 'range', static=False),
+        run_scenario('cooperative join', 'cooperative-sticky', static=False),
+        run_scenario('static restart', 'cooperative-sticky', static=True),
+    ]
+
+    print(f"\n{'Scenario':<18} | {'Group stall':>11} | {'Part. stall':>11} | {'p99 before':>10} | "
+          f"{'Max after':>9} | {'Moved':>5} | {'Redelivered':>11}")
+    print("-" * 94)
+    for r in results:
+        print(f"{r['scenario']:<18} | {r['group_stall_ms']:>8.1f} ms | {r['partition_stall_ms']:>8.1f} ms | "
+              f"{r['p99_latency_before_ms']:>7.1f} ms | {r['max_latency_after_ms']:>6.1f} ms | "
+              f"{r['partition_owner_changes']:>5} | {r['redelivered']:>11}")
+    print("="*60)
+
+    eager, cooperative, static = results
+    shorter = cooperative['group_stall_ms'] <= eager['group_stall_ms']
+    if shorter:
+        print("✓ Cooperative rebalance stalls the group no longer than eager")
+    else:
+        print("✗ Cooperative rebalance stalled the group longer than eager")
+    static_kept = static['partition_owner_changes'] == 0
+    if static_kept:
+        print("✓ Static member restart moved no partitions")
+    else:
+        print("✗ Static member restart moved partitions")
+    no_duplicates = all(r['redelivered'] == 0 for r in results)
+    if no_duplicates:
+        print("✓ No messages were processed twice")
+    else:
+        print("✗ Some messages were processed twice")
+
+    with open('rebalance_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to rebalance_results.json")
+    return shorter and static_kept and no_duplicates
+
+
+if __name__ == '__main__':
+    sys.exit(0 if test_rebalance() else 1)
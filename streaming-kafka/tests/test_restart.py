@@ -0,0 +1,255 @@
+"""
+State Restore Test
+Compares three ways an InventoryConsumer gets its reservations back after
+a restart:
+  1. Full replay: reprocess every order-event from earliest (no local state)
+  2. Warm restart: load the SQLite checkpoint, replay the changelog tail
+  3. Cold restart: SQLite file lost, restore from the compacted changelog
+  4. Rebalance: a second instance gains the partitions after the first
+     processed more orders, and must catch up on their stock levels
+MAX_RESERVATIONS is below the number of reserved orders, so reservations
+are evicted; each eviction must write a tombstone to the changelog, and
+the restores (which replay more reservations than fit) must write none.
+Runs the consumer in-process on fresh topics. Exits non-zero if a check fails.
+"""
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'streaming-kafka', 'inventory_consumer'))
+
+from confluent_kafka import Consumer, Producer, TopicPartition
+from confluent_kafka.admin import AdminClient, NewTopic
+from ids import generate_order_ids, current_timestamp
+
+KAFKA_BROKER = os.getenv('KAFKA_BROKER', 'localhost:9093')
+PARTITIONS = 3
+NUM_EVENTS = 20000
+MAX_RESERVATIONS = 15000  # About 18,000 orders are reserved: the oldest are evicted
+EXTRA_EVENTS = 3000  # Processed by the first instance before the second gains its partitions
+ITEMS = ["Burger", "Pizza", "Salad", "Sandwich", "Pasta"]
+
+
+def create_topics(*topics, config=None):
+    admin = AdminClient({'bootstrap.servers': KAFKA_BROKER})
+    futures = admin.create_topics([
+        NewTopic(topic, num_partitions=PARTITIONS, replication_factor=1, config=config or {})
+        for topic in topics
+    ])
+    for future in futures.values():
+        future.result()
+
+
+def produce_orders(topic, n):
+    """Write n OrderPlaced events straight to the input topic"""
+    producer = Producer({'bootstrap.servers': KAFKA_BROKER})
+    timestamp = current_timestamp()
+    for i, order_id in enumerate(generate_order_ids(n)):
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "event_type": "OrderPlaced",
+            "order_id": order_id,
+            "timestamp": timestamp,
+            "payload": {"user_id": f"user_{i}", "item": ITEMS[i % 5], "quantity": 1}
+        }
+        producer.produce(topic, key=order_id.encode('utf-8'), value=json.dumps(event).encode('utf-8'))
+        if i % 1000 == 0:
+            producer.poll(0)
+    producer.flush()
+
+
+def configure(run_id, group_id, state_dir):
+    os.environ.update({
+        'KAFKA_BROKER': KAFKA_BROKER,
+        'INPUT_TOPIC': f"restart-orders-{run_id}",
+        'OUTPUT_TOPIC': f"restart-inventory-{run_id}",
+        'CHANGELOG_TOPIC': f"restart-changelog-{run_id}",
+        'GROUP_ID': group_id,
+        'STATE_DIR': state_dir,
+        'MAX_RESERVATIONS': str(MAX_RESERVATIONS),
+        'BATCH_SIZE': '500',
+        'EXACTLY_ONCE': 'false',
+    })
+
+
+def count_tombstones(topic):
+    """Changelog records with no value (deleted reservations)"""
+    consumer = Consumer({'bootstrap.servers': KAFKA_BROKER, 'group.id': f"restart-verify-{uuid.uuid4()}",
+                         'enable.auto.commit': False})
+    ends = {p: consumer.get_watermark_offsets(TopicPartition(topic, p), timeout=10)[1] for p in range(PARTITIONS)}
+    consumer.assign([TopicPartition(topic, p, 0) for p in range(PARTITIONS)])
+    positions = {p: 0 for p in range(PARTITIONS)}
+    tombstones = 0
+    deadline = time.time() + 60
+    while any(positions[p] < ends[p] for p in ends) and time.time() < deadline:
+        for msg in consumer.consume(num_messages=1000, timeout=1.0):
+            if msg.error():
+                continue
+            tombstones += msg.value() is None
+            positions[msg.partition()] = msg.offset() + 1
+    consumer.close()
+    return tombstones
+
+
+def projected_stock(model, offset):
+    """{(partition, item): level} with restocks applied up to offset, comparable across instances"""
+    levels = {}
+    for partition, item, level, as_of in model.export():
+        if model.restock_qty:
+            level += (offset // model.restock_every - as_of // model.restock_every) * model.restock_qty
+        levels[(partition, item)] = level
+    return levels
+
+
+def drain(inventory, n):
+    """Run a consumer until it has processed n messages, then stop it"""
+    processed = [0]
+    process_message = inventory.process_message
+
+    def counting_process(msg):
+        ok = process_message(msg)
+        processed[0] += 1
+        if processed[0] >= n:
+            inventory.running = False
+        return ok
+
+    process_batch = inventory.process_batch
+
+    def counting_batch(messages):
+        done = process_batch(messages)
+        processed[0] += len(done)
+        if processed[0] >= n:
+            inventory.running = False
+        return done
+
+    inventory.process_message = counting_process
+    inventory.process_batch = counting_batch
+    thread = threading.Thread(target=inventory.start)
+    thread.start()
+    thread.join(timeout=600)
+
+
+def test_restart():
+    print("Starting State Restore Test")
+    print("="*60)
+    print(f"Broker: {KAFKA_BROKER}, orders: {NUM_EVENTS}")
+
+    logging.getLogger('consumer').setLevel(logging.ERROR)
+    from consumer import InventoryConsumer
+
+    run_id = uuid.uuid4().hex[:8]
+    state_dir = tempfile.mkdtemp(prefix='inventory-state-')
+    other_dir = tempfile.mkdtemp(prefix='inventory-state-')
+    create_topics(f"restart-orders-{run_id}")
+    create_topics(f"restart-changelog-{run_id}", config={'cleanup.policy': 'compact'})
+    produce_orders(f"restart-orders-{run_id}", NUM_EVENTS)
+
+    try:
+        # 1. Full replay: build state by processing every order from earliest
+        configure(run_id, f"restart-group-{run_id}", state_dir)
+        start = time.time()
+        inventory = InventoryConsumer()
+        drain(inventory, NUM_EVENTS)
+        replay_seconds = time.time() - start
+        reservations = len(inventory.inventory)
+        evicted = inventory.inventory.stats()['evicted_size']
+        tombstones = count_tombstones(f"restart-changelog-{run_id}")
+        print(f"\n1. Full replay of {NUM_EVENTS} orders: {replay_seconds:.2f}s "
+              f"({reservations} reservations, {evicted} evicted, {tombstones} tombstones)")
+
+        # 2. Warm restart: SQLite checkpoint + changelog tail
+        start = time.time()
+        warm = InventoryConsumer()
+        warm_seconds = time.time() - start
+        warm_count = len(warm.inventory)
+        warm.stop()
+        print(f"2. Warm restart (SQLite + changelog tail): {warm_seconds:.2f}s "
+              f"({warm_count} reservations)")
+
+        # 3. Cold restart: local file lost, rebuild from the changelog topic
+        shutil.rmtree(state_dir)
+        start = time.time()
+        cold = InventoryConsumer()
+        cold_seconds = time.time() - start
+        cold_count = len(cold.inventory)
+        cold.stop()
+        print(f"3. Cold restart (changelog only): {cold_seconds:.2f}s "
+              f"({cold_count} reservations)")
+
+        # 4. Rebalance: a second instance restores now, the first processes more
+        # orders, then the second gains every partition
+        configure(run_id, f"restart-other-{run_id}", other_dir)  # Never polls, so not in the first's group
+        other = InventoryConsumer()
+        produce_orders(f"restart-orders-{run_id}", EXTRA_EVENTS)
+        configure(run_id, f"restart-group-{run_id}", state_dir)
+        first = InventoryConsumer()
+        drain(first, EXTRA_EVENTS)
+        first_evicted = first.inventory.stats()['evicted_size']
+        horizon = NUM_EVENTS + EXTRA_EVENTS
+        stale = projected_stock(other.stock, horizon) != projected_stock(first.stock, horizon)
+        other.on_assign(other.consumer, [TopicPartition(f"restart-orders-{run_id}", p) for p in range(PARTITIONS)])
+        gained_stock = projected_stock(other.stock, horizon) == projected_stock(first.stock, horizon)
+        gained_reservations = len(other.inventory) == len(first.inventory)
+        other.stop()
+        final_tombstones = count_tombstones(f"restart-changelog-{run_id}")
+        print(f"4. Partitions gained after {EXTRA_EVENTS} more orders: stock "
+              f"{'matches' if gained_stock else 'differs from'} the previous owner "
+              f"(stale before assign: {stale}), {len(other.inventory)} reservations "
+              f"(previous owner {len(first.inventory)})")
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+        shutil.rmtree(other_dir, ignore_errors=True)
+
+    print("="*60)
+    checks = []
+
+    def check(ok, passed, failed):
+        checks.append(ok)
+        print(f"✓ {passed}" if ok else f"✗ {failed}")
+
+    check(warm_count == cold_count == reservations,
+          "Both restarts restored every reservation", "Restored reservation counts differ")
+    check(evicted > 0 and tombstones == evicted,
+          f"Every evicted reservation has a changelog tombstone ({tombstones})",
+          f"{evicted} reservations evicted but {tombstones} tombstones written")
+    restore_tombstones = final_tombstones - evicted - first_evicted
+    check(restore_tombstones == 0, "Restores wrote no tombstones",
+          f"Restores wrote {restore_tombstones} tombstones for live reservations")
+    check(stale and gained_stock and gained_reservations,
+          "Gained partitions caught up on the previous owner's stock and reservations",
+          "Gained partitions kept stale stock or reservations")
+    check(warm_seconds < replay_seconds,
+          f"Warm restart {replay_seconds / max(warm_seconds, 1e-6):.0f}x faster than full replay",
+          f"Warm restart ({warm_seconds:.2f}s) not faster than full replay ({replay_seconds:.2f}s)")
+
+    results = {
+        "orders": NUM_EVENTS,
+        "reservations": reservations,
+        "evicted": evicted,
+        "tombstones": tombstones,
+        "restore_tombstones": restore_tombstones,
+        "full_replay_seconds": round(replay_seconds, 3),
+        "warm_restart_seconds": round(warm_seconds, 3),
+        "warm_restart_reservations": warm_count,
+        "cold_restart_seconds": round(cold_seconds, 3),
+        "cold_restart_reservations": cold_count,
+        "gained_partitions_stock_matches": gained_stock,
+        "gained_partitions_reservations_match": gained_reservations,
+    }
+    with open('restart_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print("\n✓ Results exported to restart_results.json")
+    return all(checks)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if test_restart() else 1)
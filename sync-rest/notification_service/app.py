@@ -1,8 +1,13 @@
 from flask import Flask, request, jsonify
 import logging
 import os
+import sys
+
+sys.path.append('/app/common')
+from instrumentation import instrument_flask
 
 app = Flask(__name__)
+instrument_flask(app, 'sync_notification_service')  # GET /metrics, request latency per route
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -6,8 +6,10 @@ import sys
 
 sys.path.append('/app/common')
 from ids import generate_order_id, current_timestamp
+from instrumentation import instrument_flask, histogram
 
 app = Flask(__name__)
+instrument_flask(app, 'sync_order_service')  # GET /metrics, request latency per route
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -19,6 +21,12 @@ INVENTORY_SERVICE_URL = os.getenv('INVENTORY_SERVICE_URL', 'http://inventory_ser
 NOTIFICATION_SERVICE_URL = os.getenv('NOTIFICATION_SERVICE_URL', 'http://notification_service:8003')
 REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', '5'))
 
+# Time spent waiting on each downstream call (the synchronous chain's cost)
+downstream_latency = histogram('downstream_request_duration_seconds',
+                               'Downstream HTTP call latency in seconds', ('service', 'target'))
+inventory_latency = downstream_latency.labels('sync_order_service', 'inventory_service')
+notification_latency = downstream_latency.labels('sync_order_service', 'notification_service')
+
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -55,11 +63,12 @@ def create_order():
         # Step 1: Call Inventory Service synchronously
         try:
             logger.info(f"Calling inventory service for order {order_id}")
-            inventory_response = requests.post(
-                f"{INVENTORY_SERVICE_URL}/reserve",
-                json=order_data,
-                timeout=REQUEST_TIMEOUT
-            )
+            with inventory_latency.time():
+                inventory_response = requests.post(
+                    f"{INVENTORY_SERVICE_URL}/reserve",
+                    json=order_data,
+                    timeout=REQUEST_TIMEOUT
+                )
             
             if inventory_response.status_code != 200:
                 logger.error(f"Inventory reservation failed for order {order_id}: {inventory_response.text}")
@@ -90,11 +99,12 @@ def create_order():
         # Step 2: Call Notification Service synchronously
         try:
             logger.info(f"Calling notification service for order {order_id}")
-            notification_response = requests.post(
-                f"{NOTIFICATION_SERVICE_URL}/send",
-                json=order_data,
-                timeout=REQUEST_TIMEOUT
-            )
+            with notification_latency.time():
+                notification_response = requests.post(
+                    f"{NOTIFICATION_SERVICE_URL}/send",
+                    json=order_data,
+                    timeout=REQUEST_TIMEOUT
+                )
             
             if notification_response.status_code != 200:
                 logger.warning(f"Notification failed for order {order_id}, but order is still placed")
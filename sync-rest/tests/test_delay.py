@@ -1,17 +1,35 @@
 """
 Delay Injection Test for Synchronous REST
-Injects 2-second delay in InventoryService and measures cascading effect.
+Injects 2-second delay in InventoryService and measures cascading effect
+under a constant arrival rate (open loop, see common/loadgen.py).
 """
 import requests
-import time
-import statistics
+import os
+import sys
 import csv
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from loadgen import run_load
+
 ORDER_SERVICE_URL = "http://localhost:8001"
 INVENTORY_SERVICE_URL = "http://localhost:8002"
 NUM_REQUESTS = 100
 DELAY_SECONDS = 2
+RATE = float(os.getenv('RATE', '5'))                       # Requests per second
+CONCURRENCY = int(os.getenv('CONCURRENCY', '20'))          # > RATE * DELAY_SECONDS in flight
+WARMUP_SECONDS = float(os.getenv('WARMUP_SECONDS', '1'))
+LOAD_MODE = os.getenv('LOAD_MODE', 'threads')              # threads | asyncio
+
+
+def send_order(i):
+    order_data = {
+        "user_id": f"user_{i}",
+        "item": "Pizza",
+        "quantity": 1
+    }
+    response = requests.post(f"{ORDER_SERVICE_URL}/order", json=order_data, timeout=10)
+    return response.status_code
 
 
 def test_delay_injection():
@@ -35,49 +53,19 @@ def test_delay_injection():
         print(f"✗ Error configuring delay: {e}")
         return
     
-    # Step 2: Send requests and measure latency
-    print(f"\nSending {NUM_REQUESTS} requests with delay enabled...")
-    
-    latencies = []
-    successful_requests = 0
-    failed_requests = 0
-    
-    for i in range(NUM_REQUESTS):
-        order_data = {
-            "user_id": f"user_{i}",
-            "item": "Pizza",
-            "quantity": 1
-        }
-        
-        start_time = time.time()
-        try:
-            response = requests.post(
-                f"{ORDER_SERVICE_URL}/order",
-                json=order_data,
-                timeout=10
-            )
-            end_time = time.time()
-            
-            latency_ms = (end_time - start_time) * 1000
-            latencies.append(latency_ms)
-            
-            if response.status_code == 200:
-                successful_requests += 1
-            else:
-                failed_requests += 1
-                print(f"Request {i+1} failed with status {response.status_code}")
-        
-        except Exception as e:
-            end_time = time.time()
-            latency_ms = (end_time - start_time) * 1000
-            latencies.append(latency_ms)
-            failed_requests += 1
-            print(f"Request {i+1} failed with error: {e}")
-        
-        # Print progress
-        if (i + 1) % 10 == 0:
-            print(f"Progress: {i+1}/{NUM_REQUESTS} requests completed")
-    
+    # Step 2: Send requests at a constant rate and measure latency
+    print(f"\nSending {NUM_REQUESTS} requests with delay enabled at {RATE:g} req/s "
+          f"({CONCURRENCY} {LOAD_MODE} workers, {WARMUP_SECONDS:g}s warmup)...")
+
+    result = run_load(send_order, rate=RATE, requests=NUM_REQUESTS, concurrency=CONCURRENCY,
+                      warmup_seconds=WARMUP_SECONDS, mode=LOAD_MODE)
+    samples = result.measured
+    successful_requests = sum(1 for sample in samples if sample.outcome == 200)
+    failed_requests = len(samples) - successful_requests
+    for sample in samples:
+        if sample.outcome != 200:
+            print(f"Request {sample.index - result.warmup_requests + 1} failed: {sample.error or sample.outcome}")
+
     # Step 3: Reset delay to 0
     print(f"\nResetting delay to 0...")
     try:
@@ -91,61 +79,65 @@ def test_delay_injection():
     except Exception as e:
         print(f"⚠ Warning: Could not reset delay: {e}")
     
-    # Calculate statistics
-    if latencies:
-        latencies_sorted = sorted(latencies)
-        p50 = statistics.median(latencies)
-        p95 = latencies_sorted[int(len(latencies_sorted) * 0.95)]
-        p99 = latencies_sorted[int(len(latencies_sorted) * 0.99)]
-        avg = statistics.mean(latencies)
-        min_latency = min(latencies)
-        max_latency = max(latencies)
-        
-        print("\n" + "="*60)
-        print("DELAY INJECTION TEST RESULTS")
-        print("="*60)
-        print(f"Configured Delay: {DELAY_SECONDS}s")
-        print(f"Total Requests: {NUM_REQUESTS}")
-        print(f"Successful: {successful_requests}")
-        print(f"Failed: {failed_requests}")
-        print(f"\nLatency Statistics (ms):")
-        print(f"  Average: {avg:.2f}")
-        print(f"  Median (P50): {p50:.2f}")
-        print(f"  P95: {p95:.2f}")
-        print(f"  P99: {p99:.2f}")
-        print(f"  Min: {min_latency:.2f}")
-        print(f"  Max: {max_latency:.2f}")
-        print(f"\nExpected minimum latency: ~{DELAY_SECONDS * 1000}ms")
-        print(f"Actual P50 latency: {p50:.2f}ms")
-        print(f"Overhead beyond delay: {p50 - (DELAY_SECONDS * 1000):.2f}ms")
-        print("="*60)
-        
-        # Export to CSV
-        with open('delay_results.csv', 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['Metric', 'Value (ms)'])
-            writer.writerow(['Configured Delay', DELAY_SECONDS * 1000])
-            writer.writerow(['Average', f'{avg:.2f}'])
-            writer.writerow(['P50', f'{p50:.2f}'])
-            writer.writerow(['P95', f'{p95:.2f}'])
-            writer.writerow(['P99', f'{p99:.2f}'])
-            writer.writerow(['Min', f'{min_latency:.2f}'])
-            writer.writerow(['Max', f'{max_latency:.2f}'])
-            writer.writerow(['Total Requests', NUM_REQUESTS])
-            writer.writerow(['Successful', successful_requests])
-            writer.writerow(['Failed', failed_requests])
-            writer.writerow(['Timestamp', datetime.now().isoformat()])
-        
-        print(f"\nResults exported to delay_results.csv")
-        
-        # Also export individual latencies
-        with open('delay_latencies.csv', 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['Request', 'Latency (ms)'])
-            for i, latency in enumerate(latencies, 1):
-                writer.writerow([i, f'{latency:.2f}'])
-        
-        print(f"Individual latencies exported to delay_latencies.csv")
+    latency = result.latency.summary()
+    service = result.service.summary()
+    p50 = latency['p50']
+
+    print("\n" + "="*60)
+    print("DELAY INJECTION TEST RESULTS")
+    print("="*60)
+    print(f"Configured Delay: {DELAY_SECONDS}s")
+    print(f"Total Requests: {NUM_REQUESTS}")
+    print(f"Successful: {successful_requests}")
+    print(f"Failed: {failed_requests}")
+    print(f"Target Rate: {RATE:g} req/s, Achieved: {result.achieved_rate():.1f} req/s")
+    print(f"\nLatency Statistics (ms, from intended send time):")
+    print(f"  Average: {latency['average']:.2f}")
+    print(f"  Median (P50): {p50:.2f}")
+    print(f"  P95: {latency['p95']:.2f}")
+    print(f"  P99: {latency['p99']:.2f}")
+    print(f"  Min: {latency['min']:.2f}")
+    print(f"  Max: {latency['max']:.2f}")
+    print(f"\nService Time (ms, from actual send): P50 {service['p50']:.2f}, P99 {service['p99']:.2f}")
+    print(f"Max send lag (all workers busy): {result.max_send_lag_ms:.2f}ms")
+    print(f"\nExpected minimum latency: ~{DELAY_SECONDS * 1000}ms")
+    print(f"Actual P50 latency: {p50:.2f}ms")
+    print(f"Overhead beyond delay: {p50 - (DELAY_SECONDS * 1000):.2f}ms")
+    print("="*60)
+
+    # Export to CSV
+    with open('delay_results.csv', 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Metric', 'Value (ms)'])
+        writer.writerow(['Configured Delay', DELAY_SECONDS * 1000])
+        writer.writerow(['Average', f"{latency['average']:.2f}"])
+        writer.writerow(['P50', f'{p50:.2f}'])
+        writer.writerow(['P95', f"{latency['p95']:.2f}"])
+        writer.writerow(['P99', f"{latency['p99']:.2f}"])
+        writer.writerow(['Min', f"{latency['min']:.2f}"])
+        writer.writerow(['Max', f"{latency['max']:.2f}"])
+        writer.writerow(['Total Requests', NUM_REQUESTS])
+        writer.writerow(['Successful', successful_requests])
+        writer.writerow(['Failed', failed_requests])
+        writer.writerow(['Timestamp', datetime.now().isoformat()])
+        writer.writerow(['P99.9', f"{latency['p99_9']:.2f}"])
+        writer.writerow(['Service Time P50', f"{service['p50']:.2f}"])
+        writer.writerow(['Service Time P99', f"{service['p99']:.2f}"])
+        writer.writerow(['Target Rate (req/s)', f'{RATE:g}'])
+        writer.writerow(['Achieved Rate (req/s)', f'{result.achieved_rate():.1f}'])
+        writer.writerow(['Concurrency', f'{CONCURRENCY} ({LOAD_MODE})'])
+
+    print(f"\nResults exported to delay_results.csv")
+
+    # Also export individual latencies
+    with open('delay_latencies.csv', 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Request', 'Latency (ms)', 'Service Time (ms)', 'Status'])
+        for sample in samples:
+            writer.writerow([sample.index - result.warmup_requests + 1, f'{sample.latency_ms:.2f}',
+                             f'{sample.service_ms:.2f}', sample.outcome])
+
+    print(f"Individual latencies exported to delay_latencies.csv")
 
 
 if __name__ == '__main__':
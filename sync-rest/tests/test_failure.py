@@ -1,15 +1,36 @@
 """
 Failure Injection Test for Synchronous REST
-Makes InventoryService return 500 errors and observes OrderService behavior.
+Makes InventoryService return 500 errors and observes OrderService behavior
+under a constant arrival rate (open loop, see common/loadgen.py).
 """
 import requests
-import time
+import os
+import sys
 import csv
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from loadgen import run_load
+
 ORDER_SERVICE_URL = "http://localhost:8001"
 INVENTORY_SERVICE_URL = "http://localhost:8002"
 NUM_REQUESTS = 50
+RATE = float(os.getenv('RATE', '10'))                      # Requests per second
+CONCURRENCY = int(os.getenv('CONCURRENCY', '10'))
+LOAD_MODE = os.getenv('LOAD_MODE', 'threads')              # threads | asyncio
+
+responses = {}  # Request index -> response body, for the sample error output
+
+
+def send_order(i):
+    order_data = {
+        "user_id": f"user_{i}",
+        "item": "Salad",
+        "quantity": 1
+    }
+    response = requests.post(f"{ORDER_SERVICE_URL}/order", json=order_data, timeout=10)
+    responses[i] = response.json() if response.content else {}
+    return response.status_code
 
 
 def test_failure_injection():
@@ -33,84 +54,53 @@ def test_failure_injection():
         print(f"✗ Error enabling failure injection: {e}")
         return
     
-    # Step 2: Send requests and observe failures
-    print(f"\nSending {NUM_REQUESTS} requests with failure injection enabled...")
-    
+    # Step 2: Send requests at a constant rate and observe failures
+    print(f"\nSending {NUM_REQUESTS} requests with failure injection enabled at {RATE:g} req/s "
+          f"({CONCURRENCY} {LOAD_MODE} workers)...")
+
+    responses.clear()
+    load = run_load(send_order, rate=RATE, requests=NUM_REQUESTS, concurrency=CONCURRENCY,
+                    mode=LOAD_MODE)
+
     results = []
     successful_orders = 0
     failed_orders = 0
     timeout_errors = 0
     server_errors = 0
-    
-    for i in range(NUM_REQUESTS):
-        order_data = {
-            "user_id": f"user_{i}",
-            "item": "Salad",
-            "quantity": 1
+
+    for sample in load.measured:
+        result = {
+            'request_num': sample.index + 1,
+            'status_code': sample.outcome,
+            'latency_ms': sample.latency_ms,
+            'response': responses.get(sample.index, {})
         }
-        
-        start_time = time.time()
-        try:
-            response = requests.post(
-                f"{ORDER_SERVICE_URL}/order",
-                json=order_data,
-                timeout=10
-            )
-            end_time = time.time()
-            latency_ms = (end_time - start_time) * 1000
-            
-            result = {
-                'request_num': i + 1,
-                'status_code': response.status_code,
-                'latency_ms': latency_ms,
-                'response': response.json() if response.content else {}
-            }
-            
-            if response.status_code == 200:
-                successful_orders += 1
-                result['outcome'] = 'success'
-            elif response.status_code == 504:
-                timeout_errors += 1
-                failed_orders += 1
-                result['outcome'] = 'timeout'
-            elif response.status_code >= 500:
-                server_errors += 1
-                failed_orders += 1
-                result['outcome'] = 'server_error'
-            else:
-                failed_orders += 1
-                result['outcome'] = 'other_error'
-            
-            results.append(result)
-        
-        except requests.exceptions.Timeout:
-            end_time = time.time()
-            latency_ms = (end_time - start_time) * 1000
+        if sample.outcome == 200:
+            successful_orders += 1
+            result['outcome'] = 'success'
+        elif sample.outcome == 504:
             timeout_errors += 1
             failed_orders += 1
-            results.append({
-                'request_num': i + 1,
-                'status_code': 'TIMEOUT',
-                'latency_ms': latency_ms,
-                'outcome': 'client_timeout',
-                'response': {}
-            })
-        except Exception as e:
-            end_time = time.time()
-            latency_ms = (end_time - start_time) * 1000
+            result['outcome'] = 'timeout'
+        elif isinstance(sample.outcome, int) and sample.outcome >= 500:
+            server_errors += 1
             failed_orders += 1
-            results.append({
-                'request_num': i + 1,
-                'status_code': 'ERROR',
-                'latency_ms': latency_ms,
-                'outcome': 'exception',
-                'response': {'error': str(e)}
-            })
-        
-        # Print progress
-        if (i + 1) % 10 == 0:
-            print(f"Progress: {i+1}/{NUM_REQUESTS} requests completed")
-    
+            result['outcome'] = 'server_error'
+        elif isinstance(sample.outcome, int):
+            failed_orders += 1
+            result['outcome'] = 'other_error'
+        elif sample.outcome in ('Timeout', 'ReadTimeout', 'ConnectTimeout'):
+            timeout_errors += 1
+            failed_orders += 1
+            result['status_code'] = 'TIMEOUT'
+            result['outcome'] = 'client_timeout'
+        else:
+            failed_orders += 1
+            result['status_code'] = 'ERROR'
+            result['outcome'] = 'exception'
+            result['response'] = {'error': sample.error}
+        results.append(result)
+
     # Step 3: Disable failure injection
     print(f"\nDisabling failure injection...")
     try:
@@ -134,6 +124,8 @@ def test_failure_injection():
     print(f"  - Server Errors (5xx): {server_errors}")
     print(f"  - Timeouts: {timeout_errors}")
     print(f"\nFailure Rate: {(failed_orders / NUM_REQUESTS * 100):.1f}%")
+    print(f"Latency (ms, from intended send time): P50 {load.latency.percentile(50):.2f}, "
+          f"P99 {load.latency.percentile(99):.2f}")
     print("="*60)
     
     # Show sample failures
@@ -168,6 +160,10 @@ def test_failure_injection():
         writer.writerow(['Timeouts', timeout_errors, '', ''])
         writer.writerow(['Failure Rate %', f"{(failed_orders / NUM_REQUESTS * 100):.1f}", '', ''])
         writer.writerow(['Timestamp', datetime.now().isoformat(), '', ''])
+        writer.writerow(['P50 (ms)', f"{load.latency.percentile(50):.2f}", '', ''])
+        writer.writerow(['P99 (ms)', f"{load.latency.percentile(99):.2f}", '', ''])
+        writer.writerow(['Target Rate (req/s)', f'{RATE:g}', '', ''])
+        writer.writerow(['Concurrency', f'{CONCURRENCY} ({LOAD_MODE})', '', ''])
     
     print(f"\nResults exported to failure_results.csv")
 